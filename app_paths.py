@@ -47,6 +47,7 @@ def get_user_data_dir():
 APP_DATA_DIR = get_user_data_dir()
 ESPORTAZIONI_DIR = APP_DATA_DIR / "esportazioni"
 LOG_DIR = APP_DATA_DIR / "logs"
+RENDER_CACHE_DIR = APP_DATA_DIR / "anteprime"  # miniature e anteprime dei documenti (render_cache.py)
 
 # Creiamo fisicamente queste directory se non esistono.
 # Questa operazione è sicura perché APP_DATA_DIR è sempre scrivibile.
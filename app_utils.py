@@ -1,4 +1,5 @@
 import logging,socket ,bcrypt,json, csv, os
+import importlib, importlib.util
 import sys
 from PyQt5.QtWidgets import QMessageBox
 logger = logging.getLogger("CatastoGUI.app_utils")
@@ -20,20 +21,13 @@ from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QTextEdit, QDialogButtonBox,
 from catasto_db_manager import CatastoDBManager
 
 
-# Importa FPDF e le sue utility, che ora funzioneranno grazie a fpdf2
-try:
-    from fpdf import FPDF
-    from fpdf.enums import XPos, YPos # Ora possiamo re-importare e usare questi
-    FPDF_AVAILABLE = True
-except ImportError:
-    FPDF_AVAILABLE = False
-    # Definizioni fallback
-    class FPDF: pass
-    class PDFPartita: pass
-    class PDFPossessore: pass
-    class GenericTextReportPDF: pass
-    class BulkReportPDF: pass
-
+# --- INIZIO MODIFICA: fpdf caricato solo al primo uso ---
+# Le classi PDF vivono in pdf_reports.py (PDFPartita, PDFPossessore, GenericTextReportPDF)
+# e pdf_table.py (BulkReportPDF): importare fpdf all'avvio rallentava la comparsa del login.
+# I nomi restano importabili da qui (vedi __getattr__ in fondo al modulo), ma chi li
+# importa in cima a un modulo li carica subito: meglio importarli dove servono.
+FPDF_AVAILABLE = importlib.util.find_spec("fpdf") is not None
+# --- FINE MODIFICA ---
 # --- Funzioni Helper ---
 # All'inizio di app_utils.py
 try:
@@ -43,191 +37,6 @@ except ImportError:
     logging.warning("Libreria 'keyring' non trovata. Salvataggio sicuro password non disponibile.")
 
 
-# --- Classi PDF (versione moderna con new_x e new_y) ---
-
-if FPDF_AVAILABLE:
-    class PDFPartita(FPDF):
-        def header(self):
-            self.set_font('Helvetica', 'B', 12)
-            self.cell(0, 10, 'Dettaglio Partita Catastale', 0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-            self.ln(5)
-
-        def footer(self):
-            self.set_y(-15)  # Posizione a 1.5 cm dal fondo
-            self.set_font('Helvetica', 'I', 8)  # Font in corsivo e più piccolo
-
-            # Aggiungi la dicitura
-            disclaimer = "Il presente report ha valore puramente storico e documentale."
-            self.cell(0, 5, disclaimer, align='C', new_x='LMARGIN', new_y='NEXT')
-
-            # Aggiungi il numero di pagina sotto la dicitura
-            self.cell(0, 5, f'Pagina {self.page_no()}/{{nb}}', align='C')
-
-        def chapter_title(self, title):
-            self.set_font('Helvetica', 'B', 12)
-            self.cell(0, 6, title, 0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-            self.ln(2)
-
-        def chapter_body(self, data_dict):
-            self.set_font('Helvetica', '', 10)
-            page_width = self.w - self.l_margin - self.r_margin
-            for key, value in data_dict.items():
-                text_to_write = f"{key.replace('_', ' ').title()}: {value if value is not None else 'N/D'}"
-                self.multi_cell(page_width, 5, text_to_write, border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-            self.ln(2)
-
-        def simple_table(self, headers, data_rows, col_widths_percent=None):
-            self.set_font('Helvetica', 'B', 9)  # Header in grassetto
-            effective_page_width = self.w - self.l_margin - self.r_margin
-
-            if col_widths_percent:
-                col_widths = [effective_page_width *
-                              (p/100) for p in col_widths_percent]
-            else:
-                num_cols = len(headers)
-                default_col_width = effective_page_width / \
-                    num_cols if num_cols > 0 else effective_page_width
-                col_widths = [default_col_width] * num_cols
-
-            for i, header in enumerate(headers):
-                align = 'C'  # Centra gli header
-                if i == len(headers) - 1:  # Ultima cella della riga header
-                    self.cell(col_widths[i], 7, header, border=1,
-                              new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=align)
-                else:
-                    self.cell(col_widths[i], 7, header, border=1,
-                              new_x=XPos.RIGHT, new_y=YPos.TOP, align=align)
-
-            self.set_font('Helvetica', '', 8)
-            for row in data_rows:
-                for i, item in enumerate(row):
-                    text = str(item) if item is not None else ''
-                    align = 'L'  # Dati allineati a sinistra
-                    if i == len(row) - 1:  # Ultima cella della riga dati
-                        self.cell(
-                            col_widths[i], 6, text, border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=align)
-                    else:
-                        self.cell(
-                            col_widths[i], 6, text, border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align=align)
-            self.ln(4)
-
-    class PDFPossessore(FPDF):
-        def header(self):
-            self.set_font('Helvetica', 'B', 12)
-            self.cell(0, 10, 'Dettaglio Possessore Catastale', border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-            self.ln(5)
-
-        def footer(self):
-            self.set_y(-15)
-            self.set_font('Helvetica', 'I', 8)
-            
-            disclaimer = "Il presente report ha valore puramente storico e documentale."
-            self.cell(0, 5, disclaimer, align='C', new_x='LMARGIN', new_y='NEXT')
-
-            self.cell(0, 5, f'Pagina {self.page_no()}/{{nb}}', align='C')
-
-        def chapter_title(self, title):
-            self.set_font('Helvetica', 'B', 12)
-            self.cell(0, 6, title, border=0, new_x=XPos.LMARGIN,
-                      new_y=YPos.NEXT, align='L')
-            self.ln(2)
-
-        def chapter_body(self, data_dict):
-            self.set_font('Helvetica', '', 10)
-            page_width = self.w - self.l_margin - self.r_margin
-            for key, value in data_dict.items():
-                text_to_write = f"{key.replace('_', ' ').title()}: {value if value is not None else 'N/D'}"
-                try:
-                    self.multi_cell(page_width, 5, text_to_write, border=0,
-                                    new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-                except Exception as e:  # FPDFException
-                    if "Not enough horizontal space" in str(e):
-                        logging.getLogger("CatastoGUI").warning(
-                            f"FPDFException (chapter_body possessore): {e} per testo: {text_to_write[:100]}...")
-                        self.multi_cell(
-                            page_width, 5, f"{key.replace('_', ' ').title()}: [DATI TROPPO LUNGHI]", border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
-                    else:
-                        raise e
-            self.ln(2)
-
-        def simple_table(self, headers, data_rows, col_widths_percent=None):
-            self.set_font('Helvetica', 'B', 9)
-            effective_page_width = self.w - self.l_margin - self.r_margin
-
-            if col_widths_percent:
-                col_widths = [effective_page_width *
-                              (p/100) for p in col_widths_percent]
-            else:
-                num_cols = len(headers)
-                default_col_width = effective_page_width / \
-                    num_cols if num_cols > 0 else effective_page_width
-                col_widths = [default_col_width] * num_cols
-
-            for i, header in enumerate(headers):
-                align = 'C'
-                if i == len(headers) - 1:
-                    self.cell(col_widths[i], 7, header, border=1,
-                              new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=align)
-                else:
-                    self.cell(col_widths[i], 7, header, border=1,
-                              new_x=XPos.RIGHT, new_y=YPos.TOP, align=align)
-
-            self.set_font('Helvetica', '', 8)
-            for row in data_rows:
-                for i, item in enumerate(row):
-                    text = str(item) if item is not None else ''
-                    align = 'L'
-                    if i == len(row) - 1:
-                        self.cell(
-                            col_widths[i], 6, text, border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=align)
-                    else:
-                        self.cell(
-                            col_widths[i], 6, text, border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align=align)
-            self.ln(4)
-else:  # FPDF non disponibile
-    class PDFPartita:
-        pass  # Definizioni vuote per evitare errori di NameError
-
-    class PDFPossessore:
-        pass
-if FPDF_AVAILABLE:
-    class GenericTextReportPDF(FPDF):
-        def __init__(self, orientation='P', unit='mm', format='A4', report_title="Report"):
-            super().__init__(orientation, unit, format)
-            self.report_title = report_title
-            self.set_auto_page_break(auto=True, margin=15)
-            self.set_left_margin(15)
-            self.set_right_margin(15)
-            # Font di default per il corpo del report
-            self.set_font('Helvetica', '', 10)
-
-        def header(self):
-            self.set_font('Helvetica', 'B', 12)
-            self.cell(0, 10, self.report_title, 0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
-            self.ln(5)
-
-        def footer(self):
-            self.set_y(-15)
-            self.set_font('Helvetica', 'I', 8)
-            
-            disclaimer = "Il presente report ha valore puramente storico e documentale."
-            self.cell(0, 5, disclaimer, align='C', new_x='LMARGIN', new_y='NEXT')
-
-            self.cell(0, 5, f'Pagina {self.page_no()}/{{nb}}', align='C')
-
-        def add_report_text(self, text_content: str):
-            """Aggiunge il contenuto testuale del report al PDF."""
-            self.set_font(
-                'Courier', '', 9)  # Usiamo un font monospazio per testo preformattato
-            # Potrebbe scegliere 'Helvetica' se preferisce
-            # Sostituisci i caratteri di tabulazione con spazi per un rendering migliore in PDF
-            text_content = text_content.replace('\t', '    ')
-
-            # multi_cell gestisce automaticamente i ritorni a capo e il wrapping del testo
-            # Larghezza 0 = larghezza piena, altezza riga 5mm
-            self.multi_cell(0, 5, text_content)
-            self.ln()
-
 def get_local_ip_address():
     """
     Ottiene l'indirizzo IP locale della macchina con cui si esce sulla rete.
@@ -487,6 +296,7 @@ def gui_esporta_partita_pdf(parent_widget, db_manager: CatastoDBManager, partita
         return
 
     try:
+        from pdf_reports import PDFPartita
         pdf = PDFPartita()
         pdf.alias_nb_pages()
         pdf.set_auto_page_break(auto=True, margin=15)
@@ -693,6 +503,7 @@ def gui_esporta_possessore_pdf(parent_widget, db_manager: CatastoDBManager, poss
         return
 
     try:
+        from pdf_reports import PDFPossessore
         pdf = PDFPossessore()
         pdf.alias_nb_pages()
         pdf.set_auto_page_break(auto=True, margin=15)
@@ -842,63 +653,27 @@ def get_alternative_filename(original_path):
     return f"{base}_{timestamp}{ext}"
 
 
-if FPDF_AVAILABLE:
-    class BulkReportPDF(FPDF):
-        """
-        Classe PDF specializzata per creare report tabellari lunghi
-        con intestazioni ripetute su ogni pagina.
-        """
-        def __init__(self, orientation='L', unit='mm', format='A4', report_title="Report Dati"):
-            super().__init__(orientation, unit, format) # 'L' per Landscape, più adatto a tabelle
-            self.report_title = report_title
-            self.headers = []
-            self.col_widths = []
-
-        def header(self):
-            self.set_font('Helvetica', 'B', 12)
-            self.cell(0, 10, self.report_title, 0, 1, 'C')
-            self.ln(5)
-            # Stampa l'intestazione della tabella su ogni pagina
-            if self.headers:
-                self.set_font('Helvetica', 'B', 8)
-                self.set_fill_color(230, 230, 230)
-                for i, header in enumerate(self.headers):
-                    self.cell(self.col_widths[i], 7, header, 1, 0, 'C', 1)
-                self.ln()
-
-        def footer(self):
-            self.set_y(-15)
-            self.set_font('Helvetica', 'I', 8)
-            
-            disclaimer = "Il presente report ha valore puramente storico e documentale."
-            self.cell(0, 5, disclaimer, align='C', new_x='LMARGIN', new_y='NEXT')
-
-            self.cell(0, 5, f'Pagina {self.page_no()}/{{nb}}', align='C')
-
-        def print_table(self, headers, data):
-            if not data: return
-            
-            self.headers = headers
-            # Calcola larghezza colonne (semplice divisione)
-            effective_width = self.w - self.l_margin - self.r_margin
-            self.col_widths = [effective_width / len(headers)] * len(headers)
-            
-            self.set_font('Helvetica', '', 8)
-            self.add_page()
-            
-            for row in data:
-                # Controlla se c'è spazio per la riga, altrimenti vai a pagina nuova
-                if self.get_y() + 6 > self.page_break_trigger:
-                    self.add_page()
-
-                for i, header in enumerate(headers):
-                    # Usiamo .get(header) se i dati sono dict, o l'indice se sono liste/tuple
-                    if isinstance(row, dict):
-                        cell_value = str(row.get(header, ''))
-                    else:
-                        cell_value = str(row[i]) if i < len(row) else ''
-                    self.cell(self.col_widths[i], 6, cell_value, 1, 0, 'L')
-                self.ln()
+# --- INIZIO MODIFICA ---
+# BulkReportPDF vive in pdf_table.py (modulo senza Qt, usabile anche dai processi
+# di impaginazione parallela); le altre classi PDF in pdf_reports.py. Restano
+# importabili da qui per compatibilità, ma fpdf viene caricato solo al primo accesso.
+_LAZY_PDF_NAMES = {
+    "PDFPartita": "pdf_reports",
+    "PDFPossessore": "pdf_reports",
+    "GenericTextReportPDF": "pdf_reports",
+    "BulkReportPDF": "pdf_table",
+    "render_table_pdf": "pdf_table",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_PDF_NAMES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+# --- FINE MODIFICA ---
 # In fondo al file app_utils.py
 
 # --- DIALOGHI DI ANTEPRIMA SPOSTATI QUI PER RISOLVERE IMPORTAZIONE CIRCOLARE ---
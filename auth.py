@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Autenticazione degli utenti dell'applicazione
+=============================================
+Hash e verifica delle password (bcrypt) e pipeline di login indipendente da Qt,
+eseguita da LoginWorker (gui_main.py) fuori dal thread dell'interfaccia:
+
+1. lettura delle credenziali (get_user_credentials);
+2. verifica bcrypt della password, il passo costoso, che cresce con il fattore di lavoro;
+3. un'unica chiamata al database (complete_login) che registra l'esito dell'accesso,
+   imposta le variabili di sessione per l'audit e, se l'hash salvato usa un fattore
+   di lavoro inferiore a quello configurato, salva il nuovo hash (rehash al login).
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+import bcrypt
+
+logger = logging.getLogger("CatastoGUI.auth")
+
+APPLICATION_NAME = "CatastoAppGUI"
+
+# Esiti della pipeline di login
+LOGIN_OK = "ok"
+LOGIN_CREDENZIALI_ERRATE = "credenziali_errate"
+LOGIN_UTENTE_NON_ATTIVO = "utente_non_attivo"
+LOGIN_ERRORE_SESSIONE = "errore_sessione"
+
+_dummy_hash: Optional[bytes] = None
+
+
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
+    """Genera un hash bcrypt; `rounds` è il fattore di lavoro (None = default della libreria)."""
+    salt = bcrypt.gensalt(rounds) if rounds else bcrypt.gensalt()
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def verify_password(stored_hash: str, provided_password: str) -> bool:
+    """Verifica se la password fornita corrisponde all'hash memorizzato."""
+    try:
+        return bcrypt.checkpw(provided_password.encode('utf-8'), stored_hash.encode('utf-8'))
+    except ValueError:
+        logger.error(f"Tentativo di verifica con hash non valido: {stored_hash[:10]}...")
+        return False
+    except Exception as e:
+        logger.error(f"Errore imprevisto durante la verifica bcrypt: {e}")
+        return False
+
+
+def hash_rounds(stored_hash: str) -> Optional[int]:
+    """Fattore di lavoro di un hash bcrypt ('$2b$12$...' -> 12), None se il formato non è riconosciuto."""
+    parts = (stored_hash or "").split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(stored_hash: str, rounds: Optional[int]) -> bool:
+    """True se l'hash usa un fattore di lavoro inferiore a quello configurato (mai al ribasso)."""
+    if not rounds:
+        return False
+    current = hash_rounds(stored_hash)
+    return current is not None and current < rounds
+
+
+def _equalize_timing(password: str):
+    """Verifica fittizia per utenti inesistenti: i tempi non rivelano se lo username esiste."""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = bcrypt.hashpw(b"utente-inesistente", bcrypt.gensalt())
+    bcrypt.checkpw(password.encode('utf-8'), _dummy_hash)
+
+
+def authenticate(db_manager, username: str, password: str, client_ip: Optional[str] = None,
+                 rounds: Optional[int] = None, application_name: str = APPLICATION_NAME) -> Dict[str, Any]:
+    """
+    Esegue la pipeline di login e restituisce un dizionario con:
+    'esito' (una delle costanti LOGIN_*), 'user_id', 'user_info' (senza hash),
+    'session_id' e 'rehashed' (True se l'hash è stato aggiornato).
+    Le eccezioni del database (DBMError) vengono propagate al chiamante.
+    """
+    result: Dict[str, Any] = {"esito": LOGIN_CREDENZIALI_ERRATE, "user_id": None, "user_info": None,
+                              "session_id": None, "rehashed": False}
+    credentials = db_manager.get_user_credentials(username)
+    if not credentials:
+        _equalize_timing(password)
+        logger.warning(f"Login fallito (utente '{username}' non trovato).")
+        return result
+
+    user_id = credentials.get('id')
+    stored_hash = credentials.get('password_hash') or ""
+    # La verifica bcrypt precede qualunque esito: i tempi non rivelano lo stato dell'account
+    if stored_hash:
+        password_ok = verify_password(stored_hash, password)
+    else:
+        _equalize_timing(password)
+        password_ok = False
+
+    if not credentials.get('attivo', False):
+        logger.warning(f"Login fallito (utente '{username}' non attivo).")
+        if password_ok:  # Con la password errata l'esito resta "credenziali errate"
+            result["esito"] = LOGIN_UTENTE_NON_ATTIVO
+        return result
+
+    if not password_ok:
+        logger.warning(f"Login fallito (pwd errata) per utente '{username}'.")
+        db_manager.complete_login(user_id, False, client_ip, application_name)
+        return result
+
+    new_hash = hash_password(password, rounds) if needs_rehash(stored_hash, rounds) else None
+    session_id = db_manager.complete_login(user_id, True, client_ip, application_name, new_password_hash=new_hash)
+    if not session_id:
+        result["esito"] = LOGIN_ERRORE_SESSIONE
+        return result
+
+    if new_hash:
+        logger.info(f"Hash della password di '{username}' aggiornato al fattore di lavoro {rounds}.")
+    user_info = {k: v for k, v in credentials.items() if k != 'password_hash'}
+    result.update(esito=LOGIN_OK, user_id=user_id, user_info=user_info, session_id=session_id,
+                  rehashed=bool(new_hash))
+    logger.info(f"Login riuscito per utente '{username}' (ID App: {user_id}).")
+    return result
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Supporto per backup e ripristino con pg_dump / pg_restore
+=========================================================
+Usato da CatastoDBManager (costruzione dei comandi) e da BackupWidget (avanzamento).
+
+- Formato directory (-Fd): l'unico che pg_dump sa scrivere in parallelo (--jobs N);
+  pg_restore -j N ripristina in parallelo sia il formato directory sia il custom.
+- Compressione: da pg_dump 16 si può scegliere il metodo (--compress=gzip|lz4|zstd[:livello]);
+  con versioni precedenti è disponibile solo gzip con il livello (-Z N). Conta la
+  versione dello strumento client, che deve essere stata compilata con lz4/zstd.
+- Avanzamento per tabella: con --verbose pg_dump scrive 'dumping contents of table "s.t"'
+  e pg_restore 'processing data for table "s.t"'; BackupProgressTracker conta queste righe.
+- Verifica: manifest SHA-256 accanto al backup (formato di sha256sum, '<backup>.sha256')
+  e confronto dei conteggi di righe dopo un ripristino di prova
+  (CatastoDBManager.verify_backup).
+
+Il modulo non importa Qt né psycopg2.
+"""
+
+import hashlib
+import os
+import re
+import subprocess
+from typing import Dict, List, Optional, Set, Tuple
+
+COMPRESSION_METHODS = ("gzip", "lz4", "zstd", "none")
+# Livelli ammessi per metodo (min, max, default)
+COMPRESSION_LEVELS = {"gzip": (0, 9, 6), "lz4": (1, 12, 1), "zstd": (1, 22, 3)}
+MIN_VERSION_COMPRESSION_METHODS = 16
+
+_VERSION_RE = re.compile(r"\(PostgreSQL\)\s+(\d+)")
+_TABLE_LINE_RE = re.compile(r'(?:dumping contents of table|processing data for table)\s+"([^"]+)"')
+_TOC_TABLE_DATA_RE = re.compile(r"^\d+;\s*\d+\s+\d+\s+TABLE DATA\s", re.MULTILINE)
+MANIFEST_SUFFIX = ".sha256"
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def parse_tool_major_version(version_output: str) -> Optional[int]:
+    """'pg_dump (PostgreSQL) 16.2' -> 16."""
+    match = _VERSION_RE.search(version_output or "")
+    return int(match.group(1)) if match else None
+
+
+def get_tool_major_version(executable_path: str, timeout: float = 10.0) -> Optional[int]:
+    """Versione principale di pg_dump/pg_restore (None se non determinabile)."""
+    try:
+        result = subprocess.run([executable_path, "--version"], capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return parse_tool_major_version(result.stdout)
+
+
+def compression_args(method: Optional[str], level: Optional[int], tool_major_version: Optional[int]) -> List[str]:
+    """
+    Argomenti di compressione per pg_dump. `method` None lascia il default dello strumento.
+    Con versioni precedenti alla 16 (o sconosciute) lz4/zstd ripiegano su gzip.
+    """
+    if not method:
+        return []
+    if method not in COMPRESSION_METHODS:
+        raise ValueError(f"Metodo di compressione non supportato: {method}")
+    if method == "none":
+        return ["-Z", "0"]
+    low, high, default = COMPRESSION_LEVELS[method]
+    level = default if level is None else max(low, min(high, int(level)))
+    if tool_major_version is not None and tool_major_version >= MIN_VERSION_COMPRESSION_METHODS:
+        return [f"--compress={method}:{level}"]
+    gzip_low, gzip_high, gzip_default = COMPRESSION_LEVELS["gzip"]
+    if method != "gzip":
+        level = gzip_default
+    return ["-Z", str(max(gzip_low, min(gzip_high, level)))]
+
+
+def count_toc_table_data(toc_listing: str) -> int:
+    """Numero di voci TABLE DATA nell'elenco prodotto da 'pg_restore -l'."""
+    return len(_TOC_TABLE_DATA_RE.findall(toc_listing or ""))
+
+
+class BackupProgressTracker:
+    """Conta le tabelle elaborate leggendo l'output --verbose di pg_dump/pg_restore."""
+
+    def __init__(self, total_tables: int = 0):
+        self.total_tables = max(0, total_tables)
+        self._seen: Set[str] = set()
+
+    @property
+    def done(self) -> int:
+        return len(self._seen)
+
+    def feed_line(self, line: str) -> Optional[str]:
+        """Restituisce il nome della tabella se la riga ne annuncia una nuova, altrimenti None."""
+        match = _TABLE_LINE_RE.search(line)
+        if not match or match.group(1) in self._seen:
+            return None
+        self._seen.add(match.group(1))
+        return match.group(1)
+
+    def percent(self) -> Optional[int]:
+        """Percentuale completata (None se il totale non è noto)."""
+        if not self.total_tables:
+            return None
+        return min(100, int(self.done * 100 / max(self.total_tables, self.done)))
+
+
+# ---------------------------------------------------------------------------
+# Verifica dei backup
+# ---------------------------------------------------------------------------
+def manifest_path_for(backup_path: str) -> str:
+    return backup_path.rstrip("/\\") + MANIFEST_SUFFIX
+
+
+def backup_files(backup_path: str) -> List[Tuple[str, str]]:
+    """[(nome relativo, percorso)] dei file del backup: il file stesso o il contenuto della cartella."""
+    if os.path.isdir(backup_path):
+        return [(name, os.path.join(backup_path, name)) for name in sorted(os.listdir(backup_path))
+                if os.path.isfile(os.path.join(backup_path, name))]
+    return [(os.path.basename(backup_path), backup_path)]
+
+
+def backup_size(backup_path: str) -> int:
+    return sum(os.path.getsize(path) for _, path in backup_files(backup_path))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_checksum_manifest(backup_path: str) -> str:
+    """Scrive '<backup>.sha256' (una riga 'hash  nome' per file) e ne restituisce il percorso."""
+    manifest = manifest_path_for(backup_path)
+    lines = [f"{file_sha256(path)}  {name}\n" for name, path in backup_files(backup_path)]
+    with open(manifest, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    return manifest
+
+
+def verify_checksum_manifest(backup_path: str) -> List[str]:
+    """Problemi rilevati confrontando il backup con il suo manifest (lista vuota = integro)."""
+    manifest = manifest_path_for(backup_path)
+    expected: Dict[str, str] = {}
+    with open(manifest, "r", encoding="utf-8") as f:
+        for line in f:
+            digest, _, name = line.rstrip("\n").partition("  ")
+            if digest and name:
+                expected[name] = digest
+    actual = dict(backup_files(backup_path))
+    problems = [f"File mancante: {name}" for name in expected if name not in actual]
+    problems += [f"File non presente nel manifest: {name}" for name in actual if name not in expected]
+    problems += [f"Checksum diverso: {name}" for name, digest in expected.items()
+                 if name in actual and file_sha256(actual[name]) != digest]
+    return problems
+
+
+def compare_row_counts(live: Dict[str, int], restored: Dict[str, int]) -> List[str]:
+    """Differenze tra i conteggi di righe del database e quelli del ripristino di prova."""
+    problems = [f"Tabella assente nel ripristino: {table}" for table in sorted(live) if table not in restored]
+    problems += [f"{table}: {live[table]} righe nel database, {restored[table]} nel ripristino"
+                 for table in sorted(live) if table in restored and live[table] != restored[table]]
+    return problems
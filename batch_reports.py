@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+Generazione dei report di proprietà in blocco
+=============================================
+Produce il report di proprietà di tutte le partite di un comune (o di un elenco
+di ID) in un unico lavoro:
+
+- i dati sono letti a blocchi con poche query insiemistiche
+  (CatastoDBManager.iter_report_proprieta_batch);
+- l'impaginazione avviene in parallelo in un pool di processi;
+- l'uscita è un PDF per partita oppure un unico PDF con segnalibri;
+- ogni file è scritto in modo atomico e registrato nel manifest
+  (manifest.json nella cartella di destinazione): se il lavoro si interrompe,
+  rilanciandolo sulla stessa cartella riparte dalle partite mancanti;
+- al termine il manifest riporta file, impronte SHA-256 ed eventuali errori.
+
+Il modulo non importa Qt: le funzioni eseguite nei processi di lavoro devono
+restare leggere e serializzabili (pickle).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from report_renderer import REPORT_DISCLAIMER, render_text
+
+try:
+    from fpdf import FPDF
+    FPDF_AVAILABLE = True
+except ImportError:
+    FPDF = None
+    FPDF_AVAILABLE = False
+
+logger = logging.getLogger("CatastoGUI.batch_reports")
+
+MODE_PER_PARTITA = "per_partita"   # Un PDF per ogni partita
+MODE_UNICO = "unico"               # Un solo PDF con un segnalibro per partita
+BATCH_MODES = (MODE_PER_PARTITA, MODE_UNICO)
+
+MANIFEST_NAME = "manifest.json"
+PARTS_DIR_NAME = "parti"           # Testi intermedi della modalità 'unico' (servono anche per la ripresa)
+MANIFEST_VERSION = 1
+MANIFEST_SAVE_INTERVAL = 2.0       # secondi tra un salvataggio del manifest e il successivo
+FETCH_CHUNK_SIZE = 200             # partite lette dal database per ogni blocco
+
+ProgressCallback = Callable[[int, int, str], None]
+
+
+class BatchReportError(Exception):
+    """Errore bloccante del lavoro (parametri non validi, FPDF assente, ...)."""
+    pass
+
+
+# ----------------------------------------------------------------------------
+# Impaginazione PDF (eseguita anche nei processi di lavoro)
+# ----------------------------------------------------------------------------
+
+def _latin1(text: str) -> str:
+    """I font standard di FPDF coprono solo latin-1: i caratteri esterni diventano '?'."""
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+
+if FPDF_AVAILABLE:
+    class BatchReportPDF(FPDF):
+        """PDF dei report testuali, con titolo in testa e numero di pagina in calce."""
+
+        def __init__(self, report_title: str = "Report di Proprietà"):
+            super().__init__("P", "mm", "A4")
+            self.report_title = _latin1(report_title)
+            self.set_auto_page_break(auto=True, margin=15)
+            self.set_margins(15, 15, 15)
+
+        def header(self):
+            self.set_font("Helvetica", "B", 12)
+            self.cell(0, 10, self.report_title, align="C", new_x="LMARGIN", new_y="NEXT")
+            self.ln(3)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font("Helvetica", "I", 8)
+            self.cell(0, 5, REPORT_DISCLAIMER, align="C", new_x="LMARGIN", new_y="NEXT")
+            self.cell(0, 5, f"Pagina {self.page_no()}/{{nb}}", align="C")
+
+        def add_report(self, text: str, bookmark: Optional[str] = None):
+            """Aggiunge un report su una nuova pagina, con segnalibro facoltativo."""
+            self.add_page()
+            if bookmark:
+                self.start_section(_latin1(bookmark))
+            self.set_font("Courier", "", 9)
+            self.multi_cell(0, 4.5, _latin1(text))
+else:
+    class BatchReportPDF:
+        pass
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_target(path: str) -> str:
+    return f"{path}.tmp{os.getpid()}"
+
+
+def render_partita_output(mode: str, partita_id: int, data: Dict[str, Any], output_path: str) -> Tuple[int, str]:
+    """
+    Lavoro unitario del pool: impagina il report di una partita e lo scrive in
+    `output_path` (PDF in modalità per_partita, testo in modalità unico).
+    Restituisce (partita_id, sha256 del file).
+    """
+    text = render_text("proprieta", data)
+    tmp_path = _atomic_target(output_path)
+    if mode == MODE_PER_PARTITA:
+        pdf = BatchReportPDF(report_title=f"Report di Proprietà - {_bookmark_for(data)}")
+        pdf.alias_nb_pages()
+        pdf.add_report(text)
+        pdf.output(tmp_path)
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+    os.replace(tmp_path, output_path)  # Il file compare solo se completo
+    return partita_id, _sha256_file(output_path)
+
+
+def _bookmark_for(data: Dict[str, Any]) -> str:
+    suffisso = f"/{data['suffisso_partita']}" if data.get("suffisso_partita") else ""
+    return f"Partita n. {data.get('numero_partita')}{suffisso} ({data.get('comune_nome') or 'N/D'})"
+
+
+def _output_name(partita_id: int, data: Dict[str, Any], extension: str) -> str:
+    suffisso = re.sub(r"[^A-Za-z0-9]+", "", str(data.get("suffisso_partita") or ""))
+    numero = data.get("numero_partita") or 0
+    return f"partita_{int(numero):05d}{suffisso}_id{partita_id}.{extension}"
+
+
+# ----------------------------------------------------------------------------
+# Lavoro in blocco
+# ----------------------------------------------------------------------------
+
+class BatchReportJob:
+    """
+    Lavoro di generazione dei report di proprietà per un comune o un elenco di partite.
+
+    run() è bloccante: va eseguito in un thread di lavoro (vedi BatchReportThread
+    nella GUI). `cancel_check` viene interrogato tra un blocco e l'altro.
+    """
+
+    def __init__(self, db_manager, output_dir: str, comune_id: Optional[int] = None,
+                 partita_ids: Optional[List[int]] = None, mode: str = MODE_PER_PARTITA,
+                 workers: Optional[int] = None, comune_nome: Optional[str] = None):
+        if mode not in BATCH_MODES:
+            raise BatchReportError(f"Modalità non valida: {mode}")
+        if comune_id is None and not partita_ids:
+            raise BatchReportError("Indicare un comune o un elenco di partite.")
+        self.db_manager = db_manager
+        self.output_dir = os.path.abspath(output_dir)
+        self.comune_id = comune_id
+        self.comune_nome = comune_nome
+        self.requested_ids = list(partita_ids) if partita_ids else None
+        self.mode = mode
+        self.workers = max(1, workers if workers is not None else (os.cpu_count() or 2) - 1)
+        self.manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        self.manifest: Dict[str, Any] = {}
+        self._last_manifest_save = 0.0
+
+    # --- Manifest -----------------------------------------------------------
+
+    def _job_key(self) -> Dict[str, Any]:
+        return {"tipo_report": "proprieta", "modalita": self.mode, "comune_id": self.comune_id,
+                "partita_ids_richiesti": sorted(self.requested_ids) if self.requested_ids else None}
+
+    def _load_or_create_manifest(self) -> None:
+        key = self._job_key()
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    previous = json.load(f)
+                if previous.get("versione") == MANIFEST_VERSION and all(previous.get(k) == v for k, v in key.items()):
+                    self.manifest = previous
+                    self.manifest["ripreso_il"] = datetime.now().isoformat(timespec="seconds")
+                    logger.info(f"Ripresa del lavoro in '{self.output_dir}' "
+                                f"({sum(1 for v in previous.get('voci', {}).values() if v.get('stato') == 'ok')} partite già pronte).")
+                    return
+                logger.warning(f"Manifest esistente in '{self.output_dir}' relativo a un altro lavoro: verrà sostituito.")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Manifest illeggibile in '{self.output_dir}' ({e}): si riparte da zero.")
+        self.manifest = dict(key, versione=MANIFEST_VERSION, comune_nome=self.comune_nome, voci={},
+                             avviato_il=datetime.now().isoformat(timespec="seconds"))
+
+    def _save_manifest(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_manifest_save < MANIFEST_SAVE_INTERVAL:
+            return
+        self.manifest["aggiornato_il"] = datetime.now().isoformat(timespec="seconds")
+        tmp_path = _atomic_target(self.manifest_path)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        self._last_manifest_save = now
+
+    def _is_done(self, partita_id: int) -> bool:
+        voce = self.manifest["voci"].get(str(partita_id))
+        return bool(voce and voce.get("stato") == "ok"
+                    and os.path.exists(os.path.join(self.output_dir, voce["file"])))
+
+    # --- Esecuzione ---------------------------------------------------------
+
+    def run(self, progress_callback: Optional[ProgressCallback] = None,
+            cancel_check: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+        """Esegue (o riprende) il lavoro e restituisce il manifest finale."""
+        if not FPDF_AVAILABLE:
+            raise BatchReportError("La libreria FPDF è necessaria per generare i PDF, ma non è installata.")
+        progress = progress_callback or (lambda done, total, message: None)
+        cancelled = cancel_check or (lambda: False)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.mode == MODE_UNICO:
+            os.makedirs(os.path.join(self.output_dir, PARTS_DIR_NAME), exist_ok=True)
+        self._load_or_create_manifest()
+
+        partita_ids = self.requested_ids or self.db_manager.get_partita_ids_for_comune(self.comune_id)
+        self.manifest["partita_ids"] = partita_ids
+        self.manifest["stato"] = "in_corso"
+        pending = [pid for pid in partita_ids if not self._is_done(pid)]
+        total = len(partita_ids)
+        done = total - len(pending)
+        self._save_manifest(force=True)
+        progress(done, total, f"{done} partite già pronte, {len(pending)} da generare.")
+
+        executor = self._create_executor() if pending else None
+        in_flight: Dict[Any, Tuple[int, str, str]] = {}
+        max_in_flight = self.workers * 4  # Limita i dati in memoria in attesa di impaginazione
+
+        def record(partita_id: int, file_name: str, titolo: str, sha256: Optional[str], error: Optional[str]):
+            nonlocal done
+            voce = {"file": file_name, "titolo": titolo, "stato": "ok" if error is None else "errore"}
+            if sha256:
+                voce["sha256"] = sha256
+            if error:
+                voce["errore"] = error
+                logger.error(f"Report partita ID {partita_id} non generato: {error}")
+            self.manifest["voci"][str(partita_id)] = voce
+            done += 1
+            progress(done, total, titolo)
+            self._save_manifest()
+
+        def collect(futures):
+            for future in futures:
+                partita_id, file_name, titolo = in_flight.pop(future)
+                try:
+                    _, sha256 = future.result()
+                    record(partita_id, file_name, titolo, sha256, None)
+                except Exception as e:  # Comprende BrokenProcessPool: la partita verrà ripresa al prossimo avvio
+                    record(partita_id, file_name, titolo, None, str(e) or e.__class__.__name__)
+
+        try:
+            batches = self.db_manager.iter_report_proprieta_batch(pending, chunk_size=FETCH_CHUNK_SIZE)
+            try:
+                for batch in batches:
+                    for partita_id, data in batch:
+                        if cancelled():
+                            return self._finish("annullato", executor, in_flight)
+                        extension = "pdf" if self.mode == MODE_PER_PARTITA else "txt"
+                        file_name = _output_name(partita_id, data, extension)
+                        if self.mode == MODE_UNICO:
+                            file_name = os.path.join(PARTS_DIR_NAME, file_name)
+                        titolo = _bookmark_for(data)
+                        args = (self.mode, partita_id, data, os.path.join(self.output_dir, file_name))
+
+                        if executor is not None:
+                            try:
+                                in_flight[executor.submit(render_partita_output, *args)] = (partita_id, file_name, titolo)
+                                if len(in_flight) >= max_in_flight:
+                                    finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                                    collect(finished)
+                                continue
+                            except (BrokenProcessPool, RuntimeError) as e:
+                                logger.warning(f"Pool di processi non disponibile ({e}): si prosegue nel thread corrente.")
+                                executor = None
+                        try:
+                            _, sha256 = render_partita_output(*args)
+                            record(partita_id, file_name, titolo, sha256, None)
+                        except Exception as e:
+                            record(partita_id, file_name, titolo, None, str(e))
+            finally:
+                batches.close()
+
+            if in_flight:
+                collect(list(wait(list(in_flight)).done))
+            if self.mode == MODE_UNICO and not cancelled():
+                progress(done, total, "Composizione del PDF unico...")
+                self._assemble_merged_pdf(partita_ids)
+            return self._finish("annullato" if cancelled() else "completato", executor, in_flight)
+        except Exception:
+            self.manifest["stato"] = "errore"
+            self._save_manifest(force=True)
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _create_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 1:
+            return None
+        try:
+            return ProcessPoolExecutor(max_workers=self.workers)
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"Impossibile avviare il pool di processi ({e}): impaginazione nel thread corrente.")
+            return None
+
+    def _assemble_merged_pdf(self, partita_ids: List[int]) -> None:
+        """Unisce i testi intermedi in un solo PDF, con un segnalibro per partita."""
+        title = f"Report di Proprietà - {self.comune_nome}" if self.comune_nome else "Report di Proprietà"
+        pdf = BatchReportPDF(report_title=title)
+        pdf.alias_nb_pages()
+        included = 0
+        for pid in partita_ids:
+            voce = self.manifest["voci"].get(str(pid))
+            if not voce or voce.get("stato") != "ok":
+                continue
+            with open(os.path.join(self.output_dir, voce["file"]), "r", encoding="utf-8") as f:
+                pdf.add_report(f.read(), bookmark=voce["titolo"])
+            included += 1
+
+        file_name = f"report_proprieta_{self.comune_id or 'selezione'}.pdf"
+        target = os.path.join(self.output_dir, file_name)
+        tmp_path = _atomic_target(target)
+        pdf.output(tmp_path)
+        os.replace(tmp_path, target)
+        self.manifest["file_unico"] = {"file": file_name, "partite": included, "sha256": _sha256_file(target)}
+
+    def _finish(self, stato: str, executor, in_flight) -> Dict[str, Any]:
+        if executor is not None and in_flight:
+            executor.shutdown(wait=True, cancel_futures=True)
+        voci = self.manifest["voci"]
+        self.manifest["stato"] = stato
+        self.manifest["totali"] = {
+            "richieste": len(self.manifest.get("partita_ids", [])),
+            "ok": sum(1 for v in voci.values() if v.get("stato") == "ok"),
+            "errori": sum(1 for v in voci.values() if v.get("stato") == "errore"),
+        }
+        if stato == "completato":
+            self.manifest["completato_il"] = datetime.now().isoformat(timespec="seconds")
+        self._save_manifest(force=True)
+        logger.info(f"Lavoro di report in blocco {stato}: {self.manifest['totali']}")
+        return self.manifest
@@ -20,12 +20,29 @@ from psycopg2 import sql, extras, pool
 import sys, csv
 import logging
 from datetime import date, datetime
-from typing import List, Dict, Any, Optional, Tuple, Union
+from typing import List, Dict, Any, Optional, Set, Tuple, Union, Iterator
 import json
 import uuid
 import os
 import shutil # Per trovare i percorsi degli eseguibili
+import subprocess
+import functools
+import threading
+import time
 from contextlib import contextmanager
+from config import DEFAULT_EXECUTION_PROFILES, REFERENCE_CACHE_TTL_SECONDS, PERMISSION_CACHE_TTL_SECONDS, DOCUMENT_STORE_DIR
+from permissions import PermissionCache, PERMISSIONS_CHANNEL
+from invalidation_bus import InvalidationBus, NotificationListener, INVALIDATION_CHANNEL
+from reference_cache import ReferenceDataCache
+import incremental_export
+import document_ingestion
+import time_series
+from document_store import DocumentStore, DEFAULT_GC_GRACE_SECONDS
+from backup_tools import (compression_args, count_toc_table_data, get_tool_major_version,
+                          backup_size, manifest_path_for, write_checksum_manifest,
+                          verify_checksum_manifest, compare_row_counts)
+from db_pool import (BlockingPriorityPool, PoolTimeoutError, DEFAULT_CHECKOUT_TIMEOUT,
+                     PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND)
 from PyQt5.QtWidgets import (QAbstractItemView, QAction, QApplication, 
                              QCheckBox, QComboBox, QDateEdit, QDateTimeEdit,
                              QDialog, QDialogButtonBox, QDoubleSpinBox,
@@ -69,8 +86,112 @@ class DBNotFoundError(DBMError):
 class DBDataError(DBMError):
     """Sollevata per errori relativi a dati o parametri forniti non validi."""
     pass
+
+class DBOperationCancelled(DBMError):
+    """Sollevata (anche dal chiamante, es. dentro una COPY) quando l'utente annulla un'operazione."""
+    pass
+# -------------------------------------------------
+
+# ------------ INSTRADAMENTO SU REPLICHE IN SOLA LETTURA ------------
+REPLICA_RETRY_AFTER_SECONDS = 30  # Dopo un errore, la replica viene riprovata solo dopo questo intervallo
+REPLICA_CHECKOUT_TIMEOUT = 5.0    # Attesa breve sulla replica: meglio ripiegare presto sul primario
+
+# Genealogia delle partite (vedi sql_scripts/21_genealogia_ricorsiva.sql)
+GENEALOGY_DEFAULT_DEPTH = 10
+GENEALOGY_MAX_DEPTH = 50           # Coincide con genealogia_profondita_massima() lato SQL
+
+
+def _is_standby_error(error: Exception) -> bool:
+    """Errori propri di una replica (standby) che il primario non avrebbe: conflitti di recovery, scritture."""
+    if isinstance(error, psycopg2.errors.ReadOnlySqlTransaction):
+        return True
+    return isinstance(error, psycopg2.Error) and "conflict with recovery" in str(error).lower()
+
+def read_only_replica(func):
+    """
+    Decoratore che dichiara un metodo di CatastoDBManager come 'sola lettura':
+    le connessioni ottenute con _get_connection() durante la sua esecuzione
+    vengono prese da una replica (se configurata e raggiungibile), altrimenti
+    dal primario. Da NON usare per metodi che scrivono o che devono leggere
+    subito dati appena scritti (read-your-writes).
+    Se una query sulla replica fallisce per un errore proprio dello standby
+    (conflitto con il recovery, transazione in sola lettura) il metodo viene
+    rieseguito una volta sul primario, anche se l'errore era stato gestito al suo interno.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        state = self._routing_state
+        previous = getattr(state, "read_only", False)
+        previous_failure = getattr(state, "replica_failure", None)
+        state.read_only = True
+        state.replica_failure = None
+        try:
+            try:
+                result = func(self, *args, **kwargs)
+            except Exception:
+                if state.replica_failure is None:
+                    raise
+            else:
+                if state.replica_failure is None:
+                    return result
+            self.logger.warning(f"{func.__name__}: errore sulla replica ({state.replica_failure}); "
+                                f"ripeto la lettura sul primario.")
+            state.replica_failure = None
+            with self.force_primary():
+                return func(self, *args, **kwargs)
+        finally:
+            state.read_only = previous
+            state.replica_failure = previous_failure
+    wrapper.routes_to_replica = True
+    return wrapper
+
+def execution_profile(profile_name: str):
+    """
+    Decoratore che associa un profilo di esecuzione (vedi config.DEFAULT_EXECUTION_PROFILES)
+    a un metodo di CatastoDBManager: ogni transazione aperta con _get_connection()
+    durante la sua esecuzione riceve SET LOCAL statement_timeout / work_mem / jit
+    del profilo. I metodi senza decoratore non applicano alcun profilo e restano sui
+    default del server: un limite di tempo non deve interrompere a metà una scrittura.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            state = self._routing_state
+            previous = getattr(state, "profile", None)
+            state.profile = profile_name
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                state.profile = previous
+        wrapper.execution_profile = profile_name
+        return wrapper
+    return decorator
+
+def invalidates_reference(entity: str):
+    """
+    Decoratore per i metodi che modificano dati di riferimento (comune, tipo_localita,
+    periodo_storico): a scrittura riuscita, quindi dopo il commit, invalida subito la
+    cache locale senza attendere la notifica del server (read-your-writes).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            result = func(self, *args, **kwargs)
+            self.reference_cache.invalidate(entity)
+            return result
+        return wrapper
+    return decorator
 # -------------------------------------------------
 
+class DBChangeNotifier(QObject):
+    """
+    Ponte tra InvalidationBus e Qt: riemette ogni invalidazione come segnale.
+    Il segnale parte dal thread di ascolto; i widget, che vivono nel thread GUI,
+    lo ricevono tramite connessione accodata.
+    """
+    entity_changed = pyqtSignal(str, object)  # (entità, ID oppure None = tutti i record)
+
+
 class CatastoDBManager:
     
     def __init__(self, dbname, user, password, host, port,
@@ -79,7 +200,10 @@ class CatastoDBManager:
                  log_file="catasto_db_manager.log",
                  log_level=logging.DEBUG, # O il suo default
                  min_conn=2,
-                 max_conn=20):
+                 max_conn=20,
+                 pool_timeout=DEFAULT_CHECKOUT_TIMEOUT,
+                 replica_dsns: Optional[List[str]] = None,
+                 execution_profiles: Optional[Dict[str, Dict[str, str]]] = None):
        
         
         self._main_db_conn_params = {"dbname": dbname, "user": user, "password": password, "host": host, "port": port}
@@ -88,6 +212,7 @@ class CatastoDBManager:
         self.application_name = application_name
         self._min_conn_pool = min_conn
         self._max_conn_pool = max_conn
+        self._pool_checkout_timeout = pool_timeout # Secondi di attesa massima per una connessione libera
         # --- AGGIUNGERE QUESTA RIGA ---
         self.last_connection_error = None # Per memorizzare i dettagli dell'ultimo errore
         # -----------------------------
@@ -96,6 +221,42 @@ class CatastoDBManager:
         # ... (resto della configurazione del logger come prima) ...
         self.logger.info(f"Inizializzato gestore DB (parametri memorizzati) per {dbname}@{host}")
         self.pool = None # Il pool viene inizializzato esplicitamente dopo
+
+        # --- Repliche in sola lettura (opzionali) ---
+        # Ogni elemento è un DSN libpq, es. "host=replica1 port=5433 dbname=catasto_storico user=... password=..."
+        self._replica_dsns: List[str] = [dsn.strip() for dsn in (replica_dsns or []) if dsn and dsn.strip()]
+        self.replica_pools: List[Dict[str, Any]] = [] # [{'dsn':..., 'pool':..., 'down_until': float}]
+        self._replica_rr_index = 0
+        self._replica_lock = threading.Lock()
+        self._routing_state = threading.local() # Flag per-thread impostati da @read_only_replica / force_primary
+
+        # --- Profili di esecuzione (statement_timeout, work_mem, jit per transazione) ---
+        self.execution_profiles: Dict[str, Dict[str, str]] = {
+            name: dict(params) for name, params in DEFAULT_EXECUTION_PROFILES.items()
+        }
+        for name, params in (execution_profiles or {}).items():
+            self.execution_profiles.setdefault(name, {}).update(params)
+
+        # --- Cache dei permessi (invalidata via LISTEN/NOTIFY, vedi sql_scripts/23_notifiche_permessi.sql) ---
+        self.permission_cache = PermissionCache(self.get_user_permissions, ttl=PERMISSION_CACHE_TTL_SECONDS)
+
+        # --- Bus di invalidazione delle cache (vedi sql_scripts/24_notifiche_invalidazione.sql) ---
+        self.invalidation_bus = InvalidationBus()
+        self.change_notifier = DBChangeNotifier()
+        self.invalidation_bus.subscribe_all(self.change_notifier.entity_changed.emit)
+        self._notification_listener: Optional[NotificationListener] = None
+
+        # --- Cache dei dati di riferimento (TTL + versione per entità, invalidata dal bus) ---
+        self.reference_cache = ReferenceDataCache()
+        self.reference_cache.register("comuni", self._load_comuni, "comune", REFERENCE_CACHE_TTL_SECONDS)
+        self.reference_cache.register("comuni_semplice", self._load_elenco_comuni_semplice, "comune", REFERENCE_CACHE_TTL_SECONDS)
+        self.reference_cache.register("tipi_localita", self._load_tipi_localita, "tipo_localita", REFERENCE_CACHE_TTL_SECONDS)
+        self.reference_cache.register("periodi_storici", self._load_historical_periods, "periodo_storico", REFERENCE_CACHE_TTL_SECONDS)
+        for entity in ("comune", "tipo_localita", "periodo_storico"):
+            self.invalidation_bus.subscribe(entity, self.reference_cache.invalidate)
+
+        # --- Archivio allegati indirizzato per contenuto (vedi sql_scripts/25_archivio_documenti.sql) ---
+        self.document_store = DocumentStore(DOCUMENT_STORE_DIR)
     # In catasto_db_manager.py, SOSTITUISCI il metodo initialize_main_pool con questo:
 
     def initialize_main_pool(self) -> bool:
@@ -110,17 +271,22 @@ class CatastoDBManager:
             "minconn": self._min_conn_pool,
             "maxconn": self._max_conn_pool,
             **self._main_db_conn_params,
-            "options": f"-c search_path={self.schema},public -c application_name='{self.application_name}_{target_dbname}'"
+            # application_name come parametro di connessione: in 'options' gli apici resterebbero nel valore
+            "application_name": f"{self.application_name}_{target_dbname}",
+            "options": f"-c search_path={self.schema},public"
         }
         
         try:
             self.logger.info(f"Tentativo di inizializzazione pool per DB '{target_dbname}'...")
-            self.pool = psycopg2.pool.ThreadedConnectionPool(**pool_config)
+            # Pool bloccante con code di priorità: attende invece di sollevare subito PoolError
+            self.pool = BlockingPriorityPool(checkout_timeout=self._pool_checkout_timeout, **pool_config)
             
             conn_test = self.pool.getconn()
             self.pool.putconn(conn_test)
             
             self.logger.info(f"Pool di connessioni per DB '{target_dbname}' inizializzato e testato con successo.")
+            self._initialize_replica_pools()
+            self._start_notification_listener()
             return True
 
         except (psycopg2.pool.PoolError, psycopg2.Error) as e_init:
@@ -158,12 +324,122 @@ class CatastoDBManager:
             self.pool = None
             return False
 
+    def _initialize_replica_pools(self):
+        """
+        Crea un pool per ciascuna replica configurata. Un errore su una replica
+        non è bloccante: la replica viene marcata come non disponibile e le
+        letture ripiegano sul primario.
+        """
+        self._close_replica_pools()
+        for dsn in self._replica_dsns:
+            entry = {"dsn": self._complete_replica_dsn(dsn), "pool": None, "down_until": 0.0}
+            dsn = entry["dsn"]
+            try:
+                entry["pool"] = self._create_replica_pool(dsn)
+                self.logger.info(f"Pool replica in sola lettura inizializzato: {self._mask_dsn(dsn)}")
+            except Exception as e:
+                entry["down_until"] = time.monotonic() + REPLICA_RETRY_AFTER_SECONDS
+                self.logger.warning(f"Replica non disponibile ({self._mask_dsn(dsn)}): {e}. Le letture useranno il primario.")
+            self.replica_pools.append(entry)
+
+    def _create_replica_pool(self, dsn: str) -> BlockingPriorityPool:
+        return BlockingPriorityPool(
+            1, self._max_conn_pool,
+            checkout_timeout=REPLICA_CHECKOUT_TIMEOUT,
+            dsn=dsn,
+            application_name=f"{self.application_name}_replica",
+            # Protezione aggiuntiva: nessuna scrittura accidentale passa dalla replica
+            options=f"-c search_path={self.schema},public -c default_transaction_read_only=on")
+
+    def _complete_replica_dsn(self, dsn: str) -> str:
+        """Completa il DSN della replica con dbname/utente/password del primario, se mancanti."""
+        try:
+            given = psycopg2.extensions.parse_dsn(dsn)
+        except psycopg2.ProgrammingError as e:
+            self.logger.error(f"DSN replica non valido '{self._mask_dsn(dsn)}': {e}")
+            return dsn
+        missing = {k: v for k, v in self._main_db_conn_params.items()
+                   if k in ("dbname", "user", "password") and k not in given and v}
+        return psycopg2.extensions.make_dsn(dsn, **missing) if missing else dsn
+
+    def _close_replica_pools(self):
+        for entry in self.replica_pools:
+            if entry.get("pool"):
+                try:
+                    entry["pool"].closeall()
+                except Exception as e:
+                    self.logger.error(f"Errore chiusura pool replica {self._mask_dsn(entry['dsn'])}: {e}")
+        self.replica_pools = []
+
+    @staticmethod
+    def _mask_dsn(dsn: str) -> str:
+        """Nasconde la password in un DSN prima di scriverlo nei log."""
+        return " ".join("password=***" if part.lower().startswith("password=") else part for part in dsn.split())
+
+    def _checkout_replica_connection(self, priority: int):
+        """
+        Tenta di ottenere una connessione da una replica disponibile (round-robin).
+        Restituisce (pool, conn) oppure (None, None) se nessuna replica è utilizzabile.
+        """
+        if not self.replica_pools:
+            return None, None
+        now = time.monotonic()
+        with self._replica_lock:
+            count = len(self.replica_pools)
+            start = self._replica_rr_index
+            self._replica_rr_index = (self._replica_rr_index + 1) % count
+        for offset in range(count):
+            entry = self.replica_pools[(start + offset) % count]
+            if entry["down_until"] > now:
+                continue
+            try:
+                if entry["pool"] is None:
+                    # Replica caduta in precedenza: nuovo tentativo di creazione del pool
+                    entry["pool"] = self._create_replica_pool(entry["dsn"])
+                conn = entry["pool"].getconn(priority=priority)
+                return entry["pool"], conn
+            except PoolTimeoutError as e:
+                # Replica raggiungibile ma satura: non va esclusa, si prova la successiva (o il primario)
+                self.logger.info(f"Replica {self._mask_dsn(entry['dsn'])} occupata ({e}): provo la successiva.")
+            except (psycopg2.Error, psycopg2.pool.PoolError) as e:
+                entry["down_until"] = now + REPLICA_RETRY_AFTER_SECONDS
+                self.logger.warning(f"Replica {self._mask_dsn(entry['dsn'])} non raggiungibile ({e}); "
+                                    f"ripiego sul primario per {REPLICA_RETRY_AFTER_SECONDS}s.")
+                if isinstance(e, psycopg2.OperationalError) and entry["pool"] is not None:
+                    entry["pool"].closeall()
+                    entry["pool"] = None
+        return None, None
+
+    @contextmanager
+    def force_primary(self):
+        """
+        Forza l'uso del primario anche dentro metodi marcati @read_only_replica
+        (es. per rileggere subito un dato appena salvato).
+        """
+        previous = getattr(self._routing_state, "force_primary", False)
+        self._routing_state.force_primary = True
+        try:
+            yield
+        finally:
+            self._routing_state.force_primary = previous
+
+    def get_replica_status(self) -> List[Dict[str, Any]]:
+        """Stato delle repliche configurate (per diagnostica/GUI)."""
+        now = time.monotonic()
+        return [{
+            "dsn": self._mask_dsn(entry["dsn"]),
+            "available": entry["pool"] is not None and entry["down_until"] <= now,
+            "stats": entry["pool"].stats() if entry["pool"] else {},
+        } for entry in self.replica_pools]
+
     def close_pool(self):
         """
         Chiude tutte le connessioni nel pool e imposta self.pool a None.
         Questo metodo dovrebbe essere chiamato quando l'applicazione si chiude
         o quando il database a cui il pool è connesso viene cancellato.
         """
+        self._stop_notification_listener()
+        self._close_replica_pools()
         if self.pool:
             try:
                 pool_name_app = self.pool._kwargs.get('application_name', self.application_name) # Tenta di ottenere il nome specifico del pool
@@ -178,6 +454,35 @@ class CatastoDBManager:
         else:
             self.logger.info("close_pool chiamato, ma il pool non era attivo o già None.")
 
+    def _start_notification_listener(self):
+        """
+        Avvia l'ascolto delle notifiche (permessi e invalidazioni) su una connessione
+        dedicata, esterna al pool.
+        """
+        if self._notification_listener and self._notification_listener.is_alive():
+            return
+        dbname = self._main_db_conn_params.get("dbname")
+        listener_params = {**self._main_db_conn_params,
+                           "application_name": f"{self.application_name}_{dbname}_listener"}
+        self._notification_listener = NotificationListener(
+            connect=lambda: psycopg2.connect(**listener_params),
+            handlers={PERMISSIONS_CHANNEL: self.permission_cache.handle_notification,
+                      INVALIDATION_CHANNEL: self.invalidation_bus.handle_notification},
+            on_resync=self._on_notification_listener_resync)
+        self._notification_listener.start()
+
+    def _on_notification_listener_resync(self):
+        # Le notifiche inviate mentre la connessione di ascolto era caduta sono perse
+        self.permission_cache.invalidate()
+        self.invalidation_bus.invalidate_all()
+
+    def _stop_notification_listener(self):
+        if self._notification_listener:
+            self._notification_listener.stop()
+            self._notification_listener = None
+        self.permission_cache.invalidate()
+        self.reference_cache.invalidate()
+
     def _get_maintenance_connection(self, db_user_admin: str, db_password_admin: str, maintenance_dbname: str = "postgres"):
         """Ottiene una connessione singola a un database di manutenzione (es. postgres)."""
         maint_conn_params = self._main_db_conn_params.copy()
@@ -250,17 +555,75 @@ class CatastoDBManager:
                 conn_maint.close()
 # In catasto_db_manager.py, all'interno della classe CatastoDBManager
 
+    def _apply_execution_profile(self, conn, profile_name: Optional[str], local: bool = True):
+        """
+        Applica il profilo alla transazione corrente con set_config(..., is_local=true),
+        equivalente a SET LOCAL: i valori decadono al commit/rollback e la connessione
+        torna al pool pulita. Un solo round-trip per tutti i parametri.
+        Con `local=False` i valori valgono per la sessione (connessioni in autocommit,
+        dove SET LOCAL durerebbe una sola istruzione): vanno ripristinati con
+        _reset_execution_profile prima di restituire la connessione al pool.
+        """
+        params = self.execution_profiles.get(profile_name) if profile_name else None
+        if not params:
+            return
+        try:
+            is_local = "true" if local else "false"
+            placeholders = ", ".join(f"set_config(%s, %s, {is_local})" for _ in params)
+            values = [item for pair in params.items() for item in pair]
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {placeholders};", values)
+        except psycopg2.Error as e:
+            # Valore non valido in configurazione: si prosegue con i default del server
+            self.logger.warning(f"Impossibile applicare il profilo di esecuzione '{profile_name}' {params}: {e}")
+            conn.rollback()
+
+    def _reset_execution_profile(self, conn, profile_name: str):
+        """Riporta ai valori di default della sessione i parametri applicati con local=False."""
+        params = self.execution_profiles.get(profile_name)
+        if not params:
+            return
+        with conn.cursor() as cur:
+            cur.execute("SELECT set_config(name, reset_val, false) FROM pg_settings WHERE name = ANY(%s);",
+                        (list(params),))
+
+    def get_execution_profile(self, profile_name: str) -> Dict[str, str]:
+        """Restituisce i parametri del profilo di esecuzione indicato."""
+        return dict(self.execution_profiles.get(profile_name, {}))
+
     @contextmanager
-    def _get_connection(self):
+    def _get_connection(self, priority: int = PRIORITY_NORMAL, timeout: Optional[float] = None,
+                        profile: Optional[str] = None, read_only: bool = False, snapshot: bool = False):
         """
         Context manager per ottenere e rilasciare in sicurezza una connessione dal pool.
         Garantisce che putconn() sia sempre chiamato.
+
+        `priority` sceglie la corsia di attesa quando il pool è esaurito
+        (PRIORITY_INTERACTIVE per la GUI, PRIORITY_BACKGROUND per esportazioni e MV);
+        `timeout` sovrascrive il timeout di checkout predefinito del pool.
+        `profile` forza un profilo di esecuzione; se assente si usa quello impostato
+        da @execution_profile sul metodo chiamante, altrimenti nessuno (default del server).
+        `read_only` equivale a @read_only_replica per chi non può usare il decoratore
+        (es. generatori, la cui esecuzione avviene dopo il ritorno del metodo).
+        `snapshot` apre una transazione REPEATABLE READ, READ ONLY sul primario: tutte
+        le query del blocco vedono la stessa istantanea (esportazioni coerenti).
         """
         conn = None
+        source_pool = None
+        profile_name = profile or getattr(self._routing_state, "profile", None)
         try:
             if not self.pool:
                 raise psycopg2.pool.PoolError("Il pool di connessioni non è inizializzato.")
-            conn = self.pool.getconn()
+            # Metodi @read_only_replica: prima una replica, poi (fallback) il primario
+            if (read_only or getattr(self._routing_state, "read_only", False)) and not getattr(self._routing_state, "force_primary", False):
+                source_pool, conn = self._checkout_replica_connection(priority)
+            if conn is None:
+                source_pool = self.pool
+                conn = self.pool.getconn(priority=priority, timeout=timeout)
+            if snapshot:
+                with conn.cursor() as cur:
+                    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+            self._apply_execution_profile(conn, profile_name)
             yield conn
             # Il commit qui è implicito all'uscita del blocco 'with' senza eccezioni
             # Non chiamare conn.commit() se le transazioni sono gestite dall'esterno
@@ -270,9 +633,28 @@ class CatastoDBManager:
             # Se si tratta di DML classiche, serve un commit esplicito.
             conn.commit() # Manteniamo questo per operazioni DML standard
         except psycopg2.pool.PoolError as pe:
-            self.logger.error(f"Errore critico nell'ottenere una connessione dal pool: {pe}")
+            if isinstance(pe, PoolTimeoutError):
+                self.logger.error(f"Timeout in attesa di una connessione dal pool: {pe} Stato: {self.get_pool_stats()}")
+            else:
+                self.logger.error(f"Errore critico nell'ottenere una connessione dal pool: {pe}")
             raise psycopg2.OperationalError(f"Impossibile ottenere una connessione valida dal pool: {pe}")
+        except DBOperationCancelled:
+            # Annullamento richiesto dall'utente: non è un errore del database
+            if conn:
+                try:
+                    conn.rollback()
+                except psycopg2.Error as rollback_err:
+                    self.logger.warning(f"Rollback dopo l'annullamento non riuscito: {rollback_err}")
+            self.logger.info("Operazione annullata dall'utente: transazione annullata.")
+            raise
         except Exception as e:
+            on_replica = source_pool is not None and source_pool is not self.pool
+            if on_replica and _is_standby_error(e):
+                # Raccolto da @read_only_replica, che ripete la lettura sul primario
+                self._routing_state.replica_failure = e
+            elif isinstance(e, psycopg2.errors.QueryCanceled):
+                limit = self.execution_profiles.get(profile_name, {}).get("statement_timeout")
+                self.logger.warning(f"Query annullata: superato statement_timeout={limit} del profilo '{profile_name}'.")
             if conn:
                 try:
                     conn.rollback() # Annulla la transazione in caso di altri errori
@@ -281,15 +663,24 @@ class CatastoDBManager:
                     # Se il rollback fallisce perché la connessione è già chiusa,
                     # e l'errore originale era OperationalError (connessione persa),
                     # è un segnale che il pool potrebbe essere corrotto.
-                    if isinstance(e, psycopg2.OperationalError):
+                    if isinstance(e, psycopg2.OperationalError) and not on_replica:
                         self.logger.critical("Errore operativo critico: il server ha chiuso la connessione. Il pool potrebbe essere invalido.", exc_info=True)
                         self.close_pool() # Forziamo la chiusura del pool in questo caso critico
-            self.logger.error(f"Errore durante l'uso della connessione: {e}", exc_info=True)
+            if on_replica and _is_standby_error(e):
+                self.logger.warning(f"Errore specifico della replica: {e}")
+            else:
+                self.logger.error(f"Errore durante l'uso della connessione: {e}", exc_info=True)
             raise # Rilancia l'eccezione originale
         finally:
-            if conn:
-                self.pool.putconn(conn)
+            if conn and source_pool:
+                source_pool.putconn(conn)
     
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Restituisce i contatori del pool (connessioni in uso, inattive, thread in attesa)."""
+        if not self.pool:
+            return {}
+        return self.pool.stats()
+
     def disconnect_pool_temporarily(self) -> bool:
         self.logger.info("Chiusura temporanea del pool di connessioni per operazione di ripristino...")
         self.close_pool() # Chiude e nullifica self.pool
@@ -402,6 +793,7 @@ class CatastoDBManager:
 
     # In catasto_db_manager.py, SOSTITUISCI il metodo aggiungi_comune con questo:
 
+    @invalidates_reference("comune")
     def aggiungi_comune(self,
                         nome_comune: str,
                         provincia: str,
@@ -528,26 +920,35 @@ class CatastoDBManager:
                 return None
     
     def get_comuni(self, search_term: Optional[str] = None) -> List[Dict[str, Any]]:
-        query = f"SELECT id, nome, provincia, regione FROM {self.schema}.comune"
-        params = []
-        if search_term:
-            query += " WHERE nome ILIKE %s"
-            params.append(f"%{search_term}%")
-        query += " ORDER BY nome"
-        
+        """Comuni (id, nome, provincia, regione) dalla cache; il filtro sul nome è applicato in memoria."""
         try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=DictCursor) as cur:
-                    cur.execute(query, params)
-                    results = cur.fetchall()
-                    self.logger.info(f"Recuperati {len(results)} comuni (search_term: '{search_term}').")
-                    return [dict(row) for row in results]
+            comuni = self.reference_cache.get("comuni")
         except Exception as e:
             self.logger.error(f"Errore DB in get_comuni: {e}", exc_info=True)
             # In caso di errore, restituisce una lista vuota per non bloccare la UI
             return []
+        if search_term:
+            term = search_term.casefold()
+            comuni = [c for c in comuni if term in (c.get("nome") or "").casefold()]
+        return comuni
+
+    def _load_comuni(self) -> List[Dict[str, Any]]:
+        query = f"SELECT id, nome, provincia, regione FROM {self.schema}.comune ORDER BY nome"
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cur:
+                cur.execute(query)
+                results = [dict(row) for row in cur.fetchall()]
+                self.logger.info(f"Recuperati {len(results)} comuni.")
+                return results
+
+    def warm_reference_cache(self) -> threading.Thread:
+        """Precarica in un thread di background i dati di riferimento (da chiamare dopo il login)."""
+        thread = threading.Thread(target=self.reference_cache.warm, name="ReferenceCacheWarmup", daemon=True)
+        thread.start()
+        return thread
     
     # In catasto_db_manager.py, dentro la classe CatastoDBManager
+    @execution_profile("export")
     def get_partita_data_for_export(self, partita_id: int) -> Optional[Dict[str, Any]]:
         """
         Recupera i dati di una partita per l'esportazione chiamando una funzione SQL,
@@ -612,17 +1013,21 @@ class CatastoDBManager:
     # In catasto_db_manager.py, aggiungi questi metodi
 
     def get_tipi_localita(self) -> List[Dict[str, Any]]:
-        """Recupera tutte le tipologie di località disponibili."""
-        query = "SELECT id, nome, descrizione FROM catasto.tipo_localita ORDER BY nome;"
+        """Recupera tutte le tipologie di località disponibili (dalla cache dei dati di riferimento)."""
         try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                    cur.execute(query)
-                    return [dict(row) for row in cur.fetchall()]
+            return self.reference_cache.get("tipi_localita")
         except Exception as e:
             self.logger.error(f"Errore nel recuperare i tipi di località: {e}", exc_info=True)
             raise DBMError("Impossibile recuperare le tipologie di località.") from e
 
+    def _load_tipi_localita(self) -> List[Dict[str, Any]]:
+        query = "SELECT id, nome, descrizione FROM catasto.tipo_localita ORDER BY nome;"
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                cur.execute(query)
+                return [dict(row) for row in cur.fetchall()]
+
+    @invalidates_reference("tipo_localita")
     def gestisci_tipo_localita(self, tipo_id: Optional[int], nome: str, descrizione: Optional[str] = None) -> int:
         """Crea o aggiorna una tipologia di località."""
         if not nome or not nome.strip():
@@ -654,6 +1059,7 @@ class CatastoDBManager:
             raise DBMError("Operazione sulla tipologia di località fallita.") from e
 
     # Potresti voler aggiungere anche un metodo per l'eliminazione
+    @invalidates_reference("tipo_localita")
     def elimina_tipo_localita(self, tipo_id: int) -> bool:
         """Elimina una tipologia di località, solo se non è utilizzata."""
         query = "DELETE FROM catasto.tipo_localita WHERE id = %s;"
@@ -705,20 +1111,25 @@ class CatastoDBManager:
     def get_elenco_comuni_semplice(self) -> List[Tuple]:
         """
         Recupera un elenco di tutti i comuni (ID e nome) per popolare una scelta utente.
+        Servito dalla cache dei dati di riferimento.
         """
-        query = f"SELECT id, nome FROM {self.schema}.comune ORDER BY nome"
         try:
-            with self._get_connection() as conn:
-                # Qui non usiamo DictCursor perché la firma del metodo prevede una lista di tuple
-                with conn.cursor() as cur:
-                    cur.execute(query)
-                    return cur.fetchall()
+            return self.reference_cache.get("comuni_semplice")
         except Exception as e:
             self.logger.error(f"Errore nel recuperare l'elenco dei comuni: {e}", exc_info=True)
             # Solleviamo un'eccezione personalizzata per informare il chiamante del fallimento
             raise DBMError("Impossibile recuperare l'elenco dei comuni.") from e
+
+    def _load_elenco_comuni_semplice(self) -> List[Tuple]:
+        query = f"SELECT id, nome FROM {self.schema}.comune ORDER BY nome"
+        with self._get_connection() as conn:
+            # Qui non usiamo DictCursor perché la firma del metodo prevede una lista di tuple
+            with conn.cursor() as cur:
+                cur.execute(query)
+                return [tuple(row) for row in cur.fetchall()]
     # In catasto_db_manager.py, sostituisci la vecchia funzione con questa:
 
+    @execution_profile("maintenance")
     def import_possessori_from_csv(self, file_path: str, comune_id: int, comune_nome: str) -> Dict[str, list]:
         """
         Importa una lista di possessori da un file CSV, gestendo gli errori riga per riga.
@@ -819,6 +1230,7 @@ class CatastoDBManager:
             raise DBMError(f"Errore critico di sistema durante l'importazione: {e}") from e
     # In catasto_db_manager.py, SOSTITUISCI la vecchia funzione con questa
 
+    @execution_profile("maintenance")
     def import_partite_from_csv(self, file_path: str, comune_id: int, comune_nome: str) -> Dict[str, list]:
         """
         Importa una lista di partite da un file CSV, gestendo gli errori riga per riga.
@@ -962,33 +1374,13 @@ class CatastoDBManager:
 
     # In catasto_db_manager.py
 
+    @execution_profile("export")
+    @read_only_replica
     def get_elenco_variazioni_per_esportazione(self, comune_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """Recupera un elenco completo di variazioni, usando la vista aggiornata."""
-        query = f"SELECT * FROM {self.schema}.v_variazioni_complete"
-        params = []
-        
-        if comune_id:
-            # Recupera il nome del comune dall'ID per filtrare sulla vista
-            # Questa è una chiamata aggiuntiva al DB.
-            # Se la vista potesse includere direttamente l'ID, sarebbe più efficiente.
-            comune_info = self.get_comune_by_id(comune_id) # Presumo esista o lo creiamo
-            if comune_info and comune_info.get('nome_comune'): # Usa 'nome_comune' come chiave
-                comune_nome = comune_info['nome_comune']
-                # --- INIZIO CORREZIONE: Filtra sulla colonna 'partita_origine_comune' ---
-                query += " WHERE partita_origine_comune = %s"
-                params.append(comune_nome)
-                # --- FINE CORREZIONE ---
-            else:
-                self.logger.warning(f"Nome comune non trovato per ID {comune_id}. Impossibile filtrare le variazioni.")
-                # Se il comune ID non è valido o non trova il nome, non aggiunge il filtro.
-                # Questo potrebbe portare a un elenco completo anziché filtrato.
-                # Decidi se vuoi sollevare un'eccezione o restituire una lista vuota in questo caso.
-                # Per ora, non filtra e procede con l'elenco completo.
-
-        query += " ORDER BY data_variazione DESC;"
-
+        query, params = self._build_export_query_variazioni(comune_id)
         try:
-            with self._get_connection() as conn:
+            with self._get_connection(priority=PRIORITY_BACKGROUND) as conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
                     cur.execute(query, params)
                     return [dict(row) for row in cur.fetchall()]
@@ -996,6 +1388,20 @@ class CatastoDBManager:
             # Incapsula l'errore per dare più contesto al chiamante GUI
             raise DBMError(f"Impossibile recuperare l'elenco delle variazioni: {e}") from e
 
+    def _build_export_query_variazioni(self, comune_id: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """
+        Query (senza ';' finale) per l'elenco variazioni, condivisa da esportazione a lista,
+        streaming e COPY. La vista espone solo il nome del comune di origine, quindi il
+        filtro per ID passa da una sottoquery invece che da una chiamata separata.
+        """
+        query = f"SELECT * FROM {self.schema}.v_variazioni_complete"
+        params: List[Any] = []
+        if comune_id:
+            query += f" WHERE partita_origine_comune = (SELECT nome FROM {self.schema}.comune WHERE id = %s)"
+            params.append(comune_id)
+        query += " ORDER BY data_variazione DESC"
+        return query, params
+
     # --- NUOVO METODO: Aggiungi questo metodo alla classe CatastoDBManager ---
     def get_comune_by_id(self, comune_id: int) -> Optional[Dict[str, Any]]:
         """Recupera i dettagli di un comune tramite il suo ID."""
@@ -1018,6 +1424,8 @@ class CatastoDBManager:
         except Exception as e:
             self.logger.error(f"Errore DB in get_comune_by_id (ID: {comune_id}): {e}", exc_info=True)
             return None
+    @execution_profile("report")
+    @read_only_replica
     def get_report_consistenza_patrimoniale(self, comune_id: int) -> Dict[str, List[Dict]]:
         """
         Genera i dati per un report di consistenza patrimoniale per un dato comune.
@@ -1039,7 +1447,7 @@ class CatastoDBManager:
         """
 
         try:
-            with self._get_connection() as conn:
+            with self._get_connection(priority=PRIORITY_BACKGROUND) as conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
                     cur.execute(query_possessori, (comune_id,))
                     possessori_nel_comune = [dict(row) for row in cur.fetchall()]
@@ -1078,6 +1486,20 @@ class CatastoDBManager:
         if not isinstance(comune_id, int) or comune_id <= 0:
             raise DBDataError("ID comune non valido.")
 
+        query, params = self._build_possessori_by_comune_query(comune_id, filter_text, solo_con_partite)
+
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                    cur.execute(query, tuple(params))
+                    return [dict(row) for row in cur.fetchall()]
+        except Exception as e:
+            self.logger.error(f"Errore DB in get_possessori_by_comune: {e}", exc_info=True)
+            raise DBMError("Impossibile recuperare i possessori.") from e
+
+    def _build_possessori_by_comune_query(self, comune_id: int, filter_text: Optional[str] = None,
+                                          solo_con_partite: bool = False) -> Tuple[str, List[Union[int, str]]]:
+        """Query (senza ';' finale) dei possessori di un comune, usata anche dall'esportazione."""
         params: List[Union[int, str]] = [comune_id]
 
         # --- INIZIO CORREZIONE: Query modificata per conteggio e filtro partite ---
@@ -1111,17 +1533,9 @@ class CatastoDBManager:
         if solo_con_partite:
             query_base += " HAVING COUNT(pp.partita_id) > 0"
 
-        query = query_base + " ORDER BY p.nome_completo;"
+        query = query_base + " ORDER BY p.nome_completo"
         # --- FINE CORREZIONE ---
-
-        try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                    cur.execute(query, tuple(params))
-                    return [dict(row) for row in cur.fetchall()]
-        except Exception as e:
-            self.logger.error(f"Errore DB in get_possessori_by_comune: {e}", exc_info=True)
-            raise DBMError("Impossibile recuperare i possessori.") from e
+        return query, params
     
     
     def get_partite_per_possessore(self, possessore_id: int) -> List[Dict[str, Any]]:
@@ -1144,8 +1558,21 @@ class CatastoDBManager:
                 raise DBMError("Impossibile recuperare le partite per il possessore.") from e
     
 
+    @execution_profile("export")
+    @read_only_replica
     def get_elenco_immobili_per_esportazione(self, comune_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """Recupera un elenco completo di immobili per l'esportazione."""
+        query, params = self._build_export_query_immobili(comune_id)
+        try:
+            with self._get_connection(priority=PRIORITY_BACKGROUND) as conn:
+                with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                    cur.execute(query, params)
+                    return [dict(row) for row in cur.fetchall()]
+        except Exception as e:
+            raise DBMError(f"Impossibile recuperare l'elenco degli immobili: {e}") from e
+
+    def _build_export_query_immobili(self, comune_id: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """Query (senza ';' finale) per l'elenco immobili da esportare."""
         query = f"""
             SELECT 
                 i.id AS id_immobile, i.natura, i.classificazione, i.consistenza,
@@ -1158,40 +1585,224 @@ class CatastoDBManager:
             JOIN {self.schema}.localita l ON i.localita_id = l.id
             LEFT JOIN {self.schema}.tipo_localita tl ON l.tipo_id = tl.id
         """
-        params = []
+        params: List[Any] = []
         if comune_id:
             query += " WHERE p.comune_id = %s"
             params.append(comune_id)
-        query += " ORDER BY c.nome, p.numero_partita, l.nome, i.natura;"
+        query += " ORDER BY c.nome, p.numero_partita, l.nome, i.natura"
+        return query, params
+
+    @execution_profile("export")
+    @read_only_replica
+    def get_elenco_localita_per_esportazione(self, comune_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Recupera un elenco completo di località per l'esportazione."""
+        query, params = self._build_export_query_localita(comune_id)
         try:
-            with self._get_connection() as conn:
+            with self._get_connection(priority=PRIORITY_BACKGROUND) as conn:
                 with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
                     cur.execute(query, params)
                     return [dict(row) for row in cur.fetchall()]
         except Exception as e:
-            raise DBMError(f"Impossibile recuperare l'elenco degli immobili: {e}") from e
+            raise DBMError(f"Impossibile recuperare l'elenco delle località: {e}") from e
 
-    def get_elenco_localita_per_esportazione(self, comune_id: Optional[int] = None) -> List[Dict[str, Any]]:
-        """Recupera un elenco completo di località per l'esportazione."""
+    def _build_export_query_localita(self, comune_id: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """Query (senza ';' finale) per l'elenco località da esportare."""
         query = f"""
             SELECT l.id, l.nome, tl.nome AS tipo, l.civico, c.nome AS comune_nome
             FROM {self.schema}.localita l
             JOIN {self.schema}.comune c ON l.comune_id = c.id
             LEFT JOIN {self.schema}.tipo_localita tl ON l.tipo_id = tl.id
         """
-        params = []
+        params: List[Any] = []
         if comune_id:
             query += " WHERE l.comune_id = %s"
             params.append(comune_id)
-        query += " ORDER BY c.nome, l.nome;"
+        query += " ORDER BY c.nome, l.nome"
+        return query, params
+    
+    # --- ESPORTAZIONE IN STREAMING (cursore lato server, memoria costante) ---
+
+    def build_export_query(self, export_key: str, comune_id: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """
+        Restituisce (query, parametri) dell'esportazione indicata, la stessa usata dai
+        metodi get_* a lista. export_key: possessori, partite, immobili, localita, variazioni.
+        """
+        builders = {
+            "possessori": self._build_possessori_by_comune_query,
+            "partite": self._build_partite_by_comune_query,
+            "immobili": self._build_export_query_immobili,
+            "localita": self._build_export_query_localita,
+            "variazioni": self._build_export_query_variazioni,
+        }
+        builder = builders.get(export_key)
+        if builder is None:
+            raise DBDataError(f"Tipo di esportazione non supportato: '{export_key}'.")
+        return builder(comune_id)
+
+    def count_export_rows(self, export_key: str, comune_id: Optional[int] = None) -> int:
+        """Conta le righe di un'esportazione (serve alla barra di avanzamento)."""
+        query, params = self.build_export_query(export_key, comune_id)
         try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-                    cur.execute(query, params)
-                    return [dict(row) for row in cur.fetchall()]
+            with self._get_connection(priority=PRIORITY_BACKGROUND, profile="export", read_only=True) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"SELECT COUNT(*) FROM ({query}) AS righe_export;", params)
+                    return cur.fetchone()[0]
         except Exception as e:
-            raise DBMError(f"Impossibile recuperare l'elenco delle località: {e}") from e
-    
+            raise DBMError(f"Impossibile contare le righe da esportare: {e}") from e
+
+    def iter_export_rows(self, export_key: str, comune_id: Optional[int] = None,
+                         batch_size: int = 2000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Generatore che restituisce le righe dell'esportazione a blocchi di `batch_size`,
+        leggendole da un cursore lato server (named cursor): in memoria c'è solo un
+        blocco alla volta, qualunque sia la dimensione del comune.
+        Chiudere il generatore (es. annullamento) chiude cursore e transazione.
+        """
+        query, params = self.build_export_query(export_key, comune_id)
+        cursor_name = f"export_{export_key}_{uuid.uuid4().hex[:8]}"
+        try:
+            with self._get_connection(priority=PRIORITY_BACKGROUND, profile="export", read_only=True) as conn:
+                with conn.cursor(name=cursor_name, cursor_factory=DictCursor) as cur:
+                    cur.itersize = batch_size
+                    cur.execute(query, params)
+                    while True:
+                        rows = cur.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        yield [dict(row) for row in rows]
+        except psycopg2.Error as e:
+            self.logger.error(f"Errore DB durante l'esportazione in streaming '{export_key}': {e}", exc_info=True)
+            raise DBMError(f"Errore durante la lettura dei dati da esportare: {e}") from e
+
+    # Esportazioni per cui il CSV può essere prodotto direttamente dal server con COPY
+    COPY_EXPORT_KEYS = ("immobili", "localita", "variazioni")
+
+    def copy_export_to_file(self, export_key: str, comune_id: Optional[int], file_obj,
+                            columns: Optional[Dict[str, str]] = None) -> int:
+        """
+        Percorso veloce per i CSV: esegue COPY (SELECT ...) TO STDOUT WITH (FORMAT csv, HEADER,
+        DELIMITER ';') sulla stessa query di build_export_query e scrive i byte prodotti dal
+        server direttamente in `file_obj` (aperto in modalità binaria), senza formattare
+        le righe in Python. `columns` ({colonna: intestazione}) seleziona e rinomina le
+        colonne, come HEADER_MAPPINGS nella GUI. Restituisce il numero di righe copiate
+        (se il driver lo riporta, altrimenti -1).
+        """
+        if export_key not in self.COPY_EXPORT_KEYS:
+            raise DBDataError(f"Esportazione '{export_key}' non disponibile tramite COPY.")
+        query, params = self.build_export_query(export_key, comune_id)
+        try:
+            with self._get_connection(priority=PRIORITY_BACKGROUND, profile="export", read_only=True) as conn:
+                with conn.cursor() as cur:
+                    # COPY non accetta parametri: la query viene resa letterale con mogrify (quoting sicuro del driver)
+                    inner_query = cur.mogrify(query, params).decode(psycopg2.extensions.encodings[conn.encoding])
+                    if columns:
+                        select_list = sql.SQL(", ").join(
+                            sql.SQL("{} AS {}").format(sql.Identifier(key), sql.Identifier(label))
+                            for key, label in columns.items())
+                    else:
+                        select_list = sql.SQL("*")
+                    copy_query = sql.SQL(
+                        "COPY (SELECT {cols} FROM ({inner}) AS righe_export) "
+                        "TO STDOUT WITH (FORMAT csv, HEADER, DELIMITER ';', ENCODING 'UTF8')"
+                    ).format(cols=select_list, inner=sql.SQL(inner_query))
+                    cur.copy_expert(copy_query.as_string(conn), file_obj)
+                    self.logger.info(f"Esportazione '{export_key}' tramite COPY completata ({cur.rowcount} righe).")
+                    return cur.rowcount
+        except psycopg2.Error as e:
+            self.logger.error(f"Errore DB durante COPY dell'esportazione '{export_key}': {e}", exc_info=True)
+            raise DBMError(f"Errore durante l'esportazione CSV diretta: {e}") from e
+
+    # ------------------------------------------------------------------
+    # Dati per i report in blocco (batch_reports.py)
+    # ------------------------------------------------------------------
+
+    @read_only_replica
+    def get_partita_ids_for_comune(self, comune_id: int) -> List[int]:
+        """ID di tutte le partite di un comune, in ordine di numero e suffisso."""
+        if not isinstance(comune_id, int) or comune_id <= 0:
+            raise DBDataError("ID comune non valido.")
+        query = f"""
+            SELECT id FROM {self.schema}.partita
+            WHERE comune_id = %s
+            ORDER BY numero_partita, suffisso_partita NULLS FIRST, id
+        """
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, (comune_id,))
+                    return [row[0] for row in cur.fetchall()]
+        except psycopg2.Error as e:
+            self.logger.error(f"Errore DB in get_partita_ids_for_comune (comune {comune_id}): {e}", exc_info=True)
+            raise DBMError(f"Impossibile recuperare le partite del comune: {e}") from e
+
+    def iter_report_proprieta_batch(self, partita_ids: List[int],
+                                    chunk_size: int = 500) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+        """
+        Generatore dei dati del report di proprietà per molte partite, a blocchi di
+        `chunk_size`. Per ogni blocco esegue quattro query insiemistiche (partite,
+        intestatari, immobili, variazioni con WHERE ... = ANY(%s)) invece di una
+        chiamata a report_proprieta_json per partita. I dict prodotti hanno la
+        stessa struttura di report_proprieta_json, quindi report_renderer li impagina
+        allo stesso modo.
+
+        Le partite sono scorse in ordine di id, per intervalli consecutivi a partire
+        dall'ultimo id letto; ogni blocco è letto in una transazione breve, chiusa
+        prima del yield: il consumatore (impaginazione, anche lunga) non tiene aperta
+        alcuna transazione né una connessione del pool.
+        """
+        partite_query = f"""
+            SELECT p.id AS partita_id, c.nome AS comune_nome, p.numero_partita, p.suffisso_partita, p.tipo,
+                   p.stato, p.data_impianto, p.data_chiusura, p.numero_provenienza
+            FROM {self.schema}.partita p JOIN {self.schema}.comune c ON p.comune_id = c.id
+            WHERE p.id = ANY(%s)
+        """
+        intestatari_query = f"""
+            SELECT pp.partita_id, pos.nome_completo, pp.titolo, pp.quota
+            FROM {self.schema}.partita_possessore pp JOIN {self.schema}.possessore pos ON pp.possessore_id = pos.id
+            WHERE pp.partita_id = ANY(%s)
+            ORDER BY pp.partita_id, pos.nome_completo
+        """
+        immobili_query = f"""
+            SELECT i.partita_id, i.id, i.natura, l.nome AS localita_nome, l.civico, l.tipologia_stradale AS tipo_localita,
+                   i.numero_piani, i.numero_vani, i.consistenza, i.classificazione
+            FROM {self.schema}.immobile i JOIN {self.schema}.localita l ON i.localita_id = l.id
+            WHERE i.partita_id = ANY(%s)
+            ORDER BY i.partita_id, l.nome, i.natura
+        """
+        variazioni_query = f"""
+            SELECT v.partita_origine_id AS partita_id, v.tipo, v.data_variazione, v.numero_riferimento,
+                   p2.numero_partita AS partita_destinazione_numero, c2.nome AS partita_destinazione_comune,
+                   con.tipo AS tipo_contratto, con.data_contratto, con.notaio, con.repertorio
+            FROM {self.schema}.variazione v
+            LEFT JOIN {self.schema}.partita p2 ON v.partita_destinazione_id = p2.id
+            LEFT JOIN {self.schema}.comune c2 ON p2.comune_id = c2.id
+            LEFT JOIN {self.schema}.contratto con ON v.id = con.variazione_id
+            WHERE v.partita_origine_id = ANY(%s)
+            ORDER BY v.partita_origine_id, v.data_variazione DESC
+        """
+        ordered_ids = sorted(set(partita_ids))
+        start = 0
+        try:
+            while start < len(ordered_ids):
+                chunk = ordered_ids[start:start + chunk_size]
+                with self._get_connection(priority=PRIORITY_BACKGROUND, profile="report", read_only=True) as conn:
+                    with conn.cursor(cursor_factory=DictCursor) as cur:
+                        cur.execute(partite_query, (chunk,))
+                        reports = {row["partita_id"]: dict(row, intestatari=[], immobili=[], variazioni=[])
+                                   for row in cur.fetchall()}
+                        for key, query in (("intestatari", intestatari_query), ("immobili", immobili_query),
+                                           ("variazioni", variazioni_query)):
+                            cur.execute(query, (chunk,))
+                            for row in cur.fetchall():
+                                item = dict(row)
+                                reports[item.pop("partita_id")][key].append(item)
+                start += len(chunk)
+                # Le partite inesistenti (o cancellate nel frattempo) sono saltate
+                yield [(pid, reports[pid]) for pid in chunk if pid in reports]
+        except psycopg2.Error as e:
+            self.logger.error(f"Errore DB in iter_report_proprieta_batch: {e}", exc_info=True)
+            raise DBMError(f"Errore durante la lettura dei dati dei report: {e}") from e
+
     def get_localita_by_comune(self, comune_id: int, filter_text: Optional[str] = None) -> List[Dict[str, Any]]:
         """Recupera località per comune_id, unendo il nome del tipo dalla nuova tabella."""
         if not isinstance(comune_id, int) or comune_id <= 0:
@@ -1228,6 +1839,7 @@ class CatastoDBManager:
         except Exception as e:
             self.logger.error(f"Errore DB in get_localita_by_comune: {e}", exc_info=True)
             return [] # Restituisce lista vuota in caso di errore
+    @execution_profile("interactive")
     def search_possessori_by_term_globally(self, search_term: Optional[str], limit: int = 200) -> List[Dict[str, Any]]:
         """
         Ricerca possessori globalmente, usando il nuovo pattern di connessione.
@@ -1404,6 +2016,22 @@ class CatastoDBManager:
         if not isinstance(comune_id, int) or comune_id <= 0:
             raise DBDataError("ID comune non valido.")
 
+        query, params = self._build_partite_by_comune_query(comune_id, filter_text)
+
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor(cursor_factory=DictCursor) as cur:
+                    cur.execute(query, tuple(params))
+                    partite_list = [dict(row) for row in cur.fetchall()]
+                    self.logger.info(f"Recuperate {len(partite_list)} partite per comune ID {comune_id}.")
+                    return partite_list
+        except Exception as e:
+            self.logger.error(f"Errore DB in get_partite_by_comune: {e}", exc_info=True)
+            raise DBMError(f"Errore di sistema durante il recupero delle partite: {e}") from e
+
+    def _build_partite_by_comune_query(self, comune_id: int,
+                                       filter_text: Optional[str] = None) -> Tuple[str, List[Union[int, str]]]:
+        """Query (senza ';' finale) delle partite di un comune, usata anche dall'esportazione."""
         query_base = f"""
             SELECT
                 p.id, p.numero_partita, p.suffisso_partita, p.tipo, p.stato, p.data_impianto,
@@ -1420,18 +2048,8 @@ class CatastoDBManager:
             filter_like = f"%{filter_text}%"
             params.extend([filter_like, filter_like, filter_like, filter_like])
 
-        query = query_base + " ORDER BY p.numero_partita, p.suffisso_partita;"
-
-        try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=DictCursor) as cur:
-                    cur.execute(query, tuple(params))
-                    partite_list = [dict(row) for row in cur.fetchall()]
-                    self.logger.info(f"Recuperate {len(partite_list)} partite per comune ID {comune_id}.")
-                    return partite_list
-        except Exception as e:
-            self.logger.error(f"Errore DB in get_partite_by_comune: {e}", exc_info=True)
-            raise DBMError(f"Errore di sistema durante il recupero delle partite: {e}") from e
+        query = query_base + " ORDER BY p.numero_partita, p.suffisso_partita"
+        return query, params
     def get_partita_details(self, partita_id: int) -> Optional[Dict[str, Any]]:
         """Recupera dettagli completi di una partita, usando una singola connessione e transazione."""
         if not isinstance(partita_id, int) or partita_id <= 0:
@@ -1530,6 +2148,7 @@ class CatastoDBManager:
             self.logger.error(f"Errore DB aggiornando partita ID {partita_id}: {e}", exc_info=True)
             # Rilancia come DBMError per il chiamante
             raise DBMError(f"Impossibile aggiornare la partita: {e}") from e
+    @invalidates_reference("comune")
     def update_comune(self, comune_id: int, dati_modificati: Dict[str, Any]) -> bool:
         """
         Aggiorna i dati di un comune esistente in modo transazionale e sicuro.
@@ -1626,6 +2245,7 @@ class CatastoDBManager:
             self.logger.error(f"Errore imprevisto DB aggiornando possessore {possessore_id}: {e}", exc_info=True)
             raise DBMError(f"Impossibile aggiornare il possessore: {e}") from e
         
+    @execution_profile("interactive")
     def search_partite(self, comune_id: Optional[int] = None, numero_partita: Optional[int] = None,
                     possessore: Optional[str] = None, immobile_natura: Optional[str] = None,
                     suffisso_partita: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -1677,6 +2297,7 @@ class CatastoDBManager:
         except Exception as e:
             self.logger.error(f"Errore DB in search_partite: {e}", exc_info=True)
             return [] # Restituisce una lista vuota in caso di errore
+    @execution_profile("interactive")
     def search_immobili(self, partita_id: Optional[int] = None, comune_id: Optional[int] = None, # Usa comune_id
                         localita_id: Optional[int] = None, natura: Optional[str] = None,
                         classificazione: Optional[str] = None) -> List[Dict]:
@@ -1690,6 +2311,7 @@ class CatastoDBManager:
         except Exception as e: logger.error(f"Errore Python in search_immobili: {e}")
         return []
 
+    @execution_profile("interactive")
     def search_variazioni(self, tipo: Optional[str] = None, data_inizio: Optional[date] = None,
                           data_fine: Optional[date] = None, partita_origine_id: Optional[int] = None,
                           partita_destinazione_id: Optional[int] = None, comune_id: Optional[int] = None) -> List[Dict]: # Usa comune_id
@@ -1703,6 +2325,7 @@ class CatastoDBManager:
         except Exception as e: logger.error(f"Errore Python in search_variazioni: {e}")
         return []
 
+    @execution_profile("interactive")
     def search_consultazioni(self, data_inizio: Optional[date] = None, data_fine: Optional[date] = None,
                              richiedente: Optional[str] = None, funzionario: Optional[str] = None) -> List[Dict]:
         """Chiama la funzione SQL cerca_consultazioni (invariata rispetto a comune_id)."""
@@ -1894,6 +2517,7 @@ class CatastoDBManager:
 
     # In catasto_db_manager.py, SOSTITUISCI il metodo registra_nuova_proprieta con questo:
 
+    @execution_profile("maintenance")
     def registra_nuova_proprieta(self, comune_id: int, numero_partita: int, data_impianto: date,
                                  possessori_json_str: str,
                                  immobili_json_str: str,
@@ -1958,6 +2582,7 @@ class CatastoDBManager:
             raise DBMError(f"Impossibile registrare la nuova proprietà: {e}") from e
         # --- FINE BLOCCO MIGLIORATO ---
     
+    @execution_profile("maintenance")
     def registra_passaggio_proprieta(self, partita_origine_id: int, comune_id_nuova_partita: int, 
                                  numero_nuova_partita: int, tipo_variazione: str, data_variazione: date, 
                                  tipo_contratto: str, data_contratto: date,
@@ -2022,6 +2647,7 @@ class CatastoDBManager:
         except psycopg2.Error as db_err: logger.error(f"Errore DB registrazione consultazione: {db_err}"); return False
         except Exception as e: logger.error(f"Errore Python registrazione consultazione: {e}"); self.rollback(); return False
 
+    @execution_profile("maintenance")
     def duplicate_partita(self, partita_id_originale: int, nuovo_numero_partita: int,
                       mantenere_possessori: bool = True, mantenere_immobili: bool = False,
                       nuovo_suffisso: Optional[str] = None) -> bool:
@@ -2070,6 +2696,8 @@ class CatastoDBManager:
         except Exception as e:
             self.logger.error(f"Errore imprevisto durante trasferimento immobile ID {immobile_id}: {e}", exc_info=True)
             raise DBMError(f"Errore di sistema imprevisto durante il trasferimento: {e}") from e
+    @execution_profile("report")
+    @read_only_replica
     def genera_report_proprieta(self, partita_id: int) -> Optional[str]:
         """Chiama la funzione SQL catasto.genera_report_proprieta in modo sicuro."""
         if not isinstance(partita_id, int) or partita_id <= 0:
@@ -2092,6 +2720,8 @@ class CatastoDBManager:
         except Exception as e:
             self.logger.error(f"Errore DB in genera_report_proprieta (ID: {partita_id}): {e}", exc_info=True)
             return None
+    @execution_profile("report")
+    @read_only_replica
     def genera_report_genealogico(self, partita_id: int) -> Optional[str]:
         """Chiama la funzione SQL catasto.genera_report_genealogico in modo sicuro."""
         if not isinstance(partita_id, int) or partita_id <= 0:
@@ -2109,6 +2739,8 @@ class CatastoDBManager:
         except Exception as e:
             self.logger.error(f"Errore DB in genera_report_genealogico (ID: {partita_id}): {e}", exc_info=True)
             return None
+    @execution_profile("report")
+    @read_only_replica
     def genera_report_possessore(self, possessore_id: int) -> Optional[str]:
         """Chiama la funzione SQL catasto.genera_report_possessore in modo sicuro."""
         if not isinstance(possessore_id, int) or possessore_id <= 0:
@@ -2126,6 +2758,8 @@ class CatastoDBManager:
         except Exception as e:
             self.logger.error(f"Errore DB in genera_report_possessore (ID: {possessore_id}): {e}", exc_info=True)
             return None
+    @execution_profile("report")
+    @read_only_replica
     def genera_report_consultazioni(self, data_inizio: Optional[date] = None, 
                                 data_fine: Optional[date] = None,
                                 richiedente: Optional[str] = None) -> str:
@@ -2149,6 +2783,52 @@ class CatastoDBManager:
             self.logger.error(f"Errore in genera_report_consultazioni: {e}", exc_info=True)
             return "Errore durante la generazione del report."
 
+    # Funzioni SQL (script 22) che restituiscono i report come documento JSONB
+    REPORT_JSON_FUNCTIONS = {
+        "proprieta": ("report_proprieta_json", 1),
+        "genealogico": ("report_genealogico_json", 1),
+        "possessore": ("report_possessore_json", 1),
+        "consultazioni": ("report_consultazioni_json", 3),
+    }
+
+    @execution_profile("report")
+    @read_only_replica
+    def get_report_data(self, report_type: str, *params) -> Optional[Dict[str, Any]]:
+        """
+        Recupera i dati strutturati di un report con una sola query (report_*_json).
+        L'impaginazione è a carico del client (vedi report_renderer.py).
+
+        Restituisce None se l'entità non esiste o se le funzioni dello script 22
+        non sono installate: in tal caso il chiamante può ripiegare su genera_report_*.
+        """
+        if report_type not in self.REPORT_JSON_FUNCTIONS:
+            raise DBDataError(f"Tipo di report non valido: {report_type}")
+        function_name, n_params = self.REPORT_JSON_FUNCTIONS[report_type]
+        if len(params) != n_params:
+            raise DBDataError(f"Il report '{report_type}' richiede {n_params} parametri, ricevuti {len(params)}.")
+
+        placeholders = ", ".join(["%s"] * n_params)
+        query = f"SELECT {self.schema}.{function_name}({placeholders});"
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    result = cur.fetchone()
+                    if not result or result[0] is None:
+                        self.logger.warning(f"Nessun dato per il report '{report_type}' con parametri {params}.")
+                        return None
+                    # psycopg2 converte già il JSONB in dict
+                    return result[0] if isinstance(result[0], dict) else json.loads(result[0])
+        except psycopg2.errors.UndefinedFunction:
+            self.logger.warning(f"Funzione {function_name} non presente (script 22 non applicato?): "
+                                f"uso del report testuale legacy.")
+            return None
+        except Exception as e:
+            self.logger.error(f"Errore DB in get_report_data ({report_type}, {params}): {e}", exc_info=True)
+            return None
+
+    @execution_profile("report")
+    @read_only_replica
     def get_statistiche_comune(self) -> List[Dict[str, Any]]:
         """Recupera dati dalla vista materializzata mv_statistiche_comune in modo sicuro."""
         query = f"SELECT * FROM {self.schema}.mv_statistiche_comune ORDER BY comune;"
@@ -2163,6 +2843,30 @@ class CatastoDBManager:
             self.logger.error(f"Errore DB in get_statistiche_comune: {e}", exc_info=True)
             return []
 
+    @execution_profile("report")
+    @read_only_replica
+    def get_statistiche_aggregate(self) -> Tuple[Optional[datetime], Dict[str, List[Dict[str, Any]]]]:
+        """
+        Legge per intero mv_statistiche_comune e mv_immobili_per_tipologia, con il timestamp
+        dell'ultimo aggiornamento delle viste, nella stessa transazione (per stats_cache.AggregateCache).
+        """
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cur:
+                cur.execute("SAVEPOINT versione_viste;")
+                try:
+                    cur.execute(f"SELECT value_timestamp FROM {self.schema}.app_metadata WHERE key = 'last_mv_refresh';")
+                    row = cur.fetchone()
+                    version = row[0] if row else None
+                except psycopg2.errors.UndefinedTable:
+                    cur.execute("ROLLBACK TO SAVEPOINT versione_viste;")
+                    version = None
+                cur.execute(f"SELECT * FROM {self.schema}.mv_statistiche_comune;")
+                comuni = [dict(r) for r in cur.fetchall()]
+                cur.execute(f"SELECT * FROM {self.schema}.mv_immobili_per_tipologia;")
+                immobili = [dict(r) for r in cur.fetchall()]
+        self.logger.info(f"Aggregati statistici letti: {len(comuni)} comuni, {len(immobili)} righe per tipologia.")
+        return version, {"comuni": comuni, "immobili": immobili}
+
     def get_immobile_details(self, immobile_id: int) -> Optional[Dict[str, Any]]:
         """Recupera i dettagli completi di un singolo immobile in modo sicuro."""
         if not isinstance(immobile_id, int) or immobile_id <= 0:
@@ -2196,6 +2900,8 @@ class CatastoDBManager:
         except Exception as e:
             self.logger.error(f"Errore DB in get_immobile_details per ID {immobile_id}: {e}", exc_info=True)
             return None
+    @execution_profile("report")
+    @read_only_replica
     def get_immobili_per_tipologia(self, comune_id: Optional[int] = None, limit: int = 100) -> List[Dict[str, Any]]:
         """Recupera dati dalla vista materializzata mv_immobili_per_tipologia in modo sicuro."""
         params = []
@@ -2466,6 +3172,7 @@ class CatastoDBManager:
     
 
 
+    @execution_profile("export")
     def get_possessore_data_for_export(self, possessore_id: int) -> Optional[Dict[str, Any]]:
         """
         Recupera i dati di un possessore per l'esportazione chiamando una funzione SQL.
@@ -2495,6 +3202,7 @@ class CatastoDBManager:
     # --- Metodi Manutenzione e Ottimizzazione (Invariati rispetto a comune_id) ---
 # In catasto_db_manager.py, SOSTITUISCI il metodo refresh_materialized_views con questo:
 
+    @execution_profile("maintenance")
     def refresh_materialized_views(self, show_success_message: bool = False) -> bool:
         """Aggiorna tutte le viste materializzate del database in modo sicuro."""
         if not self.pool:
@@ -2527,7 +3235,7 @@ class CatastoDBManager:
         # --- FINE CORREZIONE ---
         
         try:
-            with self._get_connection() as conn:
+            with self._get_connection(priority=PRIORITY_BACKGROUND) as conn:
                 with conn.cursor() as cur:
                     self.logger.info("Esecuzione dello script di aggiornamento per le viste materializzate...")
                     cur.execute(query)
@@ -2746,7 +3454,51 @@ class CatastoDBManager:
             self.logger.error(f"Errore Python in register_access per utente {user_id}: {e}", exc_info=True)
             raise DBMError(f"Errore di sistema imprevisto durante la registrazione dell'evento: {e}") from e
 
-   
+    # --- INIZIO MODIFICA: chiusura del login in un solo round trip ---
+    def complete_login(self, user_id: int, esito: bool, indirizzo_ip: Optional[str] = None,
+                       application_name: Optional[str] = None,
+                       new_password_hash: Optional[str] = None) -> Optional[str]:
+        """
+        Chiude la pipeline di login (vedi auth.authenticate) con un solo invio al server.
+        Esito positivo: imposta le variabili di audit, registra il login e, se indicato,
+        aggiorna l'hash della password (rehash al fattore di lavoro configurato).
+        Esito negativo: registra solo il 'fail_login'.
+        Restituisce l'ID di sessione (None per i login falliti).
+        """
+        session_id = str(uuid.uuid4())
+        app_name = application_name if application_name else self.application_name
+        action = 'login' if esito else 'fail_login'
+
+        statements = []
+        params: List[Any] = []
+        if esito:
+            statements.append("SELECT set_config(%s, %s, false), set_config(%s, %s, false)")
+            params += [f"{self.schema}.app_user_id", str(user_id), f"{self.schema}.session_id", session_id]
+        statements.append(f"CALL {self.schema}.registra_evento_sessione(%s, %s, %s, %s, %s, %s, %s)")
+        params += [user_id, session_id, action, esito, indirizzo_ip, app_name, None]
+        if esito and new_password_hash:
+            statements.append(f"UPDATE {self.schema}.utente SET password_hash = %s, data_modifica = CURRENT_TIMESTAMP WHERE id = %s")
+            params += [new_password_hash, user_id]
+
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(";\n".join(statements) + ";", params)
+            self.logger.info(f"Evento sessione registrato: Utente ID {user_id}, Azione {action}, Esito {esito}"
+                             f"{', hash password aggiornato' if esito and new_password_hash else ''}.")
+            if esito:
+                self.permission_cache.load(user_id)
+            return session_id if esito else None
+        except psycopg2.Error as db_err:
+            pgerror_msg = getattr(db_err, 'pgerror', str(db_err))
+            self.logger.error(f"Errore DB in complete_login per utente {user_id}: {pgerror_msg}", exc_info=True)
+            raise DBMError(f"Errore database durante la registrazione dell'accesso: {pgerror_msg}") from db_err
+        except Exception as e:
+            self.logger.error(f"Errore Python in complete_login per utente {user_id}: {e}", exc_info=True)
+            raise DBMError(f"Errore di sistema imprevisto durante la registrazione dell'accesso: {e}") from e
+    # --- FINE MODIFICA ---
+
+
 
     def logout_user(self, user_id: int, session_id: str, ip_address: Optional[str]) -> bool:
         """
@@ -2764,6 +3516,7 @@ class CatastoDBManager:
                     cur.execute(f"SELECT set_config('{self.schema}.app_user_id', NULL, false);")
                     cur.execute(f"SELECT set_config('{self.schema}.session_id', NULL, false);")
             
+            self.permission_cache.invalidate(user_id)
             self.logger.info(f"Logout per utente ID {user_id}, sessione {session_id[:8]}... completato.")
             return True
 
@@ -2778,14 +3531,36 @@ class CatastoDBManager:
         except Exception as e:
             self.logger.error(f"Errore durante il processo di logout per l'utente {user_id}: {e}", exc_info=True)
             return False
+    def get_user_permissions(self, utente_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Ruolo, stato e nomi dei permessi espliciti di un utente in una sola query.
+        Usato da PermissionCache; None se l'utente non esiste.
+        """
+        query = f"""
+            SELECT u.ruolo, u.attivo,
+                   COALESCE(array_agg(p.nome) FILTER (WHERE p.nome IS NOT NULL), '{{}}') AS permessi
+            FROM {self.schema}.utente u
+            LEFT JOIN {self.schema}.utente_permesso up ON up.utente_id = u.id
+            LEFT JOIN {self.schema}.permesso p ON p.id = up.permesso_id
+            WHERE u.id = %s
+            GROUP BY u.id, u.ruolo, u.attivo;
+        """
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cur:
+                cur.execute(query, (utente_id,))
+                row = cur.fetchone()
+                return dict(row) if row else None
+
     def check_permission(self, utente_id: int, permesso_nome: str) -> bool:
-        """Chiama la funzione SQL ha_permesso."""
-        try:
-            query = "SELECT ha_permesso(%s, %s) AS permesso"
-            if self.execute_query(query, (utente_id, permesso_nome)): result = self.fetchone(); return result.get('permesso', False) if result else False
-            return False
-        except psycopg2.Error as db_err: logger.error(f"Errore DB verifica permesso '{permesso_nome}' per utente ID {utente_id}: {db_err}"); return False
-        except Exception as e: logger.error(f"Errore Python verifica permesso '{permesso_nome}' per utente ID {utente_id}: {e}"); return False
+        """
+        Stessa logica della funzione SQL ha_permesso, servita dalla cache dei permessi:
+        il database viene interrogato solo al primo controllo o dopo un'invalidazione.
+        """
+        return self.permission_cache.has_permission(utente_id, permesso_nome)
+
+    def get_user_role(self, utente_id: int) -> Optional[str]:
+        """Ruolo corrente dell'utente dalla cache dei permessi (None se non attivo o non trovato)."""
+        return self.permission_cache.role(utente_id)
     # In catasto_db_manager.py, all'interno della classe CatastoDBManager
 
     # In catasto_db_manager.py, all'interno della classe CatastoDBManager
@@ -2809,7 +3584,7 @@ class CatastoDBManager:
                 u.nome_completo
             FROM {self.schema}.sessioni_accesso sa
             LEFT JOIN {self.schema}.utente u ON sa.utente_id = u.id
-            ORDER BY sa.data_login DESC
+            ORDER BY sa.data_login DESC, sa.id DESC
             LIMIT %s;
         """
         # --- FINE MODIFICA DEFINITIVA ---
@@ -2899,6 +3674,7 @@ class CatastoDBManager:
                     if cur.rowcount == 0:
                         raise DBNotFoundError(f"Utente con ID {utente_id} non trovato per l'aggiornamento.")
             
+            self.permission_cache.invalidate(utente_id)
             self.logger.info(f"Dettagli utente ID {utente_id} aggiornati.")
             return True
         except (DBNotFoundError, DBDataError, DBUniqueConstraintError) as e:
@@ -2938,6 +3714,7 @@ class CatastoDBManager:
                     if cur.rowcount == 0:
                         raise DBNotFoundError(f"Utente con ID {utente_id} non trovato per aggiornamento stato.")
             
+            self.permission_cache.invalidate(utente_id)
             status_str = "attivato" if nuovo_stato_attivo else "disattivato"
             self.logger.info(f"Utente ID {utente_id} {status_str}.")
             return True
@@ -2984,6 +3761,7 @@ class CatastoDBManager:
                         raise DBNotFoundError(f"Utente ID {utente_id} scomparso prima dell'eliminazione finale.")
 
             # Il commit è automatico se tutto va a buon fine
+            self.permission_cache.invalidate(utente_id)
             self.logger.info(f"Utente ID {utente_id} eliminato fisicamente con successo.")
             return True
 
@@ -2993,6 +3771,8 @@ class CatastoDBManager:
     # --- Metodi Sistema Backup (Invariati rispetto a comune_id) ---
     # In catasto_db_manager.py, SOSTITUISCI la vecchia funzione get_audit_logs
 
+    @execution_profile("report")
+    @read_only_replica
     def get_audit_logs(self,
                     filters: Optional[Dict[str, Any]] = None,
                     page: int = 1,
@@ -3079,16 +3859,19 @@ class CatastoDBManager:
                             percorso_file: str, dimensione_bytes: Optional[int] = None,
                             messaggio: Optional[str] = None) -> Optional[int]:
         """Chiama la funzione SQL registra_backup."""
+        query = f"SELECT {self.schema}.registra_backup(%s, %s, %s, %s, %s, %s, %s)"
+        params = (nome_file, utente, dimensione_bytes, tipo, esito, messaggio, percorso_file)
         try:
-            query = "SELECT registra_backup(%s, %s, %s, %s, %s, %s, %s)"
-            params = (nome_file, utente, dimensione_bytes, tipo, esito, messaggio, percorso_file)
-            if self.execute_query(query, params):
-                 result = self.fetchone(); self.commit(); backup_id = result.get('registra_backup') if result else None
-                 if backup_id: logger.info(f"Log backup registrato ID: {backup_id} per '{nome_file}'")
-                 else: logger.error(f"registra_backup non ha restituito ID per '{nome_file}'.")
-                 return backup_id
-        except psycopg2.Error as db_err: logger.error(f"Errore DB reg log backup '{nome_file}': {db_err}")
-        except Exception as e: logger.error(f"Errore Python reg log backup '{nome_file}': {e}"); self.rollback()
+            with self._get_connection(priority=PRIORITY_BACKGROUND) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    result = cur.fetchone()
+            backup_id = result[0] if result else None
+            if backup_id: self.logger.info(f"Log backup registrato ID: {backup_id} per '{nome_file}'")
+            else: self.logger.error(f"registra_backup non ha restituito ID per '{nome_file}'.")
+            return backup_id
+        except psycopg2.Error as db_err: self.logger.error(f"Errore DB reg log backup '{nome_file}': {db_err}")
+        except Exception as e: self.logger.error(f"Errore Python reg log backup '{nome_file}': {e}")
         return None
     
     # Assicurati che anche i metodi come _find_executable, get_backup_command_parts, 
@@ -3125,9 +3908,17 @@ class CatastoDBManager:
                                  backup_file_path: str,
                                  pg_dump_executable_path_ui: str,
                                  format_type: str = "custom",
-                                 include_blobs: bool = False
+                                 include_blobs: bool = False,
+                                 jobs: int = 1,
+                                 compression_method: Optional[str] = None,
+                                 compression_level: Optional[int] = None
                                 ) -> Optional[List[str]]:
-        
+        """
+        Comando pg_dump per il backup. format_type: 'custom' (-Fc), 'directory' (-Fd,
+        l'unico che supporta jobs > 1) o 'plain' (-Fp, senza compressione).
+        Compressione: vedi backup_tools.compression_args. Con custom e directory viene
+        aggiunto --verbose, da cui BackupWidget ricava l'avanzamento per tabella.
+        """
         actual_pg_dump_path = self._resolve_executable_path(pg_dump_executable_path_ui, "pg_dump.exe")
         if not actual_pg_dump_path:
             return None
@@ -3145,9 +3936,22 @@ class CatastoDBManager:
         command = [actual_pg_dump_path, "-U", db_user, "-h", db_host, "-p", db_port]
         
         if format_type == "custom": command.append("-Fc")
+        elif format_type == "directory": command.append("-Fd")
         elif format_type == "plain": command.append("-Fp")
         else:
             self.logger.error(f"Formato di backup non supportato: {format_type}"); return None
+        if format_type == "directory" and jobs > 1:
+            command.extend(["--jobs", str(jobs)])
+        elif jobs > 1:
+            self.logger.warning(f"Backup parallelo non disponibile per il formato '{format_type}': uso un solo processo.")
+        if format_type != "plain":
+            if compression_method:
+                tool_version = get_tool_major_version(actual_pg_dump_path)
+                compress = compression_args(compression_method, compression_level, tool_version)
+                if compression_method not in ("gzip", "none") and compress[:1] == ["-Z"]:
+                    self.logger.warning(f"pg_dump {tool_version or '?'} non supporta '{compression_method}': uso gzip.")
+                command.extend(compress)
+            command.append("--verbose")
         command.extend(["--file", backup_file_path])
         if include_blobs: command.append("--blobs")
         command.append(db_name)
@@ -3156,8 +3960,13 @@ class CatastoDBManager:
 
     def get_restore_command_parts(self,
                                   backup_file_path: str,
-                                  pg_tool_executable_path_ui: str
+                                  pg_tool_executable_path_ui: str,
+                                  jobs: int = 1
                                  ) -> Optional[List[str]]:
+        """
+        Comando di ripristino: pg_restore per i formati custom e directory (una cartella
+        con toc.dat), con -j N se jobs > 1; psql per i file .sql.
+        """
         # USA L'ATTRIBUTO CORRETTO: _main_db_conn_params
         db_user = self._main_db_conn_params.get("user")
         db_host = self._main_db_conn_params.get("host")
@@ -3173,11 +3982,18 @@ class CatastoDBManager:
         file_extension = file_extension.lower()
         actual_pg_tool_path = None
 
-        if file_extension in [".dump", ".backup", ".custom"]:
+        is_directory_backup = os.path.isdir(backup_file_path)
+        if is_directory_backup and not os.path.isfile(os.path.join(backup_file_path, "toc.dat")):
+            self.logger.error(f"La cartella '{backup_file_path}' non è un backup in formato directory (toc.dat mancante).")
+            return None
+
+        if is_directory_backup or file_extension in [".dump", ".backup", ".custom"]:
             actual_pg_tool_path = self._resolve_executable_path(pg_tool_executable_path_ui, "pg_restore.exe")
             if not actual_pg_tool_path: return None
             command = [actual_pg_tool_path, "-U", db_user, "-h", db_host, "-p", db_port, "-d", db_name]
             command.extend(["--clean", "--if-exists", "--verbose"]) # Opzioni comuni per pg_restore
+            if jobs > 1:
+                command.extend(["--jobs", str(jobs)])
             command.append(backup_file_path)
         elif file_extension == ".sql":
             actual_pg_tool_path = self._resolve_executable_path(pg_tool_executable_path_ui, "psql.exe")
@@ -3189,6 +4005,192 @@ class CatastoDBManager:
         self.logger.info(f"Comando di ripristino preparato: {' '.join(command)}")
         return command
 
+    def count_tables_for_backup(self) -> int:
+        """Numero di tabelle con dati nel database corrente: il totale per l'avanzamento del backup."""
+        query = """
+            SELECT COUNT(*) FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind = 'r' AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+              AND n.nspname NOT LIKE 'pg_toast%' AND n.nspname NOT LIKE 'pg_temp%';
+        """
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query)
+                    return cur.fetchone()[0]
+        except Exception as e:
+            self.logger.warning(f"Impossibile contare le tabelle per l'avanzamento del backup: {e}")
+            return 0
+
+    def count_backup_table_entries(self, backup_path: str, pg_restore_executable_path_ui: str) -> int:
+        """Voci TABLE DATA di un backup custom/directory (da 'pg_restore -l'): il totale per l'avanzamento del ripristino."""
+        pg_restore_path = self._resolve_executable_path(pg_restore_executable_path_ui, "pg_restore.exe")
+        if not pg_restore_path:
+            return 0
+        try:
+            result = subprocess.run([pg_restore_path, "-l", backup_path], capture_output=True, text=True, timeout=60)
+            return count_toc_table_data(result.stdout) if result.returncode == 0 else 0
+        except (OSError, subprocess.SubprocessError) as e:
+            self.logger.warning(f"Impossibile leggere l'indice del backup '{backup_path}': {e}")
+            return 0
+
+    def _count_rows_per_table(self, conn) -> Dict[str, int]:
+        """COUNT(*) esatto di ogni tabella utente (escluse quelle delle estensioni), in una sola query."""
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT n.nspname, c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE c.relkind = 'r' AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+                  AND n.nspname NOT LIKE 'pg_toast%' AND n.nspname NOT LIKE 'pg_temp%'
+                  AND NOT EXISTS (SELECT 1 FROM pg_depend d WHERE d.objid = c.oid AND d.deptype = 'e')
+                ORDER BY 1, 2;
+            """)
+            tables = cur.fetchall()
+            if not tables:
+                return {}
+            counts = sql.SQL(" UNION ALL ").join(
+                sql.SQL("SELECT {}, COUNT(*) FROM {}").format(sql.Literal(f"{schema}.{table}"), sql.Identifier(schema, table))
+                for schema, table in tables)
+            cur.execute(counts)
+            return {name: count for name, count in cur.fetchall()}
+
+    def verify_backup(self, backup_path: str, pg_restore_executable_path_ui: str = "",
+                      write_manifest: bool = False, test_restore: bool = False, jobs: int = 1,
+                      utente: Optional[str] = None,
+                      progress_callback=None) -> Dict[str, Any]:
+        """
+        Verifica un backup e registra l'esito in backup_registro. Operazione lenta: da
+        eseguire fuori dal thread GUI (BackupVerificationThread).
+        1. Indice: 'pg_restore --list' deve leggere il TOC (formati custom e directory).
+        2. Checksum: con write_manifest scrive '<backup>.sha256', altrimenti verifica il
+           manifest se presente.
+        3. Con test_restore: ripristino (-j jobs) in un database temporaneo, confronto dei
+           conteggi di righe con il database corrente, eliminazione del database temporaneo.
+           Le differenze di conteggio sono segnalate a parte: i dati possono essere cambiati
+           dopo il backup.
+        Restituisce {'esito', 'errori', 'differenze', 'tabelle', 'manifest', 'backup_id'}.
+        """
+        def report(message: str):
+            self.logger.info(f"Verifica backup: {message}")
+            if progress_callback:
+                progress_callback(message)
+
+        errors: List[str] = []
+        differences: List[str] = []
+        result: Dict[str, Any] = {"tabelle": 0, "manifest": None, "backup_id": None}
+        is_plain = not os.path.isdir(backup_path) and backup_path.lower().endswith(".sql")
+        env = {**os.environ, "PGPASSWORD": self._main_db_conn_params.get("password") or ""}
+
+        pg_restore_path = self._resolve_executable_path(pg_restore_executable_path_ui, "pg_restore.exe")
+        if not os.path.exists(backup_path):
+            errors.append(f"Backup non trovato: {backup_path}")
+        elif not is_plain:
+            report("lettura dell'indice (pg_restore --list)...")
+            if not pg_restore_path:
+                errors.append("pg_restore non trovato: impossibile verificare l'indice.")
+            else:
+                try:
+                    toc = subprocess.run([pg_restore_path, "--list", backup_path], capture_output=True,
+                                         text=True, timeout=300, env=env)
+                    if toc.returncode != 0:
+                        errors.append(f"Indice del backup illeggibile: {toc.stderr.strip()}")
+                    else:
+                        result["tabelle"] = count_toc_table_data(toc.stdout)
+                        if not result["tabelle"]:
+                            errors.append("L'indice del backup non contiene dati di tabelle.")
+                        report(f"indice valido, {result['tabelle']} tabelle con dati.")
+                except (OSError, subprocess.SubprocessError) as e:
+                    errors.append(f"Errore durante la lettura dell'indice: {e}")
+
+        if os.path.exists(backup_path):
+            try:
+                if write_manifest:
+                    report("calcolo dei checksum SHA-256...")
+                    result["manifest"] = write_checksum_manifest(backup_path)
+                elif os.path.isfile(manifest_path_for(backup_path)):
+                    report("verifica dei checksum SHA-256...")
+                    result["manifest"] = manifest_path_for(backup_path)
+                    errors.extend(verify_checksum_manifest(backup_path))
+            except OSError as e:
+                errors.append(f"Errore sui checksum: {e}")
+
+        if test_restore and not errors:
+            self._test_restore_backup(backup_path, is_plain, pg_restore_path, jobs, env, report, errors, differences)
+
+        result.update({"esito": not errors, "errori": errors, "differenze": differences})
+        summary = "Verifica superata" if not errors else "Verifica FALLITA: " + "; ".join(errors[:5])
+        if test_restore and not errors:
+            summary += " (ripristino di prova riuscito"
+            summary += f", {len(differences)} differenze di conteggio)" if differences else ", conteggi identici)"
+        size = None
+        try:
+            size = backup_size(backup_path)
+        except OSError:
+            pass
+        result["backup_id"] = self.register_backup_log(
+            nome_file=os.path.basename(backup_path.rstrip("/\\")), utente=utente or self.get_current_user() or "N/D",
+            tipo="completo", esito=not errors, percorso_file=backup_path, dimensione_bytes=size,
+            messaggio=summary + ("\n" + "\n".join(differences[:50]) if differences else ""))
+        report(summary)
+        return result
+
+    def _test_restore_backup(self, backup_path: str, is_plain: bool, pg_restore_path: Optional[str], jobs: int,
+                             env: Dict[str, str], report, errors: List[str], differences: List[str]):
+        """Ripristino di prova in un database temporaneo (vedi verify_backup)."""
+        params = self._main_db_conn_params
+        scratch_db = f"{params.get('dbname')}_verifica_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        tool = pg_restore_path if not is_plain else self._resolve_executable_path("", "psql.exe")
+        if not tool:
+            errors.append("Strumento di ripristino non trovato: ripristino di prova non eseguito.")
+            return
+        maint_conn = None
+        try:
+            maint_conn = self._get_maintenance_connection(params.get("user"), params.get("password"))
+            report(f"creazione del database temporaneo '{scratch_db}'...")
+            with maint_conn.cursor() as cur:
+                cur.execute(sql.SQL("CREATE DATABASE {} TEMPLATE template0").format(sql.Identifier(scratch_db)))
+
+            base = [tool, "-U", params.get("user"), "-h", params.get("host"), "-p", str(params.get("port")), "-d", scratch_db]
+            if is_plain:
+                command = base + ["-v", "ON_ERROR_STOP=1", "-q", "-f", backup_path]
+            else:
+                command = base + ["--no-owner", "--no-privileges", "--jobs", str(max(1, jobs)), backup_path]
+            report(f"ripristino di prova ({max(1, jobs)} processi)...")
+            restore = subprocess.run(command, capture_output=True, text=True, env=env)
+            if restore.returncode != 0:
+                errors.append(f"Ripristino di prova fallito: {restore.stderr.strip()[-2000:]}")
+                return
+
+            report("confronto dei conteggi di righe...")
+            with self._get_connection(priority=PRIORITY_BACKGROUND, profile="maintenance") as conn:
+                live_counts = self._count_rows_per_table(conn)
+            scratch_conn = psycopg2.connect(**{**params, "dbname": scratch_db})
+            try:
+                restored_counts = self._count_rows_per_table(scratch_conn)
+            finally:
+                scratch_conn.close()
+            for problem in compare_row_counts(live_counts, restored_counts):
+                (errors if problem.startswith("Tabella assente") else differences).append(problem)
+        except (DBMError, psycopg2.Error, OSError, subprocess.SubprocessError) as e:
+            errors.append(f"Errore durante il ripristino di prova: {e}")
+        finally:
+            if maint_conn is not None:
+                try:
+                    report(f"eliminazione del database temporaneo '{scratch_db}'...")
+                    with maint_conn.cursor() as cur:
+                        cur.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(scratch_db)))
+                except psycopg2.Error as e:
+                    self.logger.error(f"Impossibile eliminare il database temporaneo '{scratch_db}': {e}")
+                maint_conn.close()
+
+    def export_incremental_changes(self, directory: str,
+                                   overlap_seconds: int = incremental_export.DEFAULT_OVERLAP_SECONDS,
+                                   progress_callback=None) -> Dict[str, Any]:
+        """
+        Esporta in `directory` le righe cambiate dall'ultimo set (incremental_export.export_changes),
+        da un'unica istantanea del primario. Da chiamare fuori dal thread GUI.
+        """
+        with self._get_connection(priority=PRIORITY_BACKGROUND, profile="export", snapshot=True) as conn:
+            return incremental_export.export_changes(conn, directory, self.schema, overlap_seconds, progress_callback)
+
     def _resolve_executable_path(self, user_provided_path: str, default_name: str) -> Optional[str]:
         if user_provided_path and os.path.isabs(user_provided_path) and os.path.exists(user_provided_path) and os.path.isfile(user_provided_path):
             self.logger.info(f"Utilizzo del percorso eseguibile fornito: {user_provided_path}")
@@ -3237,6 +4239,7 @@ class CatastoDBManager:
     
     # --- Metodi Ricerca Avanzata (MODIFICATI) ---
 
+    @execution_profile("interactive")
     def ricerca_avanzata_possessori(self, query_text: str, similarity_threshold: Optional[float] = 0.2) -> List[Dict[str, Any]]:
         """
         Esegue una ricerca avanzata di possessori chiamando una funzione SQL in modo sicuro.
@@ -3255,6 +4258,7 @@ class CatastoDBManager:
             self.logger.error(f"Errore DB durante la ricerca avanzata dei possessori: {e}", exc_info=True)
             return [] # Rilascia SEMPRE la connessione al pool
 
+    @execution_profile("interactive")
     def ricerca_avanzata_immobili_gui(self,
                                    comune_id: Optional[int] = None,
                                    localita_id: Optional[int] = None,
@@ -3307,19 +4311,22 @@ class CatastoDBManager:
 
     def get_historical_periods(self) -> List[Dict[str, Any]]:
         """
-        Recupera i periodi storici definiti dalla tabella 'periodo_storico' in modo sicuro.
+        Recupera i periodi storici definiti dalla tabella 'periodo_storico' (dalla cache dei dati di riferimento).
         """
-        query = f"SELECT id, nome, anno_inizio, anno_fine, descrizione FROM {self.schema}.periodo_storico ORDER BY anno_inizio;"
         try:
-            with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=DictCursor) as cur:
-                    cur.execute(query)
-                    results = [dict(row) for row in cur.fetchall()]
-                    self.logger.info(f"Recuperati {len(results)} periodi storici.")
-                    return results
+            return self.reference_cache.get("periodi_storici")
         except Exception as e:
             self.logger.error(f"Errore DB in get_historical_periods: {e}", exc_info=True)
             return []
+
+    def _load_historical_periods(self) -> List[Dict[str, Any]]:
+        query = f"SELECT id, nome, anno_inizio, anno_fine, descrizione FROM {self.schema}.periodo_storico ORDER BY anno_inizio;"
+        with self._get_connection() as conn:
+            with conn.cursor(cursor_factory=DictCursor) as cur:
+                cur.execute(query)
+                results = [dict(row) for row in cur.fetchall()]
+                self.logger.info(f"Recuperati {len(results)} periodi storici.")
+                return results
     
 
     def register_historical_name(self, entity_type: str, entity_id: int, name: str,
@@ -3339,6 +4346,7 @@ class CatastoDBManager:
             raise DBMError(f"Impossibile registrare il nome storico: {e}") from e
 
 
+    @execution_profile("interactive")
     def search_historical_documents(self, title: Optional[str] = None, doc_type: Optional[str] = None,
                                     period_id: Optional[int] = None, year_start: Optional[int] = None,
                                     year_end: Optional[int] = None, partita_id: Optional[int] = None) -> List[Dict]:
@@ -3372,6 +4380,7 @@ class CatastoDBManager:
 
     # All'interno della classe CatastoDBManager in catasto_db_manager.py
 
+    @invalidates_reference("periodo_storico")
     def update_periodo_storico(self, periodo_id: int, dati_modificati: Dict[str, Any]) -> bool:
         """Aggiorna i dati di un periodo storico esistente in modo transazionale e sicuro."""
         if not isinstance(periodo_id, int) or periodo_id <= 0:
@@ -3418,6 +4427,7 @@ class CatastoDBManager:
             self.logger.error(f"Errore imprevisto DB aggiornando periodo storico {periodo_id}: {e}", exc_info=True)
             raise DBMError(f"Impossibile aggiornare il periodo storico: {e}") from e
 
+    @invalidates_reference("periodo_storico")
     def aggiungi_periodo_storico(self, nome: str, anno_inizio: int, anno_fine: Optional[int], descrizione: Optional[str]) -> int:
         """Crea un nuovo periodo storico nel database."""
         if not nome or not nome.strip():
@@ -3445,6 +4455,7 @@ class CatastoDBManager:
             self.logger.error(f"Errore DB in aggiungi_periodo_storico: {e}", exc_info=True)
             raise DBMError("Impossibile creare il periodo storico.") from e
 
+    @invalidates_reference("periodo_storico")
     def elimina_periodo_storico(self, periodo_id: int) -> bool:
         """Elimina un periodo storico, solo se non è utilizzato."""
         query = "DELETE FROM catasto.periodo_storico WHERE id = %s;"
@@ -3461,6 +4472,8 @@ class CatastoDBManager:
             self.logger.error(f"Errore DB in elimina_periodo_storico: {e}", exc_info=True)
             raise DBMError("Eliminazione del periodo storico fallita.") from e
 
+    @execution_profile("report")
+    @read_only_replica
     def get_property_genealogy(self, partita_id: int) -> List[Dict]:
         """Chiama la funzione SQL albero_genealogico_proprieta in modo sicuro."""
         query = f"SELECT * FROM {self.schema}.albero_genealogico_proprieta(%s)"
@@ -3473,20 +4486,175 @@ class CatastoDBManager:
             self.logger.error(f"Errore DB in get_property_genealogy (ID: {partita_id}): {e}", exc_info=True)
             return []
 
-    def get_cadastral_stats_by_period(self, comune_id: Optional[int] = None, year_start: int = 1900, # Usa comune_id
-                                       year_end: Optional[int] = None) -> List[Dict]:
-        """Chiama la funzione SQL statistiche_catastali_periodo (MODIFICATA per comune_id)."""
-        logger.warning("La funzione SQL 'statistiche_catastali_periodo' potrebbe non essere aggiornata per comune_id.")
+    @execution_profile("report")
+    @read_only_replica
+    def get_property_genealogy_graph(self, partita_id: int, max_depth: int = GENEALOGY_DEFAULT_DEPTH) -> Dict[str, Any]:
+        """
+        Restituisce l'intero grafo genealogico (DAG) di una partita: antenati e
+        discendenti fino a max_depth generazioni.
+
+        Se è presente la tabella di chiusura (script 21) i livelli si ottengono
+        con due letture su indice; altrimenti si usa una CTE ricorsiva su
+        variazione, protetta dai cicli e limitata in profondità.
+
+        Formato: {"root_id", "nodes": [...], "edges": [...], "source"}.
+        Nei nodi 'livello' è negativo per gli antenati, positivo per i discendenti.
+        """
+        max_depth = max(1, min(int(max_depth), GENEALOGY_MAX_DEPTH))
+        genealogy: Dict[str, Any] = {"root_id": partita_id, "nodes": [], "edges": [], "source": None}
+
+        closure_query = f"""
+            SELECT %(root)s AS partita_id, 0 AS livello
+            UNION ALL
+            SELECT antenato_id, -profondita FROM {self.schema}.partita_genealogia_chiusura
+            WHERE discendente_id = %(root)s AND profondita <= %(depth)s
+            UNION ALL
+            SELECT discendente_id, profondita FROM {self.schema}.partita_genealogia_chiusura
+            WHERE antenato_id = %(root)s AND profondita <= %(depth)s
+        """
+        # UNION (non UNION ALL) scarta le righe già viste: con il limite di profondità basta a fermare i cicli
+        recursive_query = f"""
+            WITH RECURSIVE
+            su(partita_id, livello) AS (
+                SELECT %(root)s, 0
+                UNION
+                SELECT v.partita_origine_id, su.livello - 1
+                FROM su JOIN {self.schema}.variazione v ON v.partita_destinazione_id = su.partita_id
+                WHERE su.livello > -%(depth)s
+            ),
+            giu(partita_id, livello) AS (
+                SELECT %(root)s, 0
+                UNION
+                SELECT v.partita_destinazione_id, giu.livello + 1
+                FROM giu JOIN {self.schema}.variazione v ON v.partita_origine_id = giu.partita_id
+                WHERE giu.livello < %(depth)s AND v.partita_destinazione_id IS NOT NULL
+            )
+            SELECT partita_id, MAX(livello) AS livello FROM su GROUP BY partita_id
+            UNION ALL
+            SELECT partita_id, MIN(livello) FROM giu WHERE livello > 0 GROUP BY partita_id
+        """
+        nodes_query = f"""
+            SELECT p.id AS partita_id, c.nome AS comune_nome, p.numero_partita, p.suffisso_partita,
+                   p.tipo, p.stato, p.data_impianto, p.data_chiusura,
+                   (SELECT string_agg(DISTINCT pos.nome_completo, ', ')
+                      FROM {self.schema}.partita_possessore pp
+                      JOIN {self.schema}.possessore pos ON pp.possessore_id = pos.id
+                     WHERE pp.partita_id = p.id) AS possessori
+            FROM {self.schema}.partita p
+            JOIN {self.schema}.comune c ON c.id = p.comune_id
+            WHERE p.id = ANY(%s)
+        """
+        edges_query = f"""
+            SELECT v.id AS variazione_id, v.partita_origine_id, v.partita_destinazione_id,
+                   v.tipo, v.data_variazione, v.numero_riferimento, v.nominativo_riferimento
+            FROM {self.schema}.variazione v
+            WHERE v.partita_origine_id = ANY(%s) AND v.partita_destinazione_id = ANY(%s)
+            ORDER BY v.data_variazione, v.id
+        """
         try:
-            # Assumiamo funzione SQL aggiornata per comune_id
-            if year_end is None: year_end = datetime.now().year
-            query = "SELECT * FROM statistiche_catastali_periodo(%s, %s, %s)"
-            params = (comune_id, year_start, year_end) # Passa ID
-            if self.execute_query(query, params): return self.fetchall()
-        except psycopg2.errors.UndefinedFunction: logger.warning("Funzione 'statistiche_catastali_periodo' non trovata."); return []
-        except psycopg2.Error as db_err: logger.error(f"Errore DB get_cadastral_stats_by_period: {db_err}"); return []
-        except Exception as e: logger.error(f"Errore Python get_cadastral_stats_by_period: {e}"); return []
-        return []
+            with self._get_connection() as conn:
+                with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+                    cur.execute("SELECT to_regclass(%s) IS NOT NULL",
+                                (f"{self.schema}.partita_genealogia_chiusura",))
+                    use_closure = cur.fetchone()[0]
+                    genealogy["source"] = "chiusura" if use_closure else "ricorsiva"
+                    cur.execute(closure_query if use_closure else recursive_query,
+                                {"root": partita_id, "depth": max_depth})
+
+                    # In presenza di cicli una partita può risultare sia antenata sia
+                    # discendente: si tiene il livello più vicino alla radice.
+                    levels: Dict[int, int] = {}
+                    for row in cur.fetchall():
+                        pid, livello = row["partita_id"], row["livello"]
+                        if pid not in levels or abs(livello) < abs(levels[pid]):
+                            levels[pid] = livello
+
+                    ids = list(levels)
+                    cur.execute(nodes_query, (ids,))
+                    for row in cur.fetchall():
+                        node = dict(row)
+                        livello = levels[node["partita_id"]]
+                        node["livello"] = livello
+                        node["tipo_relazione"] = ("corrente" if livello == 0
+                                                  else "predecessore" if livello < 0 else "successore")
+                        genealogy["nodes"].append(node)
+                    genealogy["nodes"].sort(key=lambda n: (n["livello"], n["comune_nome"] or "", n["numero_partita"] or 0))
+
+                    cur.execute(edges_query, (ids, ids))
+                    genealogy["edges"] = [dict(row) for row in cur.fetchall()]
+
+            self.logger.debug(f"Genealogia partita {partita_id} ({genealogy['source']}): "
+                              f"{len(genealogy['nodes'])} nodi, {len(genealogy['edges'])} archi.")
+            return genealogy
+        except Exception as e:
+            self.logger.error(f"Errore DB in get_property_genealogy_graph (ID: {partita_id}): {e}", exc_info=True)
+            return {"root_id": partita_id, "nodes": [], "edges": [], "source": None}
+
+    @execution_profile("report")
+    @read_only_replica
+    def get_cadastral_stats_by_period(self, comune_id: Optional[int] = None, year_start: int = 1900,
+                                      year_end: Optional[int] = None) -> List[Dict]:
+        """
+        Righe (anno, comune) di statistiche_catastali_periodo, servita dalla tabella dei fatti
+        statistica_annuale (script 27): una riga per anno e comune, anche senza attività.
+        """
+        if year_end is None:
+            year_end = datetime.now().year
+        query = f"""
+            SELECT * FROM {self.schema}.statistiche_catastali_periodo(
+                (SELECT nome FROM {self.schema}.comune WHERE id = %s), %s, %s);
+        """
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor(cursor_factory=DictCursor) as cur:
+                    cur.execute(query, (comune_id, year_start, year_end))
+                    return [dict(row) for row in cur.fetchall()]
+        except psycopg2.errors.UndefinedFunction:
+            self.logger.warning("Funzione 'statistiche_catastali_periodo' non trovata.")
+            return []
+        except Exception as e:
+            self.logger.error(f"Errore DB in get_cadastral_stats_by_period: {e}", exc_info=True)
+            return []
+
+    @execution_profile("report")
+    @read_only_replica
+    def get_serie_storiche(self, comune_id: Optional[int] = None, anno_inizio: Optional[int] = None,
+                           anno_fine: Optional[int] = None) -> time_series.TimeSeries:
+        """
+        Serie annuali (partite aperte/chiuse/attive, variazioni per tipo, immobili per
+        classificazione) di un comune o di tutti, dalla tabella statistica_annuale:
+        una lettura per chiave primaria (o per anno) di poche centinaia di righe.
+        """
+        if anno_fine is None:
+            anno_fine = datetime.now().year
+        comune_filter = "AND comune_id = %s" if comune_id is not None else ""
+        # Nessun limite inferiore: le partite attive richiedono il saldo degli anni precedenti
+        query = f"""
+            SELECT anno, misura, categoria, SUM(valore)::BIGINT
+            FROM {self.schema}.statistica_annuale
+            WHERE anno <= %s {comune_filter}
+            GROUP BY anno, misura, categoria
+            ORDER BY anno;
+        """
+        params = (anno_fine, comune_id) if comune_id is not None else (anno_fine,)
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    rows = cur.fetchall()
+        except psycopg2.errors.UndefinedTable as e:
+            raise DBMError("Tabella 'statistica_annuale' non trovata: eseguire sql_scripts/27_statistiche_annuali.sql.") from e
+        return time_series.build_time_series(rows, anno_inizio, anno_fine)
+
+    @execution_profile("maintenance")
+    def ricalcola_statistiche_annuali(self) -> int:
+        """Ricostruisce statistica_annuale da zero (dopo TRUNCATE o caricamenti senza trigger)."""
+        with self._get_connection(priority=PRIORITY_BACKGROUND) as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {self.schema}.ricalcola_statistica_annuale();")
+                righe = cur.fetchone()[0]
+        self.logger.info(f"Statistiche annuali ricalcolate: {righe} righe.")
+        return righe
 
     def link_document_to_partita(self, document_id: int, partita_id: int,
                                  relevance: str = 'correlata', notes: Optional[str] = None) -> bool:
@@ -3504,6 +4672,7 @@ class CatastoDBManager:
         
     # All'interno della classe CatastoDBManager, nel file catasto_db_manager.py
 
+    @execution_profile("interactive")
     def ricerca_avanzata_immobili_gui(self, comune_id: Optional[int] = None, localita_id: Optional[int] = None,
                                       natura_search: Optional[str] = None, classificazione_search: Optional[str] = None,
                                       consistenza_search: Optional[str] = None, # Ricerca testuale per consistenza
@@ -3568,7 +4737,11 @@ class CatastoDBManager:
 
     
     def execute_sql_from_file(self, file_path: str) -> Tuple[bool, str]:
-        """Esegue uno script SQL da un file in modo sicuro, gestendo l'autocommit."""
+        """
+        Esegue uno script SQL da un file in modo sicuro, gestendo l'autocommit.
+        Il profilo 'maintenance' è applicato a livello di sessione dopo il passaggio in
+        autocommit (un SET LOCAL aprirebbe una transazione annullata dal cambio di modalità).
+        """
         if not os.path.exists(file_path):
             return False, f"File SQL non trovato: {file_path}"
         
@@ -3580,9 +4753,15 @@ class CatastoDBManager:
                 # Imposta il livello di isolamento per la singola operazione
                 # Questo è il modo corretto di gestire l'autocommit con un pool
                 conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
-                with conn.cursor() as cur:
-                    self.logger.info(f"Esecuzione script SQL da file: {file_path}")
-                    cur.execute(sql_content)
+                try:
+                    self._apply_execution_profile(conn, "maintenance", local=False)
+                    with conn.cursor() as cur:
+                        self.logger.info(f"Esecuzione script SQL da file: {file_path}")
+                        cur.execute(sql_content)
+                finally:
+                    # La connessione torna al pool nello stato in cui è stata presa
+                    self._reset_execution_profile(conn, "maintenance")
+                    conn.autocommit = False
             
             self.logger.info(f"Script SQL {file_path} eseguito con successo.")
             return True, f"Script {os.path.basename(file_path)} eseguito con successo."
@@ -3639,6 +4818,149 @@ class CatastoDBManager:
             self.logger.error(f"Errore DB aggiungendo documento storico '{titolo}': {e}", exc_info=True)
             raise DBMError(f"Impossibile aggiungere il documento: {e}") from e
 
+    def archivia_documento(self, file_path: str, titolo: str, tipo_documento: str,
+                           descrizione: Optional[str] = None, anno: Optional[int] = None,
+                           periodo_id: Optional[int] = None,
+                           metadati_json: Optional[str] = None) -> int:
+        """
+        Copia il file nell'archivio allegati (una sola copia per contenuto) e crea il
+        record documento_storico che lo referenzia. Restituisce l'ID del documento.
+        Se il contenuto esisteva già non viene copiato di nuovo. In caso di errore il
+        file resta nell'archivio senza riferimenti e sarà rimosso dalla pulizia.
+        """
+        try:
+            stored = self.document_store.put(file_path)
+        except OSError as e:
+            self.logger.error(f"Impossibile archiviare il file '{file_path}': {e}", exc_info=True)
+            raise DBMError(f"Impossibile copiare il file nell'archivio allegati: {e}") from e
+        extension = os.path.splitext(stored.path)[1]
+        relative_path = self.document_store.relative_path_for(stored.sha256, extension)
+        params = (titolo, tipo_documento, stored.path, descrizione, anno, periodo_id, metadati_json)
+        try:
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"""
+                        INSERT INTO {self.schema}.documento_contenuto (sha256, percorso_relativo, dimensione_bytes)
+                        VALUES (%s, %s, %s) ON CONFLICT (sha256) DO NOTHING;
+                    """, (stored.sha256, relative_path, stored.size))
+                    cur.execute(f"""
+                        INSERT INTO {self.schema}.documento_storico
+                            (titolo, tipo_documento, percorso_file, descrizione, anno, periodo_id, metadati, contenuto_sha256)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s::jsonb, %s)
+                        RETURNING id;
+                    """, params + (stored.sha256,))
+                    doc_id = cur.fetchone()[0]
+        except (psycopg2.errors.UndefinedTable, psycopg2.errors.UndefinedColumn):
+            # Script 25 non ancora eseguito: file deduplicato su disco, ma senza conteggio dei riferimenti
+            self.logger.warning("Tabella 'documento_contenuto' non trovata: eseguire sql_scripts/25_archivio_documenti.sql.")
+            return self.aggiungi_documento_storico(titolo, tipo_documento, stored.path, descrizione,
+                                                   anno, periodo_id, metadati_json)
+        except Exception as e:
+            self.logger.error(f"Errore DB archiviando il documento '{titolo}': {e}", exc_info=True)
+            raise DBMError(f"Impossibile aggiungere il documento: {e}") from e
+        self.logger.info(f"Documento storico ID {doc_id} aggiunto (contenuto {stored.sha256[:12]}, "
+                         f"{'nuovo' if stored.is_new else 'già presente'}).")
+        return doc_id
+
+    def migra_allegati_in_archivio(self, rimuovi_originali: bool = True,
+                                   progress_callback=None) -> Dict[str, int]:
+        """
+        Sposta nell'archivio per contenuto gli allegati registrati prima della sua
+        introduzione (contenuto_sha256 NULL). Ogni documento è aggiornato nella propria
+        transazione, quindi la migrazione si può interrompere e riprendere.
+        Con rimuovi_originali i vecchi file sotto la radice dell'archivio (copie fatte
+        dall'applicazione, mai i file originali dell'utente) vengono eliminati alla fine,
+        se nessun documento non migrato li usa ancora.
+        """
+        summary = {"migrati": 0, "duplicati": 0, "mancanti": 0, "errori": 0, "originali_rimossi": 0}
+        with self._get_connection(priority=PRIORITY_BACKGROUND) as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT id, percorso_file FROM {self.schema}.documento_storico
+                    WHERE contenuto_sha256 IS NULL AND percorso_file IS NOT NULL ORDER BY id;
+                """)
+                pending = cur.fetchall()
+
+        store_root = os.path.abspath(self.document_store.root) + os.sep
+        objects_root = os.path.abspath(self.document_store.objects_dir) + os.sep
+        migrated_paths: Set[str] = set()
+        for index, (doc_id, old_path) in enumerate(pending, start=1):
+            if progress_callback and (index % 50 == 0 or index == len(pending)):
+                progress_callback(index, len(pending))
+            if not os.path.isfile(old_path):
+                summary["mancanti"] += 1
+                self.logger.warning(f"Migrazione allegati: file del documento {doc_id} non trovato ({old_path}).")
+                continue
+            try:
+                stored = self.document_store.put(old_path)
+                relative_path = self.document_store.relative_path_for(stored.sha256, os.path.splitext(stored.path)[1])
+                with self._get_connection(priority=PRIORITY_BACKGROUND) as conn:
+                    with conn.cursor() as cur:
+                        cur.execute(f"""
+                            INSERT INTO {self.schema}.documento_contenuto (sha256, percorso_relativo, dimensione_bytes)
+                            VALUES (%s, %s, %s) ON CONFLICT (sha256) DO NOTHING;
+                        """, (stored.sha256, relative_path, stored.size))
+                        cur.execute(f"""
+                            UPDATE {self.schema}.documento_storico SET contenuto_sha256 = %s, percorso_file = %s
+                            WHERE id = %s AND contenuto_sha256 IS NULL;
+                        """, (stored.sha256, stored.path, doc_id))
+            except (OSError, psycopg2.Error) as e:
+                summary["errori"] += 1
+                self.logger.error(f"Migrazione allegati: errore sul documento {doc_id} ({old_path}): {e}")
+                continue
+            summary["migrati"] += 1
+            summary["duplicati"] += 0 if stored.is_new else 1
+            migrated_paths.add(old_path)
+
+        if rimuovi_originali and migrated_paths:
+            with self._get_connection(priority=PRIORITY_BACKGROUND) as conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"SELECT percorso_file FROM {self.schema}.documento_storico WHERE contenuto_sha256 IS NULL;")
+                    still_used = {row[0] for row in cur.fetchall()}
+            for old_path in migrated_paths - still_used:
+                absolute = os.path.abspath(old_path)
+                if not absolute.startswith(store_root) or absolute.startswith(objects_root):
+                    continue
+                try:
+                    os.remove(absolute)
+                    summary["originali_rimossi"] += 1
+                    parent = os.path.dirname(absolute)
+                    if parent + os.sep != store_root and not os.listdir(parent):
+                        os.rmdir(parent)
+                except OSError as e:
+                    self.logger.warning(f"Migrazione allegati: impossibile rimuovere '{old_path}': {e}")
+        self.logger.info(f"Migrazione allegati completata: {summary}")
+        return summary
+
+    def pulisci_archivio_allegati(self, grace_seconds: float = DEFAULT_GC_GRACE_SECONDS) -> Dict[str, int]:
+        """
+        Elimina i contenuti senza riferimenti: prima i record di documento_contenuto
+        (il DELETE ricontrolla riferimenti = 0 sulla riga bloccata, quindi un allegato
+        concorrente non viene perso), poi i file non più registrati e non toccati da
+        almeno `grace_seconds`.
+        """
+        with self._get_connection(priority=PRIORITY_BACKGROUND) as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"DELETE FROM {self.schema}.documento_contenuto WHERE riferimenti = 0;")
+                deleted_rows = cur.rowcount
+                cur.execute(f"SELECT sha256 FROM {self.schema}.documento_contenuto;")
+                referenced = {row[0] for row in cur.fetchall()}
+        removed = self.document_store.collect_garbage(referenced, grace_seconds)
+        removed["record"] = deleted_rows
+        return removed
+
+    def importa_documenti_da_manifest(self, manifest_path: str, base_dir: Optional[str] = None,
+                                      progress_callback=None, should_stop=None) -> Dict[str, Any]:
+        """
+        Importazione massiva dei file descritti da un manifest CSV/JSON
+        (document_ingestion.ingest_manifest): ogni blocco di documenti usa una
+        connessione del pool a priorità di background. Da chiamare fuori dal thread GUI.
+        """
+        return document_ingestion.ingest_manifest(
+            manifest_path, self.document_store,
+            lambda: self._get_connection(priority=PRIORITY_BACKGROUND), self.schema, base_dir,
+            progress_callback=progress_callback, should_stop=should_stop)
+
     def collega_documento_a_partita(self, documento_id: int, partita_id: int, 
                                rilevanza: str, note: Optional[str] = None) -> bool:
         """Inserisce o aggiorna un record nella tabella di collegamento documento_partita."""
@@ -3725,6 +5047,8 @@ class CatastoDBManager:
     # NUOVA SEZIONE: LOGICA DI RICERCA FUZZY UNIFICATA (VERSIONE FINALE v3)
     # ========================================================================
 
+    @execution_profile("interactive")
+    @read_only_replica
     def search_all_entities_fuzzy(self, query_text: str,
                                 search_possessori: bool = True,
                                 search_localita: bool = True,
@@ -3745,7 +5069,7 @@ class CatastoDBManager:
         }
 
         try:
-            with self._get_connection() as conn:
+            with self._get_connection(priority=PRIORITY_INTERACTIVE) as conn:
                 if search_possessori:
                     all_results["possessore"] = self._search_possessori_fuzzy_internal(conn, query_text, similarity_threshold, max_results_per_type)
                 if search_localita:
@@ -4063,32 +5387,56 @@ class CatastoDBManager:
             return None
     # In catasto_db_manager.py, aggiungi questo nuovo metodo alla classe CatastoDBManager
 
-    def get_dashboard_stats(self) -> Dict[str, int]:
-        """Recupera le statistiche di base per la dashboard in un'unica query."""
-        stats = {
-            "total_comuni": 0,
-            "total_partite": 0,
-            "total_possessori": 0,
-            "total_immobili": 0,
-        }
-        query = f"""
-            SELECT 
-                (SELECT COUNT(*) FROM {self.schema}.comune) AS total_comuni,
-                (SELECT COUNT(*) FROM {self.schema}.partita) AS total_partite,
-                (SELECT COUNT(*) FROM {self.schema}.possessore) AS total_possessori,
-                (SELECT COUNT(*) FROM {self.schema}.immobile) AS total_immobili;
+    DASHBOARD_COUNTED_TABLES = {"total_comuni": "comune", "total_partite": "partita",
+                                "total_possessori": "possessore", "total_immobili": "immobile"}
+
+    def get_dashboard_stats(self, approximate: bool = False) -> Dict[str, Any]:
         """
+        Numero di comuni, partite, possessori e immobili per la dashboard, senza COUNT(*):
+        dai contatori esatti di v_contatore_entita (script 28) oppure, con `approximate`,
+        dalle stime del pianificatore (pg_class.reltuples). Le tabelle mai analizzate
+        (nessun last_analyze/last_autoanalyze in pg_stat_user_tables: prima di PG14
+        reltuples vale 0, non -1) usano il contatore esatto; senza lo script 28 si
+        ripiega sui COUNT(*).
+        'fonte' indica l'origine dei valori: 'contatori', 'stime' o 'conteggio'.
+        """
+        stats: Dict[str, Any] = {key: 0 for key in self.DASHBOARD_COUNTED_TABLES}
+        tables = list(self.DASHBOARD_COUNTED_TABLES.values())
         try:
             with self._get_connection() as conn:
-                with conn.cursor(cursor_factory=DictCursor) as cur:
-                    cur.execute(query)
-                    result = cur.fetchone()
-                    if result:
-                        stats.update(dict(result))
+                with conn.cursor() as cur:
+                    counts: Dict[str, int] = {}
+                    if approximate:
+                        cur.execute("""
+                            SELECT s.relname, c.reltuples::BIGINT FROM pg_stat_user_tables s
+                            JOIN pg_class c ON c.oid = s.relid
+                            WHERE s.schemaname = %s AND s.relname = ANY(%s)
+                              AND (s.last_analyze IS NOT NULL OR s.last_autoanalyze IS NOT NULL);
+                        """, (self.schema, tables))
+                        counts = dict(cur.fetchall())
+                    missing = [table for table in tables if table not in counts]
+                    fonte = "stime" if not missing else ("contatori" if len(missing) == len(tables) else "stime e contatori")
+                    if missing:
+                        cur.execute("SAVEPOINT contatori;")
+                        try:
+                            cur.execute(f"SELECT tabella, righe FROM {self.schema}.v_contatore_entita WHERE tabella = ANY(%s);",
+                                        (missing,))
+                            counts.update(dict(cur.fetchall()))
+                        except psycopg2.errors.UndefinedTable:
+                            cur.execute("ROLLBACK TO SAVEPOINT contatori;")
+                            self.logger.warning("Vista 'v_contatore_entita' non trovata (script 28 non applicato?): uso COUNT(*).")
+                            for table in missing:
+                                cur.execute(f"SELECT COUNT(*) FROM {self.schema}.{table};")
+                                counts[table] = cur.fetchone()[0]
+                            fonte = "conteggio"
+            for key, table in self.DASHBOARD_COUNTED_TABLES.items():
+                stats[key] = int(counts.get(table, 0))
+            stats["fonte"] = fonte
             return stats
         except Exception as e:
             self.logger.error(f"Errore durante il recupero delle statistiche per la dashboard: {e}", exc_info=True)
             return stats # Restituisce il dizionario con gli zeri in caso di errore
+
     def update_last_mv_refresh_timestamp(self):
         """Aggiorna il timestamp dell'ultimo refresh delle viste al tempo attuale (UTC)."""
         # Usiamo un "UPSERT" per inserire la chiave se non esiste, o aggiornarla se esiste.
@@ -4104,6 +5452,7 @@ class CatastoDBManager:
             self.logger.info("Timestamp di aggiornamento viste materializzate aggiornato con successo.")
         except Exception as e:
             self.logger.error(f"Errore nell'aggiornare il timestamp di refresh: {e}", exc_info=True)
+    @execution_profile("maintenance")
     def cleanup_audit_logs(self, days_to_keep: int) -> int:
         """
         Elimina i record di audit_log più vecchi di un certo numero di giorni.
@@ -20,6 +20,65 @@ SETTINGS_DB_SCHEMA = "Database/Schema"
 # Non salviamo la password in QSettings
 # Non usato, ma definito per completezza
 SETTINGS_DB_PASSWORD = "Database/Password"
+# Secondi di attesa massima per ottenere una connessione dal pool quando è esaurito
+SETTINGS_DB_POOL_TIMEOUT = "Database/PoolTimeout"
+# DSN delle repliche in sola lettura, separati da ';' (dbname/utente/password mancanti sono presi dal primario)
+SETTINGS_DB_REPLICA_DSNS = "Database/ReplicaDSNs"
+
+
+# --- PROFILI DI ESECUZIONE (statement_timeout / work_mem / jit per transazione) ---
+# Applicati da CatastoDBManager con SET LOCAL (set_config(..., true)) all'inizio di ogni
+# transazione dei metodi marcati con @execution_profile; gli altri usano i default del
+# server. Le chiavi interne sono nomi di parametri PostgreSQL.
+SETTINGS_DB_PROFILES_GROUP = "Database/Profiles"
+EXECUTION_PROFILE_NAMES = ["interactive", "report", "export", "maintenance"]
+EXECUTION_PROFILE_LABELS = {
+    "interactive": "Interattivo (ricerche, maschere)",
+    "report": "Report e statistiche",
+    "export": "Esportazioni",
+    "maintenance": "Manutenzione (viste, import)",
+}
+DEFAULT_EXECUTION_PROFILES = {
+    # Le ricerche della GUI devono fallire in fretta invece di bloccare una connessione
+    "interactive": {"statement_timeout": "15s", "work_mem": "16MB", "jit": "off"},
+    # Memoria sufficiente per hash join senza spill su disco
+    "report": {"statement_timeout": "300s", "work_mem": "256MB", "jit": "on"},
+    "export": {"statement_timeout": "900s", "work_mem": "128MB", "jit": "on"},
+    # 0 = nessun limite di tempo
+    "maintenance": {"statement_timeout": "0", "work_mem": "256MB", "jit": "off"},
+}
+
+
+def load_execution_profiles(settings) -> dict:
+    """Legge i profili di esecuzione da QSettings, usando i default per i valori mancanti."""
+    profiles = {}
+    for name in EXECUTION_PROFILE_NAMES:
+        defaults = DEFAULT_EXECUTION_PROFILES[name]
+        profiles[name] = {
+            param: str(settings.value(f"{SETTINGS_DB_PROFILES_GROUP}/{name}/{param}", default, type=str)).strip() or default
+            for param, default in defaults.items()
+        }
+    return profiles
+
+
+def save_execution_profiles(settings, profiles: dict):
+    """Salva in QSettings i profili di esecuzione (solo i parametri noti)."""
+    for name in EXECUTION_PROFILE_NAMES:
+        for param in DEFAULT_EXECUTION_PROFILES[name]:
+            value = profiles.get(name, {}).get(param)
+            if value is not None:
+                settings.setValue(f"{SETTINGS_DB_PROFILES_GROUP}/{name}/{param}", str(value))
+
+
+def parse_replica_dsns(value) -> list:
+    """Converte il valore salvato in QSettings (stringa 'dsn1;dsn2' o lista) in una lista di DSN."""
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        items = value
+    else:
+        items = str(value).split(";")
+    return [item.strip() for item in items if item and item.strip()]
 
 COLONNE_POSSESSORI_DETTAGLI_NUM = 6
 COLONNE_POSSESSORI_DETTAGLI_LABELS = [
@@ -41,6 +100,52 @@ NUOVE_ETICHETTE_POSSESSORI = ["id", "nome_completo", "codice_fiscale", "data_nas
                               "paternita", "indirizzo_residenza", "comune_residenza_nome", "attivo", "note", "num_partite"]
 
 
+# --- COSTRUZIONE DIFFERITA DEI TAB ---
+# I tab vengono costruiti alla prima attivazione; se l'opzione è attiva, quelli
+# rimasti vengono pre-costruiti uno alla volta nei momenti di inattività dopo il login.
+SETTINGS_UI_PREBUILD_TABS = "UI/PrebuildTabs"
+TAB_PREBUILD_DELAY_MS = 2000     # attesa dopo la comparsa della finestra principale
+TAB_PREBUILD_INTERVAL_MS = 150   # pausa tra un tab e il successivo, per non bloccare l'interfaccia
+# Le invalidazioni ricevute entro questo intervallo vengono accorpate in un solo aggiornamento dei widget
+ENTITY_REFRESH_DEBOUNCE_MS = 500
+# Validità massima dei dati di riferimento in cache (comuni, tipi località, periodi storici),
+# oltre all'invalidazione immediata via LISTEN/NOTIFY
+REFERENCE_CACHE_TTL_SECONDS = 600
+# Validità massima dei permessi in cache, se le notifiche dello script 23 non arrivano
+PERMISSION_CACHE_TTL_SECONDS = 300
+
+# --- ARCHIVIO ALLEGATI (vedi document_store.py) ---
+# Radice dell'archivio: relativa alla cartella di lavoro, come i vecchi allegati per partita
+DOCUMENT_STORE_DIR = os.path.join(".", "allegati_catasto")
+
+# --- ESPORTAZIONI INCREMENTALI (vedi incremental_export.py) ---
+SETTINGS_INCREMENTAL_EXPORT_DIR = "Backup/IncrementalDir"
+SETTINGS_INCREMENTAL_EXPORT_INTERVAL = "Backup/IncrementalIntervalMinutes"  # 0 = solo manuale
+INCREMENTAL_EXPORT_INTERVAL_DEFAULT = 60
+
+# --- DASHBOARD ---
+# Conteggi della home: esatti dai contatori mantenuti da trigger (sql_scripts/28) oppure
+# stimati dal pianificatore (pg_class.reltuples, aggiornati da ANALYZE/autovacuum)
+SETTINGS_DASHBOARD_APPROXIMATE_COUNTS = "Dashboard/ApproximateCounts"
+
+# --- SICUREZZA: FATTORE DI LAVORO BCRYPT ---
+# Usato per le nuove password e per il rehash al login (vedi auth.py): gli hash con
+# un fattore inferiore vengono aggiornati al primo accesso riuscito, mai al ribasso.
+# Ogni unità in più raddoppia il tempo di verifica (12 ≈ 0,25 s su un PC d'ufficio).
+SETTINGS_AUTH_BCRYPT_ROUNDS = "Security/BcryptRounds"
+BCRYPT_ROUNDS_DEFAULT = 12
+BCRYPT_ROUNDS_MIN = 10
+BCRYPT_ROUNDS_MAX = 16
+
+
+def load_bcrypt_rounds(settings) -> int:
+    """Legge il fattore di lavoro bcrypt da QSettings, limitato all'intervallo ammesso."""
+    try:
+        rounds = int(settings.value(SETTINGS_AUTH_BCRYPT_ROUNDS, BCRYPT_ROUNDS_DEFAULT))
+    except (TypeError, ValueError):
+        rounds = BCRYPT_ROUNDS_DEFAULT
+    return max(BCRYPT_ROUNDS_MIN, min(BCRYPT_ROUNDS_MAX, rounds))
+
 # --- MODALITÀ DI SVILUPPO ---
 DEVELOPMENT_MODE = True
 
@@ -14,9 +14,7 @@ from PyQt5.QtCore import (QDate, QDateTime, QPoint, QProcess, QSettings,
                           pyqtSignal)
 
 from PyQt5.QtGui import (QCloseEvent, QColor, QDesktopServices, QFont, 
-                         QIcon, QPalette, QPixmap)
-
-from PyQt5.QtWebEngineWidgets import QWebEngineView
+                         QIcon, QPainter, QPalette, QPen, QPixmap)
 
 from PyQt5.QtWidgets import (QAbstractItemView, QAction, QApplication, 
                              QCheckBox, QComboBox, QDateEdit, QDateTimeEdit,
@@ -92,6 +90,10 @@ class LazyLoadedWidget(QWidget):
     Una classe base per tutti i widget che necessitano di caricare dati
     solo la prima volta che vengono visualizzati (lazy loading).
     """
+    # Entità (vedi invalidation_bus) da cui dipendono i dati mostrati:
+    # una loro modifica, anche da un altro client, ricarica il widget.
+    refresh_on_entities: Tuple[str, ...] = ()
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self._data_loaded = False
@@ -119,4 +121,164 @@ class LazyLoadedWidget(QWidget):
         # self.logger.warning(f"Metodo _load_data_on_first_show non implementato per {self.__class__.__name__}")
         # Usiamo pass per non mostrare avvisi per widget che potrebbero non averne bisogno
         pass
-        
\ No newline at end of file
+
+    def handle_entities_changed(self, entities):
+        """
+        Chiamato dalla finestra principale con le entità modificate ('*' = tutte).
+        Se il widget è visibile ricarica subito, altrimenti alla prossima attivazione.
+        """
+        if not self._data_loaded or not self.refresh_on_entities:
+            return
+        if "*" not in entities and not set(entities) & set(self.refresh_on_entities):
+            return
+        if self.isVisible():
+            self.logger.info(f"Dati modificati ({', '.join(sorted(entities))}): ricarico {self.__class__.__name__}.")
+            self._load_data_on_first_show()
+        else:
+            self._data_loaded = False
+        
+
+# --- INIZIO MODIFICA: costruzione differita dei tab ---
+class DeferredTabWidget(QWidget):
+    """
+    Segnaposto leggero per un tab: il widget vero viene costruito dalla `factory`
+    solo alla prima attivazione (o nella pre-costruzione in background dopo il login).
+    Espone load_initial_data() come LazyLoadedWidget, così i gestori di cambio tab
+    della finestra principale non devono distinguere i due casi.
+    """
+    def __init__(self, label: str, factory, parent=None):
+        super().__init__(parent)
+        self.label = label
+        self._factory = factory
+        self._real_widget: Optional[QWidget] = None
+        self._building = False
+        self.logger = logging.getLogger(f"CatastoGUI.{self.__class__.__name__}")
+        self._layout = QVBoxLayout(self)
+        self._layout.setContentsMargins(0, 0, 0, 0)
+
+    @property
+    def is_built(self) -> bool:
+        return self._real_widget is not None
+
+    @property
+    def real_widget(self) -> Optional[QWidget]:
+        return self._real_widget
+
+    def ensure_built(self) -> Optional[QWidget]:
+        """Costruisce il widget vero (una sola volta) e lo restituisce."""
+        if self._real_widget is None and not self._building:
+            self._building = True
+            try:
+                self.logger.info(f"Costruzione differita del tab '{self.label}'...")
+                widget = self._factory()
+                self._layout.addWidget(widget)
+                self._real_widget = widget
+                self._factory = None  # Rilascia la closure (riferimenti a db_manager, ecc.)
+            finally:
+                self._building = False
+        return self._real_widget
+
+    def load_initial_data(self):
+        widget = self.ensure_built()
+        if widget is not None and hasattr(widget, 'load_initial_data'):
+            widget.load_initial_data()
+# --- FINE MODIFICA ---
+
+
+class TimeSeriesChart(QWidget):
+    """
+    Grafico a linee minimale per serie annuali (nessuna dipendenza da QtChart).
+    set_series() riceve gli anni e una lista (etichetta, valori); passando il mouse
+    sul grafico il tooltip mostra i valori dell'anno più vicino.
+    """
+    COLORS = ("#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b", "#e377c2", "#17becf")
+    MARGINS = (60, 20, 20, 36)  # sinistra, alto, destra, basso
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._years: List[int] = []
+        self._series: List[Tuple[str, List[int]]] = []
+        self.setMinimumHeight(240)
+        self.setMouseTracking(True)
+
+    def set_series(self, years: List[int], series: List[Tuple[str, List[int]]]):
+        self._years = list(years)
+        self._series = list(series)
+        self.update()
+
+    @staticmethod
+    def _nice_step(span: float, ticks: int = 5) -> float:
+        raw = max(span / ticks, 1e-9)
+        magnitude = 10 ** len(str(int(raw))) / 10 if raw >= 1 else 1
+        for factor in (1, 2, 5, 10):
+            if raw <= factor * magnitude:
+                return factor * magnitude
+        return 10 * magnitude
+
+    def _plot_rect(self):
+        left, top, right, bottom = self.MARGINS
+        return left, top, max(1, self.width() - left - right), max(1, self.height() - top - bottom)
+
+    def _y_range(self) -> Tuple[float, float]:
+        values = [value for _, data in self._series for value in data]
+        low, high = min(values + [0]), max(values + [0])
+        step = self._nice_step(high - low or 1)
+        return (low // step) * step, -(-high // step) * step or step
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), self.palette().base())
+        if not self._years or not self._series:
+            painter.drawText(self.rect(), Qt.AlignCenter, "Nessun dato da visualizzare.")
+            return
+        x0, y0, width, height = self._plot_rect()
+        y_min, y_max = self._y_range()
+        n = len(self._years)
+
+        def to_x(i):
+            return x0 + (width * i / (n - 1) if n > 1 else width / 2)
+
+        def to_y(value):
+            return y0 + height - (value - y_min) / (y_max - y_min) * height
+
+        # Griglia ed etichette degli assi
+        grid_pen = QPen(QColor("#dddddd"))
+        text_pen = QPen(self.palette().text().color())
+        step = self._nice_step(y_max - y_min)
+        value = y_min
+        while value <= y_max + step / 2:
+            y = to_y(value)
+            painter.setPen(grid_pen)
+            painter.drawLine(int(x0), int(y), int(x0 + width), int(y))
+            painter.setPen(text_pen)
+            painter.drawText(0, int(y) - 8, x0 - 6, 16, Qt.AlignRight | Qt.AlignVCenter, f"{value:,.0f}".replace(",", "."))
+            value += step
+        year_step = max(1, int(self._nice_step(n, max(1, width // 70))))
+        for i, year in enumerate(self._years):
+            if (year - self._years[0]) % year_step == 0:
+                painter.drawText(int(to_x(i)) - 30, y0 + height + 6, 60, 16, Qt.AlignCenter, str(year))
+
+        # Serie e legenda
+        for index, (label, data) in enumerate(self._series):
+            color = QColor(self.COLORS[index % len(self.COLORS)])
+            painter.setPen(QPen(color, 2))
+            points = [(to_x(i), to_y(v)) for i, v in enumerate(data)]
+            for (xa, ya), (xb, yb) in zip(points, points[1:]):
+                painter.drawLine(int(xa), int(ya), int(xb), int(yb))
+            if len(points) == 1:
+                painter.drawEllipse(int(points[0][0]) - 2, int(points[0][1]) - 2, 4, 4)
+            legend_y = y0 + 4 + index * 16
+            painter.drawLine(x0 + 10, legend_y + 8, x0 + 30, legend_y + 8)
+            painter.setPen(text_pen)
+            painter.drawText(x0 + 36, legend_y, width - 40, 16, Qt.AlignLeft | Qt.AlignVCenter, label)
+
+    def mouseMoveEvent(self, event):
+        if self._years and self._series:
+            x0, _, width, _ = self._plot_rect()
+            n = len(self._years)
+            i = min(n - 1, max(0, round((event.x() - x0) / width * (n - 1)))) if n > 1 else 0
+            lines = [str(self._years[i])] + [f"{label}: {data[i]}" for label, data in self._series]
+            self.setToolTip("\n".join(lines))
+        super().mouseMoveEvent(event)
+
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Pool di connessioni bloccante con code di priorità
+===================================================
+Sostituisce psycopg2.pool.ThreadedConnectionPool, che solleva subito PoolError
+quando tutte le maxconn connessioni sono in uso. Qui invece chi chiede una
+connessione attende (fino a un timeout configurabile) in una coda FIFO,
+suddivisa in corsie di priorità: le query interattive della GUI passano
+davanti a esportazioni e refresh delle viste materializzate.
+
+L'interfaccia (getconn/putconn/closeall/_kwargs) resta compatibile con quella
+di psycopg2, in modo che CatastoDBManager possa usarlo senza altre modifiche.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    from psycopg2.pool import PoolError
+except ImportError:  # Consente l'uso (e i test) del pool anche senza psycopg2
+    psycopg2 = None
+
+    class PoolError(Exception):
+        pass
+
+logger = logging.getLogger("CatastoDB.pool")
+
+# --- Corsie di priorità (valore più basso = servito prima) ---
+PRIORITY_INTERACTIVE = 0   # Ricerche e maschere della GUI
+PRIORITY_NORMAL = 1        # Default per le chiamate senza indicazione esplicita
+PRIORITY_BACKGROUND = 2    # Esportazioni, report massivi, refresh MV
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interattiva",
+    PRIORITY_NORMAL: "normale",
+    PRIORITY_BACKGROUND: "background",
+}
+
+DEFAULT_CHECKOUT_TIMEOUT = 30.0  # secondi
+
+
+class PoolTimeoutError(PoolError):
+    """Sollevata quando non si ottiene una connessione entro il timeout di checkout."""
+    pass
+
+
+class _Waiter:
+    """Biglietto di attesa di un thread in una corsia di priorità."""
+    __slots__ = ("priority", "enqueued_at")
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+
+
+class BlockingPriorityPool:
+    """
+    Pool di connessioni thread-safe con attesa bloccante e corsie di priorità.
+
+    - getconn() attende fino a `timeout` secondi se il pool è esaurito, poi
+      solleva PoolTimeoutError (sottoclasse di PoolError).
+    - All'interno di ogni corsia l'ordine è FIFO; una connessione liberata va
+      sempre al primo thread in attesa della corsia più prioritaria.
+    - stats() restituisce i contatori correnti (in uso, inattive, in attesa).
+    """
+
+    def __init__(self, minconn: int, maxconn: int, *args,
+                 checkout_timeout: float = DEFAULT_CHECKOUT_TIMEOUT,
+                 connection_factory: Optional[Callable[..., Any]] = None,
+                 **kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise PoolError(f"Parametri del pool non validi: minconn={minconn}, maxconn={maxconn}")
+
+        self.minconn = int(minconn)
+        self.maxconn = int(maxconn)
+        self.checkout_timeout = float(checkout_timeout)
+        self.closed = False
+
+        # Stessi nomi di psycopg2.pool.AbstractConnectionPool (close_pool legge _kwargs)
+        self._args = args
+        self._kwargs = kwargs
+        self._connection_factory = connection_factory
+
+        self._idle: Deque[Any] = deque()
+        self._used: Dict[int, Any] = {}
+        self._lanes: Dict[int, Deque[_Waiter]] = {
+            PRIORITY_INTERACTIVE: deque(),
+            PRIORITY_NORMAL: deque(),
+            PRIORITY_BACKGROUND: deque(),
+        }
+        self._opening = 0  # Connessioni in fase di apertura (fuori dal lock)
+        self._cond = threading.Condition(threading.Lock())
+
+        # Contatori cumulativi per diagnostica
+        self._total_checkouts = 0
+        self._total_timeouts = 0
+        self._total_wait_time = 0.0
+
+        for _ in range(self.minconn):
+            self._idle.append(self._connect())
+
+    # ------------------------------------------------------------------
+    # Creazione / verifica delle connessioni
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+        if self._connection_factory is not None:
+            return self._connection_factory(*self._args, **self._kwargs)
+        if psycopg2 is None:
+            raise PoolError("psycopg2 non disponibile: impossibile aprire connessioni.")
+        return psycopg2.connect(*self._args, **self._kwargs)
+
+    @staticmethod
+    def _is_closed(conn) -> bool:
+        return bool(getattr(conn, "closed", False))
+
+    def _reset(self, conn) -> bool:
+        """
+        Riporta la connessione allo stato 'idle' prima di rimetterla nel pool.
+        Restituisce False se la connessione è inutilizzabile e va scartata.
+        """
+        if self._is_closed(conn):
+            return False
+        if psycopg2 is None or not hasattr(conn, "get_transaction_status"):
+            return True
+        status = conn.get_transaction_status()
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            # Chi ha messo la connessione in autocommit (es. script SQL) non la
+            # restituisce così agli altri: i profili SET LOCAL richiedono una transazione
+            if conn.autocommit:
+                conn.autocommit = False
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, conn):
+        try:
+            if not self._is_closed(conn):
+                conn.close()
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------------
+    # Coda di attesa
+    # ------------------------------------------------------------------
+
+    def _head_waiter(self) -> Optional[_Waiter]:
+        for priority in sorted(self._lanes):
+            lane = self._lanes[priority]
+            if lane:
+                return lane[0]
+        return None
+
+    def _can_serve(self) -> bool:
+        return bool(self._idle) or (len(self._used) + len(self._idle) + self._opening) < self.maxconn
+
+    # ------------------------------------------------------------------
+    # API compatibile con psycopg2.pool
+    # ------------------------------------------------------------------
+
+    def getconn(self, key=None, priority: int = PRIORITY_NORMAL, timeout: Optional[float] = None):
+        """
+        Preleva una connessione dal pool, attendendo se necessario.
+        `key` è accettato solo per compatibilità con psycopg2 e viene ignorato.
+        """
+        if priority not in self._lanes:
+            priority = PRIORITY_NORMAL
+        wait_limit = self.checkout_timeout if timeout is None else float(timeout)
+        deadline = time.monotonic() + max(wait_limit, 0.0)
+
+        with self._cond:
+            if self.closed:
+                raise PoolError("Il pool di connessioni è chiuso.")
+
+            waiter = _Waiter(priority)
+            self._lanes[priority].append(waiter)
+            try:
+                while True:
+                    if self.closed:
+                        raise PoolError("Il pool di connessioni è stato chiuso durante l'attesa.")
+                    if self._head_waiter() is waiter and self._can_serve():
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._total_timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Nessuna connessione disponibile entro {wait_limit:.1f}s "
+                            f"(corsia {PRIORITY_NAMES[priority]}, in uso {len(self._used)}/{self.maxconn}, "
+                            f"in attesa {self._waiting_count()})."
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._lanes[priority].remove(waiter)
+                # Il prossimo in coda potrebbe ora essere servibile
+                self._cond.notify_all()
+
+            self._total_checkouts += 1
+            self._total_wait_time += time.monotonic() - waiter.enqueued_at
+
+            # Riusa una connessione inattiva ancora valida
+            while self._idle:
+                conn = self._idle.popleft()
+                if self._is_closed(conn):
+                    continue
+                self._used[id(conn)] = conn
+                return conn
+            self._opening += 1
+
+        # Apertura di una nuova connessione fuori dal lock (può essere lenta)
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._opening -= 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._opening -= 1
+            self._used[id(conn)] = conn
+        return conn
+
+    def putconn(self, conn, key=None, close: bool = False):
+        """Restituisce una connessione al pool (o la chiude se richiesto/inutilizzabile)."""
+        with self._cond:
+            if self.closed:
+                # Pool già chiuso (es. durante un ripristino): si chiude solo la connessione
+                self._discard(conn)
+                return
+            if self._used.pop(id(conn), None) is None:
+                raise PoolError("Tentativo di restituire una connessione non appartenente al pool.")
+            keep = not close and not self.closed and self._reset(conn)
+            if keep and len(self._idle) + len(self._used) < self.maxconn:
+                self._idle.append(conn)
+            else:
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def closeall(self):
+        """Chiude tutte le connessioni e sveglia eventuali thread in attesa."""
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            for conn in list(self._idle) + list(self._used.values()):
+                self._discard(conn)
+            self._idle.clear()
+            self._used.clear()
+            self._cond.notify_all()
+
+    # ------------------------------------------------------------------
+    # Diagnostica
+    # ------------------------------------------------------------------
+
+    def _waiting_count(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Fotografia dello stato del pool (in uso, inattive, in attesa per corsia)."""
+        with self._cond:
+            return {
+                "in_use": len(self._used),
+                "idle": len(self._idle),
+                "opening": self._opening,
+                "waiting": self._waiting_count(),
+                "waiting_by_priority": {PRIORITY_NAMES[p]: len(lane) for p, lane in self._lanes.items()},
+                "maxconn": self.maxconn,
+                "checkout_timeout": self.checkout_timeout,
+                "total_checkouts": self._total_checkouts,
+                "total_timeouts": self._total_timeouts,
+                "avg_wait_ms": (self._total_wait_time / self._total_checkouts * 1000.0) if self._total_checkouts else 0.0,
+                "closed": self.closed,
+            }
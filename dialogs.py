@@ -1,21 +1,20 @@
 
-import os,csv,sys,logging,json,bcrypt
+import os,csv,sys,logging,json
+import auth
 from datetime import date, datetime
 from typing import Optional, List, Dict, Any, Tuple, TYPE_CHECKING
 # Importazioni PyQt5
 from PyQt5.QtCore import (QDate, QDateTime, QPoint, QProcess, QSettings, 
                           QSize, QStandardPaths, Qt, QTimer, QUrl, 
-                          pyqtSignal,pyqtSlot)
+                          pyqtSignal,pyqtSlot, QThread)
 
 from PyQt5.QtGui import (QCloseEvent, QColor, QDesktopServices, QFont, 
                          QIcon, QPalette, QPixmap)
 
-try:
-    from PyQt5.QtWebEngineWidgets import QWebEngineView
-    WEB_ENGINE_AVAILABLE = True
-except ImportError:
-    QWebEngineView = None
-    WEB_ENGINE_AVAILABLE = False
+# --- INIZIO MODIFICA: QtWebEngine caricato solo all'apertura di un PDF (vedi DocumentViewerDialog._load_pdf) ---
+import importlib.util
+WEB_ENGINE_AVAILABLE = importlib.util.find_spec("PyQt5.QtWebEngineWidgets") is not None
+# --- FINE MODIFICA ---
 
 from PyQt5.QtWidgets import (QAbstractItemView, QAction, QApplication, 
                              QCheckBox, QComboBox, QDateEdit, QDateTimeEdit,
@@ -33,6 +32,7 @@ from PyQt5.QtWidgets import (QAbstractItemView, QAction, QApplication,
 
 from PyQt5.QtGui import QPainter
 from app_paths import get_resource_path
+from render_cache import get_render_cache, can_render, best_level, RenderSet
 
 
 
@@ -41,7 +41,10 @@ from app_paths import get_resource_path
 # from PyQt5.QtSvgWidgets import QSvgWidget
 from config import (
     SETTINGS_DB_TYPE, SETTINGS_DB_HOST, SETTINGS_DB_PORT, 
-    SETTINGS_DB_NAME, SETTINGS_DB_USER, SETTINGS_DB_SCHEMA,SETTINGS_DB_PASSWORD
+    SETTINGS_DB_NAME, SETTINGS_DB_USER, SETTINGS_DB_SCHEMA,SETTINGS_DB_PASSWORD,
+    SETTINGS_DB_REPLICA_DSNS, parse_replica_dsns,
+    EXECUTION_PROFILE_NAMES, EXECUTION_PROFILE_LABELS, load_execution_profiles, save_execution_profiles,
+    load_bcrypt_rounds
 )
 from catasto_db_manager import CatastoDBManager
 
@@ -50,7 +53,7 @@ from custom_widgets import QPasswordLineEdit,ImmobiliTableWidget
 
 from app_utils import (gui_esporta_partita_pdf, gui_esporta_partita_json, gui_esporta_partita_csv,
                        gui_esporta_possessore_pdf, gui_esporta_possessore_json, gui_esporta_possessore_csv,
-                       GenericTextReportPDF, FPDF_AVAILABLE, prompt_to_open_file,PDFApreviewDialog) # <-- AGGIUNGI QUI
+                       FPDF_AVAILABLE, prompt_to_open_file,PDFApreviewDialog) # <-- AGGIUNGI QUI
 
 # --- INIZIO CORREZIONE: Importazione sicura di keyring ---
 try:
@@ -62,26 +65,6 @@ except ImportError:
     )
 # --- FINE CORREZIONE ---
 
-try:
-    from fpdf import FPDF
-    from fpdf.enums import XPos, YPos
-    FPDF_AVAILABLE = True
-except ImportError:
-    FPDF_AVAILABLE = False
-    # class FPDF: pass # Fallback se si volessero istanziare le classi PDF anche senza fpdf
-    # ma è meglio gestire con FPDF_AVAILABLE
-    # Potrebbe essere utile definire classi PDF vuote qui se FPDF non è disponibile,
-    # per evitare NameError se il codice tenta di usarle condizionalmente.
-
-    class PDFPartita:
-        pass
-
-    class PDFPossessore:
-        pass
-
-    class GenericTextReportPDF:
-        pass
-
 try:
     from catasto_db_manager import DBMError, DBUniqueConstraintError, DBNotFoundError, DBDataError
 except ImportError:
@@ -141,6 +124,15 @@ class DBConfigDialog(QDialog):
         form_layout.addRow("Utente Database:", self.user_edit)
         form_layout.addRow("Password Database:", self.password_edit)
         form_layout.addRow(self.save_password_check)
+
+        # Repliche in sola lettura (opzionali): report, esportazioni, ricerca e statistiche
+        self.replica_dsns_edit = QLineEdit()
+        self.replica_dsns_edit.setPlaceholderText("host=replica1 port=5433; host=replica2 (opzionale)")
+        self.replica_dsns_edit.setToolTip(
+            "DSN delle repliche in sola lettura separati da ';'.\n"
+            "Nome DB, utente e password mancanti vengono presi dalla connessione principale.\n"
+            "Se le repliche non sono raggiungibili si usa automaticamente il server principale.")
+        form_layout.addRow("Repliche Sola Lettura:", self.replica_dsns_edit)
         
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, self)
         buttons.button(QDialogButtonBox.Ok).setText("Testa e Salva")
@@ -166,6 +158,7 @@ class DBConfigDialog(QDialog):
 
         
         layout.addLayout(form_layout)
+        layout.addWidget(self._create_profiles_group())
         layout.addWidget(buttons)
         
         # --- Connessioni e Pre-compilazione ---
@@ -181,11 +174,81 @@ class DBConfigDialog(QDialog):
         self.port_spinbox.setValue(config.get("port", 5432))
         self.dbname_edit.setText(config.get("dbname", "catasto_storico"))
         self.user_edit.setText(config.get("user", "postgres"))
+        self.replica_dsns_edit.setText(self.settings.value(SETTINGS_DB_REPLICA_DSNS, "", type=str))
         
         self._toggle_host_field() # Chiamata iniziale per impostare lo stato corretto della UI
 
         buttons.accepted.connect(self._handle_save_and_connect)
         buttons.rejected.connect(self.reject)
+    def _create_profiles_group(self) -> QGroupBox:
+        """
+        Crea il riquadro dei profili di esecuzione: per ogni tipo di operazione
+        timeout massimo della singola query, work_mem e JIT (applicati con SET LOCAL).
+        """
+        group = QGroupBox("Profili di Esecuzione (avanzate)")
+        group.setCheckable(True)
+        group.setChecked(False) # Compresso per default: la maggior parte degli utenti non deve toccarlo
+        grid = QGridLayout()
+        grid.addWidget(QLabel("<b>Operazione</b>"), 0, 0)
+        grid.addWidget(QLabel("<b>Timeout (s)</b>"), 0, 1)
+        grid.addWidget(QLabel("<b>work_mem</b>"), 0, 2)
+        grid.addWidget(QLabel("<b>JIT</b>"), 0, 3)
+
+        profiles = load_execution_profiles(self.settings)
+        self.profile_widgets: Dict[str, Dict[str, QWidget]] = {}
+        for row, name in enumerate(EXECUTION_PROFILE_NAMES, start=1):
+            params = profiles[name]
+            timeout_spin = QSpinBox()
+            timeout_spin.setRange(0, 86400)
+            timeout_spin.setSpecialValueText("Nessun limite")
+            timeout_spin.setValue(self._timeout_to_seconds(params.get("statement_timeout", "0")))
+            work_mem_combo = QComboBox()
+            work_mem_combo.setEditable(True)
+            work_mem_combo.addItems(["4MB", "16MB", "64MB", "128MB", "256MB", "512MB", "1GB"])
+            work_mem_combo.setCurrentText(params.get("work_mem", "16MB"))
+            jit_check = QCheckBox()
+            jit_check.setChecked(params.get("jit", "off") == "on")
+
+            grid.addWidget(QLabel(EXECUTION_PROFILE_LABELS.get(name, name)), row, 0)
+            grid.addWidget(timeout_spin, row, 1)
+            grid.addWidget(work_mem_combo, row, 2)
+            grid.addWidget(jit_check, row, 3)
+            self.profile_widgets[name] = {"timeout": timeout_spin, "work_mem": work_mem_combo, "jit": jit_check}
+
+        container = QWidget()
+        container.setLayout(grid)
+        group_layout = QVBoxLayout(group)
+        group_layout.addWidget(container)
+        container.setVisible(False)
+        group.toggled.connect(container.setVisible)
+        return group
+
+    @staticmethod
+    def _timeout_to_seconds(value: str) -> int:
+        """Converte un valore di statement_timeout ('15s', '5min', '30000') in secondi."""
+        value = str(value).strip().lower()
+        try:
+            if value.endswith("ms"):
+                return int(float(value[:-2]) / 1000)
+            if value.endswith("min"):
+                return int(float(value[:-3]) * 60)
+            if value.endswith("s"):
+                return int(float(value[:-1]))
+            return int(float(value) / 1000) # Senza unità PostgreSQL intende millisecondi
+        except ValueError:
+            return 0
+
+    def get_execution_profiles(self) -> Dict[str, Dict[str, str]]:
+        """Profili di esecuzione come impostati nel dialogo."""
+        return {
+            name: {
+                "statement_timeout": f"{widgets['timeout'].value()}s" if widgets['timeout'].value() else "0",
+                "work_mem": widgets['work_mem'].currentText().strip().replace(" ", "") or "16MB",
+                "jit": "on" if widgets['jit'].isChecked() else "off",
+            }
+            for name, widgets in self.profile_widgets.items()
+        }
+
     def _toggle_host_field(self):
         """
         Abilita o disabilita il campo di testo dell'host in base alla selezione
@@ -266,7 +329,8 @@ class DBConfigDialog(QDialog):
             port=config["port"],
             dbname=config["dbname"],
             user=config["user"],
-            password=config["password"]
+            password=config["password"],
+            execution_profiles=self.get_execution_profiles()
         )
         
         # --- INIZIO CORREZIONE ---
@@ -288,6 +352,8 @@ class DBConfigDialog(QDialog):
             settings.setValue("Database/Port", config["port"])
             settings.setValue("Database/DBName", config["dbname"])
             settings.setValue("Database/User", config["user"])
+            settings.setValue(SETTINGS_DB_REPLICA_DSNS, ";".join(parse_replica_dsns(config.get("replica_dsns"))))
+            save_execution_profiles(settings, self.get_execution_profiles())
             
             if config.get("save_password", False) and config.get("password"):
                 if keyring:
@@ -430,7 +496,7 @@ class DBConfigDialog(QDialog):
 
         # Raccogli i dati di connessione dal dialogo
         config = self.get_config_values(include_password=True)
-        if not all(config.values()):
+        if not all(config.get(k) for k in ("host", "port", "dbname", "user", "password")):
             QMessageBox.warning(self, "Dati Mancanti", "Compila tutti i campi di connessione per procedere.")
             return
 
@@ -489,7 +555,8 @@ class DBConfigDialog(QDialog):
             "port": self.port_spinbox.value(),
             "dbname": self.dbname_edit.text().strip(),
             "user": self.user_edit.text().strip(),
-            "save_password": self.save_password_check.isChecked()
+            "save_password": self.save_password_check.isChecked(),
+            "replica_dsns": self.replica_dsns_edit.text().strip()
         }
         if include_password:
             config["password"] = self.password_edit.text()
@@ -497,6 +564,44 @@ class DBConfigDialog(QDialog):
         return config
     
     
+class DocumentRenderThread(QThread):
+    """Genera (o legge dalla cache) le anteprime di una lista di documenti, uno alla volta."""
+    rendered = pyqtSignal(str, object)  # percorso, RenderSet o None
+    failed = pyqtSignal(str, str)
+
+    # Thread staccati dal dialogo chiuso: restano referenziati finché la generazione
+    # corrente termina (il risultato finisce comunque nella cache su disco)
+    _detached = set()
+
+    def detach(self):
+        """Da chiamare alla chiusura del widget proprietario invece di attendere il thread."""
+        self.requestInterruption()
+        for signal in (self.rendered, self.failed):
+            try:
+                signal.disconnect()
+            except TypeError:
+                pass
+        self.setParent(None)
+        DocumentRenderThread._detached.add(self)
+        self.finished.connect(lambda: DocumentRenderThread._detached.discard(self))
+
+    def __init__(self, file_paths: List[str], parent=None):
+        super().__init__(parent)
+        self.file_paths = list(file_paths)
+        self.logger = logging.getLogger(f"CatastoGUI.{self.__class__.__name__}")
+
+    def run(self):
+        cache = get_render_cache()
+        for file_path in self.file_paths:
+            if self.isInterruptionRequested():
+                return
+            try:
+                self.rendered.emit(file_path, cache.ensure(file_path))
+            except Exception as e:
+                self.logger.warning(f"Anteprima non generata per '{file_path}': {e}")
+                self.failed.emit(file_path, str(e))
+
+
 class DocumentViewerDialog(QDialog):
     def __init__(self, parent=None, file_path: str = None):
         super().__init__(parent)
@@ -504,6 +609,9 @@ class DocumentViewerDialog(QDialog):
         self.file_path = file_path
         self.setWindowTitle("Visualizzatore Documento")
         self.setMinimumSize(800, 600)
+        self._render_set: Optional[RenderSet] = None
+        self._current_level: Optional[str] = None
+        self._render_thread: Optional[DocumentRenderThread] = None
 
         self._init_ui()
         self._load_document()
@@ -516,9 +624,14 @@ class DocumentViewerDialog(QDialog):
         self.viewer_layout.setContentsMargins(0,0,0,0)
 
         button_layout = QHBoxLayout()
+        self.full_pdf_button = QPushButton("Apri PDF Completo")
+        self.full_pdf_button.setToolTip("L'anteprima mostra solo la prima pagina.")
+        self.full_pdf_button.clicked.connect(self._show_full_pdf)
+        self.full_pdf_button.setVisible(False)
         self.close_button = QPushButton("Chiudi")
         self.close_button.clicked.connect(self.accept)
         button_layout.addStretch()
+        button_layout.addWidget(self.full_pdf_button)
         button_layout.addWidget(self.close_button)
         button_layout.addStretch()
 
@@ -534,7 +647,10 @@ class DocumentViewerDialog(QDialog):
 
         file_extension = os.path.splitext(self.file_path)[1].lower()
 
-        if file_extension == '.pdf':
+        if can_render(self.file_path):
+            # Anteprima dalla cache (generata in background al primo accesso)
+            self._load_preview()
+        elif file_extension == '.pdf':
             self._load_pdf()
         elif file_extension in ['.jpg', '.jpeg', '.png', '.bmp', '.gif']:
             self._load_image()
@@ -545,6 +661,7 @@ class DocumentViewerDialog(QDialog):
             
     def _load_pdf(self):
         try:
+            from PyQt5.QtWebEngineWidgets import QWebEngineView  # Import differito: pesante da caricare
             self.web_view = QWebEngineView(self)
             self.web_view.setUrl(QUrl.fromLocalFile(self.file_path))
             self.viewer_layout.addWidget(self.web_view)
@@ -553,16 +670,99 @@ class DocumentViewerDialog(QDialog):
             self.logger.error(f"Errore durante il caricamento del PDF in QWebEngineView: {e}", exc_info=True)
             QMessageBox.critical(self, "Errore PDF", f"Impossibile visualizzare il PDF. Errore: {e}")
             self.viewer_layout.addWidget(QLabel("Errore nel caricamento del PDF."))
-            
+
+    def _show_full_pdf(self):
+        self.full_pdf_button.setVisible(False)
+        if hasattr(self, "graphics_view"):
+            self.graphics_view.setVisible(False)
+        self._load_pdf()
+
+    def _create_graphics_view(self):
+        self.graphics_scene = QGraphicsScene(self)
+        self.graphics_view = QGraphicsView(self.graphics_scene, self)
+        self.graphics_view.setRenderHint(QPainter.Antialiasing)
+        self.graphics_view.setRenderHint(QPainter.SmoothPixmapTransform)
+        self.graphics_view.setCacheMode(QGraphicsView.CacheBackground)
+        self.graphics_view.setViewportUpdateMode(QGraphicsView.BoundingRectViewportUpdate)
+        self.graphics_view.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.graphics_view.setAlignment(Qt.AlignCenter)
+
+    def _load_preview(self):
+        self._create_graphics_view()
+        self.preview_status_label = QLabel("Preparazione dell'anteprima...")
+        self.preview_status_label.setAlignment(Qt.AlignCenter)
+        self.viewer_layout.addWidget(self.preview_status_label)
+        self.viewer_layout.addWidget(self.graphics_view)
+        self._render_thread = DocumentRenderThread([self.file_path], self)
+        self._render_thread.rendered.connect(self._on_preview_ready)
+        self._render_thread.failed.connect(self._on_preview_failed)
+        self._render_thread.start()
+
+    def _on_preview_ready(self, file_path: str, render_set):
+        self.preview_status_label.setVisible(False)
+        if render_set is None or not render_set.levels:
+            self._on_preview_failed(file_path, "anteprima non disponibile")
+            return
+        self._render_set = render_set
+        # Coordinate della scena = pixel dell'originale: i livelli vengono scalati di conseguenza
+        width, height = render_set.original_size
+        self.graphics_scene.setSceneRect(0, 0, width, height)
+        self.pixmap_item = self.graphics_scene.addPixmap(QPixmap())
+        self.pixmap_item.setTransformationMode(Qt.SmoothTransformation)
+        self.graphics_view.wheelEvent = self._preview_wheel_event
+        self.graphics_view.fitInView(self.graphics_scene.sceneRect(), Qt.KeepAspectRatio)
+        self._update_preview_level()
+        self.full_pdf_button.setVisible(self.file_path.lower().endswith(".pdf"))
+        self.logger.info(f"Anteprima caricata: {self.file_path}")
+
+    def _on_preview_failed(self, file_path: str, message: str):
+        self.logger.warning(f"Anteprima non disponibile per '{file_path}' ({message}): caricamento diretto.")
+        self.preview_status_label.setVisible(False)
+        self.graphics_view.setVisible(False)
+        if self.file_path.lower().endswith(".pdf"):
+            self._load_pdf()
+        else:
+            self._load_image()
+
+    def _update_preview_level(self):
+        """Mostra il livello della piramide adatto all'ingrandimento corrente (l'originale solo se necessario)."""
+        render_set = self._render_set
+        scale = self.graphics_view.transform().m11() * self.graphics_view.devicePixelRatioF()
+        required = max(render_set.original_size) * scale
+        level = best_level(render_set.levels, required)
+        is_pdf = self.file_path.lower().endswith(".pdf")
+        if level is None:
+            level = render_set.levels[-1] if is_pdf else (max(render_set.original_size), self.file_path)
+        if level[1] == self._current_level:
+            return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            pixmap = QPixmap(level[1])
+        finally:
+            QApplication.restoreOverrideCursor()
+        if pixmap.isNull():
+            return
+        self._current_level = level[1]
+        self.pixmap_item.setPixmap(pixmap)
+        self.pixmap_item.setScale(render_set.original_size[0] / pixmap.width())
+
+    def _preview_wheel_event(self, event):
+        factor = 1.15 if event.angleDelta().y() > 0 else 1 / 1.15
+        new_scale = self.graphics_view.transform().m11() * factor
+        if 0.01 <= new_scale <= 10.0:
+            self.graphics_view.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+            self.graphics_view.scale(factor, factor)
+            self._update_preview_level()
+        event.accept()
+
+    def done(self, result):
+        if self._render_thread and self._render_thread.isRunning():
+            self._render_thread.detach()
+        super().done(result)
+
     def _load_image(self):
         try:
-            self.graphics_scene = QGraphicsScene(self)
-            self.graphics_view = QGraphicsView(self.graphics_scene, self)
-            self.graphics_view.setRenderHint(QPainter.Antialiasing)
-            self.graphics_view.setRenderHint(QPainter.SmoothPixmapTransform)
-            self.graphics_view.setCacheMode(QGraphicsView.CacheBackground)
-            self.graphics_view.setViewportUpdateMode(QGraphicsView.BoundingRectViewportUpdate)
-            self.graphics_view.setDragMode(QGraphicsView.ScrollHandDrag)
+            self._create_graphics_view()
 
             pixmap = QPixmap(str(self.file_path))
             if pixmap.isNull():
@@ -570,7 +770,6 @@ class DocumentViewerDialog(QDialog):
 
             self.pixmap_item = self.graphics_scene.addPixmap(pixmap)
             self.graphics_view.fitInView(self.pixmap_item, Qt.KeepAspectRatio)
-            self.graphics_view.setAlignment(Qt.AlignCenter)
 
             self.zoom_factor = 1.0
             self.graphics_view.wheelEvent = self._image_wheel_event
@@ -929,6 +1128,7 @@ class PartitaDetailsDialog(QDialog):
 
         if filename_pdf:
             try:
+                from pdf_reports import GenericTextReportPDF
                 pdf = GenericTextReportPDF(report_title=pdf_report_title)
                 pdf.add_page()
                 pdf.add_report_text(text_content)
@@ -1308,7 +1508,20 @@ class ModificaPartitaDialog(QDialog):
         self.documents_table.dragEnterEvent = self.documents_table_dragEnterEvent
         self.documents_table.dragMoveEvent = self.documents_table_dragMoveEvent
         self.documents_table.dropEvent = self.documents_table_dropEvent
-        
+
+        # Striscia delle miniature (generate in background, vedi render_cache.py)
+        self.thumbnail_strip = QListWidget()
+        self.thumbnail_strip.setViewMode(QListWidget.IconMode)
+        self.thumbnail_strip.setFlow(QListWidget.LeftToRight)
+        self.thumbnail_strip.setWrapping(False)
+        self.thumbnail_strip.setMovement(QListWidget.Static)
+        self.thumbnail_strip.setIconSize(QSize(96, 96))
+        self.thumbnail_strip.setFixedHeight(140)
+        self.thumbnail_strip.setToolTip("Doppio clic per aprire il documento nel visualizzatore.")
+        self.thumbnail_strip.itemDoubleClicked.connect(self._open_thumbnail_document)
+        self._thumbnail_thread: Optional[DocumentRenderThread] = None
+
+        layout_documenti.addWidget(self.thumbnail_strip)
         layout_documenti.addWidget(self.documents_table)
 
         doc_buttons_layout = QHBoxLayout()
@@ -1599,6 +1812,8 @@ class ModificaPartitaDialog(QDialog):
     def _load_documenti_allegati(self):
         """Carica e popola la tabella dei documenti allegati alla partita."""
         self.documents_table.setRowCount(0)
+        self.thumbnail_strip.clear()
+        thumbnail_paths: List[str] = []
         self.documents_table.setSortingEnabled(False)
         self.documents_table.clearSelection() 
         self.logger.info(f"Caricamento documenti per partita ID {self.partita_id}.")
@@ -1639,6 +1854,15 @@ class ModificaPartitaDialog(QDialog):
                     path_item = QTableWidgetItem(os.path.basename(percorso_file_full) if percorso_file_full else "N/D")
                     path_item.setData(Qt.UserRole, percorso_file_full) # Salva percorso completo per l'apertura
                     self.documents_table.setItem(row, 5, path_item)
+
+                    if percorso_file_full and os.path.isfile(percorso_file_full):
+                        thumb_item = QListWidgetItem(QApplication.style().standardIcon(QStyle.SP_FileIcon),
+                                                     doc.get("titolo") or os.path.basename(percorso_file_full))
+                        thumb_item.setData(Qt.UserRole, percorso_file_full)
+                        thumb_item.setToolTip(percorso_file_full)
+                        self.thumbnail_strip.addItem(thumb_item)
+                        if can_render(percorso_file_full):
+                            thumbnail_paths.append(percorso_file_full)
                 
                 self.documents_table.resizeColumnsToContents()
             else:
@@ -1662,8 +1886,37 @@ class ModificaPartitaDialog(QDialog):
             self.documents_table.setSortingEnabled(True)
             self._update_document_tab_title() 
             self._update_details_doc_buttons_state() 
+            self._start_thumbnail_generation(thumbnail_paths)
             self.logger.debug("Tab 'Documenti' popolato.")
 
+    def _start_thumbnail_generation(self, file_paths: List[str]):
+        """Carica le miniature dalla cache, generando in background quelle mancanti."""
+        if self._thumbnail_thread and self._thumbnail_thread.isRunning():
+            self._thumbnail_thread.detach()
+        self._thumbnail_thread = None
+        if not file_paths:
+            return
+        self._thumbnail_thread = DocumentRenderThread(list(dict.fromkeys(file_paths)), self)
+        self._thumbnail_thread.rendered.connect(self._on_thumbnail_ready)
+        self._thumbnail_thread.start()
+
+    def _on_thumbnail_ready(self, file_path: str, render_set):
+        if render_set is None or not render_set.thumbnail:
+            return
+        icon = QIcon(QPixmap(render_set.thumbnail))
+        for index in range(self.thumbnail_strip.count()):
+            item = self.thumbnail_strip.item(index)
+            if item.data(Qt.UserRole) == file_path:
+                item.setIcon(icon)
+
+    def _open_thumbnail_document(self, item: QListWidgetItem):
+        DocumentViewerDialog(self, item.data(Qt.UserRole)).exec_()
+
+    def done(self, result):
+        if self._thumbnail_thread and self._thumbnail_thread.isRunning():
+            self._thumbnail_thread.detach()
+        super().done(result)
+
 
     # --- Metodi per la Gestione dei Pulsanti e Selezioni ---
 
@@ -2075,53 +2328,35 @@ class ModificaPartitaDialog(QDialog):
             doc_info = dialog.document_data
             percorso_originale = doc_info["percorso_file_originale"] # Ora sarà file_path pre-selezionato
             
-            # ... (la tua logica esistente di copia file e salvataggio nel DB da _allega_nuovo_documento_a_partita) ...
-            allegati_dir = os.path.join(".", "allegati_catasto", f"partita_{self.partita_id}")
-            os.makedirs(allegati_dir, exist_ok=True)
-            
-            nome_file_originale = os.path.basename(percorso_originale)
-            nome_file_dest = nome_file_originale 
-            percorso_destinazione_completo = os.path.join(allegati_dir, nome_file_dest)
-            
+            # Il file viene copiato nell'archivio per contenuto (una sola copia per contenuto,
+            # nessuna sovrascrittura per nomi uguali): vedi CatastoDBManager.archivia_documento
             try:
-                import shutil
-                shutil.copy2(percorso_originale, percorso_destinazione_completo)
-                self.logger.info(f"File copiato da '{percorso_originale}' a '{percorso_destinazione_completo}'")
-
-                percorso_file_db = percorso_destinazione_completo
-
-                doc_id = self.db_manager.aggiungi_documento_storico(
-                    titolo=doc_info["titolo"],
-                    tipo_documento=doc_info["tipo_documento"],
-                    percorso_file=percorso_file_db,
-                    descrizione=doc_info["descrizione"],
-                    anno=doc_info["anno"],
-                    periodo_id=doc_info["periodo_id"],
-                    metadati_json=doc_info["metadati_json"]
-                )
-                if doc_id:
-                    success_link = self.db_manager.collega_documento_a_partita(
-                        doc_id, self.partita_id, doc_info["rilevanza"], doc_info["note_legame"]
+                QApplication.setOverrideCursor(Qt.WaitCursor)
+                try:
+                    doc_id = self.db_manager.archivia_documento(
+                        percorso_originale,
+                        titolo=doc_info["titolo"],
+                        tipo_documento=doc_info["tipo_documento"],
+                        descrizione=doc_info["descrizione"],
+                        anno=doc_info["anno"],
+                        periodo_id=doc_info["periodo_id"],
+                        metadati_json=doc_info["metadati_json"]
                     )
-                    if success_link:
-                        QMessageBox.information(self, "Successo", "Documento allegato e collegato con successo.")
-                        self._load_documenti_allegati() # Aggiorna la tabella
-                    else:
-                        QMessageBox.warning(self, "Attenzione", "Documento salvato ma fallito il collegamento alla partita.")
+                finally:
+                    QApplication.restoreOverrideCursor()
+                success_link = self.db_manager.collega_documento_a_partita(
+                    doc_id, self.partita_id, doc_info["rilevanza"], doc_info["note_legame"]
+                )
+                if success_link:
+                    QMessageBox.information(self, "Successo", "Documento allegato e collegato con successo.")
+                    self._load_documenti_allegati() # Aggiorna la tabella
                 else:
-                    QMessageBox.critical(self, "Errore", "Impossibile salvare le informazioni del documento nel database.")
-                    if os.path.exists(percorso_destinazione_completo): os.remove(percorso_destinazione_completo)
+                    QMessageBox.warning(self, "Attenzione", "Documento salvato ma fallito il collegamento alla partita.")
 
-            except FileNotFoundError:
-                QMessageBox.critical(self, "Errore File", f"File sorgente non trovato: {percorso_originale}")
-            except PermissionError:
-                QMessageBox.critical(self, "Errore Permessi", f"Permessi non sufficienti per copiare il file in '{allegati_dir}'.")
             except DBMError as e_db:
                 QMessageBox.critical(self, "Errore Database", f"Errore durante il salvataggio: {e_db}")
-                if os.path.exists(percorso_destinazione_completo): os.remove(percorso_destinazione_completo)
             except Exception as e:
                 QMessageBox.critical(self, "Errore Imprevisto", f"Errore durante l'allegazione del documento: {e}")
-                if os.path.exists(percorso_destinazione_completo): os.remove(percorso_destinazione_completo)
                 self.logger.error(f"Errore allegando documento: {e}", exc_info=True)
         else:
             self.logger.info("Aggiunta documento tramite drag-and-drop annullata dall'utente (dialogo chiuso).")
@@ -5630,24 +5865,14 @@ def datetime_to_qdate(dt_date: Optional[date]) -> QDate:
     if dt_date is None:
         return QDate()  # Restituisce una QDate "nulla"
     return QDate(dt_date.year, dt_date.month, dt_date.day)
+# --- INIZIO MODIFICA: hash e verifica centralizzati in auth.py ---
 def _hash_password(password: str) -> str:
-        """Genera un hash sicuro per la password usando bcrypt."""
-        password_bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
-        hashed_bytes = bcrypt.hashpw(password_bytes, salt)
-        return hashed_bytes.decode('utf-8')
+    """Genera un hash bcrypt con il fattore di lavoro configurato (Security/BcryptRounds)."""
+    return auth.hash_password(password, load_bcrypt_rounds(QSettings()))
+
+
 def _verify_password(stored_hash: str, provided_password: str) -> bool:
     """Verifica se la password fornita corrisponde all'hash memorizzato."""
-    try:
-        stored_hash_bytes = stored_hash.encode('utf-8')
-        provided_password_bytes = provided_password.encode('utf-8')
-        return bcrypt.checkpw(provided_password_bytes, stored_hash_bytes)
-    except ValueError:
-        logging.getLogger("CatastoGUI").error(
-            f"Tentativo di verifica con hash non valido: {stored_hash[:10]}...")
-        return False
-    except Exception as e:
-        logging.getLogger("CatastoGUI").error(
-            f"Errore imprevisto durante la verifica bcrypt: {e}")
-        return False
+    return auth.verify_password(stored_hash, provided_password)
+# --- FINE MODIFICA ---
 
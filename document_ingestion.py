@@ -0,0 +1,514 @@
+# -*- coding: utf-8 -*-
+"""
+Importazione massiva di documenti scansionati
+=============================================
+Importa in un'unica operazione una cartella di scansioni (registri, fogli di
+partita) descritta da un manifest CSV o JSON che associa ogni file alle partite:
+
+    file;partita_id;titolo;tipo_documento;anno;rilevanza;note
+    registro_1850/p001.jpg;12|15;Registro partite 1850, p. 1;Registro;1850;primaria;
+
+In alternativa a partita_id la partita si indica con numero_partita (più
+suffisso_partita) e comune_id o comune (nome). Le colonne mancanti prendono i
+valori predefiniti; il titolo predefinito è il nome del file. Nel JSON: una lista
+di oggetti con le stesse chiavi (partita_id anche come lista), oppure
+{"documenti": [...]}.
+
+- Hash e copia nell'archivio allegati (document_store) avvengono in parallelo in
+  un pool di thread; il database è scritto solo dal thread chiamante, a blocchi
+  di `batch_size` documenti per transazione (documento_contenuto,
+  documento_storico e documento_partita con un INSERT multi-riga ciascuno).
+- Ogni file importato ha in documento_storico.metadati la chiave
+  {"ingestione": {"manifest": "<percorso assoluto del manifest>", "chiave": "<manifest>:<file>"}}
+  (indicizzata per manifest dallo script sql_scripts/26_ingestione_documenti.sql).
+  Il manifest è identificato dal percorso assoluto risolto, non dal nome: due
+  consegne con lo stesso 'manifest.csv' in cartelle diverse restano distinte.
+  Rieseguendo lo stesso manifest, i file già importati vengono saltati prima di
+  essere riletti: l'importazione interrotta riprende da dove si era fermata (anche
+  dopo aver corretto le righe in errore) e non crea duplicati.
+- Il resoconto è un file JSON Lines accanto al manifest (<manifest>.report.jsonl),
+  aggiornato dopo ogni blocco confermato: un esito per file ('importato' o
+  'errore', con il motivo). Le righe in errore vengono ritentate alla ripresa.
+
+Uso da riga di comando:
+    python document_ingestion.py --dsn "host=... dbname=catasto_storico user=..." --manifest D:\\scansioni\\manifest.csv
+La password si passa con la variabile d'ambiente PGPASSWORD. Il modulo non importa Qt.
+"""
+
+import csv
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from document_store import DocumentStore, StoredDocument
+
+try:
+    import psycopg2
+    from psycopg2 import sql
+    from psycopg2.extras import execute_values
+except ImportError:  # Consente la lettura dei manifest (e i test) anche senza psycopg2
+    psycopg2 = None
+
+logger = logging.getLogger("CatastoGUI.document_ingestion")
+
+DEFAULT_TIPO_DOCUMENTO = "Scansione"
+DEFAULT_RILEVANZA = "primaria"
+RILEVANZE = ("primaria", "secondaria", "correlata")
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 2) * 2)
+PARTITA_SEPARATOR = "|"
+REPORT_SUFFIX = ".report.jsonl"
+_MAX_TITLE_LENGTH = 255
+
+ESITO_IMPORTATO = "importato"
+ESITO_ERRORE = "errore"
+
+
+class ManifestError(ValueError):
+    """Manifest illeggibile o privo della colonna 'file'."""
+
+
+class PartitaRef(NamedTuple):
+    """Partita indicata per numero: il comune per ID oppure per nome (in minuscolo)."""
+    comune_id: Optional[int]
+    comune_nome: Optional[str]
+    numero_partita: int
+    suffisso_partita: str   # '' se assente, in minuscolo
+
+
+class IngestItem(NamedTuple):
+    key: str                      # "<manifest_identity>:<file relativo>", chiave di ripresa
+    line: int                     # riga del manifest (1 = intestazione nei CSV)
+    file: str                     # percorso assoluto
+    relative_file: str            # come scritto nel manifest, con '/'
+    titolo: str
+    tipo_documento: str
+    descrizione: Optional[str]
+    anno: Optional[int]
+    rilevanza: str
+    note: Optional[str]
+    partita_ids: Tuple[int, ...]
+    partita_ref: Optional[PartitaRef]
+
+
+class IngestFailure(NamedTuple):
+    key: Optional[str]
+    line: int
+    file: str
+    message: str
+
+
+# ---------------------------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------------------------
+def _read_manifest_rows(manifest_path: str) -> List[Tuple[int, Dict[str, Any]]]:
+    if os.path.splitext(manifest_path)[1].lower() == ".json":
+        with open(manifest_path, "r", encoding="utf-8-sig") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ManifestError(f"JSON non valido: {e}") from e
+        if isinstance(data, dict):
+            data = data.get("documenti")
+        if not isinstance(data, list) or not all(isinstance(entry, dict) for entry in data):
+            raise ManifestError("Il manifest JSON deve essere una lista di oggetti (o {\"documenti\": [...]}).")
+        return [(index, {str(k).strip().lower(): v for k, v in entry.items()})
+                for index, entry in enumerate(data, start=1)]
+
+    with open(manifest_path, "r", encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            delimiter = csv.Sniffer().sniff(sample.splitlines()[0] if sample else "", delimiters=";,\t").delimiter
+        except csv.Error:
+            delimiter = ";"
+        reader = csv.DictReader(f, delimiter=delimiter)
+        if not reader.fieldnames or "file" not in [name.strip().lower() for name in reader.fieldnames]:
+            raise ManifestError("Colonna 'file' mancante nell'intestazione del manifest.")
+        return [(reader.line_num, {str(k).strip().lower(): v for k, v in row.items() if k is not None})
+                for row in reader]
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _int(value: Any, field: str) -> Optional[int]:
+    text = _text(value)
+    if text is None:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        raise ValueError(f"valore non numerico per '{field}': {text!r}")
+
+
+def _partita_ids(value: Any) -> Tuple[int, ...]:
+    if isinstance(value, (list, tuple)):
+        parts = value
+    else:
+        parts = (_text(value) or "").split(PARTITA_SEPARATOR)
+    return tuple(dict.fromkeys(_int(part, "partita_id") for part in parts if _text(part) is not None))
+
+
+def manifest_identity(manifest_path: str) -> str:
+    """Identità del manifest nelle chiavi di ripresa: percorso assoluto risolto (link simbolici compresi)."""
+    return os.path.normcase(os.path.realpath(manifest_path)).replace("\\", "/")
+
+
+def parse_manifest(manifest_path: str,
+                   base_dir: Optional[str] = None) -> Tuple[List[IngestItem], List[IngestFailure]]:
+    """
+    Legge il manifest. I percorsi dei file sono relativi a `base_dir` (predefinita: la
+    cartella del manifest). Le righe non valide non interrompono la lettura: sono
+    restituite come IngestFailure. Solleva ManifestError se il file è inutilizzabile.
+    """
+    base_dir = os.path.abspath(base_dir or os.path.dirname(os.path.abspath(manifest_path)))
+    manifest_id = manifest_identity(manifest_path)
+    items: List[IngestItem] = []
+    failures: List[IngestFailure] = []
+    seen_files: Dict[str, int] = {}
+    for line, row in _read_manifest_rows(manifest_path):
+        relative_file = (_text(row.get("file")) or "").replace("\\", "/")
+        key = f"{manifest_id}:{relative_file}" if relative_file else None
+        try:
+            if not relative_file:
+                raise ValueError("colonna 'file' vuota")
+            if relative_file in seen_files:
+                key = None  # la chiave appartiene alla prima riga: l'esito di questa non la deve sovrascrivere
+                raise ValueError(f"file già indicato alla riga {seen_files[relative_file]}; "
+                                 f"per più partite usare '{PARTITA_SEPARATOR}' in partita_id")
+            seen_files[relative_file] = line
+            file_path = os.path.normpath(os.path.join(base_dir, relative_file))
+            if not os.path.isfile(file_path):
+                raise ValueError("file non trovato")
+
+            partita_ids = _partita_ids(row.get("partita_id"))
+            partita_ref = None
+            numero = _int(row.get("numero_partita"), "numero_partita")
+            if numero is not None:
+                comune_id = _int(row.get("comune_id"), "comune_id")
+                comune_nome = _text(row.get("comune"))
+                if comune_id is None and comune_nome is None:
+                    raise ValueError("numero_partita indicato senza comune_id o comune")
+                partita_ref = PartitaRef(comune_id, comune_nome.lower() if comune_nome else None, numero,
+                                         (_text(row.get("suffisso_partita")) or "").lower())
+            if not partita_ids and partita_ref is None:
+                raise ValueError("nessuna partita indicata (partita_id oppure numero_partita)")
+
+            rilevanza = (_text(row.get("rilevanza")) or DEFAULT_RILEVANZA).lower()
+            if rilevanza not in RILEVANZE:
+                raise ValueError(f"rilevanza non valida: {rilevanza!r}")
+            titolo = _text(row.get("titolo")) or os.path.splitext(os.path.basename(relative_file))[0]
+            if len(titolo) > _MAX_TITLE_LENGTH:
+                raise ValueError(f"titolo più lungo di {_MAX_TITLE_LENGTH} caratteri")
+            items.append(IngestItem(
+                key=key, line=line, file=file_path, relative_file=relative_file, titolo=titolo,
+                tipo_documento=_text(row.get("tipo_documento")) or DEFAULT_TIPO_DOCUMENTO,
+                descrizione=_text(row.get("descrizione")), anno=_int(row.get("anno"), "anno"),
+                rilevanza=rilevanza, note=_text(row.get("note")),
+                partita_ids=partita_ids, partita_ref=partita_ref))
+        except ValueError as e:
+            failures.append(IngestFailure(key, line, relative_file, str(e)))
+    return items, failures
+
+
+# ---------------------------------------------------------------------------
+# Resoconto
+# ---------------------------------------------------------------------------
+def default_report_path(manifest_path: str) -> str:
+    return os.path.splitext(manifest_path)[0] + REPORT_SUFFIX
+
+
+def load_report(report_path: str) -> Dict[str, Dict[str, Any]]:
+    """Ultimo esito registrato per ogni chiave (le righe troncate da un'interruzione sono ignorate)."""
+    outcomes: Dict[str, Dict[str, Any]] = {}
+    if not os.path.isfile(report_path):
+        return outcomes
+    with open(report_path, "r", encoding="utf-8") as f:
+        for raw_line in f:
+            try:
+                entry = json.loads(raw_line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(entry, dict) and entry.get("chiave"):
+                outcomes[entry["chiave"]] = entry
+    return outcomes
+
+
+class ReportWriter:
+    """Aggiunge gli esiti al resoconto; write() li rende persistenti prima di tornare."""
+
+    def __init__(self, report_path: str):
+        self.report_path = report_path
+
+    def write(self, entries: Iterable[Dict[str, Any]]):
+        now = datetime.now().isoformat(timespec="seconds")
+        with open(self.report_path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(dict(entry, ora=now), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _failure_entry(failure: IngestFailure) -> Dict[str, Any]:
+    return {"chiave": failure.key, "riga": failure.line, "file": failure.file,
+            "esito": ESITO_ERRORE, "messaggio": failure.message}
+
+
+# ---------------------------------------------------------------------------
+# Database
+# ---------------------------------------------------------------------------
+def _require_psycopg2():
+    if psycopg2 is None:
+        raise RuntimeError("psycopg2 non è installato: impossibile scrivere nel database.")
+
+
+def fetch_ingested_keys(conn, schema: str, manifest_id: str) -> Set[str]:
+    """Chiavi dei file del manifest (vedi manifest_identity) già presenti in documento_storico."""
+    _require_psycopg2()
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("""
+            SELECT metadati->'ingestione'->>'chiave' FROM {schema}.documento_storico
+            WHERE metadati ? 'ingestione' AND metadati->'ingestione'->>'manifest' = %s;
+        """).format(schema=sql.Identifier(schema)), (manifest_id,))
+        return {row[0] for row in cur.fetchall() if row[0]}
+
+
+def resolve_partite(conn, schema: str, items: List[IngestItem]) -> Tuple[Dict[str, Tuple[int, ...]], List[IngestFailure]]:
+    """ID delle partite di ogni elemento (per chiave), verificando che esistano; una query per tipo di riferimento."""
+    _require_psycopg2()
+    explicit_ids = {partita_id for item in items for partita_id in item.partita_ids}
+    numbers = {item.partita_ref.numero_partita for item in items if item.partita_ref}
+    existing: Set[int] = set()
+    by_ref: Dict[Tuple[Any, ...], List[int]] = {}
+    with conn.cursor() as cur:
+        if explicit_ids:
+            cur.execute(sql.SQL("SELECT id FROM {schema}.partita WHERE id = ANY(%s);")
+                        .format(schema=sql.Identifier(schema)), (list(explicit_ids),))
+            existing = {row[0] for row in cur.fetchall()}
+        if numbers:
+            cur.execute(sql.SQL("""
+                SELECT p.id, p.comune_id, lower(c.nome), p.numero_partita, lower(COALESCE(p.suffisso_partita, ''))
+                FROM {schema}.partita p JOIN {schema}.comune c ON c.id = p.comune_id
+                WHERE p.numero_partita = ANY(%s);
+            """).format(schema=sql.Identifier(schema)), (list(numbers),))
+            for partita_id, comune_id, comune_nome, numero, suffisso in cur.fetchall():
+                by_ref.setdefault(("id", comune_id, numero, suffisso), []).append(partita_id)
+                by_ref.setdefault(("nome", comune_nome, numero, suffisso), []).append(partita_id)
+
+    resolved: Dict[str, Tuple[int, ...]] = {}
+    failures: List[IngestFailure] = []
+    for item in items:
+        missing = [partita_id for partita_id in item.partita_ids if partita_id not in existing]
+        ids = [partita_id for partita_id in item.partita_ids if partita_id in existing]
+        message = f"partite inesistenti: {', '.join(map(str, missing))}" if missing else None
+        ref = item.partita_ref
+        if ref and message is None:
+            lookup = ("id", ref.comune_id) if ref.comune_id is not None else ("nome", ref.comune_nome)
+            matches = by_ref.get(lookup + (ref.numero_partita, ref.suffisso_partita), [])
+            description = f"partita {ref.numero_partita}{' ' + ref.suffisso_partita if ref.suffisso_partita else ''}"
+            if not matches:
+                message = f"{description} non trovata nel comune indicato"
+            elif len(matches) > 1:
+                message = f"{description} ambigua: più comuni con lo stesso nome"
+            elif matches[0] not in ids:
+                ids.append(matches[0])
+        if message:
+            failures.append(IngestFailure(item.key, item.line, item.relative_file, message))
+        else:
+            resolved[item.key] = tuple(ids)
+    return resolved, failures
+
+
+def insert_batch(conn, schema: str, store: DocumentStore, manifest_id: str,
+                 batch: List[Tuple[IngestItem, StoredDocument, Tuple[int, ...]]]) -> Dict[str, int]:
+    """Registra un blocco di file archiviati: un INSERT multi-riga per tabella. Restituisce {chiave: documento_id}."""
+    _require_psycopg2()
+    schema_id = sql.Identifier(schema)
+    contents = {}
+    for _, stored, _ in batch:
+        extension = os.path.splitext(stored.path)[1]
+        contents[stored.sha256] = (stored.sha256, store.relative_path_for(stored.sha256, extension), stored.size)
+    documents = [
+        (item.titolo, item.tipo_documento, stored.path, item.descrizione, item.anno,
+         json.dumps({"ingestione": {"manifest": manifest_id, "chiave": item.key, "file": item.relative_file}},
+                    ensure_ascii=False),
+         stored.sha256)
+        for item, stored, _ in batch
+    ]
+    with conn.cursor() as cur:
+        execute_values(cur, sql.SQL("""
+            INSERT INTO {schema}.documento_contenuto (sha256, percorso_relativo, dimensione_bytes)
+            VALUES %s ON CONFLICT (sha256) DO NOTHING
+        """).format(schema=schema_id), list(contents.values()), page_size=len(contents))
+        rows = execute_values(cur, sql.SQL("""
+            INSERT INTO {schema}.documento_storico
+                (titolo, tipo_documento, percorso_file, descrizione, anno, metadati, contenuto_sha256)
+            VALUES %s RETURNING metadati->'ingestione'->>'chiave', id
+        """).format(schema=schema_id), documents, template="(%s, %s, %s, %s, %s, %s::jsonb, %s)",
+            page_size=len(documents), fetch=True)
+        document_ids = dict(rows)
+        links = [(document_ids[item.key], partita_id, item.rilevanza, item.note)
+                 for item, _, partita_ids in batch for partita_id in partita_ids]
+        execute_values(cur, sql.SQL("""
+            INSERT INTO {schema}.documento_partita (documento_id, partita_id, rilevanza, note)
+            VALUES %s ON CONFLICT (documento_id, partita_id) DO NOTHING
+        """).format(schema=schema_id), links, page_size=len(links))
+    return document_ids
+
+
+# ---------------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------------
+def ingest_manifest(manifest_path: str, store: DocumentStore,
+                    connection_factory: Callable[[], ContextManager[Any]], schema: str = "catasto",
+                    base_dir: Optional[str] = None, report_path: Optional[str] = None,
+                    workers: int = DEFAULT_WORKERS, batch_size: int = DEFAULT_BATCH_SIZE,
+                    progress_callback: Optional[Callable[[int, int], None]] = None,
+                    should_stop: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+    """
+    Importa i file del manifest. `connection_factory()` deve restituire un context
+    manager che fornisce una connessione e conferma la transazione all'uscita: ogni
+    blocco usa la propria. Restituisce il riepilogo (conteggi e percorso del resoconto).
+    Un errore del database interrompe l'importazione dopo averlo registrato nel
+    resoconto; rieseguendo il manifest si riprende dai file mancanti.
+    """
+    manifest_name = os.path.basename(manifest_path)
+    manifest_id = manifest_identity(manifest_path)
+    report_path = report_path or default_report_path(manifest_path)
+    items, failures = parse_manifest(manifest_path, base_dir)
+    summary = {"totale": len(items) + len(failures), "importati": 0, "gia_importati": 0, "errori": 0,
+               "contenuti_nuovi": 0, "byte_copiati": 0, "interrotto": False, "report": report_path}
+
+    previous = load_report(report_path)
+    done_keys = {key for key, entry in previous.items() if entry.get("esito") == ESITO_IMPORTATO}
+    with connection_factory() as conn:
+        done_keys |= fetch_ingested_keys(conn, schema, manifest_id)
+        pending_items = [item for item in items if item.key not in done_keys]
+        summary["gia_importati"] = len(items) - len(pending_items)
+        resolved, unresolved = resolve_partite(conn, schema, pending_items)
+    failures += unresolved
+    pending_items = [item for item in pending_items if item.key in resolved]
+
+    writer = ReportWriter(report_path)
+    writer.write(_failure_entry(failure) for failure in failures)
+    summary["errori"] = len(failures)
+    logger.info(f"Importazione '{manifest_name}': {len(pending_items)} file da importare, "
+                f"{summary['gia_importati']} già importati, {len(failures)} righe scartate.")
+
+    processed = summary["gia_importati"] + len(failures)
+    batch: List[Tuple[IngestItem, StoredDocument, Tuple[int, ...]]] = []
+
+    def flush(size: Optional[int] = None):
+        nonlocal processed
+        chunk = batch[:size] if size else list(batch)
+        if not chunk:
+            return
+        try:
+            with connection_factory() as conn:
+                document_ids = insert_batch(conn, schema, store, manifest_id, chunk)
+        except Exception as e:
+            writer.write({"chiave": item.key, "riga": item.line, "file": item.relative_file,
+                          "esito": ESITO_ERRORE, "messaggio": f"errore del database: {e}"} for item, _, _ in chunk)
+            summary["errori"] += len(chunk)
+            raise
+        writer.write({"chiave": item.key, "riga": item.line, "file": item.relative_file, "esito": ESITO_IMPORTATO,
+                      "documento_id": document_ids[item.key], "sha256": stored.sha256, "partite": list(partita_ids)}
+                     for item, stored, partita_ids in chunk)
+        summary["importati"] += len(chunk)
+        processed += len(chunk)
+        del batch[:len(chunk)]
+        if progress_callback:
+            progress_callback(processed, summary["totale"])
+
+    queue = deque(pending_items)
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingestione") as pool:
+        while queue or in_flight:
+            # Finestra limitata: i risultati non si accumulano in memoria se il database è più lento dei dischi
+            while queue and len(in_flight) < workers * 4 and not summary["interrotto"]:
+                item = queue.popleft()
+                in_flight[pool.submit(store.put, item.file)] = item
+            if not in_flight:
+                break
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            file_errors = []
+            for future in completed:
+                item = in_flight.pop(future)
+                try:
+                    stored = future.result()
+                except OSError as e:
+                    file_errors.append(_failure_entry(IngestFailure(item.key, item.line, item.relative_file,
+                                                                    f"lettura/copia non riuscita: {e}")))
+                    continue
+                summary["contenuti_nuovi"] += stored.is_new
+                summary["byte_copiati"] += stored.size if stored.is_new else 0
+                batch.append((item, stored, resolved[item.key]))
+            if file_errors:
+                writer.write(file_errors)
+                summary["errori"] += len(file_errors)
+                processed += len(file_errors)
+            # Più file possono completarsi insieme: i blocchi restano di batch_size righe
+            while len(batch) >= batch_size:
+                flush(batch_size)
+            if should_stop and not summary["interrotto"] and should_stop():
+                summary["interrotto"] = True
+                logger.info(f"Importazione '{manifest_name}' interrotta: completamento dei file in corso.")
+    flush()
+    logger.info(f"Importazione '{manifest_name}' terminata: {summary['importati']} importati, "
+                f"{summary['errori']} errori, {summary['contenuti_nuovi']} contenuti nuovi.")
+    return summary
+
+
+def _main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Importazione massiva di documenti scansionati da un manifest CSV/JSON.")
+    parser.add_argument("--dsn", required=True, help="Stringa di connessione libpq (password in PGPASSWORD).")
+    parser.add_argument("--manifest", required=True, help="File CSV o JSON che associa i file alle partite.")
+    parser.add_argument("--cartella", help="Cartella dei file (predefinita: quella del manifest).")
+    parser.add_argument("--archivio", default=None, help="Radice dell'archivio allegati (predefinita: config.DOCUMENT_STORE_DIR).")
+    parser.add_argument("--report", help="File del resoconto (predefinito: <manifest>.report.jsonl).")
+    parser.add_argument("--schema", default="catasto")
+    parser.add_argument("--thread", type=int, default=DEFAULT_WORKERS, help="Thread per hash e copia dei file.")
+    parser.add_argument("--blocco", type=int, default=DEFAULT_BATCH_SIZE, help="Documenti per transazione.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    _require_psycopg2()
+
+    if args.archivio is None:
+        from config import DOCUMENT_STORE_DIR
+        args.archivio = DOCUMENT_STORE_DIR
+    conn = psycopg2.connect(args.dsn)
+
+    @contextmanager
+    def transaction():
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    try:
+        summary = ingest_manifest(args.manifest, DocumentStore(args.archivio), transaction, args.schema,
+                                  args.cartella, args.report, args.thread, args.blocco,
+                                  progress_callback=lambda done, total: print(f"{done}/{total}"))
+    finally:
+        conn.close()
+    print(f"Importati: {summary['importati']}, già importati: {summary['gia_importati']}, "
+          f"errori: {summary['errori']}. Resoconto: {summary['report']}")
+    return 1 if summary["errori"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
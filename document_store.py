@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Archivio degli allegati indirizzato per contenuto
+=================================================
+Ogni file allegato viene salvato una sola volta, con il nome dato dal suo hash
+SHA-256, in una cartella suddivisa sui primi caratteri dell'hash:
+
+    allegati_catasto/contenuti/3f/a2/3fa2...e9.pdf
+
+- put() calcola l'hash durante la copia (una sola lettura del file): la copia va in
+  un file temporaneo e viene rinominata solo se il contenuto non è già presente.
+  Lo stesso registro scansionato allegato a 40 partite occupa spazio una volta sola
+  e file diversi con lo stesso nome non si sovrascrivono più.
+- Un file sorgente già archiviato (stesso percorso, dimensione e data di modifica)
+  non viene riletto: l'hash è in una piccola cache in memoria.
+- I riferimenti sono contati nel database (documento_contenuto.riferimenti,
+  sql_scripts/25_archivio_documenti.sql). collect_garbage() elimina i file non più
+  referenziati, ma solo se non toccati di recente: put() aggiorna la data di
+  modifica anche quando il contenuto esiste già, così un allegato in corso non
+  viene rimosso da una pulizia concorrente.
+
+Il modulo non importa Qt né psycopg2.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, NamedTuple, Set, Tuple
+
+logger = logging.getLogger("CatastoGUI.document_store")
+
+OBJECTS_DIRNAME = "contenuti"
+DEFAULT_GC_GRACE_SECONDS = 3600
+_CHUNK_SIZE = 1024 * 1024
+_SOURCE_CACHE_SIZE = 512
+_OBJECT_NAME_RE = re.compile(r"^([0-9a-f]{64})(\.[0-9a-z]{1,10})?$")
+
+
+class StoredDocument(NamedTuple):
+    sha256: str
+    path: str            # percorso del contenuto (relativo alla radice, se questa è relativa)
+    size: int
+    is_new: bool         # False se il contenuto era già presente (nessuna copia)
+
+
+def normalized_extension(file_name: str) -> str:
+    """Estensione in minuscolo ('.pdf'); le estensioni anomale vengono scartate."""
+    extension = os.path.splitext(file_name)[1].lower()
+    return extension if re.fullmatch(r"\.[0-9a-z]{1,10}", extension) else ""
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentStore:
+    """Archivio su disco dei contenuti degli allegati. Thread-safe."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.objects_dir = os.path.join(root, OBJECTS_DIRNAME)
+        self._source_digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path_for(self, sha256: str, extension: str = "") -> str:
+        return os.path.join(self.objects_dir, sha256[:2], sha256[2:4], sha256 + extension)
+
+    def relative_path_for(self, sha256: str, extension: str = "") -> str:
+        """Percorso relativo alla radice dell'archivio (quello salvato nel database)."""
+        return os.path.join(OBJECTS_DIRNAME, sha256[:2], sha256[2:4], sha256 + extension)
+
+    def put(self, source_path: str) -> StoredDocument:
+        """Archivia il file e restituisce hash e percorso del contenuto."""
+        extension = normalized_extension(source_path)
+        stat = os.stat(source_path)
+        source_key = (os.path.abspath(source_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            known_digest = self._source_digests.get(source_key)
+        if known_digest and self._touch(self.path_for(known_digest, extension)):
+            return StoredDocument(known_digest, self.path_for(known_digest, extension), stat.st_size, False)
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(prefix=".in_arrivo_", dir=self.objects_dir)
+        try:
+            with os.fdopen(fd, "wb") as out, open(source_path, "rb") as src:
+                for chunk in iter(lambda: src.read(_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            final_path = self.path_for(sha256, extension)
+            is_new = not self._touch(final_path)
+            if is_new:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+                logger.info(f"Nuovo contenuto archiviato: {sha256}{extension} ({size} byte).")
+            else:
+                logger.debug(f"Contenuto già presente, copia evitata: {sha256}{extension}.")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._remember(source_key, sha256)
+        return StoredDocument(sha256, final_path, size, is_new)
+
+    def exists(self, sha256: str, extension: str = "") -> bool:
+        return os.path.isfile(self.path_for(sha256, extension))
+
+    def iter_objects(self) -> Iterator[Tuple[str, str]]:
+        """(sha256, percorso) di ogni contenuto presente su disco."""
+        if not os.path.isdir(self.objects_dir):
+            return
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for name in filenames:
+                match = _OBJECT_NAME_RE.match(name)
+                if match:
+                    yield match.group(1), os.path.join(dirpath, name)
+
+    def collect_garbage(self, referenced: Iterable[str],
+                        grace_seconds: float = DEFAULT_GC_GRACE_SECONDS) -> Dict[str, int]:
+        """
+        Elimina i contenuti il cui hash non è in `referenced` e non modificati da almeno
+        `grace_seconds`, più i temporanei abbandonati. Restituisce {'file', 'byte'} eliminati.
+        """
+        referenced_set: Set[str] = set(referenced)
+        cutoff = time.time() - grace_seconds
+        removed = {"file": 0, "byte": 0}
+        candidates = [(sha, path) for sha, path in self.iter_objects() if sha not in referenced_set]
+        if os.path.isdir(self.objects_dir):
+            candidates += [(None, os.path.join(self.objects_dir, name)) for name in os.listdir(self.objects_dir)
+                           if name.startswith(".in_arrivo_")]
+        for _, path in candidates:
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                os.remove(path)
+                removed["file"] += 1
+                removed["byte"] += stat.st_size
+            except OSError as e:
+                logger.warning(f"Impossibile eliminare il contenuto non referenziato '{path}': {e}")
+        with self._lock:
+            self._source_digests.clear()
+        if removed["file"]:
+            logger.info(f"Pulizia archivio allegati: {removed['file']} file, {removed['byte']} byte liberati.")
+        return removed
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        """Aggiorna la data di modifica del contenuto; False se il file non esiste."""
+        try:
+            os.utime(path, None)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _remember(self, source_key: Tuple[str, int, int], sha256: str):
+        with self._lock:
+            self._source_digests[source_key] = sha256
+            self._source_digests.move_to_end(source_key)
+            while len(self._source_digests) > _SOURCE_CACHE_SIZE:
+                self._source_digests.popitem(last=False)
@@ -8,7 +8,13 @@ Autore: Marco Santoro
 Data: 18/05/2025
 Versione: 1.2 (con integrazione menu esportazioni)
 """
-import sys,bcrypt
+import sys
+# --- INIZIO MODIFICA: profilazione dell'avvio (--profile-startup) ---
+# Attivata prima di qualunque import pesante, così che i tempi di import siano misurati tutti.
+import startup_profiler
+startup_profiler.enable_from_argv(sys.argv)
+# --- FINE MODIFICA ---
+import auth
 from gui_widgets import UnifiedFuzzySearchWidget
 import os
 import logging
@@ -16,8 +22,8 @@ from datetime import datetime
 from typing import Optional, Dict
 # Importazioni PyQt5
 from PyQt5.QtCore import (QSettings,
-                          QStandardPaths, Qt, QUrl,
-                          pyqtSlot,QCoreApplication)
+                          QStandardPaths, Qt, QThread, QTimer, QUrl,
+                          pyqtSignal, pyqtSlot,QCoreApplication)
 
 from PyQt5.QtGui import (QCloseEvent, QDesktopServices)
 
@@ -33,7 +39,6 @@ from PyQt5.QtWidgets import (QAction, QActionGroup, QApplication, # <-- AGGIUNTO
 
 from catasto_db_manager import CatastoDBManager
 from app_utils import get_local_ip_address, get_password_from_keyring 
-import pandas as pd # Importa pandas
 from app_paths import get_available_styles, load_stylesheet, get_logo_path, get_resource_path
 from dialogs import CSVImportResultDialog, EulaDialog,BackupReminderSettingsDialog
 
@@ -50,21 +55,15 @@ from gui_widgets import (
     DBConfigDialog,InserimentoPartitaWidget)
 from dialogs import CSVImportResultDialog,EulaDialog
 
-from custom_widgets import QPasswordLineEdit
+from custom_widgets import QPasswordLineEdit, DeferredTabWidget, LazyLoadedWidget
 
 
 from config import (
     SETTINGS_DB_TYPE, SETTINGS_DB_HOST, SETTINGS_DB_PORT, 
-    SETTINGS_DB_NAME, SETTINGS_DB_USER, SETTINGS_DB_SCHEMA,SETTINGS_DB_PASSWORD)
-
-try:
-    from fpdf import FPDF
-    from fpdf.enums import XPos, YPos
-    FPDF_AVAILABLE = True
-except ImportError:
-    FPDF_AVAILABLE = False
-    # QMessageBox.warning(None, "Avviso Dipendenza", "La libreria FPDF non è installata. L'esportazione in PDF non sarà disponibile.")
-    # Non mostrare il messaggio qui, ma gestire la disabilitazione dei pulsanti PDF.
+    SETTINGS_DB_NAME, SETTINGS_DB_USER, SETTINGS_DB_SCHEMA,SETTINGS_DB_PASSWORD,
+    SETTINGS_DB_POOL_TIMEOUT, SETTINGS_DB_REPLICA_DSNS, parse_replica_dsns,
+    load_execution_profiles, SETTINGS_UI_PREBUILD_TABS, TAB_PREBUILD_DELAY_MS, TAB_PREBUILD_INTERVAL_MS,
+    ENTITY_REFRESH_DEBOUNCE_MS, load_bcrypt_rounds)
 
 # Importazione del gestore DB (il percorso potrebbe necessitare aggiustamenti)
 try:
@@ -97,27 +96,37 @@ except ImportError:
                              "Non è possibile importare CatastoDBManager. "
                              "Assicurati che catasto_db_manager.py sia accessibile.")
         sys.exit(1)
-def _hash_password(password: str) -> str:
-        """Genera un hash sicuro per la password usando bcrypt."""
-        password_bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
-        hashed_bytes = bcrypt.hashpw(password_bytes, salt)
-        return hashed_bytes.decode('utf-8')
-
-def _verify_password(stored_hash: str, provided_password: str) -> bool:
-        """Verifica se la password fornita corrisponde all'hash memorizzato."""
+# --- INIZIO MODIFICA: verifica bcrypt e registrazione dell'accesso fuori dal thread GUI ---
+class LoginWorker(QThread):
+    """Esegue auth.authenticate() in background: la verifica bcrypt non blocca l'interfaccia."""
+    login_completed = pyqtSignal(dict)
+    login_error = pyqtSignal(str)
+
+    def __init__(self, db_manager: CatastoDBManager, username: str, password: str,
+                 client_ip: Optional[str], rounds: int, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.username = username
+        self.password = password
+        self.client_ip = client_ip
+        self.rounds = rounds
+
+    def run(self):
         try:
-            stored_hash_bytes = stored_hash.encode('utf-8')
-            provided_password_bytes = provided_password.encode('utf-8')
-            return bcrypt.checkpw(provided_password_bytes, stored_hash_bytes)
-        except ValueError:
-            logging.getLogger("CatastoGUI").error(
-                f"Tentativo di verifica con hash non valido: {stored_hash[:10]}...")
-            return False
-        except Exception as e:
+            result = auth.authenticate(self.db_manager, self.username, self.password,
+                                       client_ip=self.client_ip, rounds=self.rounds)
+            self.login_completed.emit(result)
+        except DBMError as e_dbm:
+            logging.getLogger("CatastoGUI").error(f"DBMError durante il login per {self.username}: {e_dbm}")
+            self.login_error.emit(f"Errore durante il processo di login:\n{e_dbm}")
+        except Exception as e_gen:
             logging.getLogger("CatastoGUI").error(
-                f"Errore imprevisto durante la verifica bcrypt: {e}")
-            return False
+                f"Errore imprevisto durante il login per {self.username}: {e_gen}", exc_info=True)
+            self.login_error.emit(f"Errore di sistema durante il login:\n{e_gen}")
+        finally:
+            self.password = None
+# --- FINE MODIFICA ---
+
 
 class LoginDialog(QDialog):
     # --- INIZIO MODIFICA 1 ---
@@ -131,6 +140,7 @@ class LoginDialog(QDialog):
         self.logged_in_user_info: Optional[Dict] = None
         # NUOVO attributo per conservare l'UUID
         self.current_session_id_from_dialog: Optional[str] = None
+        self._login_worker: Optional[LoginWorker] = None
 
         self.setWindowTitle("Login - Meridiana 1.2")
         self.setMinimumWidth(350)
@@ -150,6 +160,10 @@ class LoginDialog(QDialog):
 
         layout.addLayout(form_layout)
 
+        self.status_label = QLabel("")
+        self.status_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.status_label)
+
         buttons_layout = QHBoxLayout()
         self.login_button = QPushButton("Login")
         self.login_button.setDefault(True)
@@ -166,6 +180,8 @@ class LoginDialog(QDialog):
         self.username_edit.setFocus()
 
     def handle_login(self):
+        if self._login_worker is not None:
+            return  # verifica già in corso
         username = self.username_edit.text().strip()
         password = self.password_edit.text()
 
@@ -174,95 +190,64 @@ class LoginDialog(QDialog):
                                 "Username e password sono obbligatori.")
             return
 
-        credentials = self.db_manager.get_user_credentials(
-            username)  # Presumiamo restituisca anche 'id' utente app
-        login_success = False
-        user_id_app = None  # ID utente dell'applicazione
+        self._set_login_in_progress(True)
+        self._login_worker = LoginWorker(self.db_manager, username, password, self.client_ip,
+                                         load_bcrypt_rounds(QSettings()), self)
+        self._login_worker.login_completed.connect(self._on_login_completed)
+        self._login_worker.login_error.connect(self._on_login_error)
+        self._login_worker.finished.connect(self._on_login_worker_finished)
+        self._login_worker.start()
+
+    def _set_login_in_progress(self, in_progress: bool):
+        self.username_edit.setEnabled(not in_progress)
+        self.password_edit.setEnabled(not in_progress)
+        self.login_button.setEnabled(not in_progress)
+        self.cancel_button.setEnabled(not in_progress)
+        self.status_label.setText("Verifica delle credenziali in corso..." if in_progress else "")
+        if in_progress:
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+        else:
+            QApplication.restoreOverrideCursor()
 
-        if credentials:
-            # ID dell'utente dalla tabella 'utente'
-            user_id_app = credentials.get('id')
-            stored_hash = credentials.get('password_hash')
-            is_active = credentials.get('attivo', False)
+    def _on_login_worker_finished(self):
+        self._login_worker.deleteLater()
+        self._login_worker = None
 
-            if not is_active:
-                QMessageBox.warning(self, "Login Fallito",
-                                    "Utente non attivo.")
-                logging.getLogger("CatastoGUI").warning(
-                    f"Login GUI fallito (utente '{username}' non attivo).")
-                return  # Non procedere oltre se l'utente non è attivo
+    def _on_login_error(self, message: str):
+        self._set_login_in_progress(False)
+        QMessageBox.critical(self, "Errore di Login (DB)", message)
 
-            # Usa la tua funzione di verifica
-            if stored_hash and _verify_password(stored_hash, password):
-                login_success = True
-                logging.getLogger("CatastoGUI").info(
-                    f"Verifica password GUI OK per utente '{username}' (ID App: {user_id_app})")
-            else:
-                QMessageBox.warning(self, "Login Fallito",
-                                    "Username o Password errati.")
-                logging.getLogger("CatastoGUI").warning(
-                    f"Login GUI fallito (pwd errata) per utente '{username}'.")
-                self.password_edit.selectAll()
-                self.password_edit.setFocus()
-                return
-        else:
-            # Messaggio generico
-            QMessageBox.warning(self, "Login Fallito",
-                                "Username o Password errati.")
-            logging.getLogger("CatastoGUI").warning(
-                f"Login GUI fallito (utente '{username}' non trovato).")
-            self.username_edit.selectAll()
-            self.username_edit.setFocus()
+    def _on_login_completed(self, result: dict):
+        self._set_login_in_progress(False)
+        esito = result.get("esito")
+        if esito == auth.LOGIN_UTENTE_NON_ATTIVO:
+            QMessageBox.warning(self, "Login Fallito", "Utente non attivo.")
+            return
+        if esito == auth.LOGIN_CREDENZIALI_ERRATE:
+            # Messaggio generico: non si rivela se lo username esiste
+            QMessageBox.warning(self, "Login Fallito", "Username o Password errati.")
+            self.password_edit.selectAll()
+            self.password_edit.setFocus()
+            return
+        if esito != auth.LOGIN_OK:
+            QMessageBox.critical(
+                self, "Login Fallito", "Errore critico: Impossibile registrare la sessione di accesso nel database.")
+            logging.getLogger("CatastoGUI").error(
+                f"Login GUI OK per utente '{self.username_edit.text().strip()}' ma fallita registrazione della sessione.")
             return
 
-        if login_success and user_id_app is not None:
-            try:
-                 # --- INIZIO MODIFICA 2 ---
-                # Usiamo self.client_ip invece della variabile globale non definita
-                session_uuid_returned = self.db_manager.register_access(
-                    user_id=user_id_app,
-                    action='login',
-                    esito=True,
-                    indirizzo_ip=self.client_ip, # <-- USA L'ATTRIBUTO DI ISTANZA
-                    application_name='CatastoAppGUI'
-                )
-                # --- FINE MODIFICA 2 ---
-
-                if session_uuid_returned:
-                    self.logged_in_user_id = user_id_app
-                    # Contiene tutti i dati dell'utente, incluso 'id'
-                    self.logged_in_user_info = credentials
-                    self.current_session_id_from_dialog = session_uuid_returned  # Salva l'UUID
-
-                    # Imposta le variabili di sessione PostgreSQL per l'audit
-                    # user_id_app è l'ID dell'utente da 'utente.id'
-                    # session_uuid_returned è l'UUID dalla tabella 'sessioni_accesso.id_sessione'
-                    if not self.db_manager.set_audit_session_variables(user_id_app, session_uuid_returned):
-                        QMessageBox.critical(
-                            self, "Errore Audit", "Impossibile impostare le informazioni di sessione per l'audit. Il login non può procedere.")
-                        # Considera di non fare self.accept() qui se questo è un errore bloccante
-                        return
-
-                    QMessageBox.information(self, "Login Riuscito",
-                                            f"Benvenuto {self.logged_in_user_info.get('nome_completo', username)}!")
-                    self.accept()  # Chiude il dialogo e segnala successo
-                else:
-                    # register_access ha fallito nel restituire un session_id
-                    QMessageBox.critical(
-                        self, "Login Fallito", "Errore critico: Impossibile registrare la sessione di accesso nel database.")
-                    logging.getLogger("CatastoGUI").error(
-                        f"Login GUI OK per utente '{username}' ma fallita registrazione della sessione (nessun UUID sessione restituito).")
+        # complete_login ha già registrato l'accesso e impostato le variabili di sessione per l'audit
+        self.logged_in_user_id = result["user_id"]
+        self.logged_in_user_info = result["user_info"]
+        self.current_session_id_from_dialog = result["session_id"]
+        QMessageBox.information(self, "Login Riuscito",
+                                f"Benvenuto {self.logged_in_user_info.get('nome_completo', self.username_edit.text().strip())}!")
+        self.accept()  # Chiude il dialogo e segnala successo
 
-            except DBMError as e_dbm:  # Cattura DBMError da register_access o set_audit_session_variables
-                QMessageBox.critical(
-                    self, "Errore di Login (DB)", f"Errore durante il processo di login:\n{str(e_dbm)}")
-                logging.getLogger("CatastoGUI").error(
-                    f"DBMError durante il login per {username}: {str(e_dbm)}")
-            except Exception as e_gen:  # Altri errori imprevisti
-                QMessageBox.critical(
-                    self, "Errore Imprevisto", f"Errore di sistema durante il login:\n{str(e_gen)}")
-                logging.getLogger("CatastoGUI").error(
-                    f"Errore imprevisto durante il login per {username}: {str(e_gen)}", exc_info=True)
+    def reject(self):
+        if self._login_worker is not None:
+            return  # non si chiude il dialogo a metà di una verifica
+        super().reject()
 
 
 try:
@@ -315,6 +300,20 @@ class CatastoMainWindow(QMainWindow):
         self.backup_restore_widget_ref: Optional[BackupWidget] = None
         self.gestione_periodi_storici_widget_ref: Optional[GestionePeriodiStoriciWidget] = None
         self.gestione_tipi_localita_widget_ref: Optional[GestioneTipiLocalitaWidget] = None
+        # Registro dei tab a costruzione differita (vedi setup_tabs / _deferred_tab)
+        self._deferred_tabs = []
+        self._tab_generation = 0
+        self.fuzzy_search_tab: Optional[DeferredTabWidget] = None
+        # Invalidazioni dal bus del DB, accorpate prima di ricaricare i widget
+        self._pending_entity_changes = set()
+        self._entity_refresh_timer = QTimer(self)
+        self._entity_refresh_timer.setSingleShot(True)
+        self._entity_refresh_timer.setInterval(ENTITY_REFRESH_DEBOUNCE_MS)
+        self._entity_refresh_timer.timeout.connect(self._dispatch_entity_changes)
+        # Ricontrollo della barra "dati non aggiornati" allo scadere della soglia (vedi check_mv_refresh_status)
+        self._stale_data_timer = QTimer(self)
+        self._stale_data_timer.setSingleShot(True)
+        self._stale_data_timer.timeout.connect(self.check_mv_refresh_status)
         
         self.setWindowTitle("Meridiana 1.2 - Gestionale Catasto Storico")
         self.setMinimumSize(1280, 720)
@@ -355,16 +354,13 @@ class CatastoMainWindow(QMainWindow):
         self.statusBar().showMessage("Pronto.")
 
     def avvia_ricerca_globale_da_dashboard(self, testo: str):
-        # 1. Trova l'indice del tab "Ricerca Globale"
-        idx_ricerca = -1
-        for i in range(self.tabs.count()):
-            if "Ricerca Globale" in self.tabs.tabText(i):
-                idx_ricerca = i
-                break
-        
-        # 2. Se trovato, attivalo e imposta il testo della ricerca
-        if idx_ricerca != -1 and hasattr(self, 'fuzzy_search_widget'):
+        # 1. Trova l'indice del tab di ricerca globale (segnaposto a costruzione differita)
+        idx_ricerca = self.tabs.indexOf(self.fuzzy_search_tab) if self.fuzzy_search_tab else -1
+
+        # 2. Se trovato, attivalo (il widget viene costruito se serve) e imposta il testo della ricerca
+        if idx_ricerca != -1:
             self.tabs.setCurrentIndex(idx_ricerca)
+            self.fuzzy_search_tab.ensure_built()
             self.fuzzy_search_widget.search_edit.setText(testo)
             self.fuzzy_search_widget._perform_search() # Avvia la ricerca
         else:
@@ -376,6 +372,8 @@ class CatastoMainWindow(QMainWindow):
                               session_id: Optional[str]):  # UUID della sessione
         logging.getLogger("CatastoGUI").info(
             ">>> CatastoMainWindow: Inizio perform_initial_setup")
+        if db_manager is not None and db_manager is not self.db_manager:
+            db_manager.change_notifier.entity_changed.connect(self._on_entity_changed)
         self.db_manager = db_manager
         self.logged_in_user_id = user_id
         self.logged_in_user_info = user_info
@@ -407,6 +405,9 @@ class CatastoMainWindow(QMainWindow):
             self.logout_button.setEnabled(True)
             self.statusBar().showMessage(
                 f"Login come {user_display} effettuato con successo.")
+            if self.db_manager and self.pool_initialized_successful:
+                # Comuni, tipi località e periodi pronti prima che l'utente apra un dialogo
+                self.db_manager.warm_reference_cache()
         else:  # Modalità setup DB (admin_offline) o nessun login
             ruolo_fittizio = self.logged_in_user_info.get(
                 'ruolo') if self.logged_in_user_info else None
@@ -438,6 +439,7 @@ class CatastoMainWindow(QMainWindow):
          # --- AGGIUNGERE QUESTA CHIAMATA ALLA FINE ---
         self.check_mv_refresh_status()
         # --- FINE AGGIUNTA ---
+        self._schedule_tab_prebuild()
 # In gui_main.py, SOSTITUISCI il metodo _check_backup_reminder
 
     def _check_backup_reminder(self):
@@ -603,45 +605,54 @@ class CatastoMainWindow(QMainWindow):
             return
 
         self.tabs.clear()
+        # --- INIZIO MODIFICA: registro dei tab a costruzione differita ---
+        # Solo la Home viene costruita subito; gli altri tab sono segnaposto (DeferredTabWidget)
+        # che creano il widget vero alla prima attivazione (handle_tab_changed) o nella
+        # pre-costruzione in background avviata dopo il login (_schedule_tab_prebuild).
+        self._deferred_tabs = []
+        self._tab_generation += 1
+        is_admin = bool(self.logged_in_user_info and self.logged_in_user_info.get('ruolo') == 'admin')
 
         # Inizializza i contenitori per i sotto-tab
         self.consultazione_sub_tabs = QTabWidget()
         self.inserimento_sub_tabs = QTabWidget()
         self.sistema_sub_tabs = QTabWidget()
-        
-        # Collega anche i sotto-tab al gestore di eventi universale
-        self.consultazione_sub_tabs.currentChanged.connect(self.handle_tab_changed)
-        self.inserimento_sub_tabs.currentChanged.connect(self.handle_tab_changed)
-        self.sistema_sub_tabs.currentChanged.connect(self.handle_tab_changed)
 
         # 1. Tab Dashboard
-        self.dashboard_widget = DashboardWidget(self.db_manager, self.logged_in_user_info, self.tabs)
-        self.tabs.addTab(self.dashboard_widget, "🏠 Home")
-        self.dashboard_widget.go_to_tab_signal.connect(self.activate_tab_and_sub_tab)
-        self.dashboard_widget.ricerca_globale_richiesta.connect(self.avvia_ricerca_globale_da_dashboard)
+        with startup_profiler.phase("tab Home"):
+            self.dashboard_widget = DashboardWidget(self.db_manager, self.logged_in_user_info, self.tabs)
+            self.tabs.addTab(self.dashboard_widget, "🏠 Home")
+            self.dashboard_widget.go_to_tab_signal.connect(self.activate_tab_and_sub_tab)
+            self.dashboard_widget.ricerca_globale_richiesta.connect(self.avvia_ricerca_globale_da_dashboard)
 
         # 2. Tab Consultazione e Modifica
         consultazione_contenitore = QWidget()
         layout_consultazione = QVBoxLayout(consultazione_contenitore)
-        self.elenco_comuni_widget_ref = ElencoComuniWidget(self.db_manager, self.consultazione_sub_tabs)
-        self.consultazione_sub_tabs.addTab(self.elenco_comuni_widget_ref, "Principale")
-        self.ricerca_partite_widget_ref = RicercaPartiteWidget(self.db_manager, self.consultazione_sub_tabs)
-        self.consultazione_sub_tabs.addTab(self.ricerca_partite_widget_ref, "Ricerca Partite")
-        self.ricerca_avanzata_immobili_widget_ref = RicercaAvanzataImmobiliWidget(self.db_manager, self.consultazione_sub_tabs)
-        self.consultazione_sub_tabs.addTab(self.ricerca_avanzata_immobili_widget_ref, "Ricerca Immobili")
-        
+        self.consultazione_sub_tabs.addTab(self._deferred_tab(
+            "Principale", lambda: ElencoComuniWidget(self.db_manager, self.consultazione_sub_tabs),
+            'elenco_comuni_widget_ref'), "Principale")
+        self.consultazione_sub_tabs.addTab(self._deferred_tab(
+            "Ricerca Partite", lambda: RicercaPartiteWidget(self.db_manager, self.consultazione_sub_tabs),
+            'ricerca_partite_widget_ref'), "Ricerca Partite")
+        self.consultazione_sub_tabs.addTab(self._deferred_tab(
+            "Ricerca Immobili", lambda: RicercaAvanzataImmobiliWidget(self.db_manager, self.consultazione_sub_tabs),
+            'ricerca_avanzata_immobili_widget_ref'), "Ricerca Immobili")
+
         # Tooltip per i sotto-tab di consultazione
         self.consultazione_sub_tabs.setTabToolTip(0, "Visualizza l'elenco principale dei comuni registrati")
         self.consultazione_sub_tabs.setTabToolTip(1, "Ricerca partite per comune, numero, possessore o natura immobile")
         self.consultazione_sub_tabs.setTabToolTip(2, "Ricerca avanzata immobili con filtri multipli")
-        
+
         layout_consultazione.addWidget(self.consultazione_sub_tabs)
         self.tabs.addTab(consultazione_contenitore, "Consultazione")
 
         # 3. Tab Ricerca Globale
+        self.fuzzy_search_tab = None
         if FUZZY_SEARCH_AVAILABLE:
-            self.fuzzy_search_widget = UnifiedFuzzySearchWidget(self.db_manager, parent=self.tabs)
-            self.tabs.addTab(self.fuzzy_search_widget, "🔍 Ricerca")
+            self.fuzzy_search_tab = self._deferred_tab(
+                "Ricerca", lambda: UnifiedFuzzySearchWidget(self.db_manager, parent=self.tabs),
+                'fuzzy_search_widget')
+            self.tabs.addTab(self.fuzzy_search_tab, "🔍 Ricerca")
 
         # 4. Tab Inserimento
         inserimento_contenitore = QWidget()
@@ -649,40 +660,47 @@ class CatastoMainWindow(QMainWindow):
         utente_per_inserimenti = self.logged_in_user_info if self.logged_in_user_info else {}
 
         # Aggiunta dei widget esistenti per l'inserimento
-        self.inserimento_comune_widget_ref = InserimentoComuneWidget(
-            db_manager=self.db_manager,
-            utente_attuale_info=utente_per_inserimenti,
-            parent=self.inserimento_sub_tabs
-        )
-        self.inserimento_sub_tabs.addTab(self.inserimento_comune_widget_ref, "Comune")
-
-        self.inserimento_possessore_widget_ref = InserimentoPossessoreWidget(self.db_manager)
-        self.inserimento_sub_tabs.addTab(self.inserimento_possessore_widget_ref, "Possessore")
-        self.inserimento_possessore_widget_ref.import_csv_requested.connect(self._import_possessori_csv)
-        
-        self.inserimento_partite_widget_ref = InserimentoPartitaWidget(self.db_manager, self.inserimento_sub_tabs)
-        self.inserimento_sub_tabs.addTab(self.inserimento_partite_widget_ref, "Partita")
-        self.inserimento_partite_widget_ref.import_csv_requested.connect(self._import_partite_csv)
-    
-        self.inserimento_localita_widget_ref = InserimentoLocalitaWidget(self.db_manager, self.inserimento_sub_tabs)
-        self.inserimento_sub_tabs.addTab(self.inserimento_localita_widget_ref, "Località")
-
-        self.registrazione_proprieta_widget_ref = RegistrazioneProprietaWidget(self.db_manager)
-        self.inserimento_sub_tabs.addTab(self.registrazione_proprieta_widget_ref, "Reg. Proprietà")
-
-        self.operazioni_partita_widget_ref = OperazioniPartitaWidget(self.db_manager)
-        self.inserimento_sub_tabs.addTab(self.operazioni_partita_widget_ref, "Operazioni")
-
-        self.registra_consultazione_widget_ref = RegistraConsultazioneWidget(self.db_manager, self.logged_in_user_info)
-        self.inserimento_sub_tabs.addTab(self.registra_consultazione_widget_ref, "Reg. Consultazione")
+        self.inserimento_sub_tabs.addTab(self._deferred_tab(
+            "Comune", lambda: InserimentoComuneWidget(
+                db_manager=self.db_manager,
+                utente_attuale_info=utente_per_inserimenti,
+                parent=self.inserimento_sub_tabs
+            ), 'inserimento_comune_widget_ref'), "Comune")
+
+        self.inserimento_sub_tabs.addTab(self._deferred_tab(
+            "Possessore", lambda: InserimentoPossessoreWidget(self.db_manager), 'inserimento_possessore_widget_ref',
+            on_built=lambda w: w.import_csv_requested.connect(self._import_possessori_csv)), "Possessore")
+
+        self.inserimento_sub_tabs.addTab(self._deferred_tab(
+            "Partita", lambda: InserimentoPartitaWidget(self.db_manager, self.inserimento_sub_tabs),
+            'inserimento_partite_widget_ref',
+            on_built=lambda w: w.import_csv_requested.connect(self._import_partite_csv)), "Partita")
+
+        self.inserimento_sub_tabs.addTab(self._deferred_tab(
+            "Località", lambda: InserimentoLocalitaWidget(self.db_manager, self.inserimento_sub_tabs),
+            'inserimento_localita_widget_ref'), "Località")
+
+        self.inserimento_sub_tabs.addTab(self._deferred_tab(
+            "Reg. Proprietà", lambda: RegistrazioneProprietaWidget(self.db_manager),
+            'registrazione_proprieta_widget_ref'), "Reg. Proprietà")
+
+        self.inserimento_sub_tabs.addTab(self._deferred_tab(
+            "Operazioni", lambda: OperazioniPartitaWidget(self.db_manager),
+            'operazioni_partita_widget_ref'), "Operazioni")
+
+        self.inserimento_sub_tabs.addTab(self._deferred_tab(
+            "Reg. Consultazione", lambda: RegistraConsultazioneWidget(self.db_manager, self.logged_in_user_info),
+            'registra_consultazione_widget_ref'), "Reg. Consultazione")
 
         # Widget di gestione (solo per admin)
-        if self.logged_in_user_info and self.logged_in_user_info.get('ruolo') == 'admin':
-            self.gestione_tipi_localita_widget = GestioneTipiLocalitaWidget(self.db_manager)
-            self.inserimento_sub_tabs.addTab(self.gestione_tipi_localita_widget, "Tipi Località")
+        if is_admin:
+            self.inserimento_sub_tabs.addTab(self._deferred_tab(
+                "Tipi Località", lambda: GestioneTipiLocalitaWidget(self.db_manager),
+                'gestione_tipi_localita_widget'), "Tipi Località")
 
-            self.gestione_periodi_widget = GestionePeriodiStoriciWidget(self.db_manager)
-            self.inserimento_sub_tabs.addTab(self.gestione_periodi_widget, "Periodi")
+            self.inserimento_sub_tabs.addTab(self._deferred_tab(
+                "Periodi", lambda: GestionePeriodiStoriciWidget(self.db_manager),
+                'gestione_periodi_widget'), "Periodi")
 
         # Tooltip per i sotto-tab di inserimento
         tab_idx = 0
@@ -693,8 +711,8 @@ class CatastoMainWindow(QMainWindow):
         self.inserimento_sub_tabs.setTabToolTip(tab_idx, "Registrazione Proprietà\nRegistra una nuova proprietà completa con possessori e immobili"); tab_idx += 1
         self.inserimento_sub_tabs.setTabToolTip(tab_idx, "Operazioni Partita\nDuplica partite, trasferisci immobili, passaggio proprietà (voltura)"); tab_idx += 1
         self.inserimento_sub_tabs.setTabToolTip(tab_idx, "Registra Consultazione\nRegistra gli accessi all'archivio per tracciabilità"); tab_idx += 1
-        
-        if self.logged_in_user_info and self.logged_in_user_info.get('ruolo') == 'admin':
+
+        if is_admin:
             self.inserimento_sub_tabs.setTabToolTip(tab_idx, "Gestione Tipi Località\nGestisci le tipologie di località (Via, Piazza, ecc.)"); tab_idx += 1
             self.inserimento_sub_tabs.setTabToolTip(tab_idx, "Gestione Periodi Storici\nDefinisci i periodi storici di riferimento")
 
@@ -702,42 +720,44 @@ class CatastoMainWindow(QMainWindow):
         self.tabs.addTab(inserimento_contenitore, "Inserimento")
 
         # 5. Altri Tab
-        self.esportazioni_widget_ref = EsportazioniWidget(self.db_manager)
-        self.tabs.addTab(self.esportazioni_widget_ref, "📤 Esportazioni")
+        self.tabs.addTab(self._deferred_tab(
+            "Esportazioni", lambda: EsportazioniWidget(self.db_manager), 'esportazioni_widget_ref'), "📤 Esportazioni")
 
-        self.reportistica_widget_ref = ReportisticaWidget(self.db_manager)
-        self.tabs.addTab(self.reportistica_widget_ref, "Report")
+        self.tabs.addTab(self._deferred_tab(
+            "Report", lambda: ReportisticaWidget(self.db_manager), 'reportistica_widget_ref'), "Report")
 
-        self.statistiche_widget_ref = StatisticheWidget(self.db_manager)
-        self.tabs.addTab(self.statistiche_widget_ref, "Statistiche")
+        self.tabs.addTab(self._deferred_tab(
+            "Statistiche", lambda: StatisticheWidget(self.db_manager), 'statistiche_widget_ref'), "Statistiche")
 
         # Conta i tab per i tooltip (utile per i tab condizionali)
         main_tab_idx = 0
         self.tabs.setTabToolTip(main_tab_idx, "Home / Dashboard\nPannello principale con statistiche e accesso rapido"); main_tab_idx += 1
         self.tabs.setTabToolTip(main_tab_idx, "Consultazione e Modifica\nVisualizza e modifica comuni, partite e possessori"); main_tab_idx += 1
-        
+
         if FUZZY_SEARCH_AVAILABLE:
             self.tabs.setTabToolTip(main_tab_idx, "Ricerca Globale\nRicerca fuzzy avanzata in tutto il database"); main_tab_idx += 1
-        
+
         self.tabs.setTabToolTip(main_tab_idx, "Inserimento e Gestione\nInserisci nuovi dati e gestisci le proprietà"); main_tab_idx += 1
         self.tabs.setTabToolTip(main_tab_idx, "Esportazioni Massive\nEsporta dati in CSV, Excel e PDF"); main_tab_idx += 1
         self.tabs.setTabToolTip(main_tab_idx, "Reportistica\nGenera report dettagliati e certificati"); main_tab_idx += 1
         self.tabs.setTabToolTip(main_tab_idx, "Statistiche e Viste\nVisualizza statistiche e gestisci le viste materializzate"); main_tab_idx += 1
 
         # 6. Tab Admin
-        if self.logged_in_user_info and self.logged_in_user_info.get('ruolo') == 'admin':
-            self.gestione_utenti_widget_ref = GestioneUtentiWidget(self.db_manager, self.logged_in_user_info)
-            self.tabs.addTab(self.gestione_utenti_widget_ref, "Utenti")
+        if is_admin:
+            self.tabs.addTab(self._deferred_tab(
+                "Utenti", lambda: GestioneUtentiWidget(self.db_manager, self.logged_in_user_info),
+                'gestione_utenti_widget_ref'), "Utenti")
             self.tabs.setTabToolTip(main_tab_idx, "Gestione Utenti\nGestisci utenti, ruoli e permessi"); main_tab_idx += 1
 
             sistema_contenitore = QWidget()
             layout_sistema = QVBoxLayout(sistema_contenitore)
 
-            self.audit_viewer_widget_ref = AuditLogViewerWidget(self.db_manager)
-            self.sistema_sub_tabs.addTab(self.audit_viewer_widget_ref, "Log Audit")
+            self.sistema_sub_tabs.addTab(self._deferred_tab(
+                "Log Audit", lambda: AuditLogViewerWidget(self.db_manager), 'audit_viewer_widget_ref'), "Log Audit")
 
-            self.backup_restore_widget_ref = BackupWidget(self.db_manager)
-            self.sistema_sub_tabs.addTab(self.backup_restore_widget_ref, "Backup/Ripristino")
+            self.sistema_sub_tabs.addTab(self._deferred_tab(
+                "Backup/Ripristino", lambda: BackupWidget(self.db_manager), 'backup_restore_widget_ref'),
+                "Backup/Ripristino")
 
             # Tooltip per i sotto-tab di sistema
             self.sistema_sub_tabs.setTabToolTip(0, "Log di Audit\nVisualizza tutte le operazioni effettuate nel sistema")
@@ -747,8 +767,61 @@ class CatastoMainWindow(QMainWindow):
             self.tabs.addTab(sistema_contenitore, "Sistema")
             self.tabs.setTabToolTip(main_tab_idx, "Sistema\nConfigurazione, backup, log di audit")
 
+        # Collega i sotto-tab al gestore universale solo ora: aggiungere il primo tab emette
+        # currentChanged e, se collegati prima, costruirebbe subito il primo sotto-tab di ogni gruppo.
+        self.consultazione_sub_tabs.currentChanged.connect(self.handle_tab_changed)
+        self.inserimento_sub_tabs.currentChanged.connect(self.handle_tab_changed)
+        self.sistema_sub_tabs.currentChanged.connect(self.handle_tab_changed)
+        # --- FINE MODIFICA ---
+
         self.tabs.setCurrentIndex(0)
-        self.logger.info("Setup dei tab completato con nomi abbreviati e tooltip.")
+        self.logger.info(f"Setup dei tab completato: {len(self._deferred_tabs)} tab a costruzione differita.")
+
+    # --- INIZIO MODIFICA: costruzione differita e pre-costruzione in background dei tab ---
+    def _deferred_tab(self, label: str, factory, ref_attr: Optional[str] = None, on_built=None) -> DeferredTabWidget:
+        """
+        Registra un tab a costruzione differita. Alla costruzione il widget viene salvato
+        in `ref_attr` (gli attributi *_widget_ref restano None finché il tab non esiste)
+        e passato a `on_built` per collegare i segnali.
+        """
+        def build():
+            with startup_profiler.phase(f"tab {label}"):
+                widget = factory()
+            if ref_attr:
+                setattr(self, ref_attr, widget)
+            if on_built:
+                on_built(widget)
+            return widget
+
+        placeholder = DeferredTabWidget(label, build)
+        self._deferred_tabs.append(placeholder)
+        return placeholder
+
+    def _schedule_tab_prebuild(self):
+        """Dopo il login pre-costruisce i tab non ancora aperti, uno per volta, quando l'interfaccia è inattiva."""
+        if not QSettings().value(SETTINGS_UI_PREBUILD_TABS, True, type=bool):
+            self.logger.info("Pre-costruzione dei tab disattivata nelle impostazioni.")
+            return
+        generation = self._tab_generation
+        QTimer.singleShot(TAB_PREBUILD_DELAY_MS, lambda: self._prebuild_next_tab(generation))
+
+    def _prebuild_next_tab(self, generation: int):
+        # Un nuovo setup_tabs (o il logout) invalida la pre-costruzione in corso
+        if generation != self._tab_generation or self.logged_in_user_id is None:
+            return
+        pending = next((t for t in self._deferred_tabs if not t.is_built), None)
+        if pending is None:
+            self.logger.info("Pre-costruzione dei tab completata.")
+            return
+        try:
+            pending.ensure_built()  # Solo il widget: i dati si caricano alla prima attivazione
+        except Exception as e:
+            # Il tab resta un segnaposto: verrà ricostruito (mostrando l'errore) quando l'utente lo apre
+            self.logger.error(f"Pre-costruzione del tab '{pending.label}' fallita: {e}", exc_info=True)
+            self._deferred_tabs.remove(pending)
+        QTimer.singleShot(TAB_PREBUILD_INTERVAL_MS, lambda: self._prebuild_next_tab(generation))
+    # --- FINE MODIFICA ---
+
     def activate_tab_and_sub_tab(self, main_tab_name: str, sub_tab_name: str, activate_report_sub_tab: bool = False):
         self.logger.info(
             f"Richiesta attivazione: Tab Principale='{main_tab_name}', Sotto-Tab='{sub_tab_name}'")
@@ -849,7 +922,8 @@ class CatastoMainWindow(QMainWindow):
                 idx_sotto_tab_operazioni = -1
                 for i in range(self.inserimento_sub_tabs.count()):
                     # Controlla se il widget del sotto-tab è l'istanza che ci interessa
-                    if self.inserimento_sub_tabs.widget(i) == target_operazioni_widget:
+                    sub_widget = self.inserimento_sub_tabs.widget(i)
+                    if getattr(sub_widget, 'real_widget', sub_widget) == target_operazioni_widget:
                         idx_sotto_tab_operazioni = i
                         break
 
@@ -924,6 +998,25 @@ class CatastoMainWindow(QMainWindow):
                 self.logger.error(f"Errore durante il lazy loading del widget '{widget_to_load.__class__.__name__}': {e}", exc_info=True)
                 QMessageBox.critical(self, "Errore Caricamento Widget", f"Impossibile caricare i dati per la sezione selezionata:\n{e}")
 
+    def _on_entity_changed(self, entity: str, entity_id):
+        """Riceve le invalidazioni (anche di altri client) e programma un solo aggiornamento."""
+        self._pending_entity_changes.add(entity)
+        self._entity_refresh_timer.start()
+
+    def _dispatch_entity_changes(self):
+        entities, self._pending_entity_changes = self._pending_entity_changes, set()
+        if not entities or not self.logged_in_user_id:
+            return
+        for widget in self.findChildren(LazyLoadedWidget) + self.findChildren(DashboardWidget):
+            try:
+                widget.handle_entities_changed(entities)
+            except Exception as e:
+                self.logger.error(f"Errore nell'aggiornamento di '{widget.__class__.__name__}' "
+                                  f"dopo una modifica ai dati: {e}", exc_info=True)
+        # Aggiornamento delle viste materializzate (app_metadata.last_mv_refresh), anche da un altro client
+        if "*" in entities or "app_metadata" in entities:
+            self.check_mv_refresh_status()
+
     def update_ui_based_on_role(self):
         self.logger.info(
             ">>> CatastoMainWindow: Chiamata a update_ui_based_on_role")
@@ -948,7 +1041,11 @@ class CatastoMainWindow(QMainWindow):
         else:
             # Scenario 2: Database connesso normalmente
             if self.logged_in_user_info:
+                # Ruolo dalla cache dei permessi: riflette le modifiche fatte da un admin
+                # dopo il login (invalidazione via LISTEN/NOTIFY) senza query ripetute.
                 ruolo = self.logged_in_user_info.get('ruolo')
+                if self.db_manager and self.logged_in_user_id:
+                    ruolo = self.db_manager.get_user_role(self.logged_in_user_id)
             else:
                 # Questo caso non dovrebbe succedere con il flusso attuale (dopo login, user_info non è None)
                 # Ma per sicurezza, se non c'è user_info, il ruolo è None.
@@ -1159,6 +1256,7 @@ class CatastoMainWindow(QMainWindow):
             # self.db_status_label.setText("Database: Connesso (Logout effettuato)")
             self.logout_button.setEnabled(False)
 
+            self._tab_generation += 1  # Interrompe l'eventuale pre-costruzione dei tab
             self.tabs.clear()  # Rimuove tutti i tab
             # Potresti voler re-inizializzare i tab in uno stato "non loggato" o semplicemente chiudere.
             # Per ora, chiudiamo l'applicazione dopo il logout per semplicità.
@@ -1341,6 +1439,7 @@ class CatastoMainWindow(QMainWindow):
         Controlla il timestamp dell'ultimo aggiornamento e mostra la barra di notifica se i dati sono obsoleti.
         """
         from datetime import timedelta, timezone
+        self._stale_data_timer.stop()
         if not self.db_manager or not self.db_manager.pool: return
         # --- MODIFICA QUI: Leggiamo il valore da QSettings ---
         settings = QSettings()
@@ -1365,6 +1464,10 @@ class CatastoMainWindow(QMainWindow):
             self.stale_data_bar.show()
         else:
             self.stale_data_bar.hide()
+            # Nessun controllo periodico: un solo ricontrollo quando la soglia verrà superata
+            # (gli aggiornamenti delle viste arrivano come notifica 'app_metadata')
+            remaining_ms = int((staleness_threshold - time_since_refresh).total_seconds() * 1000) + 1000
+            self._stale_data_timer.start(min(remaining_ms, 2**31 - 1))
     def _apri_dialogo_impostazioni_aggiornamento(self):
         """
         Apre un dialogo per permettere all'utente di impostare la soglia (in ore)
@@ -1390,9 +1493,9 @@ class CatastoMainWindow(QMainWindow):
         if ok:
             # Salva il nuovo valore nelle impostazioni dell'applicazione
             settings.setValue("General/StaleDataThresholdHours", new_threshold)
+            self.check_mv_refresh_status()
             QMessageBox.information(self, "Impostazione Salvata",
-                                    f"La nuova soglia di {new_threshold} ore è stata salvata.\n"
-                                    "La modifica sarà effettiva al prossimo riavvio dell'applicazione.")
+                                    f"La nuova soglia di {new_threshold} ore è stata salvata.")
 
 
     def _handle_stale_data_refresh_click(self):
@@ -1530,7 +1633,13 @@ def setup_global_logging():
 
 def run_gui_app():
     try:
-        app = QApplication(sys.argv)
+        # --- INIZIO MODIFICA: QtWebEngine importato solo al primo PDF (DocumentViewerDialog) ---
+        # Import differito consentito solo se l'attributo è impostato prima di creare QApplication.
+        QCoreApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+        startup_profiler.mark("import dei moduli completati")
+        with startup_profiler.phase("QApplication"):
+            app = QApplication(sys.argv)
+        # --- FINE MODIFICA ---
         # --- INIZIO MODIFICA ---
         # Imposta i metadati dell'applicazione.
         # Questo è FONDAMENTALE affinché QStandardPaths possa generare
@@ -1575,7 +1684,8 @@ def run_gui_app():
         
         gui_logger.info("Avvio dell'applicazione GUI Catasto Storico...")
         db_manager_gui: Optional[CatastoDBManager] = None
-        main_window_instance = CatastoMainWindow(client_ip_address_gui)
+        with startup_profiler.phase("CatastoMainWindow"):
+            main_window_instance = CatastoMainWindow(client_ip_address_gui)
 
         # --- NUOVO FLUSSO DI AVVIO ---
 
@@ -1596,7 +1706,10 @@ def run_gui_app():
             "port": settings.value(SETTINGS_DB_PORT, 5432, type=int),
             "dbname": settings.value(SETTINGS_DB_NAME, "catasto_storico", type=str),
             "user": settings.value(SETTINGS_DB_USER, "postgres", type=str),
-            "password": saved_password or ""  # Assicurati che ci sia sempre una password (anche vuota)
+            "password": saved_password or "",  # Assicurati che ci sia sempre una password (anche vuota)
+            "pool_timeout": settings.value(SETTINGS_DB_POOL_TIMEOUT, 30.0, type=float),
+            "replica_dsns": parse_replica_dsns(settings.value(SETTINGS_DB_REPLICA_DSNS, "", type=str)),
+            "execution_profiles": load_execution_profiles(settings)
         }
         
         # Prova a connettere solo se sono presenti i dati essenziali E la password
@@ -1645,7 +1758,10 @@ def run_gui_app():
                     'port': current_config.get('port'), 
                     'dbname': current_config.get('dbname'),
                     'user': current_config.get('user'),
-                    'password': current_config.get('password', '')  # Assicurati che ci sia sempre una password
+                    'password': current_config.get('password', ''),  # Assicurati che ci sia sempre una password
+                    'pool_timeout': settings.value(SETTINGS_DB_POOL_TIMEOUT, 30.0, type=float),
+                    'replica_dsns': parse_replica_dsns(current_config.get('replica_dsns')),
+                    'execution_profiles': load_execution_profiles(settings)
                 }
                 
                 # Rimuovi eventuali chiavi con valore None (ma mantieni password vuota se necessario)
@@ -1684,6 +1800,7 @@ def run_gui_app():
         # Passiamo la variabile 'client_ip_address_gui' al costruttore del LoginDialog
         login_dialog = LoginDialog(db_manager_gui, client_ip_address_gui, parent=main_window_instance)
         # --- FINE MODIFICA ---
+        startup_profiler.mark("finestra di login pronta")
         if login_dialog.exec_() != QDialog.Accepted:
             gui_logger.info("Login utente annullato. Uscita.")
             sys.exit(0)
@@ -1709,12 +1826,15 @@ def run_gui_app():
             gui_logger.info("Welcome screen chiusa. Uscita.")
             sys.exit(0)
             
-        main_window_instance.perform_initial_setup(
-            db_manager_gui,
-            login_dialog.logged_in_user_id,
-            login_dialog.logged_in_user_info,
-            login_dialog.current_session_id_from_dialog
-        )
+        with startup_profiler.phase("perform_initial_setup"):
+            main_window_instance.perform_initial_setup(
+                db_manager_gui,
+                login_dialog.logged_in_user_id,
+                login_dialog.logged_in_user_info,
+                login_dialog.current_session_id_from_dialog
+            )
+        startup_profiler.mark("finestra principale visibile")
+        startup_profiler.report()
         
         gui_logger.info("Setup completato. Avvio loop eventi.")
         sys.exit(app.exec_())
@@ -1733,6 +1853,9 @@ if __name__ == "__main__":
     
     # Importa qui per evitare importazioni circolari (se necessario)
     import traceback
+    # Necessario per il pool di processi dei report in blocco nell'eseguibile Windows (PyInstaller)
+    import multiprocessing
+    multiprocessing.freeze_support()
     
     try:
         run_gui_app()
@@ -1,9 +1,10 @@
 
-import os,csv,sys,logging,json
+import os,csv,sys,logging,json,html,shutil,time
 from datetime import date, datetime
 from typing import Optional, List, Dict, Any, Tuple, TYPE_CHECKING
-from app_utils import BulkReportPDF, FPDF_AVAILABLE, _get_default_export_path, prompt_to_open_file
-import pandas as pd # Importa pandas
+from app_utils import FPDF_AVAILABLE, _get_default_export_path, prompt_to_open_file
+# pandas, openpyxl, fpdf (pdf_reports/pdf_table/batch_reports) e QtWebEngine sono importati
+# solo dove servono: caricarli qui rallentava l'avvio dell'applicazione.
 
 # Importazioni PyQt5
 from PyQt5.QtCore import (QDate, QDateTime, QPoint, QProcess, QSettings, 
@@ -14,8 +15,6 @@ from PyQt5.QtCore import (QDate, QDateTime, QPoint, QProcess, QSettings,
 from PyQt5.QtGui import (QCloseEvent, QColor, QDesktopServices, QFont, 
                          QIcon, QPalette, QPixmap)
 
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-
 from PyQt5.QtWidgets import (QAbstractItemView, QAction, QApplication, 
                              QCheckBox, QComboBox, QDateEdit, QDateTimeEdit,
                              QDialog, QDialogButtonBox, QDoubleSpinBox,
@@ -33,7 +32,8 @@ from config import (
     SETTINGS_DB_NAME, SETTINGS_DB_USER, SETTINGS_DB_SCHEMA,
     COLONNE_POSSESSORI_DETTAGLI_NUM ,COLONNE_POSSESSORI_DETTAGLI_LABELS,COLONNE_VISUALIZZAZIONE_POSSESSORI_NUM,
     COLONNE_VISUALIZZAZIONE_POSSESSORI_LABELS, COLONNE_INSERIMENTO_POSSESSORI_NUM, COLONNE_INSERIMENTO_POSSESSORI_LABELS,
-    NUOVE_ETICHETTE_POSSESSORI)
+    NUOVE_ETICHETTE_POSSESSORI, SETTINGS_INCREMENTAL_EXPORT_DIR, SETTINGS_INCREMENTAL_EXPORT_INTERVAL,
+    INCREMENTAL_EXPORT_INTERVAL_DEFAULT, SETTINGS_DASHBOARD_APPROXIMATE_COUNTS)
 from dialogs import ( ModificaPossessoreDialog, PartiteComuneDialog, ModificaImmobileDialog,
                      PossessoriComuneDialog, LocalitaSelectionDialog, ModificaComuneDialog, 
                      PartitaDetailsDialog, CreateUserDialog,ModificaLocalitaDialog,PeriodoStoricoEditDialog, 
@@ -49,9 +49,11 @@ if TYPE_CHECKING:
     # non a runtime, quindi non crea il ciclo.
     from gui_main import CatastoMainWindow 
     from catasto_db_manager import CatastoDBManager # Se serve anche per type hint
+    from batch_reports import BatchReportJob
 
 # In gui_widgets.py, dopo le importazioni PyQt e standard:
-from custom_widgets import QPasswordLineEdit, LazyLoadedWidget
+from custom_widgets import QPasswordLineEdit, LazyLoadedWidget, TimeSeriesChart
+from time_series import MEASURE_LABELS, series_key
 from dialogs import (DBConfigDialog,DocumentViewerDialog, ModificaPossessoreDialog, PartiteComuneDialog, ModificaImmobileDialog,
                     PossessoriComuneDialog, LocalitaSelectionDialog, ModificaComuneDialog,PeriodoStoricoDetailsDialog,
                     PartitaDetailsDialog,CreateUserDialog)
@@ -60,7 +62,9 @@ from dialogs import (ComuneSelectionDialog, PartitaSearchDialog, PossessoreSelec
 
 from app_utils import (gui_esporta_partita_pdf, gui_esporta_partita_json, gui_esporta_partita_csv,
                        gui_esporta_possessore_pdf, gui_esporta_possessore_json, gui_esporta_possessore_csv,
-                       GenericTextReportPDF,FPDF_AVAILABLE, is_file_locked,get_alternative_filename)
+                       FPDF_AVAILABLE, is_file_locked,get_alternative_filename)
+from report_renderer import render_text, render_html
+from backup_tools import BackupProgressTracker, COMPRESSION_METHODS, COMPRESSION_LEVELS
 # È possibile che alcune utility (es. hashing) siano usate da dialoghi che ora sono in gui_main.py
 # In tal caso, gui_main.py importerà _hash_password da app_utils.py.
 
@@ -68,13 +72,19 @@ from app_utils import (gui_esporta_partita_pdf, gui_esporta_partita_json, gui_es
 
 # Importazione del gestore DB e eccezioni
 try:
-    from catasto_db_manager import CatastoDBManager, DBMError, DBUniqueConstraintError, DBNotFoundError, DBDataError
+    from catasto_db_manager import (CatastoDBManager, DBMError, DBUniqueConstraintError, DBNotFoundError, DBDataError,
+                                    DBOperationCancelled)
 except ImportError:
     # Fallback o gestione errore
     class DBMError(Exception):
         pass  # ... definizioni fallback come nel file originale
+
+    class DBOperationCancelled(DBMError):
+        pass
     print("ATTENZIONE: catasto_db_manager non trovato, usando eccezioni DB fallback in gui_widgets.py")
 class ElencoComuniWidget(LazyLoadedWidget):
+    refresh_on_entities = ('comune',)
+
     def __init__(self, db_manager: 'CatastoDBManager', parent=None):
         super().__init__(parent)
         # Stampa di debug visibile nella console all'avvio
@@ -1085,6 +1095,8 @@ class InserimentoComuneWidget(LazyLoadedWidget): # Eredita da LazyLoadedWidget
 # In gui_widgets.py, aggiungi questa nuova classe
 
 class GestioneTipiLocalitaWidget(LazyLoadedWidget):
+    refresh_on_entities = ('tipo_localita',)
+
     def __init__(self, db_manager: 'CatastoDBManager', parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
@@ -1201,6 +1213,8 @@ class GestioneTipiLocalitaWidget(LazyLoadedWidget):
 # Assicurati che queste importazioni siano presenti all'inizio del file
 
 class GestionePeriodiStoriciWidget(LazyLoadedWidget):
+    refresh_on_entities = ('periodo_storico',)
+
     def __init__(self, db_manager: 'CatastoDBManager', parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
@@ -3404,6 +3418,163 @@ class OperazioniPartitaWidget(QWidget):
         self._load_partita_sorgente_from_spinbox()
 
 
+class _ExportCancelled(DBOperationCancelled):
+    """Sollevata dentro la COPY per interromperla quando l'utente annulla."""
+    pass
+
+
+class _CopyProgressWriter:
+    """
+    Oggetto file passato a cursor.copy_expert: inoltra i byte al file reale,
+    stima le righe per la barra di avanzamento e interrompe la COPY se annullata.
+    La stima conta i fine riga, quindi un campo su più righe la fa crescere:
+    il numero esatto è quello restituito da copy_export_to_file.
+    """
+    PROGRESS_EVERY = 5000  # righe tra un aggiornamento e l'altro
+
+    def __init__(self, target, total: int, thread: 'StreamingExportThread'):
+        self.target = target
+        self.total = total
+        self.thread = thread
+        self.rows_written = -1  # La prima riga è l'intestazione
+        self._next_progress = self.PROGRESS_EVERY
+
+    def write(self, data):
+        if self.thread._cancel_requested:
+            raise _ExportCancelled()
+        self.target.write(data)
+        self.rows_written += data.count(b"\n") if isinstance(data, bytes) else data.count("\n")
+        if self.rows_written >= self._next_progress:
+            self._next_progress = self.rows_written + self.PROGRESS_EVERY
+            self.thread.progress_updated.emit(min(self.rows_written, self.total), self.total)
+        return len(data)
+
+
+class StreamingExportThread(QThread):
+    """
+    Esporta in CSV o XLSX leggendo le righe a blocchi da un cursore lato server
+    (CatastoDBManager.iter_export_rows) e scrivendole subito su file: la memoria
+    usata non dipende dal numero di righe. Supporta avanzamento e annullamento.
+    """
+    progress_updated = pyqtSignal(int, int)    # righe scritte, righe totali
+    export_completed = pyqtSignal(str, int)    # percorso file ('' se nessun dato), righe scritte
+    export_cancelled = pyqtSignal()
+    error_occurred = pyqtSignal(str)
+
+    BATCH_SIZE = 2000
+
+    def __init__(self, db_manager, export_key: str, comune_id: int, file_format: str,
+                 filename: str, header_map: Dict[str, str], use_copy: bool = False, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.export_key = export_key
+        self.comune_id = comune_id
+        self.file_format = file_format  # 'csv' o 'xlsx'
+        self.filename = filename
+        self.header_map = header_map
+        self.use_copy = use_copy  # CSV generato dal server con COPY TO STDOUT
+        self._cancel_requested = False
+        self.logger = logging.getLogger(f"CatastoGUI.{self.__class__.__name__}")
+
+    def cancel(self):
+        """Richiede l'interruzione: viene rispettata al termine del blocco corrente."""
+        self._cancel_requested = True
+
+    def run(self):
+        try:
+            total = self.db_manager.count_export_rows(self.export_key, self.comune_id)
+            if total == 0:
+                self.export_completed.emit("", 0)
+                return
+            self.progress_updated.emit(0, total)
+
+            if self.file_format == "xlsx":
+                written = self._write_xlsx(total)
+            elif self.use_copy:
+                written = self._write_csv_copy(total)
+            else:
+                written = self._write_csv(total)
+
+            if self._cancel_requested:
+                self._remove_partial_file()
+                self.export_cancelled.emit()
+                return
+            self.export_completed.emit(self.filename, written)
+        except _ExportCancelled:
+            self._remove_partial_file()
+            self.export_cancelled.emit()
+        except Exception as e:
+            self.logger.error(f"Errore durante l'esportazione in streaming '{self.export_key}': {e}", exc_info=True)
+            self._remove_partial_file()
+            self.error_occurred.emit(str(e))
+
+    def _iter_batches(self):
+        rows_generator = self.db_manager.iter_export_rows(self.export_key, self.comune_id, batch_size=self.BATCH_SIZE)
+        try:
+            for batch in rows_generator:
+                if self._cancel_requested:
+                    break
+                yield batch
+        finally:
+            rows_generator.close()  # Chiude il cursore lato server e restituisce la connessione
+
+    def _columns(self, first_batch: List[Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+        """Chiavi ordinate e intestazioni, identiche a quelle dell'esportazione tradizionale."""
+        if self.header_map:
+            return list(self.header_map.keys()), list(self.header_map.values())
+        keys = list(first_batch[0].keys()) if first_batch else []
+        return keys, keys
+
+    def _write_csv(self, total: int) -> int:
+        written = 0
+        with open(self.filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile, delimiter=';')
+            keys = None
+            for batch in self._iter_batches():
+                if keys is None:
+                    keys, headers = self._columns(batch)
+                    writer.writerow(headers)
+                writer.writerows([row.get(key) for key in keys] for row in batch)
+                written += len(batch)
+                self.progress_updated.emit(written, total)
+        return written
+
+    def _write_csv_copy(self, total: int) -> int:
+        """CSV prodotto dal server (COPY TO STDOUT): i byte vanno sul file senza passare da Python."""
+        with open(self.filename, 'wb') as csvfile:
+            writer = _CopyProgressWriter(csvfile, total, self)
+            copied = self.db_manager.copy_export_to_file(self.export_key, self.comune_id, writer,
+                                                         columns=self.header_map or None)
+            self.progress_updated.emit(total, total)
+        return copied if copied >= 0 else min(max(writer.rows_written, 0), total)
+
+    def _write_xlsx(self, total: int) -> int:
+        # Modalità write-only di openpyxl: le righe vengono serializzate man mano
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title="Sheet1")
+        written = 0
+        keys = None
+        for batch in self._iter_batches():
+            if keys is None:
+                keys, headers = self._columns(batch)
+                sheet.append(headers)
+            for row in batch:
+                sheet.append([row.get(key) for key in keys])
+            written += len(batch)
+            self.progress_updated.emit(written, total)
+        if not self._cancel_requested:
+            workbook.save(self.filename)
+        return written
+
+    def _remove_partial_file(self):
+        try:
+            if self.filename and os.path.exists(self.filename):
+                os.remove(self.filename)
+        except OSError as e:
+            self.logger.warning(f"Impossibile rimuovere il file parziale '{self.filename}': {e}")
+
+
 class EsportazioniWidget(LazyLoadedWidget):
     HEADER_MAPPINGS = {
         "Elenco Possessori": {
@@ -3429,10 +3600,19 @@ class EsportazioniWidget(LazyLoadedWidget):
             "tipo_contratto": "Tipo Contratto", "notaio": "Notaio"
         }
     }
+    # Tipi di esportazione tabellari gestiti in streaming (chiave per CatastoDBManager.build_export_query)
+    STREAMING_EXPORT_KEYS = {
+        "Elenco Possessori": "possessori",
+        "Elenco Partite": "partite",
+        "Elenco Immobili": "immobili",
+        "Elenco Località": "localita",
+        "Elenco Variazioni": "variazioni",
+    }
 
     def __init__(self, db_manager: CatastoDBManager, parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
+        self.export_thread: Optional[StreamingExportThread] = None
         self._initUI()
 
 
@@ -3482,6 +3662,18 @@ class EsportazioniWidget(LazyLoadedWidget):
         format_layout.addStretch()
         main_layout.addWidget(format_group)
 
+        # Avanzamento dell'esportazione in background (visibile solo durante l'esportazione)
+        progress_layout = QHBoxLayout()
+        self.export_progress_bar = QProgressBar()
+        self.export_progress_bar.setFormat("%v / %m righe")
+        self.btn_cancel_export = QPushButton("Annulla Esportazione")
+        self.btn_cancel_export.clicked.connect(self._cancel_streaming_export)
+        progress_layout.addWidget(self.export_progress_bar, 1)
+        progress_layout.addWidget(self.btn_cancel_export)
+        self.export_progress_bar.setVisible(False)
+        self.btn_cancel_export.setVisible(False)
+        main_layout.addLayout(progress_layout)
+
         self.status_log = QTextEdit()
         self.status_log.setReadOnly(True)
         
@@ -3598,6 +3790,10 @@ class EsportazioniWidget(LazyLoadedWidget):
         export_type, comune_id, comune_name = self._get_export_parameters()
         if not export_type: return
 
+        if export_type in self.STREAMING_EXPORT_KEYS:
+            self._start_streaming_export(export_type, comune_id, comune_name, "csv")
+            return
+
         data = self._fetch_data_for_export(export_type, comune_id)
 
         # Controllo fondamentale - deve essere il primo punto di uscita
@@ -3678,6 +3874,9 @@ class EsportazioniWidget(LazyLoadedWidget):
             self._export_consistenza_patrimoniale_xls(comune_id, comune_name)
             return
         # --- FINE LOGICA DEDICATA --
+        if export_type in self.STREAMING_EXPORT_KEYS:
+            self._start_streaming_export(export_type, comune_id, comune_name, "xlsx")
+            return
         data = self._fetch_data_for_export(export_type, comune_id)
         if not data:
             QMessageBox.information(self, "Nessun Dato", "Nessun dato trovato per l'esportazione.")
@@ -3693,6 +3892,7 @@ class EsportazioniWidget(LazyLoadedWidget):
         if not filename: return
             
         try:
+            import pandas as pd  # Import differito: pandas rallenta l'avvio
             df = pd.DataFrame(data)
             # Seleziona solo le colonne che abbiamo mappato, nell'ordine corretto
             if header_map:
@@ -3742,16 +3942,12 @@ class EsportazioniWidget(LazyLoadedWidget):
 
         try:
             pdf_title = f"{export_type} - Comune di {comune_name}"
-            pdf = BulkReportPDF(report_title=pdf_title)
-            pdf.alias_nb_pages()
-            pdf.set_auto_page_break(auto=True, margin=15)
-            
-            
+            # --- INIZIO MODIFICA: impaginazione veloce (pdf_table) ---
             # Trasforma i dati per la tabella PDF, usando le chiavi ordinate
-            data_rows = [[str(row.get(key, '')) for key in ordered_keys] for row in data]
-            
-            pdf.print_table(user_friendly_headers, data_rows) # Usa le intestazioni "belle"
-            pdf.output(filename)
+            data_rows = [[row.get(key) for key in ordered_keys] for row in data]
+            from pdf_table import render_table_pdf
+            render_table_pdf(filename, user_friendly_headers, data_rows, report_title=pdf_title)
+            # --- FINE MODIFICA ---
             
             file_url = QUrl.fromLocalFile(filename).toString()
             base_name = os.path.basename(filename)
@@ -3776,6 +3972,7 @@ class EsportazioniWidget(LazyLoadedWidget):
             filename, _ = QFileDialog.getSaveFileName(self, "Salva Report Excel", default_filename, "File Excel (*.xlsx)")
             if not filename: return
 
+            import pandas as pd  # Import differito: pandas rallenta l'avvio
             with pd.ExcelWriter(filename, engine='openpyxl') as writer:
                 for possessore_nome, partite_list in report_data.items():
                     # Tronca il nome del foglio se troppo lungo per Excel (max 31 caratteri)
@@ -3807,6 +4004,7 @@ class EsportazioniWidget(LazyLoadedWidget):
             filename, _ = QFileDialog.getSaveFileName(self, "Salva Report PDF", full_default_path, "File PDF (*.pdf)")
             if not filename: return
 
+            from pdf_table import BulkReportPDF
             pdf = BulkReportPDF(report_title=f"Report Consistenza Patrimoniale - Comune di {comune_name}")
             pdf.alias_nb_pages()
             pdf.add_page()
@@ -3853,6 +4051,82 @@ class EsportazioniWidget(LazyLoadedWidget):
 
 
     
+    # --- ESPORTAZIONE IN STREAMING (CSV/XLSX) ---
+
+    def _start_streaming_export(self, export_type: str, comune_id: int, comune_name: str, file_format: str):
+        """Chiede il file di destinazione e avvia l'esportazione a blocchi in un thread separato."""
+        if self.export_thread and self.export_thread.isRunning():
+            QMessageBox.information(self, "Esportazione in Corso", "Attendere il termine dell'esportazione corrente.")
+            return
+
+        extension, file_filter, label = ("xlsx", "File Excel (*.xlsx)", "Excel") if file_format == "xlsx" \
+            else ("csv", "File CSV (*.csv)", "CSV")
+        type_slug = export_type.lower().replace(" ", "_")
+        default_filename_base = f"{type_slug}_{comune_name.replace(' ', '_')}_{date.today().isoformat()}.{extension}"
+        full_default_path = _get_default_export_path(default_filename_base)
+
+        filename, _ = QFileDialog.getSaveFileName(self, f"Esporta {export_type} in {label}", full_default_path, file_filter)
+        if not filename: return
+
+        export_key = self.STREAMING_EXPORT_KEYS[export_type]
+        # CSV di immobili/località/variazioni: percorso veloce con COPY lato server
+        use_copy = file_format == "csv" and export_key in getattr(self.db_manager, "COPY_EXPORT_KEYS", ())
+        self.export_thread = StreamingExportThread(
+            self.db_manager, export_key, comune_id, file_format,
+            filename, self.HEADER_MAPPINGS.get(export_type, {}), use_copy=use_copy, parent=self)
+        self.export_thread.progress_updated.connect(self._on_streaming_export_progress)
+        self.export_thread.export_completed.connect(self._on_streaming_export_completed)
+        self.export_thread.export_cancelled.connect(self._on_streaming_export_cancelled)
+        self.export_thread.error_occurred.connect(self._on_streaming_export_error)
+        self.export_thread.finished.connect(self._reset_streaming_export_ui)
+
+        self._set_export_buttons_enabled(False)
+        self.export_progress_bar.setRange(0, 0)  # Indeterminata finché non si conosce il totale
+        self.export_progress_bar.setVisible(True)
+        self.btn_cancel_export.setEnabled(True)
+        self.btn_cancel_export.setVisible(True)
+        self.log_status(f"Esportazione '{export_type}' ({label}) del comune {comune_name} avviata...")
+        self.export_thread.start()
+
+    def _cancel_streaming_export(self):
+        if self.export_thread and self.export_thread.isRunning():
+            self.btn_cancel_export.setEnabled(False)
+            self.log_status("Annullamento dell'esportazione richiesto...")
+            self.export_thread.cancel()
+
+    def _on_streaming_export_progress(self, written: int, total: int):
+        if self.export_progress_bar.maximum() != total:
+            self.export_progress_bar.setRange(0, total)
+        self.export_progress_bar.setValue(written)
+
+    def _on_streaming_export_completed(self, filename: str, written: int):
+        if not filename:
+            QMessageBox.information(self, "Nessun Dato", "Nessun dato trovato per l'esportazione.")
+            self.log_status("Nessun dato da esportare.")
+            return
+        self.log_status(f"Esportazione completata con successo ({written} record).", link=filename)
+        QMessageBox.information(self, "Successo", f"{written} record esportati con successo.")
+
+    def _on_streaming_export_cancelled(self):
+        self.log_status("Esportazione annullata dall'utente. Il file parziale è stato rimosso.", error=True)
+
+    def _on_streaming_export_error(self, message: str):
+        self.log_status(f"Errore durante l'esportazione: {message}", error=True)
+        QMessageBox.critical(self, "Errore Esportazione", f"Impossibile completare l'esportazione:\n{message}")
+
+    def _reset_streaming_export_ui(self):
+        self.export_progress_bar.setVisible(False)
+        self.btn_cancel_export.setVisible(False)
+        self._set_export_buttons_enabled(True)
+        self.export_thread = None
+
+    def _set_export_buttons_enabled(self, enabled: bool):
+        self.btn_export_csv.setEnabled(enabled)
+        self.btn_export_xls.setEnabled(enabled)
+        self.btn_export_pdf.setEnabled(enabled and FPDF_AVAILABLE)
+        self.export_type_combo.setEnabled(enabled)
+        self.comune_filter_combo.setEnabled(enabled)
+
     def _open_export_file_link(self, url: QUrl):
         """Apre il file locale puntato dall'URL cliccato nel log."""
         self.logger.info(f"Tentativo di aprire il file dal link: {url.toLocalFile()}")
@@ -3868,11 +4142,53 @@ class EsportazioniWidget(LazyLoadedWidget):
 
 # In gui_widgets.py, SOSTITUISCI l'intera classe ReportisticaWidget con questa:
 
+class BatchReportThread(QThread):
+    """
+    Esegue un BatchReportJob (report di proprietà in blocco) fuori dal thread
+    della GUI, inoltrando avanzamento ed esito tramite segnali.
+    """
+    progress_updated = pyqtSignal(int, int, str)   # partite pronte, totale, descrizione
+    job_completed = pyqtSignal(dict)               # manifest finale
+    job_cancelled = pyqtSignal(dict)               # manifest al momento dell'interruzione
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, job: "BatchReportJob", parent=None):
+        super().__init__(parent)
+        self.job = job
+        self._cancel_requested = False
+        self.logger = logging.getLogger(f"CatastoGUI.{self.__class__.__name__}")
+
+    def cancel(self):
+        """Richiede l'interruzione; il lavoro potrà essere ripreso sulla stessa cartella."""
+        self._cancel_requested = True
+
+    def run(self):
+        try:
+            manifest = self.job.run(progress_callback=self.progress_updated.emit,
+                                    cancel_check=lambda: self._cancel_requested)
+            if manifest.get("stato") == "annullato":
+                self.job_cancelled.emit(manifest)
+            else:
+                self.job_completed.emit(manifest)
+        except Exception as e:
+            self.logger.error(f"Errore nel lavoro di report in blocco: {e}", exc_info=True)
+            self.error_occurred.emit(str(e))
+
+
 class ReportisticaWidget(LazyLoadedWidget):
     def __init__(self, db_manager, parent=None):
         super().__init__(parent)
         self.db_manager = db_manager
         self.current_report_content = ""  # Memorizza il report corrente
+        # --- INIZIO MODIFICA: report strutturati ---
+        # (tipo_report, dati JSON) dell'ultimo report: permette di impaginarlo
+        # in TXT/HTML/PDF senza rieseguire la query. None = report testuale legacy.
+        self.current_report_data = None
+        # --- FINE MODIFICA ---
+        self.batch_comune_id = None
+        self.batch_comune_nome = None
+        self.batch_thread = None
+        self.logger = logging.getLogger(f"CatastoGUI.{self.__class__.__name__}")
         self._initUI()
 
     def _initUI(self):
@@ -3890,6 +4206,7 @@ class ReportisticaWidget(LazyLoadedWidget):
         self.tabs_report_specifici.addTab(self._create_report_genealogico_tab(), "Genealogico")
         self.tabs_report_specifici.addTab(self._create_report_possessore_tab(), "Possessore")
         self.tabs_report_specifici.addTab(self._create_report_consultazioni_tab(), "Consultazioni")
+        self.tabs_report_specifici.addTab(self._create_report_batch_tab(), "In Blocco per Comune")
 
         generation_layout.addWidget(self.tabs_report_specifici)
         main_layout.addWidget(generation_group)
@@ -3909,7 +4226,8 @@ class ReportisticaWidget(LazyLoadedWidget):
         export_buttons_layout = QHBoxLayout()
         self.export_txt_button = QPushButton("Esporta come TXT"); self.export_txt_button.clicked.connect(self._export_current_report_txt)
         self.export_pdf_button = QPushButton("Esporta come PDF"); self.export_pdf_button.clicked.connect(self._export_current_report_pdf); self.export_pdf_button.setEnabled(FPDF_AVAILABLE)
-        export_buttons_layout.addStretch(); export_buttons_layout.addWidget(self.export_txt_button); export_buttons_layout.addWidget(self.export_pdf_button)
+        self.export_html_button = QPushButton("Esporta come HTML"); self.export_html_button.clicked.connect(self._export_current_report_html)
+        export_buttons_layout.addStretch(); export_buttons_layout.addWidget(self.export_txt_button); export_buttons_layout.addWidget(self.export_pdf_button); export_buttons_layout.addWidget(self.export_html_button)
         output_layout.addLayout(export_buttons_layout)
 
         main_layout.addWidget(output_group, 1)
@@ -3963,15 +4281,169 @@ class ReportisticaWidget(LazyLoadedWidget):
         layout.addRow(self.generate_consult_button)
         return widget
     
+    # --- INIZIO MODIFICA: report strutturati ---
+    def _load_structured_report(self, report_type: str, params: tuple, legacy_method, empty_message: str):
+        """
+        Recupera i dati del report con una sola query (get_report_data) e li impagina
+        lato client con report_renderer. Se le funzioni JSON non sono disponibili o
+        l'entità non esiste, ripiega sul report testuale generato dal server.
+        """
+        data = self.db_manager.get_report_data(report_type, *params)
+        if data is not None:
+            self.current_report_data = (report_type, data)
+            self.current_report_content = render_text(report_type, data)
+        else:
+            self.current_report_data = None
+            self.current_report_content = legacy_method(*params) or empty_message
+        self._show_current_report()
+
+    def _show_current_report(self):
+        """Mostra il report corrente: HTML se strutturato, testo semplice altrimenti."""
+        self.report_output_browser.clear()
+        if self.current_report_data is not None:
+            self.report_output_browser.setHtml(render_html(*self.current_report_data))
+        else:
+            self.report_output_browser.setPlainText(self.current_report_content)
+
+    def _current_report_html(self) -> str:
+        if self.current_report_data is not None:
+            return render_html(*self.current_report_data)
+        return f"<html><head><meta charset='utf-8'></head><body><pre>{html.escape(self.current_report_content)}</pre></body></html>"
+    # --- FINE MODIFICA ---
+
+    # --- INIZIO MODIFICA: report in blocco ---
+    def _create_report_batch_tab(self) -> QWidget:
+        widget = QWidget(); layout = QFormLayout(widget)
+
+        comune_layout = QHBoxLayout()
+        self.batch_comune_label = QLabel("Nessun comune selezionato.")
+        self.batch_comune_button = QPushButton("Seleziona Comune..."); self.batch_comune_button.clicked.connect(self._select_batch_comune)
+        comune_layout.addWidget(self.batch_comune_label, 1); comune_layout.addWidget(self.batch_comune_button)
+        layout.addRow("Comune (*):", comune_layout)
+
+        from batch_reports import MODE_PER_PARTITA, MODE_UNICO  # batch_reports carica fpdf
+        self.batch_mode_combo = QComboBox()
+        self.batch_mode_combo.addItem("Un PDF per ogni partita", MODE_PER_PARTITA)
+        self.batch_mode_combo.addItem("Un unico PDF con segnalibri", MODE_UNICO)
+        layout.addRow("Formato di uscita:", self.batch_mode_combo)
+
+        self.batch_workers_spin = QSpinBox(); self.batch_workers_spin.setRange(1, max(1, os.cpu_count() or 1))
+        self.batch_workers_spin.setValue(max(1, (os.cpu_count() or 2) - 1))
+        self.batch_workers_spin.setToolTip("Numero di processi usati per impaginare i report in parallelo.")
+        layout.addRow("Processi paralleli:", self.batch_workers_spin)
+
+        dir_layout = QHBoxLayout()
+        self.batch_dir_edit = QLineEdit()
+        self.batch_dir_edit.setToolTip("Rilanciando il lavoro sulla stessa cartella si riprende dalle partite mancanti.")
+        browse_button = QPushButton("Sfoglia..."); browse_button.clicked.connect(self._browse_batch_dir)
+        dir_layout.addWidget(self.batch_dir_edit, 1); dir_layout.addWidget(browse_button)
+        layout.addRow("Cartella di destinazione (*):", dir_layout)
+
+        buttons_layout = QHBoxLayout()
+        self.batch_start_button = QPushButton("Avvia / Riprendi"); self.batch_start_button.clicked.connect(self._start_batch_report)
+        self.batch_start_button.setEnabled(FPDF_AVAILABLE)
+        self.batch_cancel_button = QPushButton("Interrompi"); self.batch_cancel_button.clicked.connect(self._cancel_batch_report)
+        self.batch_cancel_button.setEnabled(False)
+        buttons_layout.addStretch(); buttons_layout.addWidget(self.batch_start_button); buttons_layout.addWidget(self.batch_cancel_button)
+        layout.addRow(buttons_layout)
+
+        self.batch_progress_bar = QProgressBar(); self.batch_progress_bar.setVisible(False)
+        self.batch_status_label = QLabel("")
+        layout.addRow(self.batch_progress_bar)
+        layout.addRow(self.batch_status_label)
+        return widget
+
+    def _select_batch_comune(self):
+        dialog = ComuneSelectionDialog(self.db_manager, self)
+        if dialog.exec_() == QDialog.Accepted and dialog.selected_comune_id:
+            self.batch_comune_id = dialog.selected_comune_id
+            self.batch_comune_nome = dialog.selected_comune_name
+            self.batch_comune_label.setText(self.batch_comune_nome)
+            if not self.batch_dir_edit.text().strip():
+                safe_name = "".join(c if c.isalnum() else "_" for c in self.batch_comune_nome)
+                self.batch_dir_edit.setText(_get_default_export_path(f"report_{safe_name}"))
+
+    def _browse_batch_dir(self):
+        directory = QFileDialog.getExistingDirectory(self, "Cartella di destinazione dei report", self.batch_dir_edit.text())
+        if directory:
+            self.batch_dir_edit.setText(directory)
+
+    def _start_batch_report(self):
+        if self.batch_thread is not None and self.batch_thread.isRunning():
+            return
+        if not self.batch_comune_id:
+            return QMessageBox.warning(self, "Dati mancanti", "Selezionare il comune.")
+        output_dir = self.batch_dir_edit.text().strip()
+        if not output_dir:
+            return QMessageBox.warning(self, "Dati mancanti", "Indicare la cartella di destinazione.")
+
+        from batch_reports import BatchReportJob, BatchReportError
+        try:
+            job = BatchReportJob(self.db_manager, output_dir, comune_id=self.batch_comune_id,
+                                 mode=self.batch_mode_combo.currentData(),
+                                 workers=self.batch_workers_spin.value(), comune_nome=self.batch_comune_nome)
+        except BatchReportError as e:
+            return QMessageBox.warning(self, "Parametri non validi", str(e))
+
+        self.batch_thread = BatchReportThread(job, self)
+        self.batch_thread.progress_updated.connect(self._on_batch_progress)
+        self.batch_thread.job_completed.connect(self._on_batch_completed)
+        self.batch_thread.job_cancelled.connect(self._on_batch_cancelled)
+        self.batch_thread.error_occurred.connect(self._on_batch_error)
+        self.batch_thread.finished.connect(self._reset_batch_ui)
+
+        self.batch_start_button.setEnabled(False); self.batch_cancel_button.setEnabled(True)
+        self.batch_progress_bar.setRange(0, 0); self.batch_progress_bar.setVisible(True)
+        self.batch_status_label.setText("Lettura delle partite del comune...")
+        self.batch_thread.start()
+
+    def _cancel_batch_report(self):
+        if self.batch_thread is not None and self.batch_thread.isRunning():
+            self.batch_thread.cancel()
+            self.batch_cancel_button.setEnabled(False)
+            self.batch_status_label.setText("Interruzione in corso...")
+
+    def _on_batch_progress(self, done: int, total: int, message: str):
+        self.batch_progress_bar.setRange(0, max(total, 1))
+        self.batch_progress_bar.setValue(done)
+        self.batch_status_label.setText(f"{done}/{total} - {message}")
+
+    def _on_batch_completed(self, manifest: dict):
+        totali = manifest.get("totali", {})
+        output_dir = self.batch_thread.job.output_dir
+        folder_url = QUrl.fromLocalFile(output_dir).toString()
+        errori = f", <span style='color:red;'>{totali['errori']} errori</span>" if totali.get("errori") else ""
+        summary = (f"<p><b>Report in blocco completati</b> per {html.escape(manifest.get('comune_nome') or '')}: "
+                   f"{totali.get('ok', 0)} su {totali.get('richieste', 0)} partite{errori}.</p>"
+                   f"<p>Cartella: <a href='{folder_url}'>{html.escape(output_dir)}</a> (dettagli nel manifest.json)</p>")
+        self.report_output_browser.append(summary)
+        self.batch_status_label.setText("Lavoro completato.")
+
+    def _on_batch_cancelled(self, manifest: dict):
+        totali = manifest.get("totali", {})
+        self.batch_status_label.setText(f"Interrotto: {totali.get('ok', 0)} partite pronte. "
+                                        f"Premere 'Avvia / Riprendi' per continuare.")
+
+    def _on_batch_error(self, message: str):
+        self.batch_status_label.setText("Errore durante il lavoro.")
+        QMessageBox.critical(self, "Errore Report in Blocco", f"Il lavoro si è interrotto:\n{message}\n\n"
+                             "Rilanciandolo sulla stessa cartella riprenderà dalle partite mancanti.")
+
+    def _reset_batch_ui(self):
+        self.batch_start_button.setEnabled(FPDF_AVAILABLE)
+        self.batch_cancel_button.setEnabled(False)
+        self.batch_progress_bar.setVisible(False)
+    # --- FINE MODIFICA ---
+
     def generate_report_consultazioni(self):
         data_inizio = self.consult_data_inizio_edit.date().toPyDate()
         data_fine = self.consult_data_fine_edit.date().toPyDate()
         richiedente = self.consult_richiedente_edit.text().strip() or None
 
         try:
-            report_text = self.db_manager.genera_report_consultazioni(data_inizio, data_fine, richiedente)
-            self.current_report_content = report_text or "Nessuna consultazione trovata per i criteri specificati."
-            self.report_output_browser.setPlainText(self.current_report_content)
+            self._load_structured_report("consultazioni", (data_inizio, data_fine, richiedente),
+                                         self.db_manager.genera_report_consultazioni,
+                                         "Nessuna consultazione trovata per i criteri specificati.")
         except DBMError as e:
             QMessageBox.critical(self, "Errore Report", f"Impossibile generare il report delle consultazioni:\n{e}")
     def _update_partita_info_label(self, label_widget, partita_id):
@@ -4008,41 +4480,22 @@ class ReportisticaWidget(LazyLoadedWidget):
         partita_id = self.partita_id_edit.value()
         if partita_id <= 0: return QMessageBox.warning(self, "Errore", "Selezionare un ID partita valido.")
 
-        report_text = self.db_manager.genera_report_proprieta(partita_id)
-        # --- INIZIO CORREZIONE ---
-        self.current_report_content = report_text or f"Nessun report generato per la partita ID {partita_id}."
-
-        # 1. Pulisci completamente il widget
-        self.report_output_browser.clear()
-        # 2. Imposta il nuovo contenuto come testo semplice
-        self.report_output_browser.setPlainText(self.current_report_content)
-        # --- FINE CORREZIONE ---
+        self._load_structured_report("proprieta", (partita_id,), self.db_manager.genera_report_proprieta,
+                                     f"Nessun report generato per la partita ID {partita_id}.")
 
     def generate_genealogico(self):
         partita_id = self.partita_id_gen_edit.value()
         if partita_id <= 0: return QMessageBox.warning(self, "Errore", "Selezionare un ID partita valido.")
 
-        report_text = self.db_manager.genera_report_genealogico(partita_id)
-        self.current_report_content = report_text or f"Nessun report generato per la partita ID {partita_id}."
-
-        # 1. Pulisci completamente il widget
-        self.report_output_browser.clear()
-        # 2. Imposta il nuovo contenuto come testo semplice
-        self.report_output_browser.setPlainText(self.current_report_content)
-        # --- FINE CORREZIONE ---
+        self._load_structured_report("genealogico", (partita_id,), self.db_manager.genera_report_genealogico,
+                                     f"Nessun report generato per la partita ID {partita_id}.")
 
     def generate_possessore(self):
         possessore_id = self.possessore_id_edit.value()
         if possessore_id <= 0: return QMessageBox.warning(self, "Errore", "Selezionare un ID possessore valido.")
 
-        report_text = self.db_manager.genera_report_possessore(possessore_id)
-        self.current_report_content = report_text or f"Nessun report generato per il possessore ID {possessore_id}."
-
-        # 1. Pulisci completamente il widget
-        self.report_output_browser.clear()
-        # 2. Imposta il nuovo contenuto come testo semplice
-        self.report_output_browser.setPlainText(self.current_report_content)
-        # --- FINE CORREZIONE ---
+        self._load_structured_report("possessore", (possessore_id,), self.db_manager.genera_report_possessore,
+                                     f"Nessun report generato per il possessore ID {possessore_id}.")
 
     # In gui_widgets.py, nella classe ReportisticaWidget
 
@@ -4067,8 +4520,7 @@ class ReportisticaWidget(LazyLoadedWidget):
                     f.write(self.current_report_content)
                 
                 # Se arriviamo qui, il file è stato salvato con successo
-                self.report_output_browser.clear()
-                self.report_output_browser.setPlainText(self.current_report_content)
+                self._show_current_report()
                 
                 file_url = QUrl.fromLocalFile(filename).toString()
                 base_name = os.path.basename(filename)
@@ -4170,6 +4622,7 @@ class ReportisticaWidget(LazyLoadedWidget):
                     break
                     
                 progress.setValue(30)
+                from pdf_reports import GenericTextReportPDF
                 pdf = GenericTextReportPDF(report_title="Report Catasto Storico")
                 
                 progress.setValue(50)
@@ -4182,8 +4635,7 @@ class ReportisticaWidget(LazyLoadedWidget):
                 progress.setValue(100)
                 
                 # Successo
-                self.report_output_browser.clear()
-                self.report_output_browser.setPlainText(self.current_report_content)
+                self._show_current_report()
                 
                 file_url = QUrl.fromLocalFile(filename).toString()
                 base_name = os.path.basename(filename)
@@ -4248,7 +4700,33 @@ class ReportisticaWidget(LazyLoadedWidget):
                 )
                 break
             finally:
-                progress.close()    
+                progress.close()
+
+    def _export_current_report_html(self):
+        if not self.current_report_content.strip():
+            QMessageBox.warning(self, "Nessun Contenuto", "Generare un report prima di esportarlo.")
+            return
+
+        default_filename_base = f"report_catasto_{date.today().isoformat()}.html"
+        full_default_path = _get_default_export_path(default_filename_base)
+
+        filename, _ = QFileDialog.getSaveFileName(self, "Salva Report HTML", full_default_path, "File HTML (*.html *.htm)")
+        if not filename: return
+        if is_file_locked(filename):
+            filename = get_alternative_filename(filename)
+
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(self._current_report_html())
+        except OSError as e:
+            QMessageBox.critical(self, "Errore di Scrittura", f"Errore durante il salvataggio del file:\n{e}")
+            return
+
+        self._show_current_report()
+        file_url = QUrl.fromLocalFile(filename).toString()
+        self.report_output_browser.append(
+            f"<hr><p style='color:green;'>Report HTML esportato: <a href='{file_url}'>{os.path.basename(filename)}</a></p>")
+
     def _open_export_file_link(self, url: QUrl):
         """Apre il file locale puntato dall'URL cliccato nel log."""
         self.logger.info(f"Tentativo di aprire il file dal link: {url.toLocalFile()}")
@@ -4263,10 +4741,23 @@ from custom_widgets import LazyLoadedWidget
 from dialogs import ComuneSelectionDialog # Assicurati che sia importato
 
 class StatisticheWidget(LazyLoadedWidget):
+    # Una modifica dei dati fa solo controllare la versione delle viste (stats_cache):
+    # gli aggregati vengono riletti quando le viste materializzate sono state aggiornate.
+    refresh_on_entities = ('comune', 'partita', 'possessore', 'immobile')
+    COMUNI_COLUMNS = [("comune", "Comune"), ("provincia", "Provincia"), ("totale_partite", "Totale Partite"),
+                      ("partite_attive", "Partite Attive"), ("partite_inattive", "Partite Inattive"),
+                      ("totale_possessori", "Totale Possessori"), ("totale_immobili", "Totale Immobili")]
+    IMMOBILI_COLUMNS = [("comune_nome", "Comune"), ("classificazione", "Classificazione"),
+                        ("numero_immobili", "Numero Immobili"), ("totale_piani", "Totale Piani"),
+                        ("totale_vani", "Totale Vani"), ("media_vani", "Media Vani/Immobile")]
+
     def __init__(self, db_manager, parent=None):
         super().__init__(parent)  # Chiama il costruttore della classe base
         self.db_manager = db_manager
-        self.comune_filter_id = None
+        self.comune_filter_name: Optional[str] = None
+        self._stats_cache = None  # stats_cache.AggregateCache, creata al primo caricamento
+        self._stats_snapshot = None
+        self._sort_state = {"comuni": ("comune", False), "immobili": ("comune_nome", False)}
         # Il self.logger e self._data_loaded sono già gestiti da LazyLoadedWidget
 
         self._initUI()
@@ -4294,6 +4785,8 @@ class StatisticheWidget(LazyLoadedWidget):
         immobili_tab = self._create_immobili_tipologia_tab()
         stats_sub_tabs.addTab(immobili_tab, "Immobili per Tipologia")
 
+        stats_sub_tabs.addTab(self._create_serie_storiche_tab(), "Andamento nel Tempo")
+
         # --- Contenitore per il tab Manutenzione ---
         maintenance_tab = self._create_maintenance_tab()
 
@@ -4305,15 +4798,30 @@ class StatisticheWidget(LazyLoadedWidget):
         """Crea il widget per il tab 'Statistiche per Comune'."""
         widget = QWidget()
         layout = QVBoxLayout(widget)
+        controls_layout = QHBoxLayout()
+        self.comuni_search_edit = QLineEdit()
+        self.comuni_search_edit.setPlaceholderText("Filtra per comune o provincia...")
+        self.comuni_search_edit.setClearButtonEnabled(True)
+        self.comuni_search_edit.textChanged.connect(self._render_stats_comune)
         refresh_button = QPushButton("Aggiorna Statistiche Comuni")
+        refresh_button.setToolTip("Rilegge le viste materializzate dal database.\n"
+                                  "Filtri e ordinamenti lavorano sui dati già caricati.")
         refresh_button.clicked.connect(self.refresh_stats_comune)
+        controls_layout.addWidget(self.comuni_search_edit, 1)
+        controls_layout.addWidget(refresh_button)
         self.stats_comune_table = QTableWidget()
-        self.stats_comune_table.setColumnCount(7)
-        self.stats_comune_table.setHorizontalHeaderLabels(["Comune", "Provincia", "Totale Partite", "Partite Attive", "Partite Inattive", "Totale Possessori", "Totale Immobili"])
+        self.stats_comune_table.setColumnCount(len(self.COMUNI_COLUMNS))
+        self.stats_comune_table.setHorizontalHeaderLabels([label for _, label in self.COMUNI_COLUMNS])
         self.stats_comune_table.setAlternatingRowColors(True)
+        self.stats_comune_table.setEditTriggers(QTableWidget.NoEditTriggers)
         self.stats_comune_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        layout.addWidget(refresh_button)
+        self.stats_comune_table.horizontalHeader().setSortIndicatorShown(True)
+        self.stats_comune_table.horizontalHeader().sectionClicked.connect(
+            lambda section: self._toggle_sort("comuni", self.COMUNI_COLUMNS[section][0]))
+        self.comuni_totals_label = QLabel()
+        layout.addLayout(controls_layout)
         layout.addWidget(self.stats_comune_table)
+        layout.addWidget(self.comuni_totals_label)
         return widget
 
     def _create_immobili_tipologia_tab(self):
@@ -4330,15 +4838,73 @@ class StatisticheWidget(LazyLoadedWidget):
         filter_layout.addWidget(self.comune_filter_display)
         filter_layout.addWidget(self.clear_filter_button)
         layout.addLayout(filter_layout)
+        controls_layout = QHBoxLayout()
+        self.immobili_search_edit = QLineEdit()
+        self.immobili_search_edit.setPlaceholderText("Filtra per comune o classificazione...")
+        self.immobili_search_edit.setClearButtonEnabled(True)
+        self.immobili_search_edit.textChanged.connect(self._render_immobili_tipologia)
+        self.immobili_group_combo = QComboBox()
+        self.immobili_group_combo.addItem("Comune e classificazione", ("comune_nome", "classificazione"))
+        self.immobili_group_combo.addItem("Solo classificazione", ("classificazione",))
+        self.immobili_group_combo.addItem("Solo comune", ("comune_nome",))
+        self.immobili_group_combo.currentIndexChanged.connect(self._render_immobili_tipologia)
         refresh_button = QPushButton("Aggiorna Statistiche Immobili")
         refresh_button.clicked.connect(self.refresh_immobili_tipologia)
-        layout.addWidget(refresh_button)
+        controls_layout.addWidget(self.immobili_search_edit, 1)
+        controls_layout.addWidget(QLabel("Raggruppa per:"))
+        controls_layout.addWidget(self.immobili_group_combo)
+        controls_layout.addWidget(refresh_button)
+        layout.addLayout(controls_layout)
         self.immobili_table = QTableWidget()
-        self.immobili_table.setColumnCount(6)
-        self.immobili_table.setHorizontalHeaderLabels(["Comune", "Classificazione", "Numero Immobili", "Totale Piani", "Totale Vani", "Media Vani/Immobile"])
+        self.immobili_table.setColumnCount(len(self.IMMOBILI_COLUMNS))
+        self.immobili_table.setHorizontalHeaderLabels([label for _, label in self.IMMOBILI_COLUMNS])
         self.immobili_table.setAlternatingRowColors(True)
+        self.immobili_table.setEditTriggers(QTableWidget.NoEditTriggers)
         self.immobili_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.immobili_table.horizontalHeader().setSortIndicatorShown(True)
+        self.immobili_table.horizontalHeader().sectionClicked.connect(
+            lambda section: self._toggle_sort("immobili", self.IMMOBILI_COLUMNS[section][0]))
+        self.immobili_totals_label = QLabel()
         layout.addWidget(self.immobili_table)
+        layout.addWidget(self.immobili_totals_label)
+        return widget
+
+    def _create_serie_storiche_tab(self):
+        """Crea il widget per il tab 'Andamento nel Tempo' (serie da statistica_annuale)."""
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        controls_layout = QHBoxLayout()
+        self.serie_comune_combo = QComboBox()
+        self.serie_comune_combo.addItem("Tutti i comuni", None)
+        self.serie_anno_da_spinbox = QSpinBox()
+        self.serie_anno_da_spinbox.setRange(1000, 2100)
+        self.serie_anno_da_spinbox.setSpecialValueText("Primo anno")
+        self.serie_anno_da_spinbox.setValue(1000)
+        self.serie_anno_a_spinbox = QSpinBox()
+        self.serie_anno_a_spinbox.setRange(1000, 2100)
+        self.serie_anno_a_spinbox.setValue(datetime.now().year)
+        self.serie_misura_combo = QComboBox()
+        for measure, label in MEASURE_LABELS.items():
+            self.serie_misura_combo.addItem(label, measure)
+        self.serie_categorie_check = QCheckBox("Dettaglio per tipo/classificazione")
+        self.serie_categorie_check.setToolTip("Per variazioni e immobili mostra una linea per categoria (le più frequenti).")
+        for control_signal in (self.serie_comune_combo.currentIndexChanged, self.serie_anno_da_spinbox.valueChanged,
+                               self.serie_anno_a_spinbox.valueChanged, self.serie_misura_combo.currentIndexChanged,
+                               self.serie_categorie_check.toggled):
+            control_signal.connect(self._refresh_serie_storiche)
+        controls_layout.addWidget(QLabel("Comune:"))
+        controls_layout.addWidget(self.serie_comune_combo, 1)
+        controls_layout.addWidget(QLabel("Dal:"))
+        controls_layout.addWidget(self.serie_anno_da_spinbox)
+        controls_layout.addWidget(QLabel("Al:"))
+        controls_layout.addWidget(self.serie_anno_a_spinbox)
+        controls_layout.addWidget(self.serie_misura_combo)
+        controls_layout.addWidget(self.serie_categorie_check)
+        layout.addLayout(controls_layout)
+        self.serie_chart = TimeSeriesChart()
+        layout.addWidget(self.serie_chart, 1)
+        self.serie_status_label = QLabel()
+        layout.addWidget(self.serie_status_label)
         return widget
 
     def _create_maintenance_tab(self):
@@ -4358,6 +4924,14 @@ class StatisticheWidget(LazyLoadedWidget):
         
         group_layout.addWidget(QFrame(self, frameShape=QFrame.HLine))
 
+        annuali_label = QLabel("Le serie di 'Andamento nel Tempo' sono mantenute automaticamente. "
+                               "Ricalcolarle solo dopo caricamenti massivi eseguiti con i trigger disabilitati.")
+        annuali_label.setWordWrap(True)
+        self.rebuild_annual_stats_button = QPushButton("Ricalcola Statistiche Annuali")
+        self.rebuild_annual_stats_button.clicked.connect(self.rebuild_annual_stats)
+        group_layout.addWidget(annuali_label)
+        group_layout.addWidget(self.rebuild_annual_stats_button)
+
         
         layout.addWidget(group)
 
@@ -4368,69 +4942,169 @@ class StatisticheWidget(LazyLoadedWidget):
         return widget
 
     def _load_data_on_first_show(self):
-        """Carica i dati iniziali la prima volta che il tab viene mostrato."""
+        """Alla prima visualizzazione (o dopo una modifica dei dati) usa gli aggregati in memoria se ancora validi."""
         self.logger.info("StatisticheWidget: Esecuzione lazy loading...")
-        self.refresh_stats_comune()
-        self.refresh_immobili_tipologia()
+        if self._load_statistics():
+            self._render_stats_comune()
+            self._render_immobili_tipologia()
+        self._populate_serie_comuni()
+        self._refresh_serie_storiche()
+
+    SERIE_MAX_CATEGORIE = 8
+
+    def _populate_serie_comuni(self):
+        current_id = self.serie_comune_combo.currentData()
+        self.serie_comune_combo.blockSignals(True)
+        self.serie_comune_combo.clear()
+        self.serie_comune_combo.addItem("Tutti i comuni", None)
+        try:
+            for comune_id, nome in self.db_manager.get_elenco_comuni_semplice():
+                self.serie_comune_combo.addItem(nome, comune_id)
+        except DBMError as e:
+            self.log_status(f"Impossibile caricare l'elenco dei comuni: {e}", error=True)
+        index = self.serie_comune_combo.findData(current_id)
+        self.serie_comune_combo.setCurrentIndex(max(index, 0))
+        self.serie_comune_combo.blockSignals(False)
+
+    def _refresh_serie_storiche(self):
+        """Rilegge le serie dalla tabella dei fatti: una query di poche righe, eseguita a ogni cambio dei controlli."""
+        anno_da = self.serie_anno_da_spinbox.value()
+        anno_da = None if anno_da == self.serie_anno_da_spinbox.minimum() else anno_da
+        anno_a = self.serie_anno_a_spinbox.value()
+        if anno_da is not None and anno_da > anno_a:
+            self.serie_status_label.setText("L'anno iniziale è successivo all'anno finale.")
+            return
+        started = time.perf_counter()
+        try:
+            serie = self.db_manager.get_serie_storiche(self.serie_comune_combo.currentData(), anno_da, anno_a)
+        except Exception as e:
+            self.serie_chart.set_series([], [])
+            self.serie_status_label.setText(f"Serie non disponibili: {e}")
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        measure = self.serie_misura_combo.currentData()
+        categories = serie.categories(measure) if self.serie_categorie_check.isChecked() else []
+        if categories:
+            # Le categorie più frequenti nell'intervallo, le altre sommate in "Altre"
+            categories.sort(key=lambda category: -sum(serie.series[series_key(measure, category)]))
+            lines = [(category, serie.series[series_key(measure, category)])
+                     for category in categories[:self.SERIE_MAX_CATEGORIE]]
+            if len(categories) > self.SERIE_MAX_CATEGORIE:
+                others = [sum(values) for values in zip(*(serie.series[series_key(measure, category)]
+                                                         for category in categories[self.SERIE_MAX_CATEGORIE:]))]
+                lines.append(("Altre", others))
+        else:
+            lines = [(self.serie_misura_combo.currentText(), serie.series[measure])]
+        self.serie_chart.set_series(serie.years, lines)
+        values = serie.series[measure]
+        summary = f"a fine periodo {values[-1]}" if measure == "partite_attive" else f"totale {sum(values)}"
+        self.serie_status_label.setText(
+            f"{serie.years[0]}-{serie.years[-1]}: {summary} - serie calcolate in {elapsed_ms:.0f} ms.")
+
+    def _load_statistics(self, force: bool = False) -> bool:
+        """Carica gli aggregati tramite la cache: una query sola se le viste non sono state aggiornate."""
+        if self._stats_cache is None:
+            from stats_cache import AggregateCache  # Import differito: NumPy rallenta l'avvio
+            self._stats_cache = AggregateCache(self.db_manager.get_statistiche_aggregate,
+                                               self.db_manager.get_last_mv_refresh_timestamp)
+        try:
+            self._stats_snapshot = self._stats_cache.get(force=force)
+        except Exception as e:
+            self.log_status(f"Errore DB durante il caricamento delle statistiche: {e}", error=True)
+            QMessageBox.critical(self, "Errore", f"Impossibile caricare le statistiche:\n{e}")
+            return False
+        return True
+
+    def _toggle_sort(self, table_name: str, column: str):
+        current_column, descending = self._sort_state[table_name]
+        self._sort_state[table_name] = (column, not descending if column == current_column else False)
+        if table_name == "comuni":
+            self._render_stats_comune()
+        else:
+            self._render_immobili_tipologia()
+
+    def _fill_table(self, table: QTableWidget, columns, rows: List[Dict[str, Any]], sort_state):
+        table.setUpdatesEnabled(False)
+        table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            for j, (key, _) in enumerate(columns):
+                value = row.get(key, "")
+                item = QTableWidgetItem(f"{value:.2f}" if isinstance(value, float) else str(value))
+                if isinstance(value, (int, float)):
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(i, j, item)
+        sort_column, descending = sort_state
+        keys = [key for key, _ in columns]
+        if sort_column in keys:
+            table.horizontalHeader().setSortIndicator(keys.index(sort_column),
+                                                      Qt.DescendingOrder if descending else Qt.AscendingOrder)
+        table.setUpdatesEnabled(True)
+
+    def _render_stats_comune(self):
+        if self._stats_snapshot is None:
+            return
+        table = self._stats_snapshot.tables["comuni"]
+        mask = table.mask(contains=self.comuni_search_edit.text(), contains_columns=("comune", "provincia"))
+        sort_column, descending = self._sort_state["comuni"]
+        rows = table.rows(table.order(sort_column, descending, mask))
+        self._fill_table(self.stats_comune_table, self.COMUNI_COLUMNS, rows, self._sort_state["comuni"])
+        totals = table.group_sum([], mask).rows()[0]
+        self.comuni_totals_label.setText(
+            f"{len(rows)} comuni su {len(table)} - Totale: {totals['totale_partite']} partite, "
+            f"{totals['totale_immobili']} immobili.")
+
+    def _render_immobili_tipologia(self):
+        if self._stats_snapshot is None:
+            return
+        table = self._stats_snapshot.tables["immobili"]
+        equals = {"comune_nome": self.comune_filter_name} if self.comune_filter_name else None
+        mask = table.mask(equals, self.immobili_search_edit.text(), ("comune_nome", "classificazione"))
+        group_by = self.immobili_group_combo.currentData()
+        grouped = table.group_sum(group_by, mask)
+        sort_column, descending = self._sort_state["immobili"]
+        if sort_column == "media_vani":
+            rows = grouped.rows()
+        else:
+            rows = grouped.rows(grouped.order(sort_column if sort_column in grouped.columns else None, descending, None))
+        for row in rows:
+            row["media_vani"] = round(row["totale_vani"] / row["numero_immobili"], 2) if row["numero_immobili"] else 0.0
+        if sort_column == "media_vani":
+            rows.sort(key=lambda row: row["media_vani"], reverse=descending)
+        for j, (key, _) in enumerate(self.IMMOBILI_COLUMNS):
+            self.immobili_table.setColumnHidden(j, key in ("comune_nome", "classificazione") and key not in group_by)
+        self._fill_table(self.immobili_table, self.IMMOBILI_COLUMNS, rows, self._sort_state["immobili"])
+        totals = table.group_sum([], mask).rows()[0]
+        self.immobili_totals_label.setText(
+            f"{len(rows)} righe - Totale: {totals['numero_immobili']} immobili, {totals['totale_vani']} vani.")
 
     def refresh_stats_comune(self):
         self.logger.info("Aggiornamento statistiche comuni...")
-        self.stats_comune_table.setRowCount(0)
-        try:
-            stats = self.db_manager.get_statistiche_comune()
-            if stats:
-                self.stats_comune_table.setRowCount(len(stats))
-                for i, s in enumerate(stats):
-                    self.stats_comune_table.setItem(i, 0, QTableWidgetItem(s.get('comune', '')))
-                    self.stats_comune_table.setItem(i, 1, QTableWidgetItem(s.get('provincia', '')))
-                    self.stats_comune_table.setItem(i, 2, QTableWidgetItem(str(s.get('totale_partite', 0))))
-                    self.stats_comune_table.setItem(i, 3, QTableWidgetItem(str(s.get('partite_attive', 0))))
-                    self.stats_comune_table.setItem(i, 4, QTableWidgetItem(str(s.get('partite_inattive', 0))))
-                    self.stats_comune_table.setItem(i, 5, QTableWidgetItem(str(s.get('totale_possessori', 0))))
-                    self.stats_comune_table.setItem(i, 6, QTableWidgetItem(str(s.get('totale_immobili', 0))))
-                self.stats_comune_table.resizeColumnsToContents()
+        if self._load_statistics(force=True):
+            self._render_stats_comune()
+            self._render_immobili_tipologia()
             self.log_status("Statistiche comuni aggiornate con successo.")
-        except DBMError as e:
-            self.log_status(f"Errore DB durante l'aggiornamento delle statistiche comuni: {e}", error=True)
-            QMessageBox.critical(self, "Errore", f"Impossibile caricare le statistiche:\n{e}")
 
     def filter_immobili_per_comune(self):
         dialog = ComuneSelectionDialog(self.db_manager, self)
         if dialog.exec_() == QDialog.Accepted and dialog.selected_comune_id:
-            self.comune_filter_id = dialog.selected_comune_id
+            self.comune_filter_name = dialog.selected_comune_name
             self.comune_filter_display.setText(f"Comune: {dialog.selected_comune_name}")
-            self.refresh_immobili_tipologia()
+            self._render_immobili_tipologia()
 
     def clear_immobili_filter(self):
-        self.comune_filter_id = None
+        self.comune_filter_name = None
         self.comune_filter_display.setText("Visualizzando tutti i comuni")
-        self.refresh_immobili_tipologia()
+        self._render_immobili_tipologia()
 
     def refresh_immobili_tipologia(self):
         self.logger.info("Aggiornamento statistiche immobili per tipologia...")
-        self.immobili_table.setRowCount(0)
-        try:
-            stats = self.db_manager.get_immobili_per_tipologia(self.comune_filter_id)
-            if stats:
-                self.immobili_table.setRowCount(len(stats))
-                for i, s in enumerate(stats):
-                    self.immobili_table.setItem(i, 0, QTableWidgetItem(s.get('comune_nome', '')))
-                    self.immobili_table.setItem(i, 1, QTableWidgetItem(s.get('classificazione', 'N/D')))
-                    num_immobili = s.get('numero_immobili', 0)
-                    self.immobili_table.setItem(i, 2, QTableWidgetItem(str(num_immobili)))
-                    self.immobili_table.setItem(i, 3, QTableWidgetItem(str(s.get('totale_piani', 0))))
-                    totale_vani = s.get('totale_vani', 0)
-                    self.immobili_table.setItem(i, 4, QTableWidgetItem(str(totale_vani)))
-                    media_vani = round(totale_vani / num_immobili, 2) if num_immobili > 0 else 0
-                    self.immobili_table.setItem(i, 5, QTableWidgetItem(str(media_vani)))
-                self.immobili_table.resizeColumnsToContents()
+        if self._load_statistics(force=True):
+            self._render_stats_comune()
+            self._render_immobili_tipologia()
             status_text = "Statistiche immobili aggiornate"
-            if self.comune_filter_id:
+            if self.comune_filter_name:
                 status_text += f" (filtrate per {self.comune_filter_display.text()})"
             self.log_status(status_text + ".")
-        except DBMError as e:
-            self.log_status(f"Errore DB durante l'aggiornamento delle statistiche immobili: {e}", error=True)
-            QMessageBox.critical(self, "Errore", f"Impossibile caricare le statistiche:\n{e}")
 
     def update_all_views(self):
         self.log_status("Avvio aggiornamento di tutte le viste materializzate...")
@@ -4438,15 +5112,26 @@ class StatisticheWidget(LazyLoadedWidget):
         try:
             if self.db_manager.refresh_materialized_views():
                 self.log_status("Aggiornamento viste completato con successo.")
-                self.refresh_stats_comune()
-                self.refresh_immobili_tipologia()
+                if self._load_statistics(force=True):
+                    self._render_stats_comune()
+                    self._render_immobili_tipologia()
             else:
                 self.log_status("ERRORE: Aggiornamento viste non riuscito. Controllare i log.", error=True)
         finally:
             QApplication.restoreOverrideCursor()
-
     
 
+    def rebuild_annual_stats(self):
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            righe = self.db_manager.ricalcola_statistiche_annuali()
+            self.log_status(f"Statistiche annuali ricalcolate: {righe} righe.")
+            self._refresh_serie_storiche()
+        except Exception as e:
+            self.log_status(f"ERRORE nel ricalcolo delle statistiche annuali: {e}", error=True)
+        finally:
+            QApplication.restoreOverrideCursor()
+
     def log_status(self, message, error=False):
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         formatted_message = f"[{timestamp}] {message}"
@@ -5147,6 +5832,106 @@ class AuditLogViewerWidget(LazyLoadedWidget):
         except Exception as e: QMessageBox.critical(self, "Errore Esportazione", f"Errore durante l'esportazione Excel:\n{e}")
 # ... (Fine della classe AuditLogViewerWidget) ...
 
+class BackupVerificationThread(QThread):
+    """
+    Esegue CatastoDBManager.verify_backup (indice, checksum ed eventuale ripristino
+    di prova) fuori dal thread della GUI.
+    """
+    progress_message = pyqtSignal(str)
+    verification_finished = pyqtSignal(dict)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, db_manager: 'CatastoDBManager', backup_path: str, pg_restore_path: str,
+                 write_manifest: bool, test_restore: bool, jobs: int, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.backup_path = backup_path
+        self.pg_restore_path = pg_restore_path
+        self.write_manifest = write_manifest
+        self.test_restore = test_restore
+        self.jobs = jobs
+        self.logger = logging.getLogger(f"CatastoGUI.{self.__class__.__name__}")
+
+    def run(self):
+        try:
+            result = self.db_manager.verify_backup(
+                self.backup_path, self.pg_restore_path, write_manifest=self.write_manifest,
+                test_restore=self.test_restore, jobs=self.jobs, progress_callback=self.progress_message.emit)
+            self.verification_finished.emit(result)
+        except Exception as e:
+            self.logger.error(f"Errore nella verifica del backup '{self.backup_path}': {e}", exc_info=True)
+            self.error_occurred.emit(str(e))
+
+
+class IncrementalExportThread(QThread):
+    """Esegue CatastoDBManager.export_incremental_changes fuori dal thread della GUI."""
+    progress_message = pyqtSignal(str)
+    export_finished = pyqtSignal(dict)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, db_manager: 'CatastoDBManager', directory: str, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.directory = directory
+        self.logger = logging.getLogger(f"CatastoGUI.{self.__class__.__name__}")
+
+    def run(self):
+        try:
+            result = self.db_manager.export_incremental_changes(
+                self.directory, progress_callback=self.progress_message.emit)
+            self.export_finished.emit(result)
+        except Exception as e:
+            self.logger.error(f"Errore nell'esportazione incrementale in '{self.directory}': {e}", exc_info=True)
+            self.error_occurred.emit(str(e))
+
+
+class DocumentStoreMaintenanceThread(QThread):
+    """Migrazione degli allegati esistenti nell'archivio per contenuto, o pulizia dei contenuti non usati."""
+    progress_updated = pyqtSignal(int, int)
+    maintenance_finished = pyqtSignal(str, dict)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, db_manager: 'CatastoDBManager', operation: str, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.operation = operation  # 'migrazione' o 'pulizia'
+        self.logger = logging.getLogger(f"CatastoGUI.{self.__class__.__name__}")
+
+    def run(self):
+        try:
+            if self.operation == "migrazione":
+                result = self.db_manager.migra_allegati_in_archivio(progress_callback=self.progress_updated.emit)
+            else:
+                result = self.db_manager.pulisci_archivio_allegati()
+            self.maintenance_finished.emit(self.operation, result)
+        except Exception as e:
+            self.logger.error(f"Errore nella manutenzione dell'archivio allegati ({self.operation}): {e}", exc_info=True)
+            self.error_occurred.emit(str(e))
+
+
+class DocumentIngestionThread(QThread):
+    """Importazione massiva di scansioni da manifest (CatastoDBManager.importa_documenti_da_manifest)."""
+    progress_updated = pyqtSignal(int, int)
+    ingestion_finished = pyqtSignal(dict)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, db_manager: 'CatastoDBManager', manifest_path: str, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.manifest_path = manifest_path
+        self.logger = logging.getLogger(f"CatastoGUI.{self.__class__.__name__}")
+
+    def run(self):
+        try:
+            result = self.db_manager.importa_documenti_da_manifest(
+                self.manifest_path, progress_callback=self.progress_updated.emit,
+                should_stop=self.isInterruptionRequested)
+            self.ingestion_finished.emit(result)
+        except Exception as e:
+            self.logger.error(f"Errore nell'importazione dal manifest '{self.manifest_path}': {e}", exc_info=True)
+            self.error_occurred.emit(str(e))
+
+
 class BackupWidget(QWidget):
     def __init__(self, db_manager: 'CatastoDBManager', parent=None):
         super().__init__(parent)
@@ -5159,6 +5944,14 @@ class BackupWidget(QWidget):
         self.process.readyReadStandardOutput.connect(self._handle_stdout)
         self.process.readyReadStandardError.connect(self._handle_stderr)
         self.process.finished.connect(self._handle_process_finished)
+        self._progress_tracker: Optional[BackupProgressTracker] = None
+        self._last_backup_path: Optional[str] = None
+        self._verification_thread: Optional[BackupVerificationThread] = None
+        self._incremental_thread: Optional[IncrementalExportThread] = None
+        self._document_store_thread: Optional[DocumentStoreMaintenanceThread] = None
+        self._ingestion_thread: Optional[DocumentIngestionThread] = None
+        self._incremental_timer = QTimer(self)
+        self._incremental_timer.timeout.connect(self._start_incremental_export)
 
         self._init_ui()
 
@@ -5208,12 +6001,38 @@ class BackupWidget(QWidget):
         backup_layout.addRow("File di Backup:", backup_path_layout)
 
         self.backup_format_combo = QComboBox()
-        self.backup_format_combo.addItems([
-            "Custom (compresso, per pg_restore - raccomandato)",
-            "Plain SQL (testo semplice)"
-        ])
+        self.backup_format_combo.addItem("Custom (compresso, per pg_restore - raccomandato)", "custom")
+        self.backup_format_combo.addItem("Directory (compresso, parallelo - per database grandi)", "directory")
+        self.backup_format_combo.addItem("Plain SQL (testo semplice)", "plain")
+        self.backup_format_combo.currentIndexChanged.connect(self._update_backup_options)
         backup_layout.addRow("Formato Backup:", self.backup_format_combo)
 
+        max_jobs = max(1, os.cpu_count() or 1)
+        self.backup_jobs_spinbox = QSpinBox()
+        self.backup_jobs_spinbox.setRange(1, max_jobs)
+        self.backup_jobs_spinbox.setValue(min(4, max_jobs))
+        self.backup_jobs_spinbox.setToolTip("Processi pg_dump paralleli (solo formato Directory).\n"
+                                            "Ogni processo apre una connessione al server.")
+        backup_layout.addRow("Processi paralleli:", self.backup_jobs_spinbox)
+
+        self.compression_method_combo = QComboBox()
+        self.compression_method_combo.addItem("Predefinita di pg_dump", None)
+        for method in COMPRESSION_METHODS:
+            self.compression_method_combo.addItem("Nessuna" if method == "none" else method, method)
+        self.compression_method_combo.setToolTip("lz4 e zstd richiedono pg_dump 16 o successivo: "
+                                                 "con versioni precedenti viene usato gzip.")
+        self.compression_method_combo.currentIndexChanged.connect(self._update_backup_options)
+        self.compression_level_spinbox = QSpinBox()
+        compression_layout = QHBoxLayout()
+        compression_layout.addWidget(self.compression_method_combo)
+        compression_layout.addWidget(QLabel("Livello:"))
+        compression_layout.addWidget(self.compression_level_spinbox)
+        backup_layout.addRow("Compressione:", compression_layout)
+
+        self.verify_after_backup_checkbox = QCheckBox("Verifica il backup al termine (indice e checksum)")
+        self.verify_after_backup_checkbox.setChecked(True)
+        backup_layout.addRow(self.verify_after_backup_checkbox)
+
         self.pg_dump_path_edit = QLineEdit()
         self.pg_dump_path_edit.setPlaceholderText(
             "Es. C:\\Program Files\\PostgreSQL\\17\\bin\\pg_dump.exe (opzionale)")
@@ -5239,10 +6058,20 @@ class BackupWidget(QWidget):
         btn_browse_restore_path.clicked.connect(
             self._browse_restore_file_open_path)
         restore_path_layout = QHBoxLayout()
+        btn_browse_restore_dir = QPushButton("Cartella...")
+        btn_browse_restore_dir.setToolTip("Seleziona un backup in formato Directory")
+        btn_browse_restore_dir.clicked.connect(self._browse_restore_dir_open_path)
         restore_path_layout.addWidget(self.restore_file_path_edit)
         restore_path_layout.addWidget(btn_browse_restore_path)
+        restore_path_layout.addWidget(btn_browse_restore_dir)
         restore_layout.addRow("File di Backup:", restore_path_layout)
 
+        self.restore_jobs_spinbox = QSpinBox()
+        self.restore_jobs_spinbox.setRange(1, max_jobs)
+        self.restore_jobs_spinbox.setValue(min(4, max_jobs))
+        self.restore_jobs_spinbox.setToolTip("Processi pg_restore paralleli (backup Custom e Directory).")
+        restore_layout.addRow("Processi paralleli:", self.restore_jobs_spinbox)
+
         self.pg_restore_path_edit = QLineEdit()
         self.pg_restore_path_edit.setPlaceholderText(
             "Es. ...\\bin\\pg_restore.exe o ...\\bin\\psql.exe (opz.)")
@@ -5258,6 +6087,87 @@ class BackupWidget(QWidget):
 
         main_layout.addWidget(restore_group)
 
+        # --- Sezione Verifica ---
+        verify_group = QGroupBox("Verifica Backup")
+        verify_layout = QHBoxLayout(verify_group)
+        self.test_restore_checkbox = QCheckBox("Ripristino di prova in un database temporaneo")
+        self.test_restore_checkbox.setToolTip(
+            "Ripristina il backup in un database temporaneo (con i processi paralleli del ripristino),\n"
+            "confronta il numero di righe di ogni tabella con il database corrente e poi lo elimina.\n"
+            "Richiede il permesso CREATEDB e spazio sufficiente sul server.")
+        self.verify_button = QPushButton("Verifica File Selezionato")
+        self.verify_button.setToolTip("Verifica il backup indicato nella sezione Ripristino, senza ripristinarlo.")
+        self.verify_button.clicked.connect(self._start_verification_of_selected)
+        verify_layout.addWidget(self.test_restore_checkbox)
+        verify_layout.addStretch()
+        verify_layout.addWidget(self.verify_button)
+        main_layout.addWidget(verify_group)
+
+        # --- Sezione Esportazione Incrementale ---
+        settings = QSettings()
+        incremental_group = QGroupBox("Esportazione Incrementale (solo modifiche)")
+        incremental_layout = QFormLayout(incremental_group)
+        self.incremental_dir_edit = QLineEdit(settings.value(SETTINGS_INCREMENTAL_EXPORT_DIR, "", type=str))
+        self.incremental_dir_edit.setReadOnly(True)
+        self.incremental_dir_edit.setPlaceholderText("Cartella dei set di modifiche...")
+        btn_browse_incremental = QPushButton("Sfoglia...")
+        btn_browse_incremental.clicked.connect(self._browse_incremental_dir)
+        incremental_dir_layout = QHBoxLayout()
+        incremental_dir_layout.addWidget(self.incremental_dir_edit)
+        incremental_dir_layout.addWidget(btn_browse_incremental)
+        incremental_layout.addRow("Cartella:", incremental_dir_layout)
+
+        self.incremental_interval_spinbox = QSpinBox()
+        self.incremental_interval_spinbox.setRange(0, 24 * 60)
+        self.incremental_interval_spinbox.setSuffix(" min")
+        self.incremental_interval_spinbox.setSpecialValueText("Solo manuale")
+        self.incremental_interval_spinbox.setValue(
+            settings.value(SETTINGS_INCREMENTAL_EXPORT_INTERVAL, INCREMENTAL_EXPORT_INTERVAL_DEFAULT, type=int))
+        self.incremental_interval_spinbox.setToolTip(
+            "Intervallo tra due esportazioni automatiche, finché l'applicazione resta aperta.\n"
+            "Per esportazioni senza applicazione aperta pianificare 'incremental_export.py esporta'.")
+        self.incremental_interval_spinbox.valueChanged.connect(self._update_incremental_schedule)
+        self.incremental_export_button = QPushButton("Esporta Ora")
+        self.incremental_export_button.setToolTip(
+            "Esporta le righe inserite, modificate o eliminate dall'ultima esportazione nella cartella.\n"
+            "La prima esportazione in una cartella nuova è completa.")
+        self.incremental_export_button.clicked.connect(self._start_incremental_export)
+        incremental_controls_layout = QHBoxLayout()
+        incremental_controls_layout.addWidget(self.incremental_interval_spinbox)
+        incremental_controls_layout.addStretch()
+        incremental_controls_layout.addWidget(self.incremental_export_button)
+        incremental_layout.addRow("Ogni:", incremental_controls_layout)
+        self.incremental_status_label = QLabel("Nessuna esportazione in questa sessione.")
+        incremental_layout.addRow(self.incremental_status_label)
+        main_layout.addWidget(incremental_group)
+
+        # --- Sezione Archivio Allegati ---
+        document_store_group = QGroupBox("Archivio Allegati")
+        document_store_layout = QHBoxLayout(document_store_group)
+        self.migrate_documents_button = QPushButton("Migra Allegati Esistenti")
+        self.migrate_documents_button.setToolTip(
+            "Sposta gli allegati delle cartelle 'partita_<id>' nell'archivio per contenuto:\n"
+            "i file identici vengono conservati una sola volta.")
+        self.migrate_documents_button.clicked.connect(lambda: self._start_document_store_maintenance("migrazione"))
+        self.clean_documents_button = QPushButton("Elimina Contenuti Non Usati")
+        self.clean_documents_button.setToolTip("Elimina dall'archivio i file non più referenziati da alcun documento.")
+        self.clean_documents_button.clicked.connect(lambda: self._start_document_store_maintenance("pulizia"))
+        self.ingest_documents_button = QPushButton("Importa Scansioni da Manifest...")
+        self.ingest_documents_button.setToolTip(
+            "Importa una cartella di scansioni descritta da un manifest CSV o JSON\n"
+            "(colonne: file; partita_id oppure comune/comune_id e numero_partita; titolo, tipo_documento, anno, ...).\n"
+            "Rieseguendo lo stesso manifest l'importazione riprende dai file non ancora importati.")
+        self.ingest_documents_button.clicked.connect(self._start_document_ingestion)
+        self.stop_ingestion_button = QPushButton("Interrompi Importazione")
+        self.stop_ingestion_button.setEnabled(False)
+        self.stop_ingestion_button.clicked.connect(self._stop_document_ingestion)
+        document_store_layout.addWidget(self.migrate_documents_button)
+        document_store_layout.addWidget(self.clean_documents_button)
+        document_store_layout.addStretch()
+        document_store_layout.addWidget(self.ingest_documents_button)
+        document_store_layout.addWidget(self.stop_ingestion_button)
+        main_layout.addWidget(document_store_group)
+
         # --- Output e Progresso ---
         output_group = QGroupBox("Output Operazione")
         output_layout = QVBoxLayout(output_group)
@@ -5273,6 +6183,162 @@ class BackupWidget(QWidget):
         main_layout.addWidget(output_group, 1)
 
         self.setLayout(main_layout)
+        self._update_backup_options()
+        self._update_incremental_schedule()
+
+    def _browse_incremental_dir(self):
+        directory = QFileDialog.getExistingDirectory(self, "Cartella delle Esportazioni Incrementali",
+                                                     self.incremental_dir_edit.text())
+        if directory:
+            self.incremental_dir_edit.setText(directory)
+            QSettings().setValue(SETTINGS_INCREMENTAL_EXPORT_DIR, directory)
+            self._update_incremental_schedule()
+
+    def _update_incremental_schedule(self):
+        minutes = self.incremental_interval_spinbox.value()
+        QSettings().setValue(SETTINGS_INCREMENTAL_EXPORT_INTERVAL, minutes)
+        if minutes and self.incremental_dir_edit.text():
+            self._incremental_timer.start(minutes * 60 * 1000)
+        else:
+            self._incremental_timer.stop()
+
+    def _start_incremental_export(self):
+        directory = self.incremental_dir_edit.text()
+        if not directory:
+            if self.sender() is self.incremental_export_button:
+                QMessageBox.warning(self, "Cartella Mancante", "Selezionare la cartella delle esportazioni incrementali.")
+            return
+        if self._incremental_thread and self._incremental_thread.isRunning():
+            return
+        if self.process.state() != QProcess.NotRunning:
+            # Un backup o un ripristino in corso: l'esportazione programmata slitta al prossimo intervallo
+            self.logger.info("Esportazione incrementale rinviata: operazione di backup/ripristino in corso.")
+            return
+        self.incremental_export_button.setEnabled(False)
+        self.incremental_status_label.setText("Esportazione in corso...")
+        self._incremental_thread = IncrementalExportThread(self.db_manager, directory, parent=self)
+        self._incremental_thread.export_finished.connect(self._handle_incremental_finished)
+        self._incremental_thread.error_occurred.connect(self._handle_incremental_error)
+        self._incremental_thread.start()
+
+    def _handle_incremental_finished(self, result: dict):
+        self.incremental_export_button.setEnabled(True)
+        now = QDateTime.currentDateTime().toString("dd/MM/yyyy HH:mm")
+        if result.get("set"):
+            message = (f"Set '{result['set']}' creato: {result['righe']} righe modificate, "
+                       f"{result['eliminazioni']} eliminazioni.")
+            self._log_to_output_box(f"Esportazione incrementale: {message}", "SUCCESS")
+        else:
+            message = "nessuna modifica da esportare."
+        self.incremental_status_label.setText(f"Ultima esportazione ({now}): {message}")
+
+    def _handle_incremental_error(self, message: str):
+        self.incremental_export_button.setEnabled(True)
+        self.incremental_status_label.setText("Ultima esportazione fallita: vedere l'area 'Output Operazione'.")
+        self._log_to_output_box(f"Errore nell'esportazione incrementale: {message}", "ERROR")
+
+    def _start_document_store_maintenance(self, operation: str):
+        if self._document_store_thread and self._document_store_thread.isRunning():
+            return
+        if operation == "migrazione" and QMessageBox.question(
+                self, "Migrazione Allegati",
+                "Gli allegati esistenti verranno spostati nell'archivio per contenuto e le vecchie copie\n"
+                "nella cartella degli allegati verranno eliminate. Si consiglia un backup prima di procedere.\n\n"
+                "Continuare?", QMessageBox.Yes | QMessageBox.No, QMessageBox.No) != QMessageBox.Yes:
+            return
+        self.migrate_documents_button.setEnabled(False)
+        self.clean_documents_button.setEnabled(False)
+        self._log_to_output_box("Migrazione degli allegati avviata..." if operation == "migrazione"
+                                else "Pulizia dell'archivio allegati avviata...", "INFO")
+        self._document_store_thread = DocumentStoreMaintenanceThread(self.db_manager, operation, parent=self)
+        self._document_store_thread.progress_updated.connect(
+            lambda done, total: self._log_to_output_box(f"Allegati elaborati: {done}/{total}", "INFO"))
+        self._document_store_thread.maintenance_finished.connect(self._handle_document_store_finished)
+        self._document_store_thread.error_occurred.connect(self._handle_document_store_error)
+        self._document_store_thread.start()
+
+    def _handle_document_store_finished(self, operation: str, result: dict):
+        self.migrate_documents_button.setEnabled(True)
+        self.clean_documents_button.setEnabled(True)
+        if operation == "migrazione":
+            message = (f"Migrazione completata: {result['migrati']} documenti migrati "
+                       f"({result['duplicati']} con contenuto già presente), {result['originali_rimossi']} vecchi file rimossi, "
+                       f"{result['mancanti']} file mancanti, {result['errori']} errori.")
+        else:
+            message = (f"Pulizia completata: {result['file']} file eliminati, "
+                       f"{result['byte'] / (1024 * 1024):.1f} MB liberati.")
+        level = "WARNING" if result.get("errori") or result.get("mancanti") else "SUCCESS"
+        self._log_to_output_box(message, level)
+        QMessageBox.information(self, "Archivio Allegati", message)
+
+    def _handle_document_store_error(self, message: str):
+        self.migrate_documents_button.setEnabled(True)
+        self.clean_documents_button.setEnabled(True)
+        self._log_to_output_box(f"Errore nella manutenzione dell'archivio allegati: {message}", "ERROR")
+        QMessageBox.critical(self, "Archivio Allegati", f"Operazione non completata:\n{message}")
+
+    def _start_document_ingestion(self):
+        if self._ingestion_thread and self._ingestion_thread.isRunning():
+            return
+        manifest_path, _ = QFileDialog.getOpenFileName(
+            self, "Seleziona il Manifest delle Scansioni", "", "Manifest (*.csv *.json);;Tutti i file (*)")
+        if not manifest_path:
+            return
+        self.ingest_documents_button.setEnabled(False)
+        self.stop_ingestion_button.setEnabled(True)
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.setVisible(True)
+        self._log_to_output_box(f"Importazione scansioni dal manifest '{os.path.basename(manifest_path)}' avviata...", "INFO")
+        self._ingestion_thread = DocumentIngestionThread(self.db_manager, manifest_path, parent=self)
+        self._ingestion_thread.progress_updated.connect(self._update_ingestion_progress)
+        self._ingestion_thread.ingestion_finished.connect(self._handle_ingestion_finished)
+        self._ingestion_thread.error_occurred.connect(self._handle_ingestion_error)
+        self._ingestion_thread.start()
+
+    def _stop_document_ingestion(self):
+        if self._ingestion_thread and self._ingestion_thread.isRunning():
+            self._ingestion_thread.requestInterruption()
+            self.stop_ingestion_button.setEnabled(False)
+            self._log_to_output_box("Interruzione richiesta: completamento dei file in corso...", "WARNING")
+
+    def _update_ingestion_progress(self, done: int, total: int):
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def _finish_document_ingestion_ui(self):
+        self.ingest_documents_button.setEnabled(True)
+        self.stop_ingestion_button.setEnabled(False)
+        self.progress_bar.setVisible(False)
+        self.progress_bar.setRange(0, 100)
+
+    def _handle_ingestion_finished(self, result: dict):
+        self._finish_document_ingestion_ui()
+        message = (f"{'Importazione interrotta' if result['interrotto'] else 'Importazione completata'}: "
+                   f"{result['importati']} documenti importati ({result['contenuti_nuovi']} file nuovi, "
+                   f"{result['byte_copiati'] / (1024 * 1024):.1f} MB copiati), {result['gia_importati']} già importati, "
+                   f"{result['errori']} errori.\nResoconto: {result['report']}")
+        self._log_to_output_box(message, "WARNING" if result["errori"] or result["interrotto"] else "SUCCESS")
+        QMessageBox.information(self, "Importazione Scansioni", message)
+
+    def _handle_ingestion_error(self, message: str):
+        self._finish_document_ingestion_ui()
+        self._log_to_output_box(f"Errore nell'importazione delle scansioni: {message}", "ERROR")
+        QMessageBox.critical(self, "Importazione Scansioni",
+                             f"Importazione interrotta:\n{message}\n\n"
+                             "I documenti già confermati restano importati: rieseguire lo stesso manifest per riprendere.")
+
+    def _update_backup_options(self):
+        """Abilita parallelismo e compressione solo per i formati che li supportano."""
+        format_type = self.backup_format_combo.currentData()
+        self.backup_jobs_spinbox.setEnabled(format_type == "directory")
+        self.compression_method_combo.setEnabled(format_type != "plain")
+        method = self.compression_method_combo.currentData()
+        levels = COMPRESSION_LEVELS.get(method)
+        self.compression_level_spinbox.setEnabled(format_type != "plain" and levels is not None)
+        if levels:
+            low, high, default = levels
+            self.compression_level_spinbox.setRange(low, high)
+            self.compression_level_spinbox.setValue(default)
 
     def _browse_backup_file_save_path(self):
         current_dbname = self.db_manager.get_current_dbname()
@@ -5280,9 +6346,13 @@ class BackupWidget(QWidget):
 
         default_filename = f"{default_db_name}_backup_{QDateTime.currentDateTime().toString('yyyyMMdd_HHmmss')}"
 
-        if self.backup_format_combo.currentIndex() == 0:
+        format_type = self.backup_format_combo.currentData()
+        if format_type == "custom":
             filter_str = "File di Backup PostgreSQL Custom (*.dump *.backup);;Tutti i file (*)"
             default_filename += ".dump"
+        elif format_type == "directory":
+            # pg_dump crea la cartella: si sceglie il nome, senza estensione
+            filter_str = "Cartella di backup (*)"
         else:
             filter_str = "File SQL (*.sql);;Tutti i file (*)"
             default_filename += ".sql"
@@ -5299,16 +6369,40 @@ class BackupWidget(QWidget):
         if filePath:
             self.restore_file_path_edit.setText(filePath)
 
+    def _browse_restore_dir_open_path(self):
+        dirPath = QFileDialog.getExistingDirectory(self, "Seleziona Cartella di Backup (formato Directory)")
+        if dirPath:
+            if not os.path.isfile(os.path.join(dirPath, "toc.dat")):
+                QMessageBox.warning(self, "Cartella Non Valida",
+                                    "La cartella selezionata non contiene un backup in formato Directory (toc.dat mancante).")
+                return
+            self.restore_file_path_edit.setText(dirPath)
+
     def _update_ui_for_process(self, is_running: bool):
         self.backup_button.setEnabled(not is_running)
         self.restore_button.setEnabled(not is_running)
+        self.verify_button.setEnabled(not is_running)
         self.progress_bar.setVisible(is_running)
         if is_running:
-            self.progress_bar.setRange(0, 0)
+            total = self._progress_tracker.total_tables if self._progress_tracker else 0
+            # Avanzamento per tabella se il totale è noto, altrimenti barra indeterminata
+            self.progress_bar.setRange(0, 100 if total else 0)
+            self.progress_bar.setValue(0)
             self.output_text_edit.clear()
         else:
+            self._progress_tracker = None
             self.progress_bar.setRange(0, 1)
             self.progress_bar.setValue(0)
+            self.progress_bar.resetFormat()
+
+    def _track_progress(self, line: str):
+        if not self._progress_tracker:
+            return
+        table = self._progress_tracker.feed_line(line)
+        percent = self._progress_tracker.percent()
+        if table and percent is not None:
+            self.progress_bar.setValue(percent)
+            self.progress_bar.setFormat(f"%p% - {table} ({self._progress_tracker.done}/{self._progress_tracker.total_tables})")
 
     # --- Modificato: Utilizza _log_to_output_box ---
     @pyqtSlot()
@@ -5322,6 +6416,7 @@ class BackupWidget(QWidget):
     def _handle_stderr(self):
         data = self.process.readAllStandardError().data().decode(errors='ignore')
         for line in data.splitlines():
+            self._track_progress(line)
             lower_line = line.lower()
             if "warning" in lower_line or "avviso" in lower_line:
                 self._log_to_output_box(line, "WARNING")
@@ -5404,8 +6499,61 @@ class BackupWidget(QWidget):
                 QMessageBox.critical(self, user_message_title, user_message_text, QMessageBox.Ok, self).exec_()
 
         else: # Non è un'operazione di ripristino (es. Backup)
+            # La verifica parte subito, in background, mentre l'utente legge l'esito
+            verify = (exitStatus == QProcess.NormalExit and exitCode == 0
+                      and self._last_backup_path and self.verify_after_backup_checkbox.isChecked())
+            if verify:
+                self._start_verification(self._last_backup_path, write_manifest=True)
+                user_message_text += "\nLa verifica del backup è in corso: l'esito comparirà nell'area 'Output Operazione'."
             QMessageBox(message_box_type, user_message_title, user_message_text, QMessageBox.Ok, self).exec_()
 
+    def _start_verification_of_selected(self):
+        backup_path = self.restore_file_path_edit.text()
+        if not backup_path or not os.path.exists(backup_path):
+            QMessageBox.warning(self, "File Mancante", "Selezionare nella sezione Ripristino il backup da verificare.")
+            return
+        self._start_verification(backup_path, write_manifest=False)
+
+    def _start_verification(self, backup_path: str, write_manifest: bool):
+        """Avvia BackupVerificationThread; con write_manifest (backup appena creato) scrive i checksum."""
+        if self._verification_thread and self._verification_thread.isRunning():
+            self._log_to_output_box("Una verifica è già in corso.", "WARNING")
+            return
+        self._update_ui_for_process(True)
+        self._log_to_output_box(f"Verifica del backup '{os.path.basename(backup_path.rstrip('/'))}' avviata...", "INFO")
+        self._verification_thread = BackupVerificationThread(
+            self.db_manager, backup_path, self.pg_restore_path_edit.text().strip(),
+            write_manifest=write_manifest, test_restore=self.test_restore_checkbox.isChecked(),
+            jobs=self.restore_jobs_spinbox.value(), parent=self)
+        self._verification_thread.progress_message.connect(lambda msg: self._log_to_output_box(msg, "INFO"))
+        self._verification_thread.verification_finished.connect(self._handle_verification_finished)
+        self._verification_thread.error_occurred.connect(self._handle_verification_error)
+        self._verification_thread.start()
+
+    def _handle_verification_finished(self, result: dict):
+        self._update_ui_for_process(False)
+        for difference in result.get("differenze", []):
+            self._log_to_output_box(f"Differenza: {difference}", "WARNING")
+        if result.get("esito"):
+            self._log_to_output_box("Verifica del backup superata.", "SUCCESS")
+            if result.get("manifest"):
+                self._log_to_output_box(f"Manifest dei checksum: {result['manifest']}", "INFO")
+            if result.get("differenze"):
+                QMessageBox.information(self, "Verifica Backup",
+                                        "Il backup è integro. Alcuni conteggi di righe differiscono dal database attuale "
+                                        "(dati modificati dopo il backup?): vedere l'area 'Output Operazione'.")
+        else:
+            for error in result.get("errori", []):
+                self._log_to_output_box(error, "ERROR")
+            QMessageBox.warning(self, "Verifica Backup Fallita",
+                                "Il backup NON ha superato la verifica e potrebbe non essere ripristinabile.\n"
+                                "Dettagli nell'area 'Output Operazione'.")
+
+    def _handle_verification_error(self, message: str):
+        self._update_ui_for_process(False)
+        self._log_to_output_box(f"Errore durante la verifica del backup: {message}", "ERROR")
+        QMessageBox.critical(self, "Errore Verifica Backup", f"La verifica del backup non è stata completata:\n{message}")
+
 
     # --- Modificato: Utilizza _log_to_output_box ---
     def _start_backup(self):
@@ -5415,7 +6563,21 @@ class BackupWidget(QWidget):
                 self, "Percorso Mancante", "Selezionare un percorso e un nome file per il backup.")
             return
 
-        if os.path.exists(backup_file):
+        format_type = self.backup_format_combo.currentData()
+        if format_type == "directory" and os.path.isdir(backup_file):
+            # pg_dump -Fd rifiuta una cartella non vuota: si elimina solo un precedente backup
+            if os.listdir(backup_file) and not os.path.isfile(os.path.join(backup_file, "toc.dat")):
+                QMessageBox.warning(self, "Cartella Non Vuota",
+                                    f"La cartella '{os.path.basename(backup_file)}' esiste e non è un backup.\n"
+                                    "Scegliere un nome di cartella nuovo.")
+                return
+            reply = QMessageBox.question(self, "Conferma Sovrascrittura",
+                                        f"La cartella di backup '{os.path.basename(backup_file)}' esiste già.\nVuoi sovrascriverla?",
+                                        QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply == QMessageBox.No:
+                return
+            shutil.rmtree(backup_file)
+        elif os.path.exists(backup_file):
             reply = QMessageBox.question(self, "Conferma Sovrascrittura",
                                         f"Il file '{os.path.basename(backup_file)}' esiste già.\nVuoi sovrascriverlo?",
                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
@@ -5439,6 +6601,10 @@ class BackupWidget(QWidget):
             self._update_ui_for_process(False)
             return
 
+        # Il formato plain non usa --verbose: nessun avanzamento per tabella
+        total_tables = self.db_manager.count_tables_for_backup() if format_type != "plain" else 0
+        self._progress_tracker = BackupProgressTracker(total_tables)
+        self._last_backup_path = backup_file
         self._update_ui_for_process(True)
         self.output_text_edit.clear()
         self._log_to_output_box(f"Avvio backup su: {backup_file}...", "INFO")
@@ -5446,8 +6612,11 @@ class BackupWidget(QWidget):
         command_parts = self.db_manager.get_backup_command_parts(
             backup_file_path=backup_file,
             pg_dump_executable_path_ui=self.pg_dump_path_edit.text().strip(),
-            format_type="custom" if self.backup_format_combo.currentIndex() == 0 else "plain",
-            include_blobs=False
+            format_type=format_type,
+            include_blobs=False,
+            jobs=self.backup_jobs_spinbox.value(),
+            compression_method=self.compression_method_combo.currentData(),
+            compression_level=self.compression_level_spinbox.value() if self.compression_level_spinbox.isEnabled() else None
         )
 
         if not command_parts:
@@ -5541,6 +6710,10 @@ class BackupWidget(QWidget):
             self._update_ui_for_process(False)
             return
 
+        total_tables = 0
+        if os.path.isdir(restore_file) or not restore_file.lower().endswith(".sql"):
+            total_tables = self.db_manager.count_backup_table_entries(restore_file, self.pg_restore_path_edit.text().strip())
+        self._progress_tracker = BackupProgressTracker(total_tables)
         self._update_ui_for_process(True)
         self.output_text_edit.clear()
         self._log_to_output_box(
@@ -5565,7 +6738,8 @@ class BackupWidget(QWidget):
 
         command_parts = self.db_manager.get_restore_command_parts(
             backup_file_path=restore_file,
-            pg_tool_executable_path_ui=self.pg_restore_path_edit.text().strip()
+            pg_tool_executable_path_ui=self.pg_restore_path_edit.text().strip(),
+            jobs=self.restore_jobs_spinbox.value()
         )
 
         if not command_parts:
@@ -6187,6 +7361,7 @@ class UnifiedFuzzySearchWidget(QWidget):
             return
 
         try:
+            from pdf_table import BulkReportPDF
             pdf = BulkReportPDF(report_title=f"Risultati Ricerca Fuzzy per '{query_text}'")
             pdf.alias_nb_pages()
             pdf.set_font('Times', '', 12)
@@ -6467,7 +7642,30 @@ class RegistraConsultazioneWidget(QWidget):
 # In gui_widgets.py, puoi commentare o eliminare la vecchia classe LandingPageWidget
 # e aggiungere questa nuova classe.
 
+class DashboardStatsThread(QThread):
+    """Conteggi della dashboard in background (sola lettura: i contatori sono compattati da chi scrive)."""
+    stats_ready = pyqtSignal(dict)
+    error_occurred = pyqtSignal(str)
+
+    def __init__(self, db_manager: 'CatastoDBManager', approximate: bool = False, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.approximate = approximate
+        self.logger = logging.getLogger(f"CatastoGUI.{self.__class__.__name__}")
+
+    def run(self):
+        try:
+            self.stats_ready.emit(self.db_manager.get_dashboard_stats(approximate=self.approximate))
+        except Exception as e:
+            self.logger.error(f"Errore nel caricamento delle statistiche della dashboard: {e}", exc_info=True)
+            self.error_occurred.emit(str(e))
+
+
 class DashboardWidget(QWidget):
+    # Entità (vedi invalidation_bus) da cui dipendono i conteggi e le attività recenti
+    STATS_ENTITIES = ("comune", "partita", "possessore", "immobile")
+    SESSION_LOG_ENTITY = "sessione"
+    SESSION_LOG_LIMIT = 5
     # Segnali per navigare ad altri tab (manteniamo la logica)
     go_to_tab_signal = pyqtSignal(str, str) # Segnale emetterà (nome_tab_principale, nome_sotto_tab)
     # --- INIZIO MODIFICA ---
@@ -6482,6 +7680,10 @@ class DashboardWidget(QWidget):
         
         self.logger = logging.getLogger(f"CatastoGUI.{self.__class__.__name__}")
         self.is_admin = self.current_user_info.get('ruolo') == 'admin' if self.current_user_info else False
+        self._stats_thread: Optional[DashboardStatsThread] = None
+        self._stats_refresh_pending = False
+        # Modifiche ricevute mentre la dashboard non è visibile: applicate alla comparsa
+        self._pending_entities: set = set()
         self._initUI()
         self.load_initial_data() # Lazy loading
 
@@ -6517,6 +7719,20 @@ class DashboardWidget(QWidget):
         stats_layout.addWidget(self.stat_possessori_label); stats_layout.addWidget(self.stat_immobili_label)
         main_layout.addLayout(stats_layout)
 
+        stats_options_layout = QHBoxLayout()
+        self.stats_source_label = QLabel("")
+        self.stats_source_label.setStyleSheet("color: gray;")
+        self.approximate_counts_check = QCheckBox("Conteggi stimati")
+        self.approximate_counts_check.setToolTip(
+            "Usa le stime del pianificatore di PostgreSQL (aggiornate da ANALYZE) invece dei contatori esatti.")
+        self.approximate_counts_check.setChecked(
+            QSettings().value(SETTINGS_DASHBOARD_APPROXIMATE_COUNTS, False, type=bool))
+        self.approximate_counts_check.toggled.connect(self._on_approximate_counts_toggled)
+        stats_options_layout.addWidget(self.stats_source_label)
+        stats_options_layout.addStretch()
+        stats_options_layout.addWidget(self.approximate_counts_check)
+        main_layout.addLayout(stats_options_layout)
+
         # 4. Attività Recenti e Azioni Rapide
         bottom_layout = QHBoxLayout()
         
@@ -6577,18 +7793,21 @@ class DashboardWidget(QWidget):
     def load_initial_data(self):
         """Carica tutti i dati necessari per la dashboard."""
         self.logger.info("Caricamento dati per la Dashboard...")
-        # La parte delle statistiche rimane invariata
-        stats = self.db_manager.get_dashboard_stats()
-        self.stat_comuni_label.setText(f"<h3>Comuni</h3><p style='font-size: 24pt; font-weight: bold;'>{stats.get('total_comuni', 0)}</p>")
-        self.stat_partite_label.setText(f"<h3>Partite</h3><p style='font-size: 24pt; font-weight: bold;'>{stats.get('total_partite', 0)}</p>")
-        self.stat_possessori_label.setText(f"<h3>Possessori</h3><p style='font-size: 24pt; font-weight: bold;'>{stats.get('total_possessori', 0)}</p>")
-        self.stat_immobili_label.setText(f"<h3>Immobili</h3><p style='font-size: 24pt; font-weight: bold;'>{stats.get('total_immobili', 0)}</p>")
-
-        # Carica gli ultimi log di sessione
-        session_logs = self.db_manager.get_recent_session_logs(limit=5)
-        
-        self.audit_table.setRowCount(len(session_logs))
-        for row, log in enumerate(session_logs):
+        # I conteggi arrivano dal thread: la dashboard si mostra subito
+        self.refresh_stats()
+
+        self._load_session_logs()
+
+    def _load_session_logs(self):
+        """
+        Ultimi eventi di sessione. Si rilegge sempre l'intera finestra (poche righe su
+        indice): un logout modifica righe già mostrate e più eventi possono avere lo
+        stesso data_login, quindi un filtro "successivi all'ultimo" ne perderebbe.
+        """
+        logs = self.db_manager.get_recent_session_logs(limit=self.SESSION_LOG_LIMIT)
+
+        self.audit_table.setRowCount(len(logs))
+        for row, log in enumerate(logs):
             # --- INIZIO MODIFICA DEFINITIVA ---
             # Usiamo le chiavi corrette ('data_login' e 'indirizzo_ip') restituite dalla query
             ts = log.get('data_login')
@@ -6607,6 +7826,60 @@ class DashboardWidget(QWidget):
             
         self.audit_table.resizeColumnsToContents()
 
+    def handle_entities_changed(self, entities):
+        """
+        Chiamato dalla finestra principale con le entità modificate (notifiche del bus,
+        anche da altri client): aggiorna solo conteggi e/o attività recenti. Se la
+        dashboard non è visibile le modifiche vengono applicate alla prossima comparsa.
+        """
+        if not self.isVisible():
+            self._pending_entities |= set(entities)
+            return
+        entities = set(entities)
+        if "*" in entities or entities & set(self.STATS_ENTITIES):
+            self.refresh_stats()
+        if "*" in entities or self.SESSION_LOG_ENTITY in entities:
+            self._load_session_logs()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self._pending_entities:
+            entities, self._pending_entities = self._pending_entities, set()
+            self.handle_entities_changed(entities)
+
+    def refresh_stats(self):
+        """Aggiorna i conteggi in background; le richieste durante un caricamento ne producono uno solo successivo."""
+        if self._stats_thread is not None and self._stats_thread.isRunning():
+            self._stats_refresh_pending = True
+            return
+        self._stats_refresh_pending = False
+        self._stats_thread = DashboardStatsThread(
+            self.db_manager, approximate=self.approximate_counts_check.isChecked(), parent=self)
+        self._stats_thread.stats_ready.connect(self._on_stats_ready)
+        self._stats_thread.finished.connect(self._on_stats_thread_finished)
+        self._stats_thread.start()
+
+    def _on_stats_thread_finished(self):
+        if self._stats_refresh_pending:
+            self.refresh_stats()
+
+    def _on_stats_ready(self, stats: Dict[str, Any]):
+        for label, title, key in ((self.stat_comuni_label, "Comuni", 'total_comuni'),
+                                  (self.stat_partite_label, "Partite", 'total_partite'),
+                                  (self.stat_possessori_label, "Possessori", 'total_possessori'),
+                                  (self.stat_immobili_label, "Immobili", 'total_immobili')):
+            value = f"{stats.get(key, 0):,}".replace(",", ".")
+            prefix = "~" if str(stats.get('fonte', '')).startswith("stime") else ""
+            label.setText(f"<h3>{title}</h3><p style='font-size: 24pt; font-weight: bold;'>{prefix}{value}</p>")
+        fonti = {"contatori": "Conteggi esatti", "stime": "Stime del pianificatore (aggiornate da ANALYZE)",
+                 "stime e contatori": "Stime del pianificatore e conteggi esatti", "conteggio": "Conteggi esatti"}
+        self.stats_source_label.setText(
+            f"{fonti.get(stats.get('fonte'), '')} - aggiornati alle {datetime.now().strftime('%H:%M:%S')}")
+
+    def _on_approximate_counts_toggled(self, checked: bool):
+        QSettings().setValue(SETTINGS_DASHBOARD_APPROXIMATE_COUNTS, checked)
+        self.refresh_stats()
+
     def _avvia_ricerca_globale(self):
         """Emette un segnale per passare al tab di ricerca globale e inserire il testo."""
         testo_ricerca = self.search_edit.text().strip()
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+"""
+Esportazioni logiche incrementali
+=================================
+Tra un backup completo e l'altro, esporta solo le righe cambiate dall'ultima
+esportazione in "set di modifiche" append-only, riapplicabili a un altro database.
+
+- Righe inserite/modificate: data_modifica (mantenuta da update_modified_column)
+  oppure un'operazione 'I'/'U' in audit_log (per le tabelle senza trigger di
+  aggiornamento del timestamp). Le tabelle senza data_modifica (periodo_storico,
+  tipo_localita, nome_storico: piccole) vengono esportate per intero.
+- Righe eliminate: operazioni 'D' in audit_log.
+- Ogni set parte da (fine del set precedente - sovrapposizione): una transazione
+  iniziata prima della fine del set precedente ma confermata dopo non va persa.
+  Le righe esportate due volte non sono un problema, perché la riapplicazione è
+  idempotente (upsert per id, DELETE per id).
+- La prima esportazione di una cartella è completa (baseline).
+
+Struttura della cartella di destinazione:
+    000001_20261019_140000/      un set per esportazione, mai modificato dopo la creazione
+        <tabella>.jsonl          una riga JSON per record (to_jsonb della riga)
+        eliminazioni.jsonl       {"tabella": ..., "id": ...}
+        manifest.json            intervallo, conteggi, versione del formato
+    checkpoint.json              ultimo set scritto (fine dell'intervallo)
+
+Sul database di destinazione l'ultimo set applicato è in app_metadata
+(chiave REPLAY_METADATA_KEY); la riapplicazione usa jsonb_populate_recordset,
+quindi le conversioni di tipo le fa PostgreSQL. I trigger del database di
+destinazione restano attivi: data_modifica dei record aggiornati riporta l'ora
+della riapplicazione.
+
+Uso da riga di comando (per Utilità di pianificazione di Windows o cron):
+    python incremental_export.py esporta   --dsn "host=... dbname=catasto_storico user=..." --cartella D:\\incrementali
+    python incremental_export.py riapplica --dsn "host=... dbname=catasto_copia user=..."   --cartella D:\\incrementali
+La password si passa con la variabile d'ambiente PGPASSWORD.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import psycopg2
+from psycopg2 import sql
+
+logger = logging.getLogger("CatastoGUI.incremental_export")
+
+FORMAT_VERSION = 1
+# Ordine compatibile con le chiavi esterne: DELETE in ordine inverso (prima), poi upsert in quest'ordine.
+# documento_partita (chiave primaria composta) non è gestita.
+EXPORT_TABLES = (
+    "periodo_storico", "tipo_localita", "comune", "registro_partite", "registro_matricole",
+    "partita", "possessore", "partita_possessore", "localita", "immobile", "partita_relazione",
+    "variazione", "contratto", "consultazione", "nome_storico", "documento_storico",
+)
+DEFAULT_OVERLAP_SECONDS = 600
+CHECKPOINT_FILE = "checkpoint.json"
+MANIFEST_FILE = "manifest.json"
+DELETES_FILE = "eliminazioni.jsonl"
+REPLAY_METADATA_KEY = "incrementale_ultimo_set_applicato"
+_SET_NAME_RE = re.compile(r"^(\d{6})_\d{8}_\d{6}$")
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+_REPLAY_BATCH_SIZE = 500
+_EXPORT_FETCH_SIZE = 2000
+
+
+# ---------------------------------------------------------------------------
+# Cartella dei set di modifiche (nessun accesso al database)
+# ---------------------------------------------------------------------------
+def set_name(sequence: int, until: datetime) -> str:
+    return f"{sequence:06d}_{until.strftime('%Y%m%d_%H%M%S')}"
+
+
+def list_change_sets(directory: str) -> List[str]:
+    """Nomi dei set completi presenti nella cartella, in ordine di creazione."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory)
+                  if _SET_NAME_RE.match(name) and os.path.isfile(os.path.join(directory, name, MANIFEST_FILE)))
+
+
+def read_checkpoint(directory: str) -> Optional[Dict[str, Any]]:
+    """{'sequence', 'set', 'until' (datetime)} dell'ultimo set scritto, o None per una cartella nuova."""
+    path = os.path.join(directory, CHECKPOINT_FILE)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data["until"] = datetime.strptime(data["until"], _TIMESTAMP_FORMAT)
+    return data
+
+
+def export_window_start(checkpoint: Optional[Dict[str, Any]],
+                        overlap_seconds: int = DEFAULT_OVERLAP_SECONDS) -> Optional[datetime]:
+    """Inizio dell'intervallo da esportare (None = esportazione completa)."""
+    if checkpoint is None:
+        return None
+    return checkpoint["until"] - timedelta(seconds=max(0, overlap_seconds))
+
+
+def _start_change_set(directory: str, sequence: int, until: datetime):
+    """Crea la cartella temporanea del set. Restituisce (nome, percorso temporaneo)."""
+    os.makedirs(directory, exist_ok=True)
+    name = set_name(sequence, until)
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    os.makedirs(tmp_path, exist_ok=False)
+    return name, tmp_path
+
+
+def _write_jsonl(path: str, rows: Iterable[Any]) -> int:
+    """Scrive le righe man mano che arrivano (il file si crea solo alla prima). Restituisce il conteggio."""
+    count = 0
+    f = None
+    try:
+        for row in rows:
+            if f is None:
+                f = open(path, "w", encoding="utf-8")
+            f.write((row if isinstance(row, str) else json.dumps(row, ensure_ascii=False)) + "\n")
+            count += 1
+    finally:
+        if f is not None:
+            f.close()
+    return count
+
+
+def _finish_change_set(directory: str, name: str, tmp_path: str, sequence: int, since: Optional[datetime],
+                       until: datetime, counts: Dict[str, int], deletes_count: int,
+                       full_tables: Iterable[str]) -> str:
+    """Scrive il manifest, rende visibile il set (rename) e aggiorna checkpoint.json."""
+    manifest = {
+        "versione_formato": FORMAT_VERSION,
+        "sequenza": sequence,
+        "da": since.strftime(_TIMESTAMP_FORMAT) if since else None,
+        "a": until.strftime(_TIMESTAMP_FORMAT),
+        "righe": {table: count for table, count in counts.items() if count},
+        "eliminazioni": deletes_count,
+        "tabelle_complete": sorted(full_tables),
+    }
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.rename(tmp_path, os.path.join(directory, name))
+
+    checkpoint_tmp = os.path.join(directory, CHECKPOINT_FILE + ".tmp")
+    with open(checkpoint_tmp, "w", encoding="utf-8") as f:
+        json.dump({"sequence": sequence, "set": name, "until": until.strftime(_TIMESTAMP_FORMAT)}, f)
+    os.replace(checkpoint_tmp, os.path.join(directory, CHECKPOINT_FILE))
+    return name
+
+
+def write_change_set(directory: str, sequence: int, since: Optional[datetime], until: datetime,
+                     rows: Dict[str, List[Any]], deletes: List[Dict[str, Any]],
+                     full_tables: Iterable[str] = ()) -> str:
+    """
+    Scrive un set (prima in una cartella temporanea, poi rinominata: un set visibile
+    è sempre completo) e aggiorna checkpoint.json. Restituisce il nome del set.
+    `rows` contiene oggetti JSON già serializzati (str) o dict.
+    """
+    name, tmp_path = _start_change_set(directory, sequence, until)
+    counts = {table: _write_jsonl(os.path.join(tmp_path, f"{table}.jsonl"), table_rows)
+              for table, table_rows in rows.items()}
+    deletes_count = _write_jsonl(os.path.join(tmp_path, DELETES_FILE), deletes)
+    return _finish_change_set(directory, name, tmp_path, sequence, since, until, counts, deletes_count, full_tables)
+
+
+def load_change_set(directory: str, name: str) -> Dict[str, Any]:
+    """{'manifest', 'rows': {tabella: [dict]}, 'deletes': [dict]} di un set."""
+    path = os.path.join(directory, name)
+    with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("versione_formato") != FORMAT_VERSION:
+        raise ValueError(f"Set '{name}': versione del formato non supportata ({manifest.get('versione_formato')}).")
+    rows: Dict[str, List[Dict[str, Any]]] = {}
+    for table in manifest.get("righe", {}):
+        with open(os.path.join(path, f"{table}.jsonl"), "r", encoding="utf-8") as f:
+            rows[table] = [json.loads(line) for line in f if line.strip()]
+    deletes: List[Dict[str, Any]] = []
+    if manifest.get("eliminazioni"):
+        with open(os.path.join(path, DELETES_FILE), "r", encoding="utf-8") as f:
+            deletes = [json.loads(line) for line in f if line.strip()]
+    return {"manifest": manifest, "rows": rows, "deletes": deletes}
+
+
+def pending_change_sets(directory: str, last_applied: Optional[str]) -> List[str]:
+    """Set successivi a `last_applied` (tutti se None)."""
+    return [name for name in list_change_sets(directory) if last_applied is None or name > last_applied]
+
+
+# ---------------------------------------------------------------------------
+# Esportazione
+# ---------------------------------------------------------------------------
+def _table_columns(cur, schema: str, table: str) -> List[str]:
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = %s AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """, (schema, table))
+    return [row[0] for row in cur.fetchall()]
+
+
+def export_changes(conn, directory: str, schema: str = "catasto",
+                   overlap_seconds: int = DEFAULT_OVERLAP_SECONDS,
+                   progress_callback: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Esporta le modifiche successive all'ultimo set della cartella.
+    `conn` deve essere in una transazione REPEATABLE READ (tutte le tabelle lette
+    dalla stessa istantanea, quindi chiavi esterne coerenti): la funzione non fa commit.
+    Le righe sono lette da cursori lato server e scritte man mano nei file del set:
+    in memoria c'è solo un blocco di _EXPORT_FETCH_SIZE righe alla volta.
+    Restituisce {'set', 'righe', 'eliminazioni', 'da', 'a'}; 'set' è None se non c'era
+    nulla da esportare (nessun set vuoto viene scritto).
+    """
+    checkpoint = read_checkpoint(directory)
+    since = export_window_start(checkpoint, overlap_seconds)
+    sequence = (checkpoint["sequence"] + 1) if checkpoint else 1
+    queries: Dict[str, sql.Composable] = {}
+    full_tables: List[str] = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT LOCALTIMESTAMP;")
+        until = cur.fetchone()[0]
+        audit_available = bool(_table_columns(cur, schema, "audit_log"))
+        for table in EXPORT_TABLES:
+            columns = _table_columns(cur, schema, table)
+            if "id" not in columns:
+                continue
+            table_ident = sql.Identifier(schema, table)
+            incremental = since is not None and "data_modifica" in columns
+            if incremental:
+                audit_filter = sql.SQL("")
+                if audit_available:
+                    audit_filter = sql.SQL(
+                        " OR t.id IN (SELECT record_id FROM {} WHERE tabella = %(tabella)s "
+                        "AND operazione IN ('I', 'U') AND timestamp >= %(da)s)"
+                    ).format(sql.Identifier(schema, "audit_log"))
+                queries[table] = sql.SQL(
+                    "SELECT to_jsonb(t)::text FROM {} t WHERE t.data_modifica >= %(da)s{} ORDER BY t.id"
+                ).format(table_ident, audit_filter)
+            else:
+                if since is not None:
+                    full_tables.append(table)
+                queries[table] = sql.SQL("SELECT to_jsonb(t)::text FROM {} t ORDER BY t.id").format(table_ident)
+
+        deletes: List[Dict[str, Any]] = []
+        if since is not None and audit_available:
+            cur.execute(sql.SQL("""
+                SELECT tabella, record_id FROM {} WHERE operazione = 'D' AND record_id IS NOT NULL
+                  AND tabella = ANY(%s) AND timestamp >= %s ORDER BY id
+            """).format(sql.Identifier(schema, "audit_log")), (list(EXPORT_TABLES), since))
+            deletes = [{"tabella": table, "id": record_id} for table, record_id in cur.fetchall()]
+
+    name, tmp_path = _start_change_set(directory, sequence, until)
+    try:
+        counts: Dict[str, int] = {}
+        for table, query in queries.items():
+            with conn.cursor(name=f"incrementale_{table}") as cur:
+                cur.itersize = _EXPORT_FETCH_SIZE
+                cur.execute(query, {"tabella": table, "da": since})
+                counts[table] = _write_jsonl(os.path.join(tmp_path, f"{table}.jsonl"), (row[0] for row in cur))
+            if progress_callback and counts[table]:
+                progress_callback(f"{table}: {counts[table]} righe")
+        deletes_count = _write_jsonl(os.path.join(tmp_path, DELETES_FILE), deletes)
+
+        # Le tabelle esportate per intero (riferimento) non bastano da sole a giustificare un set
+        changed = sum(count for table, count in counts.items() if table not in full_tables)
+        result = {"set": None, "righe": changed, "eliminazioni": deletes_count, "da": since, "a": until}
+        if checkpoint is not None and not changed and not deletes_count:
+            shutil.rmtree(tmp_path)
+            logger.info("Esportazione incrementale: nessuna modifica dall'ultimo set.")
+            return result
+        result["set"] = _finish_change_set(directory, name, tmp_path, sequence, since, until,
+                                           counts, deletes_count, full_tables)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    logger.info(f"Esportazione incrementale '{result['set']}': {changed} righe, {deletes_count} eliminazioni.")
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Riapplicazione
+# ---------------------------------------------------------------------------
+def get_last_applied_set(conn, schema: str = "catasto") -> Optional[str]:
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("SELECT value_text FROM {} WHERE key = %s").format(sql.Identifier(schema, "app_metadata")),
+                    (REPLAY_METADATA_KEY,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _apply_upserts(cur, schema: str, table: str, table_rows: List[Dict[str, Any]]):
+    columns = _table_columns(cur, schema, table)
+    if not columns:
+        raise ValueError(f"Tabella '{schema}.{table}' assente nel database di destinazione.")
+    column_list = sql.SQL(", ").join(sql.Identifier(c) for c in columns)
+    updates = sql.SQL(", ").join(sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in columns if c != "id")
+    query = sql.SQL(
+        "INSERT INTO {table} ({cols}) SELECT {cols} FROM jsonb_populate_recordset(NULL::{table}, %s::jsonb) "
+        "ON CONFLICT (id) DO UPDATE SET {updates}"
+    ).format(table=sql.Identifier(schema, table), cols=column_list, updates=updates)
+    for start in range(0, len(table_rows), _REPLAY_BATCH_SIZE):
+        cur.execute(query, (json.dumps(table_rows[start:start + _REPLAY_BATCH_SIZE], ensure_ascii=False),))
+
+
+def replay_changes(conn, directory: str, schema: str = "catasto",
+                   progress_callback: Optional[Callable[[str], None]] = None) -> List[str]:
+    """
+    Applica al database di `conn` i set non ancora applicati, uno per transazione
+    (insieme all'aggiornamento di app_metadata). Restituisce i nomi dei set applicati.
+    In caso di errore il set corrente viene annullato e l'eccezione propagata.
+    """
+    applied: List[str] = []
+    for name in pending_change_sets(directory, get_last_applied_set(conn, schema)):
+        change_set = load_change_set(directory, name)
+        try:
+            with conn.cursor() as cur:
+                # Prima le eliminazioni: una riga ricreata con un nuovo id e la stessa chiave
+                # naturale (es. nome del comune) violerebbe il vincolo di unicità se la
+                # vecchia fosse ancora presente. Un id eliminato non compare tra le righe
+                # dello stesso set (gli id non vengono riutilizzati).
+                for table in reversed(EXPORT_TABLES):
+                    ids = [item["id"] for item in change_set["deletes"] if item["tabella"] == table]
+                    if ids:
+                        cur.execute(sql.SQL("DELETE FROM {} WHERE id = ANY(%s)").format(sql.Identifier(schema, table)), (ids,))
+                for table in EXPORT_TABLES:
+                    if change_set["rows"].get(table):
+                        _apply_upserts(cur, schema, table, change_set["rows"][table])
+                for table in change_set["rows"]:
+                    cur.execute(sql.SQL(
+                        "SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST((SELECT MAX(id) FROM {}), 1)) "
+                        "WHERE pg_get_serial_sequence(%s, 'id') IS NOT NULL"
+                    ).format(sql.Identifier(schema, table)), (f"{schema}.{table}", f"{schema}.{table}"))
+                cur.execute(sql.SQL(
+                    "INSERT INTO {} (key, value_text, value_timestamp) VALUES (%s, %s, now()) "
+                    "ON CONFLICT (key) DO UPDATE SET value_text = EXCLUDED.value_text, value_timestamp = EXCLUDED.value_timestamp"
+                ).format(sql.Identifier(schema, "app_metadata")), (REPLAY_METADATA_KEY, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(name)
+        logger.info(f"Set di modifiche '{name}' applicato.")
+        if progress_callback:
+            progress_callback(f"Set '{name}' applicato.")
+    return applied
+
+
+def _main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Esportazioni incrementali del database catasto.")
+    parser.add_argument("comando", choices=["esporta", "riapplica"])
+    parser.add_argument("--dsn", required=True, help="Stringa di connessione libpq (password in PGPASSWORD).")
+    parser.add_argument("--cartella", required=True, help="Cartella dei set di modifiche.")
+    parser.add_argument("--schema", default="catasto")
+    parser.add_argument("--sovrapposizione", type=int, default=DEFAULT_OVERLAP_SECONDS,
+                        help="Secondi di sovrapposizione con il set precedente.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        if args.comando == "esporta":
+            conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+            result = export_changes(conn, args.cartella, args.schema, args.sovrapposizione)
+            conn.rollback()
+            print(result["set"] or "Nessuna modifica da esportare.")
+        else:
+            applied = replay_changes(conn, args.cartella, args.schema)
+            print(f"Set applicati: {len(applied)}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(_main())
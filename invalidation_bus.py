@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Bus di invalidazione delle cache
+================================
+I trigger di sql_scripts/24_notifiche_invalidazione.sql inviano su
+INVALIDATION_CHANNEL un payload 'entita:id' (es. 'comune:12') a ogni modifica
+delle tabelle principali, oppure 'entita:*' quando cambia l'intera tabella o
+un'istruzione modifica più di 50 record (caricamenti massivi).
+
+InvalidationBus smista le notifiche alle cache registrate nel processo
+(subscribe per tipo di entità, subscribe_all per tutto); NotificationListener
+resta in ascolto su una connessione dedicata, esterna al pool, e consegna i
+payload di uno o più canali. Nessuna dipendenza da Qt: il ponte verso i segnali
+dei widget è in CatastoDBManager (DBChangeNotifier).
+"""
+
+import logging
+import select
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("CatastoGUI.invalidation_bus")
+
+INVALIDATION_CHANNEL = "catasto_invalidazioni"
+ALL = "*"   # come entità: tutte le entità (es. dopo una disconnessione); come ID: tutti i record
+
+InvalidationCallback = Callable[[str, Optional[int]], None]
+
+
+def parse_payload(payload: str) -> Tuple[str, Optional[int]]:
+    """'comune:12' -> ('comune', 12); 'comune:*' o 'comune' -> ('comune', None)."""
+    entity, _, entity_id = (payload or "").strip().partition(":")
+    entity = entity.strip() or ALL
+    entity_id = entity_id.strip()
+    return entity, int(entity_id) if entity_id.isdigit() else None
+
+
+class InvalidationBus:
+    """Registro dei callback (entita, id) per tipo di entità. Thread-safe."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[InvalidationCallback]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, entity: str, callback: InvalidationCallback):
+        """Registra il callback per un tipo di entità (ALL per riceverle tutte)."""
+        with self._lock:
+            callbacks = self._subscribers.setdefault(entity, [])
+            if callback not in callbacks:
+                callbacks.append(callback)
+
+    def subscribe_all(self, callback: InvalidationCallback):
+        self.subscribe(ALL, callback)
+
+    def unsubscribe(self, callback: InvalidationCallback):
+        with self._lock:
+            for callbacks in self._subscribers.values():
+                if callback in callbacks:
+                    callbacks.remove(callback)
+
+    def publish(self, entity: str, entity_id: Optional[int] = None):
+        """
+        Consegna un'invalidazione ai callback dell'entità e a quelli registrati su ALL.
+        Con entity == ALL vengono chiamati tutti i callback (con entity_id None).
+        """
+        with self._lock:
+            if entity == ALL:
+                targets = [(name, cb) for name, cbs in self._subscribers.items() for cb in cbs]
+            else:
+                targets = [(entity, cb) for cb in self._subscribers.get(entity, [])]
+                targets += [(entity, cb) for cb in self._subscribers.get(ALL, [])]
+        for name, callback in targets:
+            try:
+                callback(name, entity_id)
+            except Exception as e:
+                logger.error(f"Errore nel callback di invalidazione per '{name}': {e}", exc_info=True)
+
+    def handle_notification(self, payload: str):
+        """Callback per il canale INVALIDATION_CHANNEL."""
+        entity, entity_id = parse_payload(payload)
+        logger.debug(f"Invalidazione ricevuta: {entity} (ID: {entity_id if entity_id is not None else 'tutti'}).")
+        self.publish(entity, entity_id)
+
+    def invalidate_all(self):
+        """Usato quando le notifiche potrebbero essere andate perse (connessione di ascolto caduta)."""
+        logger.info("Invalidazione completa di tutte le cache registrate.")
+        self.publish(ALL)
+
+
+class NotificationListener(threading.Thread):
+    """
+    Thread demone che esegue LISTEN sui canali di `handlers` ({canale: callback(payload)}).
+    `connect` restituisce una nuova connessione psycopg2 (non presa dal pool).
+    Se la connessione cade si ritenta ogni `retry_interval` secondi; quando l'ascolto
+    riprende viene chiamato `on_resync`, perché le notifiche inviate nel frattempo
+    sono perse e le cache vanno svuotate.
+    """
+
+    def __init__(self, connect: Callable[[], Any], handlers: Dict[str, Callable[[str], None]],
+                 on_resync: Optional[Callable[[], None]] = None,
+                 poll_interval: float = 5.0, retry_interval: float = 30.0):
+        super().__init__(name="Listener-" + ",".join(handlers), daemon=True)
+        self._connect = connect
+        self._handlers = dict(handlers)
+        self._on_resync = on_resync
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self._stop_event = threading.Event()
+        self._conn = None
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        lost_connection = False
+        while not self._stop_event.is_set():
+            try:
+                self._conn = self._connect()
+                self._conn.autocommit = True
+                with self._conn.cursor() as cur:
+                    for channel in self._handlers:
+                        cur.execute(f"LISTEN {channel};")
+                logger.info(f"In ascolto sui canali: {', '.join(self._handlers)}.")
+                if lost_connection and self._on_resync:
+                    self._on_resync()
+                lost_connection = False
+                self._listen_loop()
+            except Exception as e:
+                logger.warning(f"Ascolto delle notifiche interrotto: {e}")
+                lost_connection = True
+                self._stop_event.wait(self.retry_interval)
+            finally:
+                self._close_connection()
+
+    def _listen_loop(self):
+        conn = self._conn
+        while not self._stop_event.is_set():
+            if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                handler = self._handlers.get(notify.channel)
+                if handler is None:
+                    continue
+                try:
+                    handler(notify.payload)
+                except Exception as e:
+                    logger.error(f"Errore nella gestione della notifica su '{notify.channel}': {e}", exc_info=True)
+
+    def _close_connection(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
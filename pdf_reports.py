@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Classi PDF dei report testuali (dettaglio partita, dettaglio possessore, report generico).
+Spostate da app_utils.py: fpdf (con Pillow e fontTools) si carica solo quando
+serve davvero un PDF, non all'avvio dell'applicazione.
+"""
+import logging
+
+try:
+    from fpdf import FPDF
+    from fpdf.enums import XPos, YPos
+    FPDF_AVAILABLE = True
+except ImportError:
+    FPDF_AVAILABLE = False
+    # Definizioni fallback
+    class FPDF: pass
+    class PDFPartita: pass
+    class PDFPossessore: pass
+    class GenericTextReportPDF: pass
+
+
+if FPDF_AVAILABLE:
+    class PDFPartita(FPDF):
+        def header(self):
+            self.set_font('Helvetica', 'B', 12)
+            self.cell(0, 10, 'Dettaglio Partita Catastale', 0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+            self.ln(5)
+
+        def footer(self):
+            self.set_y(-15)  # Posizione a 1.5 cm dal fondo
+            self.set_font('Helvetica', 'I', 8)  # Font in corsivo e più piccolo
+
+            # Aggiungi la dicitura
+            disclaimer = "Il presente report ha valore puramente storico e documentale."
+            self.cell(0, 5, disclaimer, align='C', new_x='LMARGIN', new_y='NEXT')
+
+            # Aggiungi il numero di pagina sotto la dicitura
+            self.cell(0, 5, f'Pagina {self.page_no()}/{{nb}}', align='C')
+
+        def chapter_title(self, title):
+            self.set_font('Helvetica', 'B', 12)
+            self.cell(0, 6, title, 0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+            self.ln(2)
+
+        def chapter_body(self, data_dict):
+            self.set_font('Helvetica', '', 10)
+            page_width = self.w - self.l_margin - self.r_margin
+            for key, value in data_dict.items():
+                text_to_write = f"{key.replace('_', ' ').title()}: {value if value is not None else 'N/D'}"
+                self.multi_cell(page_width, 5, text_to_write, border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            self.ln(2)
+
+        def simple_table(self, headers, data_rows, col_widths_percent=None):
+            self.set_font('Helvetica', 'B', 9)  # Header in grassetto
+            effective_page_width = self.w - self.l_margin - self.r_margin
+
+            if col_widths_percent:
+                col_widths = [effective_page_width *
+                              (p/100) for p in col_widths_percent]
+            else:
+                num_cols = len(headers)
+                default_col_width = effective_page_width / \
+                    num_cols if num_cols > 0 else effective_page_width
+                col_widths = [default_col_width] * num_cols
+
+            for i, header in enumerate(headers):
+                align = 'C'  # Centra gli header
+                if i == len(headers) - 1:  # Ultima cella della riga header
+                    self.cell(col_widths[i], 7, header, border=1,
+                              new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=align)
+                else:
+                    self.cell(col_widths[i], 7, header, border=1,
+                              new_x=XPos.RIGHT, new_y=YPos.TOP, align=align)
+
+            self.set_font('Helvetica', '', 8)
+            for row in data_rows:
+                for i, item in enumerate(row):
+                    text = str(item) if item is not None else ''
+                    align = 'L'  # Dati allineati a sinistra
+                    if i == len(row) - 1:  # Ultima cella della riga dati
+                        self.cell(
+                            col_widths[i], 6, text, border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=align)
+                    else:
+                        self.cell(
+                            col_widths[i], 6, text, border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align=align)
+            self.ln(4)
+
+    class PDFPossessore(FPDF):
+        def header(self):
+            self.set_font('Helvetica', 'B', 12)
+            self.cell(0, 10, 'Dettaglio Possessore Catastale', border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+            self.ln(5)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Helvetica', 'I', 8)
+            
+            disclaimer = "Il presente report ha valore puramente storico e documentale."
+            self.cell(0, 5, disclaimer, align='C', new_x='LMARGIN', new_y='NEXT')
+
+            self.cell(0, 5, f'Pagina {self.page_no()}/{{nb}}', align='C')
+
+        def chapter_title(self, title):
+            self.set_font('Helvetica', 'B', 12)
+            self.cell(0, 6, title, border=0, new_x=XPos.LMARGIN,
+                      new_y=YPos.NEXT, align='L')
+            self.ln(2)
+
+        def chapter_body(self, data_dict):
+            self.set_font('Helvetica', '', 10)
+            page_width = self.w - self.l_margin - self.r_margin
+            for key, value in data_dict.items():
+                text_to_write = f"{key.replace('_', ' ').title()}: {value if value is not None else 'N/D'}"
+                try:
+                    self.multi_cell(page_width, 5, text_to_write, border=0,
+                                    new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+                except Exception as e:  # FPDFException
+                    if "Not enough horizontal space" in str(e):
+                        logging.getLogger("CatastoGUI").warning(
+                            f"FPDFException (chapter_body possessore): {e} per testo: {text_to_write[:100]}...")
+                        self.multi_cell(
+                            page_width, 5, f"{key.replace('_', ' ').title()}: [DATI TROPPO LUNGHI]", border=0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='L')
+                    else:
+                        raise e
+            self.ln(2)
+
+        def simple_table(self, headers, data_rows, col_widths_percent=None):
+            self.set_font('Helvetica', 'B', 9)
+            effective_page_width = self.w - self.l_margin - self.r_margin
+
+            if col_widths_percent:
+                col_widths = [effective_page_width *
+                              (p/100) for p in col_widths_percent]
+            else:
+                num_cols = len(headers)
+                default_col_width = effective_page_width / \
+                    num_cols if num_cols > 0 else effective_page_width
+                col_widths = [default_col_width] * num_cols
+
+            for i, header in enumerate(headers):
+                align = 'C'
+                if i == len(headers) - 1:
+                    self.cell(col_widths[i], 7, header, border=1,
+                              new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=align)
+                else:
+                    self.cell(col_widths[i], 7, header, border=1,
+                              new_x=XPos.RIGHT, new_y=YPos.TOP, align=align)
+
+            self.set_font('Helvetica', '', 8)
+            for row in data_rows:
+                for i, item in enumerate(row):
+                    text = str(item) if item is not None else ''
+                    align = 'L'
+                    if i == len(row) - 1:
+                        self.cell(
+                            col_widths[i], 6, text, border=1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align=align)
+                    else:
+                        self.cell(
+                            col_widths[i], 6, text, border=1, new_x=XPos.RIGHT, new_y=YPos.TOP, align=align)
+            self.ln(4)
+else:  # FPDF non disponibile
+    class PDFPartita:
+        pass  # Definizioni vuote per evitare errori di NameError
+
+    class PDFPossessore:
+        pass
+if FPDF_AVAILABLE:
+    class GenericTextReportPDF(FPDF):
+        def __init__(self, orientation='P', unit='mm', format='A4', report_title="Report"):
+            super().__init__(orientation, unit, format)
+            self.report_title = report_title
+            self.set_auto_page_break(auto=True, margin=15)
+            self.set_left_margin(15)
+            self.set_right_margin(15)
+            # Font di default per il corpo del report
+            self.set_font('Helvetica', '', 10)
+
+        def header(self):
+            self.set_font('Helvetica', 'B', 12)
+            self.cell(0, 10, self.report_title, 0, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+            self.ln(5)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Helvetica', 'I', 8)
+            
+            disclaimer = "Il presente report ha valore puramente storico e documentale."
+            self.cell(0, 5, disclaimer, align='C', new_x='LMARGIN', new_y='NEXT')
+
+            self.cell(0, 5, f'Pagina {self.page_no()}/{{nb}}', align='C')
+
+        def add_report_text(self, text_content: str):
+            """Aggiunge il contenuto testuale del report al PDF."""
+            self.set_font(
+                'Courier', '', 9)  # Usiamo un font monospazio per testo preformattato
+            # Potrebbe scegliere 'Helvetica' se preferisce
+            # Sostituisci i caratteri di tabulazione con spazi per un rendering migliore in PDF
+            text_content = text_content.replace('\t', '    ')
+
+            # multi_cell gestisce automaticamente i ritorni a capo e il wrapping del testo
+            # Larghezza 0 = larghezza piena, altezza riga 5mm
+            self.multi_cell(0, 5, text_content)
+            self.ln()
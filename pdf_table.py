@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+Motore di impaginazione veloce per tabelle PDF lunghe
+=====================================================
+Usato da BulkReportPDF (re-esportata da app_utils) per le esportazioni
+tabellari in PDF (elenchi di immobili, partite, possessori di un comune...).
+
+Rispetto alla vecchia print_table (una chiamata a cell() per cella, colonne di
+larghezza fissa e testo troncato):
+- le larghezze delle colonne sono calcolate una sola volta su un campione di righe;
+- le larghezze delle stringhe sono misurate con la tabella dei caratteri del font
+  e memorizzate in cache (valori ripetuti come comuni, stati, tipi costano zero);
+- il testo va a capo dentro la cella invece di essere tagliato;
+- le righe arrivano da un iteratore qualsiasi e sono emesse a blocchi di una
+  pagina: testo con text() e griglia disegnata una volta per pagina (poche line()
+  invece di quattro bordi per cella).
+
+Il modulo non importa Qt.
+"""
+
+import itertools
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from fpdf import FPDF
+    from fpdf.enums import TextMode
+    FPDF_AVAILABLE = True
+except ImportError:
+    FPDF = None
+    FPDF_AVAILABLE = False
+
+logger = logging.getLogger("CatastoGUI.pdf_table")
+
+REPORT_DISCLAIMER = "Il presente report ha valore puramente storico e documentale."
+
+TABLE_FONT = ("Helvetica", "", 8)
+HEADER_FONT = ("Helvetica", "B", 8)
+LINE_HEIGHT = 3.6          # mm per riga di testo nella cella
+CELL_PADDING = 1.0         # mm a sinistra/destra e sopra/sotto
+MIN_COL_WIDTH = 10.0       # mm
+MAX_LINES_PER_CELL = 8     # oltre, il testo viene troncato con '...'
+SAMPLE_ROWS = 300          # righe usate per stimare le larghezze
+WIDTH_PERCENTILE = 0.9     # le celle più lunghe del 90° percentile vanno a capo
+_CACHE_LIMIT = 200000      # voci massime per cache (misure e a capo)
+
+
+def _latin1(text: str) -> str:
+    """I font standard coprono solo latin-1: i caratteri esterni diventano '?'."""
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+
+def _cell_text(value: Any) -> str:
+    if value is None:
+        return ""
+    text = value if isinstance(value, str) else str(value)
+    if not text.isascii():
+        text = _latin1(text)
+    return text.replace("\r", "").replace("\t", " ")
+
+
+def _row_values(row: Any, headers: Sequence[str]) -> List[str]:
+    """Le righe possono essere dict (chiavi = intestazioni) o sequenze posizionali."""
+    if isinstance(row, dict):
+        return [_cell_text(row.get(h, "")) for h in headers]
+    values = [_cell_text(v) for v in row[:len(headers)]]
+    values.extend([""] * (len(headers) - len(values)))
+    return values
+
+
+class TextMeasurer:
+    """
+    Misura le stringhe con la tabella delle larghezze del font corrente, con una
+    cache per font: la stessa stringa viene misurata una sola volta.
+    """
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+        self._caches: Dict[Tuple[str, str, float], Dict[str, float]] = {}
+
+    def widest_glyph(self) -> float:
+        """Larghezza del glifo più largo del font corrente (con un margine per il grassetto)."""
+        pdf = self.pdf
+        cw = getattr(pdf.current_font, "cw", None)
+        if isinstance(cw, dict) and cw:
+            return max(cw.values()) * 1.05 * pdf.font_size_pt * 0.001 / pdf.k
+        return self.width("W") * 1.5
+
+    def width(self, text: str) -> float:
+        pdf = self.pdf
+        key = (pdf.font_family, pdf.font_style, pdf.font_size_pt)
+        cache = self._caches.get(key)
+        if cache is None:
+            cache = self._caches[key] = {}
+        w = cache.get(text)
+        if w is None:
+            cw = getattr(pdf.current_font, "cw", None)
+            if cw is not None and not hasattr(pdf.current_font, "ttffile"):
+                # Font standard: somma diretta delle larghezze in millesimi di em
+                default = cw.get("?", 500)
+                w = sum(cw.get(ch, default) for ch in text) * pdf.font_size_pt * 0.001 / pdf.k
+            else:
+                w = pdf.get_string_width(text)
+            if len(cache) >= _CACHE_LIMIT:
+                cache.clear()
+            cache[text] = w
+        return w
+
+
+class TableLayout:
+    """Larghezze delle colonne e regole di a capo, calcolate una volta per tabella."""
+
+    def __init__(self, measurer: TextMeasurer, col_widths: List[float]):
+        self.measurer = measurer
+        self.col_widths = col_widths
+        # Numero di caratteri che entra sicuramente nella colonna anche col glifo più largo:
+        # le stringhe più corte non vengono nemmeno misurate.
+        widest = measurer.widest_glyph() or 1.0
+        self._safe_chars = [int((w - 2 * CELL_PADDING) / widest) for w in col_widths]
+        self._wrap_caches: List[Dict[str, List[str]]] = [{} for _ in col_widths]
+
+    @classmethod
+    def from_sample(cls, pdf, measurer: TextMeasurer, headers: Sequence[str],
+                    sample: List[List[str]], available_width: float) -> "TableLayout":
+        """Stima le larghezze dal campione: 90° percentile del contenuto, almeno la parola più lunga dell'intestazione."""
+        pdf.set_font(*HEADER_FONT)
+        header_min = [max((measurer.width(word) for word in h.split()), default=0.0) + 2 * CELL_PADDING
+                      for h in headers]
+        header_full = [measurer.width(h) + 2 * CELL_PADDING for h in headers]
+        pdf.set_font(*TABLE_FONT)
+
+        natural = []
+        for i in range(len(headers)):
+            widths = sorted(measurer.width(row[i]) for row in sample) if sample else [0.0]
+            content = widths[min(len(widths) - 1, int(len(widths) * WIDTH_PERCENTILE))] + 2 * CELL_PADDING
+            natural.append(max(content, header_full[i] if content >= header_min[i] else header_min[i], MIN_COL_WIDTH))
+        floors = [max(MIN_COL_WIDTH, m) for m in header_min]
+
+        total = sum(natural)
+        if total <= available_width:
+            # Spazio in avanzo distribuito in proporzione
+            col_widths = [w * available_width / total for w in natural]
+        else:
+            # Si restringono solo le colonne sopra il minimo, in proporzione all'eccedenza
+            spare = sum(w - f for w, f in zip(natural, floors))
+            excess = total - available_width
+            if spare <= 0 or excess >= spare:
+                col_widths = [available_width / len(headers)] * len(headers)
+            else:
+                col_widths = [w - (w - f) * excess / spare for w, f in zip(natural, floors)]
+        return cls(measurer, col_widths)
+
+    def wrap(self, col: int, text: str) -> List[str]:
+        """Spezza il testo in righe che stanno nella colonna (a capo per parole, poi per caratteri)."""
+        if len(text) <= self._safe_chars[col] and "\n" not in text:
+            return [text]
+        cache = self._wrap_caches[col]
+        lines = cache.get(text)
+        if lines is not None:
+            return lines
+
+        limit = self.col_widths[col] - 2 * CELL_PADDING
+        width = self.measurer.width
+        if not text or ("\n" not in text and width(text) <= limit):
+            lines = [text]
+        else:
+            lines = []
+            for paragraph in text.split("\n"):
+                current = ""
+                for word in paragraph.strip().split():
+                    candidate = f"{current} {word}" if current else word
+                    if width(candidate) <= limit:
+                        current = candidate
+                        continue
+                    if current:
+                        lines.append(current)
+                    # Parola più lunga della colonna: spezzata a caratteri
+                    while width(word) > limit and len(word) > 1:
+                        cut = len(word) - 1
+                        while cut > 1 and width(word[:cut]) > limit:
+                            cut -= 1
+                        lines.append(word[:cut])
+                        word = word[cut:]
+                    current = word
+                lines.append(current)
+            if len(lines) > MAX_LINES_PER_CELL:
+                lines = lines[:MAX_LINES_PER_CELL]
+                lines[-1] = lines[-1][:max(1, len(lines[-1]) - 3)] + "..."
+
+        if len(cache) >= _CACHE_LIMIT:
+            cache.clear()
+        cache[text] = lines
+        return lines
+
+    def layout_row(self, values: List[str]) -> Tuple[List[List[str]], float]:
+        cells = [self.wrap(i, v) for i, v in enumerate(values)]
+        height = max(len(lines) for lines in cells) * LINE_HEIGHT + 2 * CELL_PADDING
+        return cells, height
+
+
+if FPDF_AVAILABLE:
+    class BulkReportPDF(FPDF):
+        """
+        Classe PDF specializzata per creare report tabellari lunghi
+        con intestazioni ripetute su ogni pagina.
+        """
+        def __init__(self, orientation='L', unit='mm', format='A4', report_title="Report Dati"):
+            super().__init__(orientation, unit, format) # 'L' per Landscape, più adatto a tabelle
+            self.report_title = report_title
+            self.headers = []
+            self.col_widths = []
+            self._measurer = TextMeasurer(self)
+            self._header_cells: List[List[str]] = []
+            self._header_height = 0.0
+            self._encoded_cache: Dict[str, str] = {}
+
+        def header(self):
+            self.set_font('Helvetica', 'B', 12)
+            self.cell(0, 10, _latin1(self.report_title), 0, new_x="LMARGIN", new_y="NEXT", align='C')
+            self.ln(5)
+            # Stampa l'intestazione della tabella su ogni pagina
+            if self.headers:
+                self._draw_table_header()
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Helvetica', 'I', 8)
+            self.cell(0, 5, REPORT_DISCLAIMER, align='C', new_x='LMARGIN', new_y='NEXT')
+            self.cell(0, 5, f'Pagina {self.page_no()}/{{nb}}', align='C')
+
+        # --- Tabella ------------------------------------------------------
+
+        def _draw_table_header(self):
+            x0, y0 = self.l_margin, self.get_y()
+            self.set_font(*HEADER_FONT)
+            self.set_fill_color(230, 230, 230)
+            self.rect(x0, y0, sum(self.col_widths), self._header_height, style='DF')
+            x = x0
+            for width, lines in zip(self.col_widths, self._header_cells):
+                for n, line in enumerate(lines):
+                    tx = x + (width - self._measurer.width(line)) / 2
+                    self.text(tx, y0 + CELL_PADDING + LINE_HEIGHT * (n + 0.75), line)
+                x += width
+            self._draw_vertical_rules(y0, y0 + self._header_height)
+            self.set_xy(x0, y0 + self._header_height)
+            self.set_font(*TABLE_FONT)
+
+        def _draw_vertical_rules(self, top: float, bottom: float):
+            x = self.l_margin
+            self.line(x, top, x, bottom)
+            for width in self.col_widths:
+                x += width
+                self.line(x, top, x, bottom)
+
+        def _flush_page(self, batch: List[Tuple[List[List[str]], float]]):
+            """Emette in un colpo solo le righe di una pagina: testo, righe orizzontali, verticali."""
+            if not batch:
+                return
+            x0, top = self.l_margin, self.get_y()
+            right = x0 + sum(self.col_widths)
+            col_x = [x + CELL_PADDING for x in itertools.accumulate([x0] + self.col_widths[:-1])]
+            items = []
+            y = top
+            for cells, height in batch:
+                base = y + CELL_PADDING + LINE_HEIGHT * 0.75
+                for cx, lines in zip(col_x, cells):
+                    for n, content in enumerate(lines):
+                        if content:
+                            items.append((cx, base + LINE_HEIGHT * n, content))
+                y += height
+            self._emit_text_block(items)
+            # Griglia: una linea per bordo di riga e per bordo di colonna, non quattro per cella
+            k, h = self.k, self.h
+            path = []
+            y = top
+            for _, height in batch:
+                y += height
+                path.append(f"{x0 * k:.2f} {(h - y) * k:.2f} m {right * k:.2f} {(h - y) * k:.2f} l")
+            path.append("S")
+            self._out(" ".join(path))
+            self._draw_vertical_rules(top, y)
+            self.set_y(y)
+
+        def _emit_text_block(self, items: List[Tuple[float, float, str]]):
+            """
+            Scrive tutte le stringhe della pagina in un unico oggetto di testo PDF.
+            Vale per i font standard (testo già ridotto a latin-1); con font TTF,
+            sottolineato o modalità di testo diverse si passa da text().
+            """
+            font = self.current_font
+            if (hasattr(font, "ttffile") or self.underline or self.strikethrough
+                    or self._record_text_quad_points or self.text_mode != TextMode.FILL):
+                for x, y, content in items:
+                    self.text(x, y, content)
+                return
+            if not self.current_font_is_set_on_page:
+                self._out(self._set_font_for_page(font, self.font_size_pt))
+            encoded = self._encoded_cache
+            if len(encoded) >= _CACHE_LIMIT:
+                encoded.clear()
+            k, h = self.k, self.h
+            parts = ["q", self.text_color.serialize().lower(), "BT",
+                     f"/F{font.i} {self.font_size_pt:.2f} Tf"]
+            for x, y, content in items:
+                op = encoded.get(content)
+                if op is None:
+                    op = encoded[content] = font.encode_text(content)
+                parts.append(f"1 0 0 1 {x * k:.2f} {(h - y) * k:.2f} Tm {op}")
+            parts.append("ET Q")
+            self._out("\n".join(parts))
+
+        def prepare_table(self, headers: Sequence[str], sample: List[List[str]],
+                          col_widths: Optional[List[float]] = None) -> TableLayout:
+            """Calcola (una volta) larghezze e intestazione della tabella."""
+            self.headers = [_latin1(str(h)) for h in headers]
+            self.set_font(*TABLE_FONT)
+            available = self.w - self.l_margin - self.r_margin
+            if col_widths:
+                layout = TableLayout(self._measurer, list(col_widths))
+            else:
+                layout = TableLayout.from_sample(self, self._measurer, self.headers, sample, available)
+            self.col_widths = layout.col_widths
+            self.set_font(*HEADER_FONT)
+            self._header_cells = [layout.wrap(i, h) for i, h in enumerate(self.headers)]
+            self._header_height = max(len(c) for c in self._header_cells) * LINE_HEIGHT + 2 * CELL_PADDING
+            self.set_font(*TABLE_FONT)
+            return layout
+
+        def print_table(self, headers, data: Iterable[Any], col_widths: Optional[List[float]] = None,
+                        sample_size: int = SAMPLE_ROWS) -> int:
+            """
+            Stampa una tabella a partire da `data` (lista o qualunque iteratore di
+            dict/sequenze). Le larghezze sono stimate sulle prime `sample_size` righe,
+            poi le righe vengono lette e impaginate in streaming, una pagina alla volta.
+            Restituisce il numero di righe stampate.
+            """
+            rows = iter(data)
+            self.set_font(*TABLE_FONT)
+            sample = [_row_values(r, headers) for r in itertools.islice(rows, sample_size)]
+            if not sample:
+                return 0
+            layout = self.prepare_table(headers, sample, col_widths)
+            return self.emit_rows(layout, itertools.chain(
+                sample, (_row_values(r, headers) for r in rows)))
+
+        def emit_rows(self, layout: TableLayout, rows: Iterable[List[str]]) -> int:
+            """Impagina righe già normalizzate (liste di stringhe) su pagine nuove."""
+            self.add_page()
+            self.set_font(*TABLE_FONT)
+            limit = self.page_break_trigger
+            batch: List[Tuple[List[List[str]], float]] = []
+            y = self.get_y()
+            count = 0
+            for values in rows:
+                cells, height = layout.layout_row(values)
+                if y + height > limit and batch:
+                    self._flush_page(batch)
+                    batch = []
+                    self.add_page()
+                    self.set_font(*TABLE_FONT)
+                    y = self.get_y()
+                batch.append((cells, height))
+                y += height
+                count += 1
+            self._flush_page(batch)
+            return count
+else:
+    class BulkReportPDF:
+        pass
+
+
+def render_table_pdf(filename: str, headers: Sequence[str], rows: Iterable[Any], report_title: str = "Report Dati",
+                     orientation: str = 'L') -> int:
+    """Scrive in `filename` un PDF con la sola tabella. Restituisce il numero di righe scritte."""
+    if not FPDF_AVAILABLE:
+        raise RuntimeError("La libreria FPDF è necessaria per l'esportazione in PDF.")
+    pdf = BulkReportPDF(orientation=orientation, report_title=report_title)
+    pdf.alias_nb_pages()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    count = pdf.print_table(headers, rows)
+    pdf.output(filename)
+    return count
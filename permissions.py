@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Cache dei permessi degli utenti
+===============================
+Replica lato client della logica della funzione SQL ha_permesso():
+utente non attivo -> nessun permesso; ruolo 'admin' -> tutti i permessi;
+altrimenti i permessi assegnati in utente_permesso.
+
+Ruolo, stato e insieme dei permessi di un utente vengono letti con una sola query
+(CatastoDBManager.get_user_permissions) al login o al primo controllo, poi i
+controlli sono serviti dalla memoria senza occupare connessioni del pool.
+Le voci vengono invalidate dalle notifiche del canale PERMISSIONS_CHANNEL
+(trigger di sql_scripts/23_notifiche_permessi.sql) e ricaricate al controllo
+successivo. L'ascolto avviene con invalidation_bus.NotificationListener, su una
+connessione dedicata esterna al pool.
+
+Come in ReferenceDataCache, ogni invalidazione incrementa una generazione: un
+caricamento iniziato prima di un'invalidazione non viene memorizzato (altrimenti un
+ruolo revocato resterebbe in cache fino alla fine della sessione). Le voci scadono
+comunque dopo `ttl` secondi, per i database senza i trigger dello script 23.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, Optional
+
+logger = logging.getLogger("CatastoGUI.permissions")
+
+PERMISSIONS_CHANNEL = "catasto_permessi"
+ALL_USERS_PAYLOAD = "*"   # payload inviato quando cambia la tabella permesso
+DEFAULT_TTL_SECONDS = 300.0
+
+
+class PermissionCache:
+    """Permessi per utente: {utente_id: {'ruolo', 'attivo', 'permessi'}}. Thread-safe."""
+
+    def __init__(self, loader: Callable[[int], Optional[Dict[str, Any]]], ttl: float = DEFAULT_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self._loader = loader
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._generation = 0                       # incrementata da ogni invalidazione completa
+        self._user_generations: Dict[int, int] = {}  # incrementata dall'invalidazione del singolo utente
+        self._lock = threading.Lock()
+
+    def _generation_of(self, utente_id: int):
+        return self._generation, self._user_generations.get(utente_id, 0)
+
+    def load(self, utente_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Legge (o rilegge) dal database i permessi dell'utente. None se non trovato o in errore.
+        Se durante la lettura arriva un'invalidazione il risultato è restituito ma non memorizzato.
+        """
+        with self._lock:
+            generation = self._generation_of(utente_id)
+        try:
+            data = self._loader(utente_id)
+        except Exception as e:
+            logger.error(f"Impossibile caricare i permessi dell'utente ID {utente_id}: {e}")
+            return None
+        if data is None:
+            return None
+        entry = {"ruolo": data.get("ruolo"), "attivo": bool(data.get("attivo")),
+                 "permessi": frozenset(data.get("permessi") or ()), "loaded_at": self._clock()}
+        with self._lock:
+            if self._generation_of(utente_id) != generation:
+                logger.debug(f"Permessi utente ID {utente_id} invalidati durante la lettura: non memorizzati.")
+                return entry
+            self._entries[utente_id] = entry
+        logger.debug(f"Permessi utente ID {utente_id} in cache: ruolo={entry['ruolo']}, "
+                     f"{len(entry['permessi'])} permessi espliciti.")
+        return entry
+
+    def _entry(self, utente_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(utente_id)
+        if entry is not None and self._clock() - entry["loaded_at"] < self.ttl:
+            return entry
+        return self.load(utente_id)
+
+    def has_permission(self, utente_id: int, permesso_nome: str) -> bool:
+        entry = self._entry(utente_id)
+        if not entry or not entry["attivo"]:
+            return False
+        return entry["ruolo"] == "admin" or permesso_nome in entry["permessi"]
+
+    def role(self, utente_id: int) -> Optional[str]:
+        """Ruolo dell'utente se attivo, altrimenti None."""
+        entry = self._entry(utente_id)
+        return entry["ruolo"] if entry and entry["attivo"] else None
+
+    def permissions(self, utente_id: int) -> FrozenSet[str]:
+        entry = self._entry(utente_id)
+        return entry["permessi"] if entry and entry["attivo"] else frozenset()
+
+    def invalidate(self, utente_id: Optional[int] = None):
+        """Scarta la voce di un utente (o tutte, con None): verrà riletta al prossimo controllo."""
+        with self._lock:
+            if utente_id is None:
+                self._generation += 1
+                self._entries.clear()
+            else:
+                self._user_generations[utente_id] = self._user_generations.get(utente_id, 0) + 1
+                self._entries.pop(utente_id, None)
+
+    def handle_notification(self, payload: str):
+        """Callback per il canale PERMISSIONS_CHANNEL: payload = ID utente oppure '*'."""
+        payload = (payload or "").strip()
+        if payload == ALL_USERS_PAYLOAD or not payload.isdigit():
+            logger.info("Modifica ai permessi notificata: cache dei permessi svuotata.")
+            self.invalidate()
+        else:
+            logger.info(f"Modifica ai permessi dell'utente ID {payload} notificata: voce invalidata.")
+            self.invalidate(int(payload))
+
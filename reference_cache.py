@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Cache dei dati di riferimento
+=============================
+Comuni, tipi di località e periodi storici cambiano raramente ma vengono riletti
+a ogni apertura di dialoghi e combo. ReferenceDataCache li tiene in memoria:
+
+- ogni voce ha un loader, l'entità da cui dipende (nomi di invalidation_bus) e un TTL;
+- ogni entità ha un numero di versione, incrementato da invalidate() (chiamato dal
+  bus di invalidazione o dai metodi di scrittura locali). Una voce è valida solo se
+  è stata caricata con la versione corrente e il TTL non è scaduto: un'invalidazione
+  arrivata durante un caricamento rende subito vecchio il risultato;
+- warm() precarica tutte le voci (dopo il login, in un thread di background).
+
+get() restituisce sempre una copia: chi modifica la lista non altera la cache.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("CatastoGUI.reference_cache")
+
+ALL = "*"
+DEFAULT_TTL_SECONDS = 600.0
+
+
+class ReferenceDataCache:
+    """Voci {nome: dati} con TTL e versione per entità. Thread-safe."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._loaders: Dict[str, Dict[str, Any]] = {}  # nome -> {'loader', 'entity', 'ttl'}
+        self._entries: Dict[str, Dict[str, Any]] = {}  # nome -> {'data', 'version', 'loaded_at'}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, name: str, loader: Callable[[], List[Any]], entity: str,
+                 ttl: float = DEFAULT_TTL_SECONDS):
+        with self._lock:
+            self._loaders[name] = {"loader": loader, "entity": entity, "ttl": ttl}
+            self._versions.setdefault(entity, 0)
+
+    def get(self, name: str) -> List[Any]:
+        """Dati della voce, ricaricati se invalidati o scaduti. Gli errori del loader vengono propagati."""
+        with self._lock:
+            spec = self._loaders[name]
+            version = self._versions[spec["entity"]]
+            entry = self._entries.get(name)
+            if (entry is not None and entry["version"] == version
+                    and self._clock() - entry["loaded_at"] < spec["ttl"]):
+                self.hits += 1
+                return self._copy(entry["data"])
+            self.misses += 1
+
+        data = list(spec["loader"]())
+        with self._lock:
+            # Se nel frattempo è arrivata un'invalidazione, la voce resta vecchia
+            # e sarà ricaricata alla prossima richiesta.
+            self._entries[name] = {"data": data, "version": version, "loaded_at": self._clock()}
+        logger.debug(f"Dati di riferimento '{name}' caricati: {len(data)} righe.")
+        return self._copy(data)
+
+    def invalidate(self, entity: str = ALL, entity_id: Optional[int] = None):
+        """Rende vecchie le voci che dipendono dall'entità (ALL = tutte). Firma compatibile con InvalidationBus."""
+        with self._lock:
+            for known_entity in self._versions:
+                if entity == ALL or known_entity == entity:
+                    self._versions[known_entity] += 1
+
+    def warm(self, names: Optional[Iterable[str]] = None):
+        """Carica le voci indicate (default: tutte). Gli errori sono solo registrati nel log."""
+        for name in list(names if names is not None else self._loaders):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.warning(f"Precaricamento dei dati di riferimento '{name}' fallito: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    def _copy(data: List[Any]) -> List[Any]:
+        return [dict(row) if isinstance(row, dict) else row for row in data]
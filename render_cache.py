@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Cache delle anteprime dei documenti
+===================================
+Una scansione a 600 dpi caricata per intero in un QPixmap occupa centinaia di MB e
+richiede secondi; un PDF richiede l'avvio di QtWebEngine. RenderCache genera una
+volta sola, in background, versioni ridotte di ogni documento e le salva su disco
+indicizzate per hash del contenuto (lo stesso di document_store):
+
+    <radice>/3f/3fa2...e9/miniatura.png     lato lungo THUMBNAIL_SIZE
+    <radice>/3f/3fa2...e9/livello_1024.jpg  piramide di risoluzioni (PYRAMID_SIZES)
+    <radice>/3f/3fa2...e9/livello_2048.jpg  solo i livelli più piccoli dell'originale
+
+- Immagini: con Pillow; per i JPEG draft() decodifica direttamente a risoluzione
+  ridotta, quindi anche la prima generazione non carica l'immagine piena.
+- PDF: la prima pagina viene rasterizzata solo se PyMuPDF (fitz) è installato;
+  altrimenti il visualizzatore usa QtWebEngine come prima.
+- Un documento è pronto quando esiste 'completo': i file vengono scritti prima
+  in temporanei e rinominati, quindi una generazione interrotta viene rifatta.
+
+Il visualizzatore sceglie il livello più piccolo che copre la risoluzione
+richiesta (best_level) e passa all'originale solo agli ingrandimenti massimi.
+Il modulo non importa Qt.
+"""
+
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from document_store import file_sha256
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import fitz  # PyMuPDF
+    PDF_RASTER_AVAILABLE = True
+except ImportError:
+    PDF_RASTER_AVAILABLE = False
+
+logger = logging.getLogger("CatastoGUI.render_cache")
+
+THUMBNAIL_SIZE = 256
+PYRAMID_SIZES = (1024, 2048, 4096)
+PDF_PAGE_SIZE = 2048
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff")
+_COMPLETE_MARKER = "completo"
+_SHA256_NAME_RE = re.compile(r"^([0-9a-f]{64})(\.[0-9a-z]+)?$")
+
+
+_default_cache: Optional["RenderCache"] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_render_cache() -> "RenderCache":
+    """Cache condivisa dall'applicazione, nella cartella dati dell'utente (app_paths.RENDER_CACHE_DIR)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            from app_paths import RENDER_CACHE_DIR
+            _default_cache = RenderCache(str(RENDER_CACHE_DIR))
+        return _default_cache
+
+
+class RenderSet(NamedTuple):
+    thumbnail: Optional[str]
+    levels: List[Tuple[int, str]]   # (lato lungo, percorso), dal più piccolo
+    original_size: Tuple[int, int]  # (larghezza, altezza) dell'originale; per i PDF della pagina rasterizzata
+
+
+def best_level(levels: List[Tuple[int, str]], required_long_side: float) -> Optional[Tuple[int, str]]:
+    """Il livello più piccolo con lato lungo >= richiesto; None se serve più dell'ultimo livello."""
+    for level in levels:
+        if level[0] >= required_long_side:
+            return level
+    return None
+
+
+def can_render(file_path: str) -> bool:
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        return PIL_AVAILABLE
+    return extension == ".pdf" and PIL_AVAILABLE and PDF_RASTER_AVAILABLE
+
+
+class RenderCache:
+    """Anteprime su disco indicizzate per hash del contenuto. Thread-safe."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def content_key(self, file_path: str) -> str:
+        """Hash del contenuto: dal nome per i file dell'archivio allegati, altrimenti calcolato (e ricordato)."""
+        match = _SHA256_NAME_RE.match(os.path.basename(file_path))
+        if match:
+            return match.group(1)
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(key)
+        if digest is None:
+            digest = file_sha256(file_path)
+            with self._lock:
+                self._digests[key] = digest
+        return digest
+
+    def directory_for(self, content_key: str) -> str:
+        return os.path.join(self.root, content_key[:2], content_key)
+
+    def get(self, file_path: str) -> Optional[RenderSet]:
+        """Anteprime già generate, senza generarle (None se assenti)."""
+        return self._read(self.directory_for(self.content_key(file_path)))
+
+    def ensure(self, file_path: str) -> Optional[RenderSet]:
+        """Anteprime del documento, generate se mancano. None se il formato non è gestito."""
+        if not can_render(file_path):
+            return None
+        key = self.content_key(file_path)
+        directory = self.directory_for(key)
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:  # due richieste per lo stesso documento: una sola generazione
+            existing = self._read(directory)
+            if existing is not None:
+                return existing
+            os.makedirs(directory, exist_ok=True)
+            if os.path.splitext(file_path)[1].lower() == ".pdf":
+                image = self._rasterize_pdf_first_page(file_path)
+            else:
+                image = self._open_image(file_path)
+            self._write_pyramid(directory, image)
+            logger.info(f"Anteprime generate per '{os.path.basename(file_path)}' ({image.size[0]}x{image.size[1]}).")
+            return self._read(directory)
+
+    # --- Generazione -------------------------------------------------------
+    @staticmethod
+    def _open_image(file_path: str) -> "Image.Image":
+        image = Image.open(file_path)
+        original_size = image.size
+        # Per i JPEG decodifica già ridotta (fattori 1/2, 1/4, 1/8) fino al livello più grande necessario
+        image.draft("RGB", (max(PYRAMID_SIZES), max(PYRAMID_SIZES)))
+        if getattr(image, "n_frames", 1) > 1:
+            image.seek(0)
+        image = image.convert("RGB")
+        image.info["dimensioni_originali"] = original_size
+        return image
+
+    @staticmethod
+    def _rasterize_pdf_first_page(file_path: str) -> "Image.Image":
+        with fitz.open(file_path) as pdf:
+            page = pdf.load_page(0)
+            zoom = PDF_PAGE_SIZE / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+        image.info["dimensioni_originali"] = image.size
+        return image
+
+    def _write_pyramid(self, directory: str, image: "Image.Image"):
+        original_size = image.info.get("dimensioni_originali", image.size)
+        current = image
+        # Dal livello più grande al più piccolo: ogni riduzione parte dalla precedente
+        for size in sorted(PYRAMID_SIZES, reverse=True):
+            if max(current.size) <= size and size != min(PYRAMID_SIZES):
+                continue
+            current = current.copy()
+            current.thumbnail((size, size), Image.LANCZOS)
+            self._save_atomic(current, os.path.join(directory, f"livello_{size}.jpg"), "JPEG", quality=85)
+        thumbnail = current.copy()
+        thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+        self._save_atomic(thumbnail, os.path.join(directory, "miniatura.png"), "PNG")
+        with open(os.path.join(directory, _COMPLETE_MARKER), "w", encoding="utf-8") as f:
+            f.write(f"{original_size[0]}x{original_size[1]}\n")
+
+    @staticmethod
+    def _save_atomic(image: "Image.Image", path: str, image_format: str, **options):
+        tmp_path = path + ".tmp"
+        image.save(tmp_path, image_format, **options)
+        os.replace(tmp_path, path)
+
+    # --- Lettura -----------------------------------------------------------
+    @staticmethod
+    def _read(directory: str) -> Optional[RenderSet]:
+        marker = os.path.join(directory, _COMPLETE_MARKER)
+        if not os.path.isfile(marker):
+            return None
+        with open(marker, "r", encoding="utf-8") as f:
+            width, _, height = f.read().strip().partition("x")
+        levels = []
+        for name in os.listdir(directory):
+            match = re.fullmatch(r"livello_(\d+)\.jpg", name)
+            if match:
+                levels.append((int(match.group(1)), os.path.join(directory, name)))
+        thumbnail = os.path.join(directory, "miniatura.png")
+        return RenderSet(thumbnail if os.path.isfile(thumbnail) else None, sorted(levels), (int(width), int(height)))
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Impaginazione lato client dei report strutturati
+================================================
+Le funzioni SQL report_*_json (sql_scripts/22_report_strutturati.sql)
+restituiscono i dati di un report come un unico documento JSON. Questo modulo
+li trasforma in testo semplice o HTML partendo da un modello dichiarativo
+condiviso (REPORT_TEMPLATES), così lo stesso risultato di una sola query
+può essere mostrato a video ed esportato in TXT, HTML o PDF.
+
+Il modulo non dipende da Qt né dal database: lavora solo su dict/list.
+"""
+
+import html
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+REPORT_SUBTITLE = "CATASTO STORICO ANNI '50"
+REPORT_DISCLAIMER = "Il presente report ha valore puramente storico e documentale."
+NOT_AVAILABLE = "N/D"
+
+_TEXT_RULE = "=" * 60
+_ISO_DATE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})")
+
+# ----------------------------------------------------------------------------
+# Modelli dei report
+# ----------------------------------------------------------------------------
+# - "campi": coppie (etichetta, chiave) dell'intestazione; i valori nulli sono omessi.
+# - "sezioni": elenchi di voci. "voce" è il titolo della voce (str.format sui
+#   campi della voce, i nulli diventano N/D), "dettagli" le righe facoltative,
+#   "sottoelenco" un eventuale elenco annidato, "vuoto" il testo per elenco vuoto.
+# - "totale": riga finale con il numero di voci della sezione ({n}).
+
+REPORT_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    "proprieta": {
+        "titolo": "REPORT PROPRIETÀ IMMOBILIARE",
+        "campi": [("Comune", "comune_nome"), ("Partita N.", "numero_partita"), ("Suffisso", "suffisso_partita"),
+                  ("Tipo", "tipo"), ("Data impianto", "data_impianto"), ("Stato", "stato"),
+                  ("Data chiusura", "data_chiusura"), ("Provenienza (partita n.)", "numero_provenienza")],
+        "sezioni": [
+            {"titolo": "INTESTATARI", "chiave": "intestatari", "voce": "{nome_completo}",
+             "dettagli": [("Titolo", "titolo"), ("Quota", "quota")],
+             "vuoto": "Nessun intestatario registrato."},
+            {"titolo": "IMMOBILI", "chiave": "immobili", "voce": "{natura} - {localita_nome}",
+             "dettagli": [("Civico", "civico"), ("Tipo località", "tipo_localita"), ("Piani", "numero_piani"),
+                          ("Vani", "numero_vani"), ("Consistenza", "consistenza"),
+                          ("Classificazione", "classificazione")],
+             "vuoto": "Nessun immobile associato."},
+            {"titolo": "VARIAZIONI", "chiave": "variazioni", "voce": "{tipo} del {data_variazione}",
+             "dettagli": [("Nuova partita", "partita_destinazione_numero"),
+                          ("Comune", "partita_destinazione_comune"), ("Riferimento", "numero_riferimento"),
+                          ("Contratto", "tipo_contratto"), ("Data contratto", "data_contratto"),
+                          ("Notaio", "notaio"), ("Repertorio", "repertorio")],
+             "vuoto": "Nessuna variazione registrata."},
+        ],
+    },
+    "genealogico": {
+        "titolo": "REPORT GENEALOGICO DELLA PROPRIETÀ",
+        "campi": [("Comune", "comune_nome"), ("Partita N.", "numero_partita"), ("Tipo", "tipo"),
+                  ("Data impianto", "data_impianto"), ("Stato", "stato"), ("Data chiusura", "data_chiusura"),
+                  ("Provenienza (partita n.)", "numero_provenienza")],
+        "sezioni": [
+            {"titolo": "INTESTATARI", "chiave": "intestatari", "voce": "{nome_completo}",
+             "dettagli": [("Titolo", "titolo"), ("Quota", "quota")],
+             "vuoto": "Nessun intestatario registrato."},
+            {"titolo": "PREDECESSORI", "chiave": "predecessori", "voce": "Partita n. {numero_partita} ({comune_nome})",
+             "dettagli": [("Impianto", "data_impianto"), ("Chiusura", "data_chiusura"), ("Intestatari", "possessori"),
+                          ("Variazione di origine", "tipo_variazione"), ("Data variazione", "data_variazione")],
+             "vuoto": "Nessun predecessore diretto trovato tramite variazioni."},
+            {"titolo": "SUCCESSORI", "chiave": "successori", "voce": "Partita n. {numero_partita} ({comune_nome})",
+             "dettagli": [("Impianto", "data_impianto"), ("Chiusura", "data_chiusura"), ("Intestatari", "possessori"),
+                          ("Variazione di destinazione", "tipo_variazione"), ("Data variazione", "data_variazione")],
+             "vuoto": "Nessun successore trovato."},
+            {"titolo": "GENEALOGIA COMPLETA (OLTRE IL PRIMO GRADO)", "chiave": "albero",
+             "voce": "Livello {livello}: partita n. {numero_partita} ({comune_nome})",
+             "dettagli": [("Relazione", "tipo_relazione"), ("Intestatari", "possessori"),
+                          ("Data variazione", "data_variazione")],
+             "vuoto": "Nessuna altra generazione collegata."},
+        ],
+    },
+    "possessore": {
+        "titolo": "REPORT STORICO DEL POSSESSORE",
+        "campi": [("Possessore", "nome_completo"), ("Paternità", "paternita"), ("Comune", "comune_nome"),
+                  ("Attivo", "attivo")],
+        "sezioni": [
+            {"titolo": "PARTITE INTESTATE", "chiave": "partite", "voce": "Partita n. {numero_partita} ({comune_nome})",
+             "dettagli": [("Tipo", "tipo"), ("Stato", "stato"), ("Impianto", "data_impianto"),
+                          ("Chiusura", "data_chiusura"), ("Titolo", "titolo"), ("Quota", "quota"),
+                          ("Immobili associati", "num_immobili")],
+             "sottoelenco": {"chiave": "immobili", "voce": "{natura} in {localita_nome}"},
+             "vuoto": "Nessuna partita intestata."},
+            {"titolo": "VARIAZIONI CORRELATE", "chiave": "variazioni", "voce": "{tipo_variazione} del {data_variazione}",
+             "dettagli": [("Da partita n.", "partita_origine"), ("Comune origine", "comune_origine"),
+                          ("A partita n.", "partita_destinazione"), ("Comune destinazione", "comune_destinazione"),
+                          ("Contratto", "tipo_contratto"), ("Data contratto", "data_contratto"),
+                          ("Notaio", "notaio"), ("Repertorio", "repertorio")],
+             "vuoto": "Nessuna variazione correlata."},
+        ],
+    },
+    "consultazioni": {
+        "titolo": "REPORT DELLE CONSULTAZIONI",
+        "campi": [("Data inizio", "data_inizio"), ("Data fine", "data_fine"), ("Richiedente", "richiedente")],
+        "sezioni": [
+            {"titolo": "CONSULTAZIONI", "chiave": "consultazioni", "voce": "Consultazione ID {id} - {data}",
+             "dettagli": [("Richiedente", "richiedente"), ("Documento", "documento_identita"),
+                          ("Motivazione", "motivazione"), ("Materiale consultato", "materiale_consultato"),
+                          ("Funzionario autorizzante", "funzionario_autorizzante")],
+             "vuoto": "Nessuna consultazione trovata per i parametri specificati.",
+             "totale": "Totale consultazioni: {n}"},
+        ],
+    },
+}
+
+REPORT_FORMATS = ("txt", "html")
+
+
+# ----------------------------------------------------------------------------
+# Formattazione dei valori
+# ----------------------------------------------------------------------------
+
+def format_value(value: Any) -> Optional[str]:
+    """Converte un valore JSON/Python nella sua forma leggibile (None resta None)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return "Sì" if value else "No"
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%d/%m/%Y")
+    if isinstance(value, str):
+        match = _ISO_DATE_RE.match(value)
+        if match and len(value) in (10, 19, 26):  # 'YYYY-MM-DD' o timestamp ISO restituiti da jsonb
+            return f"{match.group(3)}/{match.group(2)}/{match.group(1)}"
+    return str(value)
+
+
+class _ReportFields(dict):
+    """Dizionario per str.format_map: valori formattati, N/D per mancanti o nulli."""
+
+    def __missing__(self, key):
+        return NOT_AVAILABLE
+
+
+def _format_line(pattern: str, item: Dict[str, Any]) -> str:
+    return pattern.format_map(_ReportFields(
+        (key, format_value(value) or NOT_AVAILABLE) for key, value in item.items()
+    ))
+
+
+# ----------------------------------------------------------------------------
+# Costruzione dei blocchi (indipendente dal formato di uscita)
+# ----------------------------------------------------------------------------
+# Blocchi prodotti:
+#   ("campo", etichetta, valore)
+#   ("sezione", titolo)
+#   ("voce", titolo, [(etichetta, valore), ...], [righe del sottoelenco])
+#   ("nota", testo)
+
+def build_report_blocks(report_type: str, data: Dict[str, Any]) -> List[Tuple]:
+    """Applica il modello del report ai dati e restituisce la sequenza di blocchi."""
+    template = REPORT_TEMPLATES.get(report_type)
+    if template is None:
+        raise ValueError(f"Tipo di report sconosciuto: {report_type!r}")
+
+    blocks: List[Tuple] = []
+    for label, key in template["campi"]:
+        value = format_value(data.get(key))
+        if value is not None:
+            blocks.append(("campo", label, value))
+
+    for section in template["sezioni"]:
+        items = data.get(section["chiave"]) or []
+        blocks.append(("sezione", section["titolo"]))
+        if not items:
+            blocks.append(("nota", section["vuoto"]))
+            continue
+        sublist = section.get("sottoelenco")
+        for item in items:
+            details = []
+            for label, key in section.get("dettagli", ()):
+                value = format_value(item.get(key))
+                if value is not None:
+                    details.append((label, value))
+            sub_lines = []
+            if sublist:
+                sub_lines = [_format_line(sublist["voce"], sub) for sub in item.get(sublist["chiave"]) or []]
+            blocks.append(("voce", _format_line(section["voce"], item), details, sub_lines))
+        if section.get("totale"):
+            blocks.append(("nota", section["totale"].format(n=len(items))))
+    return blocks
+
+
+# ----------------------------------------------------------------------------
+# Renderer
+# ----------------------------------------------------------------------------
+
+def render_text(report_type: str, data: Dict[str, Any], generated_on: Optional[date] = None) -> str:
+    """Report in testo semplice (anteprima, esportazione TXT e PDF)."""
+    title = REPORT_TEMPLATES.get(report_type, {}).get("titolo", "REPORT")
+    lines = [_TEXT_RULE, title.center(60).rstrip(), REPORT_SUBTITLE.center(60).rstrip(), _TEXT_RULE, ""]
+    header_done = False
+
+    for block in build_report_blocks(report_type, data):
+        kind = block[0]
+        if kind == "campo":
+            lines.append(f"{block[1].upper()}: {block[2]}")
+            continue
+        if not header_done:
+            lines.append("")
+            header_done = True
+        if kind == "sezione":
+            if lines[-1]:
+                lines.append("")
+            lines.append(f" {block[1]} ".center(52, "-"))
+        elif kind == "voce":
+            lines.append(f"- {block[1]}")
+            lines.extend(f"    {label}: {value}" for label, value in block[2])
+            lines.extend(f"      · {line}" for line in block[3])
+        elif kind == "nota":
+            lines.append(block[1])
+            lines.append("")
+
+    if lines[-1]:
+        lines.append("")
+    lines += [_TEXT_RULE,
+              f"Report generato il: {format_value(generated_on or date.today())}",
+              REPORT_DISCLAIMER, _TEXT_RULE, ""]
+    return "\n".join(lines)
+
+
+def render_html(report_type: str, data: Dict[str, Any], generated_on: Optional[date] = None) -> str:
+    """Report in HTML (anteprima nel QTextBrowser ed esportazione HTML)."""
+    esc = html.escape
+    title = REPORT_TEMPLATES.get(report_type, {}).get("titolo", "REPORT")
+    parts = ["<html><head><meta charset='utf-8'>",
+             f"<title>{esc(title)}</title>",
+             "<style>body{font-family:sans-serif;font-size:10pt} h1{font-size:14pt;text-align:center}"
+             " h2{font-size:11pt;border-bottom:1px solid #888;margin-top:14px}"
+             " td.lbl{font-weight:bold;padding-right:10px} .det{color:#444;margin-left:16px}"
+             " .nota{font-style:italic;color:#555} .piede{font-size:8pt;color:#666;text-align:center}</style>",
+             "</head><body>",
+             f"<h1>{esc(title)}<br><small>{esc(REPORT_SUBTITLE)}</small></h1>"]
+    in_table = in_list = False
+
+    for block in build_report_blocks(report_type, data):
+        kind = block[0]
+        if kind == "campo":
+            if not in_table:
+                parts.append("<table>")
+                in_table = True
+            parts.append(f"<tr><td class='lbl'>{esc(block[1])}</td><td>{esc(block[2])}</td></tr>")
+            continue
+        if in_table:
+            parts.append("</table>")
+            in_table = False
+        if kind != "voce" and in_list:
+            parts.append("</ul>")
+            in_list = False
+        if kind == "sezione":
+            parts.append(f"<h2>{esc(block[1].capitalize())}</h2>")
+        elif kind == "voce":
+            if not in_list:
+                parts.append("<ul>")
+                in_list = True
+            details = "".join(f"<div class='det'>{esc(label)}: {esc(value)}</div>" for label, value in block[2])
+            sub = ("<ul>" + "".join(f"<li>{esc(line)}</li>" for line in block[3]) + "</ul>") if block[3] else ""
+            parts.append(f"<li><b>{esc(block[1])}</b>{details}{sub}</li>")
+        elif kind == "nota":
+            parts.append(f"<p class='nota'>{esc(block[1])}</p>")
+
+    if in_table:
+        parts.append("</table>")
+    if in_list:
+        parts.append("</ul>")
+    parts.append(f"<hr><p class='piede'>Report generato il: {esc(format_value(generated_on or date.today()))}<br>"
+                 f"{esc(REPORT_DISCLAIMER)}</p></body></html>")
+    return "".join(parts)
+
+
+def render_report(report_type: str, data: Dict[str, Any], fmt: str = "txt",
+                  generated_on: Optional[date] = None) -> str:
+    """Punto di ingresso unico: fmt è 'txt' oppure 'html'."""
+    if fmt == "html":
+        return render_html(report_type, data, generated_on)
+    if fmt == "txt":
+        return render_text(report_type, data, generated_on)
+    raise ValueError(f"Formato di report non supportato: {fmt!r}")
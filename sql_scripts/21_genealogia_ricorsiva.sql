@@ -0,0 +1,230 @@
+-- File: 21_genealogia_ricorsiva.sql (v1.1 - Idempotente)
+-- Scopo: Motore genealogico delle partite.
+--        1. Tabella di chiusura (antenato, discendente, profondita) mantenuta
+--           dai trigger su variazione: le interrogazioni multi-generazione
+--           diventano semplici letture su indice.
+--        2. Nuova versione di albero_genealogico_proprieta basata su WITH RECURSIVE
+--           (entrambe le direzioni, protetta dai cicli, con limite di profondità).
+-- Note: Questo script può essere eseguito più volte senza causare errori.
+
+SET search_path TO catasto, public;
+
+-- ========================================================================
+-- 1. Tabella di chiusura della genealogia
+-- ========================================================================
+CREATE TABLE IF NOT EXISTS partita_genealogia_chiusura (
+    antenato_id    INTEGER NOT NULL REFERENCES partita(id) ON UPDATE CASCADE ON DELETE CASCADE,
+    discendente_id INTEGER NOT NULL REFERENCES partita(id) ON UPDATE CASCADE ON DELETE CASCADE,
+    profondita     INTEGER NOT NULL CHECK (profondita > 0),
+    PRIMARY KEY (antenato_id, discendente_id)
+);
+CREATE INDEX IF NOT EXISTS idx_genealogia_chiusura_discendente
+    ON partita_genealogia_chiusura(discendente_id, profondita);
+
+COMMENT ON TABLE partita_genealogia_chiusura IS
+    'Chiusura transitiva del grafo delle variazioni (origine -> destinazione). Una riga per ogni coppia antenato/discendente con la distanza minima in generazioni.';
+COMMENT ON COLUMN partita_genealogia_chiusura.profondita IS
+    'Numero minimo di variazioni che separano l''antenato dal discendente (1 = predecessore diretto).';
+
+-- Limite di sicurezza per la ricorsione (dati storici con eventuali cicli)
+CREATE OR REPLACE FUNCTION genealogia_profondita_massima()
+RETURNS INTEGER AS $$
+    SELECT 50;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- ========================================================================
+-- 2. Ricalcolo degli antenati per un insieme di partite
+-- ========================================================================
+-- Cancella e ricostruisce le righe di chiusura dei discendenti indicati
+-- risalendo il grafo delle variazioni con una CTE ricorsiva.
+CREATE OR REPLACE FUNCTION ricalcola_antenati_partite(p_partite_ids INTEGER[])
+RETURNS VOID AS $$
+BEGIN
+    IF p_partite_ids IS NULL OR cardinality(p_partite_ids) = 0 THEN
+        RETURN;
+    END IF;
+
+    DELETE FROM partita_genealogia_chiusura WHERE discendente_id = ANY(p_partite_ids);
+
+    INSERT INTO partita_genealogia_chiusura (antenato_id, discendente_id, profondita)
+    WITH RECURSIVE risalita(discendente_id, antenato_id, profondita) AS (
+        SELECT v.partita_destinazione_id, v.partita_origine_id, 1
+        FROM variazione v
+        WHERE v.partita_destinazione_id = ANY(p_partite_ids)
+        UNION
+        SELECT r.discendente_id, v.partita_origine_id, r.profondita + 1
+        FROM risalita r
+        JOIN variazione v ON v.partita_destinazione_id = r.antenato_id
+        WHERE r.profondita < genealogia_profondita_massima()
+          AND v.partita_origine_id <> r.discendente_id
+    )
+    SELECT antenato_id, discendente_id, MIN(profondita)
+    FROM risalita
+    WHERE antenato_id <> discendente_id
+    GROUP BY antenato_id, discendente_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Ricostruzione completa (primo popolamento o riallineamento manuale)
+CREATE OR REPLACE FUNCTION ricostruisci_genealogia_chiusura()
+RETURNS INTEGER AS $$
+DECLARE
+    v_righe INTEGER;
+BEGIN
+    TRUNCATE partita_genealogia_chiusura;
+    PERFORM ricalcola_antenati_partite(ARRAY(
+        SELECT DISTINCT partita_destinazione_id FROM variazione WHERE partita_destinazione_id IS NOT NULL
+    ));
+    SELECT COUNT(*) INTO v_righe FROM partita_genealogia_chiusura;
+    RETURN v_righe;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION ricostruisci_genealogia_chiusura() IS
+    'Svuota e ricostruisce partita_genealogia_chiusura a partire da tutte le variazioni. Restituisce il numero di righe generate.';
+
+-- ========================================================================
+-- 3. Trigger di manutenzione su variazione
+-- ========================================================================
+-- Inserimento: prodotto incrementale (antenati dell'origine) x (discendenti della destinazione),
+-- con lo stesso limite di profondità del ricalcolo (le due vie producono le stesse righe)
+CREATE OR REPLACE FUNCTION aggiungi_arco_genealogia(p_origine_id INTEGER, p_destinazione_id INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF p_destinazione_id IS NULL OR p_origine_id = p_destinazione_id THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO partita_genealogia_chiusura AS c (antenato_id, discendente_id, profondita)
+    SELECT a.antenato_id, d.discendente_id, a.profondita + 1 + d.profondita
+    FROM (
+        SELECT p_origine_id AS antenato_id, 0 AS profondita
+        UNION ALL
+        SELECT antenato_id, profondita FROM partita_genealogia_chiusura WHERE discendente_id = p_origine_id
+    ) a
+    CROSS JOIN (
+        SELECT p_destinazione_id AS discendente_id, 0 AS profondita
+        UNION ALL
+        SELECT discendente_id, profondita FROM partita_genealogia_chiusura WHERE antenato_id = p_destinazione_id
+    ) d
+    WHERE a.antenato_id <> d.discendente_id
+      AND a.profondita + 1 + d.profondita <= genealogia_profondita_massima()
+    ON CONFLICT (antenato_id, discendente_id)
+    DO UPDATE SET profondita = LEAST(c.profondita, EXCLUDED.profondita);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Cancellazione/modifica: si ricalcolano la vecchia destinazione e tutti i suoi discendenti
+CREATE OR REPLACE FUNCTION rimuovi_arco_genealogia(p_destinazione_id INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    IF p_destinazione_id IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM ricalcola_antenati_partite(ARRAY(
+        SELECT p_destinazione_id
+        UNION
+        SELECT discendente_id FROM partita_genealogia_chiusura WHERE antenato_id = p_destinazione_id
+    ));
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trg_variazione_genealogia()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM aggiungi_arco_genealogia(NEW.partita_origine_id, NEW.partita_destinazione_id);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM rimuovi_arco_genealogia(OLD.partita_destinazione_id);
+    ELSIF TG_OP = 'UPDATE' THEN
+        IF NEW.partita_origine_id IS DISTINCT FROM OLD.partita_origine_id
+           OR NEW.partita_destinazione_id IS DISTINCT FROM OLD.partita_destinazione_id THEN
+            PERFORM rimuovi_arco_genealogia(OLD.partita_destinazione_id);
+            PERFORM aggiungi_arco_genealogia(NEW.partita_origine_id, NEW.partita_destinazione_id);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_variazione_genealogia ON variazione;
+CREATE TRIGGER trg_variazione_genealogia
+AFTER INSERT OR DELETE OR UPDATE OF partita_origine_id, partita_destinazione_id ON variazione
+FOR EACH ROW EXECUTE FUNCTION trg_variazione_genealogia();
+
+-- ========================================================================
+-- 4. albero_genealogico_proprieta con CTE ricorsiva
+-- ========================================================================
+-- Sostituisce la versione dello script 11 (tabella temporanea, 5 livelli fissi
+-- e colonna p.comune_nome non più esistente). Firma invariata.
+CREATE OR REPLACE FUNCTION albero_genealogico_proprieta(p_partita_id INTEGER)
+RETURNS TABLE (
+    livello INTEGER,
+    tipo_relazione VARCHAR,
+    partita_id INTEGER,
+    comune_nome VARCHAR,
+    numero_partita INTEGER,
+    tipo VARCHAR,
+    possessori TEXT,
+    data_variazione DATE
+) AS $$
+BEGIN
+    RETURN QUERY
+    WITH RECURSIVE
+    predecessori(partita_id, livello, data_variazione) AS (
+        SELECT v.partita_origine_id, -1, v.data_variazione
+        FROM variazione v WHERE v.partita_destinazione_id = p_partita_id
+        UNION
+        SELECT v.partita_origine_id, pr.livello - 1, v.data_variazione
+        FROM predecessori pr
+        JOIN variazione v ON v.partita_destinazione_id = pr.partita_id
+        WHERE pr.livello > -genealogia_profondita_massima()
+          AND v.partita_origine_id <> p_partita_id
+    ),
+    successori(partita_id, livello, data_variazione) AS (
+        SELECT v.partita_destinazione_id, 1, v.data_variazione
+        FROM variazione v WHERE v.partita_origine_id = p_partita_id AND v.partita_destinazione_id IS NOT NULL
+        UNION
+        SELECT v.partita_destinazione_id, su.livello + 1, v.data_variazione
+        FROM successori su
+        JOIN variazione v ON v.partita_origine_id = su.partita_id
+        WHERE su.livello < genealogia_profondita_massima()
+          AND v.partita_destinazione_id IS NOT NULL
+          AND v.partita_destinazione_id <> p_partita_id
+    ),
+    -- Ogni partita compare una sola volta, al livello più vicino alla radice
+    nodi AS (
+        SELECT 0 AS livello, 'corrente'::VARCHAR AS tipo_relazione, p_partita_id AS partita_id, NULL::DATE AS data_variazione
+        UNION ALL
+        (SELECT DISTINCT ON (pr.partita_id) pr.livello, 'predecessore'::VARCHAR, pr.partita_id, pr.data_variazione
+           FROM predecessori pr ORDER BY pr.partita_id, pr.livello DESC, pr.data_variazione)
+        UNION ALL
+        (SELECT DISTINCT ON (su.partita_id) su.livello, 'successore'::VARCHAR, su.partita_id, su.data_variazione
+           FROM successori su ORDER BY su.partita_id, su.livello, su.data_variazione)
+    )
+    SELECT n.livello, n.tipo_relazione, p.id, c.nome::VARCHAR, p.numero_partita, p.tipo::VARCHAR,
+           (SELECT string_agg(DISTINCT pos.nome_completo, ', ')
+              FROM partita_possessore pp JOIN possessore pos ON pp.possessore_id = pos.id
+             WHERE pp.partita_id = p.id),
+           n.data_variazione
+    FROM nodi n
+    JOIN partita p ON p.id = n.partita_id
+    JOIN comune c ON c.id = p.comune_id
+    ORDER BY n.livello, c.nome, p.numero_partita;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- ========================================================================
+-- 5. Primo popolamento della tabella di chiusura
+-- ========================================================================
+DO $$
+DECLARE
+    v_righe INTEGER;
+BEGIN
+    v_righe := ricostruisci_genealogia_chiusura();
+    RAISE NOTICE 'Tabella partita_genealogia_chiusura ricostruita: % righe.', v_righe;
+END $$;
+
+-- ========================================================================
+-- Fine Script
+-- ========================================================================
@@ -0,0 +1,213 @@
+-- File: 22_report_strutturati.sql (v1.0 - Idempotente)
+-- Scopo: Versioni strutturate (JSONB) dei report dello script 14.
+--        Le funzioni genera_report_* costruiscono il testo con concatenazioni
+--        ripetute dentro i cicli (costo quadratico sulla dimensione del report)
+--        e legano la formattazione al server. Queste funzioni restituiscono
+--        invece un unico documento JSONB prodotto da una sola query insiemistica;
+--        l'impaginazione (TXT, HTML, PDF) avviene lato client (report_renderer.py).
+-- Note: Le funzioni testuali dello script 14 restano disponibili per compatibilità.
+--       Richiede lo script 21 (albero_genealogico_proprieta ricorsiva).
+
+SET search_path TO catasto, public;
+
+-- ========================================================================
+-- Funzione: report_proprieta_json
+-- ========================================================================
+CREATE OR REPLACE FUNCTION report_proprieta_json(p_partita_id INTEGER)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'partita_id', p.id,
+        'comune_nome', c.nome,
+        'numero_partita', p.numero_partita,
+        'suffisso_partita', p.suffisso_partita,
+        'tipo', p.tipo,
+        'stato', p.stato,
+        'data_impianto', p.data_impianto,
+        'data_chiusura', p.data_chiusura,
+        'numero_provenienza', p.numero_provenienza,
+        'intestatari', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                       'nome_completo', pos.nome_completo, 'titolo', pp.titolo, 'quota', pp.quota)
+                   ORDER BY pos.nome_completo)
+            FROM partita_possessore pp JOIN possessore pos ON pp.possessore_id = pos.id
+            WHERE pp.partita_id = p.id), '[]'::jsonb),
+        'immobili', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                       'id', i.id, 'natura', i.natura, 'localita_nome', l.nome, 'civico', l.civico,
+                       'tipo_localita', l.tipologia_stradale, 'numero_piani', i.numero_piani,
+                       'numero_vani', i.numero_vani, 'consistenza', i.consistenza,
+                       'classificazione', i.classificazione)
+                   ORDER BY l.nome, i.natura)
+            FROM immobile i JOIN localita l ON i.localita_id = l.id
+            WHERE i.partita_id = p.id), '[]'::jsonb),
+        'variazioni', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                       'tipo', v.tipo, 'data_variazione', v.data_variazione,
+                       'numero_riferimento', v.numero_riferimento,
+                       'partita_destinazione_numero', p2.numero_partita,
+                       'partita_destinazione_comune', c2.nome,
+                       'tipo_contratto', con.tipo, 'data_contratto', con.data_contratto,
+                       'notaio', con.notaio, 'repertorio', con.repertorio)
+                   ORDER BY v.data_variazione DESC)
+            FROM variazione v
+            LEFT JOIN partita p2 ON v.partita_destinazione_id = p2.id
+            LEFT JOIN comune c2 ON p2.comune_id = c2.id
+            LEFT JOIN contratto con ON v.id = con.variazione_id
+            WHERE v.partita_origine_id = p.id), '[]'::jsonb)
+    )
+    FROM partita p JOIN comune c ON p.comune_id = c.id
+    WHERE p.id = p_partita_id;
+$$ LANGUAGE sql STABLE;
+
+-- ========================================================================
+-- Funzione: report_genealogico_json
+-- ========================================================================
+CREATE OR REPLACE FUNCTION report_genealogico_json(p_partita_id INTEGER)
+RETURNS JSONB AS $$
+    WITH collegate AS (
+        -- Predecessori e successori diretti con la variazione che li collega
+        SELECT 'predecessore' AS verso, v.partita_origine_id AS partita_id, v.tipo AS tipo_variazione, v.data_variazione
+        FROM variazione v WHERE v.partita_destinazione_id = p_partita_id
+        UNION ALL
+        SELECT 'successore', v.partita_destinazione_id, v.tipo, v.data_variazione
+        FROM variazione v WHERE v.partita_origine_id = p_partita_id AND v.partita_destinazione_id IS NOT NULL
+    ),
+    dettaglio AS (
+        SELECT col.verso, col.data_variazione,
+               jsonb_build_object(
+                   'partita_id', p.id, 'comune_nome', c.nome, 'numero_partita', p.numero_partita,
+                   'data_impianto', p.data_impianto, 'data_chiusura', p.data_chiusura,
+                   'possessori', (SELECT string_agg(DISTINCT pos.nome_completo, ', ')
+                                    FROM partita_possessore pp JOIN possessore pos ON pp.possessore_id = pos.id
+                                   WHERE pp.partita_id = p.id),
+                   'tipo_variazione', col.tipo_variazione, 'data_variazione', col.data_variazione) AS voce
+        FROM collegate col
+        JOIN partita p ON p.id = col.partita_id
+        JOIN comune c ON p.comune_id = c.id
+    )
+    SELECT jsonb_build_object(
+        'partita_id', p.id,
+        'comune_nome', c.nome,
+        'numero_partita', p.numero_partita,
+        'tipo', p.tipo,
+        'stato', p.stato,
+        'data_impianto', p.data_impianto,
+        'data_chiusura', p.data_chiusura,
+        'numero_provenienza', p.numero_provenienza,
+        'intestatari', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                       'nome_completo', pos.nome_completo, 'titolo', pp.titolo, 'quota', pp.quota)
+                   ORDER BY pos.nome_completo)
+            FROM partita_possessore pp JOIN possessore pos ON pp.possessore_id = pos.id
+            WHERE pp.partita_id = p.id), '[]'::jsonb),
+        'predecessori', COALESCE((
+            SELECT jsonb_agg(d.voce ORDER BY d.data_variazione DESC)
+            FROM dettaglio d WHERE d.verso = 'predecessore'), '[]'::jsonb),
+        'successori', COALESCE((
+            SELECT jsonb_agg(d.voce ORDER BY d.data_variazione)
+            FROM dettaglio d WHERE d.verso = 'successore'), '[]'::jsonb),
+        -- Genealogia completa su più generazioni (esclusi la radice e i collegamenti diretti)
+        'albero', COALESCE((
+            SELECT jsonb_agg(to_jsonb(a) ORDER BY a.livello, a.comune_nome, a.numero_partita)
+            FROM albero_genealogico_proprieta(p.id) a
+            WHERE abs(a.livello) > 1), '[]'::jsonb)
+    )
+    FROM partita p JOIN comune c ON p.comune_id = c.id
+    WHERE p.id = p_partita_id;
+$$ LANGUAGE sql STABLE;
+
+-- ========================================================================
+-- Funzione: report_possessore_json
+-- ========================================================================
+CREATE OR REPLACE FUNCTION report_possessore_json(p_possessore_id INTEGER)
+RETURNS JSONB AS $$
+    WITH partite_possessore AS (
+        SELECT p.id, p.numero_partita, p.tipo, p.stato, p.data_impianto, p.data_chiusura,
+               c.nome AS comune_nome, pp.titolo, pp.quota
+        FROM partita_possessore pp
+        JOIN partita p ON pp.partita_id = p.id
+        JOIN comune c ON p.comune_id = c.id
+        WHERE pp.possessore_id = p_possessore_id
+    ),
+    -- Immobili di tutte le partite in un'unica passata, raggruppati per partita
+    immobili_partita AS (
+        SELECT i.partita_id,
+               jsonb_agg(jsonb_build_object(
+                   'natura', i.natura, 'localita_nome', l.nome,
+                   'tipo_localita', l.tipologia_stradale, 'classificazione', i.classificazione)
+               ORDER BY l.nome, i.natura) AS immobili,
+               COUNT(*) AS num_immobili
+        FROM immobile i JOIN localita l ON i.localita_id = l.id
+        WHERE i.partita_id IN (SELECT id FROM partite_possessore)
+        GROUP BY i.partita_id
+    )
+    SELECT jsonb_build_object(
+        'possessore_id', pos.id,
+        'nome_completo', pos.nome_completo,
+        'paternita', pos.paternita,
+        'comune_nome', c.nome,
+        'attivo', pos.attivo,
+        'partite', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                       'partita_id', pp.id, 'numero_partita', pp.numero_partita, 'comune_nome', pp.comune_nome,
+                       'tipo', pp.tipo, 'stato', pp.stato, 'data_impianto', pp.data_impianto,
+                       'data_chiusura', pp.data_chiusura, 'titolo', pp.titolo, 'quota', pp.quota,
+                       'num_immobili', COALESCE(ip.num_immobili, 0),
+                       'immobili', COALESCE(ip.immobili, '[]'::jsonb))
+                   ORDER BY pp.data_impianto DESC NULLS LAST, pp.numero_partita)
+            FROM partite_possessore pp LEFT JOIN immobili_partita ip ON ip.partita_id = pp.id), '[]'::jsonb),
+        'variazioni', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                       'tipo_variazione', v.tipo, 'data_variazione', v.data_variazione,
+                       'partita_origine', p_orig.numero_partita, 'comune_origine', c_orig.nome,
+                       'partita_destinazione', p_dest.numero_partita, 'comune_destinazione', c_dest.nome,
+                       'tipo_contratto', con.tipo, 'data_contratto', con.data_contratto,
+                       'notaio', con.notaio, 'repertorio', con.repertorio)
+                   ORDER BY v.data_variazione DESC)
+            FROM variazione v
+            JOIN partita p_orig ON v.partita_origine_id = p_orig.id
+            JOIN comune c_orig ON p_orig.comune_id = c_orig.id
+            LEFT JOIN partita p_dest ON v.partita_destinazione_id = p_dest.id
+            LEFT JOIN comune c_dest ON p_dest.comune_id = c_dest.id
+            LEFT JOIN contratto con ON v.id = con.variazione_id
+            WHERE v.partita_origine_id IN (SELECT id FROM partite_possessore)
+               OR v.partita_destinazione_id IN (SELECT id FROM partite_possessore)), '[]'::jsonb)
+    )
+    FROM possessore pos JOIN comune c ON pos.comune_id = c.id
+    WHERE pos.id = p_possessore_id;
+$$ LANGUAGE sql STABLE;
+
+-- ========================================================================
+-- Funzione: report_consultazioni_json
+-- ========================================================================
+CREATE OR REPLACE FUNCTION report_consultazioni_json(
+    p_data_inizio DATE DEFAULT NULL,
+    p_data_fine DATE DEFAULT NULL,
+    p_richiedente VARCHAR DEFAULT NULL
+)
+RETURNS JSONB AS $$
+    SELECT jsonb_build_object(
+        'data_inizio', p_data_inizio,
+        'data_fine', p_data_fine,
+        'richiedente', p_richiedente,
+        'consultazioni', COALESCE(jsonb_agg(jsonb_build_object(
+                'id', c.id, 'data', c.data, 'richiedente', c.richiedente,
+                'documento_identita', c.documento_identita, 'motivazione', c.motivazione,
+                'materiale_consultato', c.materiale_consultato,
+                'funzionario_autorizzante', c.funzionario_autorizzante)
+            ORDER BY c.data DESC, c.richiedente) FILTER (WHERE c.id IS NOT NULL), '[]'::jsonb)
+    )
+    FROM consultazione c
+    WHERE (p_data_inizio IS NULL OR c.data >= p_data_inizio)
+      AND (p_data_fine IS NULL OR c.data <= p_data_fine)
+      AND (p_richiedente IS NULL OR c.richiedente ILIKE '%' || p_richiedente || '%');
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION report_proprieta_json(INTEGER) IS 'Dati strutturati del report di proprietà (sostituisce genera_report_proprieta).';
+COMMENT ON FUNCTION report_genealogico_json(INTEGER) IS 'Dati strutturati del report genealogico, con albero multi-generazione (sostituisce genera_report_genealogico).';
+COMMENT ON FUNCTION report_possessore_json(INTEGER) IS 'Dati strutturati del report del possessore (sostituisce genera_report_possessore).';
+COMMENT ON FUNCTION report_consultazioni_json(DATE, DATE, VARCHAR) IS 'Dati strutturati del report delle consultazioni (sostituisce genera_report_consultazioni).';
+
+-- ========================================================================
+-- Fine Script
+-- ========================================================================
@@ -0,0 +1,68 @@
+-- File: 23_notifiche_permessi.sql (v1.0 - Idempotente)
+-- Scopo: Notifiche LISTEN/NOTIFY sulle modifiche a ruoli e permessi.
+--        Il client mantiene in memoria i permessi dell'utente collegato
+--        (permissions.PermissionCache) e li rilegge solo quando riceve una
+--        notifica sul canale 'catasto_permessi'.
+--        Payload: ID dell'utente interessato, oppure '*' se cambia la tabella
+--        permesso (tutti gli utenti).
+-- Note: pg_notify dentro una transazione viene consegnato solo al COMMIT e
+--       le notifiche identiche nella stessa transazione vengono accorpate.
+
+SET search_path TO catasto, public;
+
+-- ========================================================================
+-- Utenti: ruolo, stato attivo, cancellazione
+-- ========================================================================
+CREATE OR REPLACE FUNCTION trg_notifica_permessi_utente()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('catasto_permessi', OLD.id::text);
+    ELSIF NEW.ruolo IS DISTINCT FROM OLD.ruolo OR NEW.attivo IS DISTINCT FROM OLD.attivo THEN
+        PERFORM pg_notify('catasto_permessi', NEW.id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notifica_permessi_utente ON utente;
+CREATE TRIGGER trg_notifica_permessi_utente
+AFTER DELETE OR UPDATE OF ruolo, attivo ON utente
+FOR EACH ROW EXECUTE FUNCTION trg_notifica_permessi_utente();
+
+-- ========================================================================
+-- Permessi assegnati ai singoli utenti
+-- ========================================================================
+CREATE OR REPLACE FUNCTION trg_notifica_utente_permesso()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('catasto_permessi', OLD.utente_id::text);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('catasto_permessi', NEW.utente_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notifica_utente_permesso ON utente_permesso;
+CREATE TRIGGER trg_notifica_utente_permesso
+AFTER INSERT OR UPDATE OR DELETE ON utente_permesso
+FOR EACH ROW EXECUTE FUNCTION trg_notifica_utente_permesso();
+
+-- ========================================================================
+-- Catalogo dei permessi (rinomina/cancellazione: riguarda tutti gli utenti)
+-- ========================================================================
+CREATE OR REPLACE FUNCTION trg_notifica_catalogo_permessi()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('catasto_permessi', '*');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notifica_catalogo_permessi ON permesso;
+CREATE TRIGGER trg_notifica_catalogo_permessi
+AFTER UPDATE OR DELETE OR TRUNCATE ON permesso
+FOR EACH STATEMENT EXECUTE FUNCTION trg_notifica_catalogo_permessi();
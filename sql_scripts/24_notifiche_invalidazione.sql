@@ -0,0 +1,117 @@
+-- File: 24_notifiche_invalidazione.sql (v1.1 - Idempotente)
+-- Scopo: Bus di invalidazione delle cache client (invalidation_bus.py).
+--        A ogni modifica delle tabelle principali viene inviata una notifica
+--        sul canale 'catasto_invalidazioni' con payload 'entita:id'
+--        (es. 'comune:12'); TRUNCATE invia 'entita:*'.
+--        I client svuotano solo le cache e ricaricano solo i widget interessati.
+-- Note: pg_notify dentro una transazione viene consegnato solo al COMMIT e
+--       i payload identici nella stessa transazione vengono accorpati.
+--       Le tabelle di collegamento notificano l'entità padre (es. una modifica
+--       a partita_possessore notifica 'partita:<partita_id>').
+--       I trigger sono a livello di istruzione, con tabelle di transizione: oltre
+--       50 ID distinti per istruzione (TG_ARGV[2]; importazioni CSV, caricamenti massivi)
+--       si invia un solo 'entita:*' invece di una notifica per riga a ogni client.
+
+SET search_path TO catasto, public;
+
+-- ========================================================================
+-- Funzioni di notifica generiche
+-- ========================================================================
+-- TG_ARGV[0] = nome dell'entità nel payload
+-- TG_ARGV[1] = colonna con l'ID da notificare (default 'id')
+-- TG_ARGV[2] = numero massimo di ID notificati singolarmente (default 50)
+CREATE OR REPLACE FUNCTION trg_notifica_invalidazione()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_colonna TEXT := COALESCE(TG_ARGV[1], 'id');
+    v_soglia INTEGER := COALESCE(TG_ARGV[2]::INTEGER, 50);
+    v_ids TEXT[];
+    v_id TEXT;
+BEGIN
+    -- Al massimo v_soglia + 1 ID distinti: basta per decidere tra notifiche singole e '*'
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(t.id) INTO v_ids
+        FROM (SELECT DISTINCT to_jsonb(n) ->> v_colonna AS id FROM nuove n LIMIT v_soglia + 1) t;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(t.id) INTO v_ids
+        FROM (SELECT DISTINCT to_jsonb(v) ->> v_colonna AS id FROM vecchie v LIMIT v_soglia + 1) t;
+    ELSE
+        SELECT array_agg(t.id) INTO v_ids
+        FROM (SELECT to_jsonb(v) ->> v_colonna AS id FROM vecchie v
+              UNION
+              SELECT to_jsonb(n) ->> v_colonna FROM nuove n
+              LIMIT v_soglia + 1) t;
+    END IF;
+
+    IF v_ids IS NULL THEN
+        RETURN NULL;  -- nessuna riga modificata
+    END IF;
+    IF cardinality(v_ids) > v_soglia OR array_position(v_ids, NULL) IS NOT NULL THEN
+        PERFORM pg_notify('catasto_invalidazioni', TG_ARGV[0] || ':*');
+        RETURN NULL;
+    END IF;
+    FOREACH v_id IN ARRAY v_ids LOOP
+        PERFORM pg_notify('catasto_invalidazioni', TG_ARGV[0] || ':' || v_id);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trg_notifica_invalidazione_tabella()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('catasto_invalidazioni', TG_ARGV[0] || ':*');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ========================================================================
+-- Registrazione dei trigger (tabella, entità, colonna ID)
+-- ========================================================================
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN
+        SELECT * FROM (VALUES
+            ('comune',             'comune',          'id'),
+            ('tipo_localita',      'tipo_localita',   'id'),
+            ('periodo_storico',    'periodo_storico', 'id'),
+            ('partita',            'partita',         'id'),
+            ('possessore',         'possessore',      'id'),
+            ('localita',           'localita',        'id'),
+            ('immobile',           'immobile',        'id'),
+            ('variazione',         'variazione',      'id'),
+            ('partita_possessore', 'partita',         'partita_id')
+        ) AS t(tabella, entita, colonna)
+    LOOP
+        IF to_regclass(r.tabella) IS NULL THEN
+            RAISE NOTICE 'Tabella % non trovata: trigger di invalidazione non creato.', r.tabella;
+            CONTINUE;
+        END IF;
+        -- v1.0: un trigger FOR EACH ROW per tabella
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_invalidazione_%1$s ON %1$I', r.tabella);
+
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_invalidazione_%1$s_ins ON %1$I', r.tabella);
+        EXECUTE format('CREATE TRIGGER trg_invalidazione_%1$s_ins
+                        AFTER INSERT ON %1$I REFERENCING NEW TABLE AS nuove
+                        FOR EACH STATEMENT EXECUTE FUNCTION trg_notifica_invalidazione(%2$L, %3$L)',
+                       r.tabella, r.entita, r.colonna);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_invalidazione_%1$s_upd ON %1$I', r.tabella);
+        EXECUTE format('CREATE TRIGGER trg_invalidazione_%1$s_upd
+                        AFTER UPDATE ON %1$I REFERENCING OLD TABLE AS vecchie NEW TABLE AS nuove
+                        FOR EACH STATEMENT EXECUTE FUNCTION trg_notifica_invalidazione(%2$L, %3$L)',
+                       r.tabella, r.entita, r.colonna);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_invalidazione_%1$s_del ON %1$I', r.tabella);
+        EXECUTE format('CREATE TRIGGER trg_invalidazione_%1$s_del
+                        AFTER DELETE ON %1$I REFERENCING OLD TABLE AS vecchie
+                        FOR EACH STATEMENT EXECUTE FUNCTION trg_notifica_invalidazione(%2$L, %3$L)',
+                       r.tabella, r.entita, r.colonna);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_invalidazione_%1$s_truncate ON %1$I', r.tabella);
+        EXECUTE format('CREATE TRIGGER trg_invalidazione_%1$s_truncate
+                        AFTER TRUNCATE ON %1$I
+                        FOR EACH STATEMENT EXECUTE FUNCTION trg_notifica_invalidazione_tabella(%2$L)',
+                       r.tabella, r.entita);
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,69 @@
+-- File: 25_archivio_documenti.sql (v1.0 - Idempotente)
+-- Scopo: Archivio degli allegati indirizzato per contenuto (document_store.py).
+--        Ogni contenuto (file) è registrato una sola volta in documento_contenuto,
+--        identificato dal suo hash SHA-256; i record di documento_storico che lo
+--        usano lo referenziano con contenuto_sha256. Il numero di riferimenti è
+--        mantenuto da trigger: i contenuti con riferimenti = 0 possono essere
+--        eliminati dalla pulizia dell'archivio.
+-- Note: documento_storico.percorso_file continua a contenere il percorso del file
+--       (ora quello del contenuto archiviato), quindi la lettura non cambia.
+
+SET search_path TO catasto, public;
+
+CREATE TABLE IF NOT EXISTS documento_contenuto (
+    sha256 CHAR(64) PRIMARY KEY,
+    percorso_relativo TEXT NOT NULL,
+    dimensione_bytes BIGINT NOT NULL,
+    riferimenti INTEGER NOT NULL DEFAULT 0 CHECK (riferimenti >= 0),
+    data_creazione TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE documento_contenuto IS 'Contenuti degli allegati, salvati una sola volta e identificati dall''hash SHA-256.';
+COMMENT ON COLUMN documento_contenuto.percorso_relativo IS 'Percorso del file rispetto alla radice dell''archivio allegati.';
+COMMENT ON COLUMN documento_contenuto.riferimenti IS 'Numero di record di documento_storico che usano il contenuto (mantenuto da trigger).';
+
+ALTER TABLE documento_storico ADD COLUMN IF NOT EXISTS contenuto_sha256 CHAR(64)
+    REFERENCES documento_contenuto(sha256) ON DELETE RESTRICT;
+CREATE INDEX IF NOT EXISTS idx_documento_contenuto_sha256 ON documento_storico(contenuto_sha256)
+    WHERE contenuto_sha256 IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_documento_contenuto_non_usati ON documento_contenuto(sha256)
+    WHERE riferimenti = 0;
+
+-- ========================================================================
+-- Conteggio dei riferimenti
+-- ========================================================================
+CREATE OR REPLACE FUNCTION trg_aggiorna_riferimenti_contenuto()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.contenuto_sha256 IS NOT NULL THEN
+        UPDATE documento_contenuto SET riferimenti = riferimenti - 1 WHERE sha256 = OLD.contenuto_sha256;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.contenuto_sha256 IS NOT NULL THEN
+        UPDATE documento_contenuto SET riferimenti = riferimenti + 1 WHERE sha256 = NEW.contenuto_sha256;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_riferimenti_contenuto_ins_del ON documento_storico;
+CREATE TRIGGER trg_riferimenti_contenuto_ins_del
+AFTER INSERT OR DELETE ON documento_storico
+FOR EACH ROW EXECUTE FUNCTION trg_aggiorna_riferimenti_contenuto();
+
+DROP TRIGGER IF EXISTS trg_riferimenti_contenuto_upd ON documento_storico;
+CREATE TRIGGER trg_riferimenti_contenuto_upd
+AFTER UPDATE OF contenuto_sha256 ON documento_storico
+FOR EACH ROW
+WHEN (OLD.contenuto_sha256 IS DISTINCT FROM NEW.contenuto_sha256)
+EXECUTE FUNCTION trg_aggiorna_riferimenti_contenuto();
+
+-- Riallinea i contatori (utile dopo ripristini parziali o modifiche manuali)
+UPDATE documento_contenuto dc
+SET riferimenti = sub.n
+FROM (
+    SELECT dc2.sha256, COUNT(ds.id) AS n
+    FROM documento_contenuto dc2
+    LEFT JOIN documento_storico ds ON ds.contenuto_sha256 = dc2.sha256
+    GROUP BY dc2.sha256
+) sub
+WHERE dc.sha256 = sub.sha256 AND dc.riferimenti <> sub.n;
@@ -0,0 +1,12 @@
+-- File: 26_ingestione_documenti.sql (v1.0 - Idempotente)
+-- Scopo: Supporto all'importazione massiva di documenti (document_ingestion.py).
+--        Ogni documento importato da un manifest ha in metadati la chiave
+--        {"ingestione": {"manifest": <percorso assoluto>, "chiave": "<manifest>:<file>"}}: alla
+--        ripresa di un'importazione interrotta i file già importati si trovano con
+--        una lettura dell'indice, senza scansionare documento_storico.
+
+SET search_path TO catasto, public;
+
+CREATE INDEX IF NOT EXISTS idx_documento_ingestione_manifest
+    ON documento_storico ((metadati->'ingestione'->>'manifest'))
+    WHERE metadati ? 'ingestione';
@@ -0,0 +1,243 @@
+-- File: 27_statistiche_annuali.sql (v1.0 - Idempotente)
+-- Scopo: Tabella dei fatti annuali per le serie storiche (CatastoDBManager.get_serie_storiche).
+--        Per comune e anno contiene:
+--          partite_aperte  partite con data_impianto nell'anno
+--          partite_chiuse  partite con data_chiusura nell'anno
+--          variazioni      per tipo (categoria), anno di data_variazione, comune della partita di origine
+--          immobili        per classificazione (categoria), anno di impianto della partita
+--        La tabella è mantenuta da trigger a livello di istruzione (con tabelle di
+--        transizione): un INSERT di 10.000 immobili produce un solo aggiornamento per
+--        ogni (comune, anno, classificazione) coinvolto, non 10.000.
+--        Le partite attive a fine anno si ottengono come somma cumulativa
+--        (aperte - chiuse) e non vengono memorizzate.
+-- Note: ricalcola_statistica_annuale() ricostruisce la tabella da zero (eseguita alla
+--       fine di questo script; utile dopo TRUNCATE o caricamenti con trigger disabilitati).
+--       statistiche_catastali_periodo() (script 11) viene ridefinita per leggere da qui.
+
+SET search_path TO catasto, public;
+
+CREATE TABLE IF NOT EXISTS statistica_annuale (
+    comune_id INTEGER NOT NULL REFERENCES comune(id) ON DELETE CASCADE,
+    anno INTEGER NOT NULL,
+    misura VARCHAR(30) NOT NULL CHECK (misura IN ('partite_aperte', 'partite_chiuse', 'variazioni', 'immobili')),
+    categoria VARCHAR(100) NOT NULL DEFAULT '',
+    valore BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (comune_id, anno, misura, categoria)
+);
+CREATE INDEX IF NOT EXISTS idx_statistica_annuale_anno ON statistica_annuale (anno, misura);
+
+COMMENT ON TABLE statistica_annuale IS 'Conteggi annuali per comune (partite aperte/chiuse, variazioni per tipo, immobili per classificazione), mantenuti da trigger.';
+
+-- ========================================================================
+-- Applicazione delle variazioni (una riga per chiave, in ordine di chiave per evitare deadlock)
+-- ========================================================================
+CREATE OR REPLACE FUNCTION statistica_annuale_somma(
+    p_comune_id INTEGER[], p_anno INTEGER[], p_misura TEXT[], p_categoria TEXT[], p_delta BIGINT[]
+) RETURNS VOID AS $$
+    INSERT INTO statistica_annuale AS s (comune_id, anno, misura, categoria, valore)
+    SELECT t.comune_id, t.anno, t.misura, t.categoria, SUM(t.delta)
+    FROM unnest(p_comune_id, p_anno, p_misura, p_categoria, p_delta) AS t(comune_id, anno, misura, categoria, delta)
+    WHERE t.comune_id IS NOT NULL AND t.anno IS NOT NULL
+    GROUP BY t.comune_id, t.anno, t.misura, t.categoria
+    HAVING SUM(t.delta) <> 0
+    ORDER BY t.comune_id, t.anno, t.misura, t.categoria
+    ON CONFLICT (comune_id, anno, misura, categoria) DO UPDATE SET valore = s.valore + EXCLUDED.valore;
+$$ LANGUAGE sql;
+
+-- ========================================================================
+-- Trigger su partita: aperture e chiusure; se cambiano comune o data di impianto
+-- si spostano anche gli immobili e le variazioni della partita
+-- ========================================================================
+CREATE OR REPLACE FUNCTION trg_statistica_annuale_partita()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM statistica_annuale_somma(array_agg(d.comune_id), array_agg(d.anno), array_agg(d.misura),
+                                         array_agg(d.categoria), array_agg(d.delta))
+        FROM (
+            SELECT comune_id, EXTRACT(YEAR FROM data_impianto)::INTEGER AS anno, 'partite_aperte' AS misura, '' AS categoria, 1::BIGINT AS delta FROM nuove
+            UNION ALL
+            SELECT comune_id, EXTRACT(YEAR FROM data_chiusura)::INTEGER, 'partite_chiuse', '', 1 FROM nuove WHERE data_chiusura IS NOT NULL
+        ) d;
+    ELSIF TG_OP = 'DELETE' THEN
+        -- Immobili e variazioni (ON DELETE RESTRICT) sono già stati eliminati e sottratti
+        PERFORM statistica_annuale_somma(array_agg(d.comune_id), array_agg(d.anno), array_agg(d.misura),
+                                         array_agg(d.categoria), array_agg(d.delta))
+        FROM (
+            SELECT comune_id, EXTRACT(YEAR FROM data_impianto)::INTEGER AS anno, 'partite_aperte' AS misura, '' AS categoria, -1::BIGINT AS delta FROM vecchie
+            UNION ALL
+            SELECT comune_id, EXTRACT(YEAR FROM data_chiusura)::INTEGER, 'partite_chiuse', '', -1 FROM vecchie WHERE data_chiusura IS NOT NULL
+        ) d;
+    ELSE
+        PERFORM statistica_annuale_somma(array_agg(d.comune_id), array_agg(d.anno), array_agg(d.misura),
+                                         array_agg(d.categoria), array_agg(d.delta))
+        FROM (
+            WITH cambiate AS (
+                SELECT v.id, v.comune_id AS v_comune, v.data_impianto AS v_impianto, v.data_chiusura AS v_chiusura,
+                       n.comune_id AS n_comune, n.data_impianto AS n_impianto, n.data_chiusura AS n_chiusura
+                FROM vecchie v JOIN nuove n ON n.id = v.id
+                WHERE (v.comune_id, v.data_impianto, v.data_chiusura) IS DISTINCT FROM (n.comune_id, n.data_impianto, n.data_chiusura)
+            )
+            SELECT v_comune AS comune_id, EXTRACT(YEAR FROM v_impianto)::INTEGER AS anno, 'partite_aperte' AS misura, '' AS categoria, -1::BIGINT AS delta FROM cambiate
+            UNION ALL
+            SELECT n_comune, EXTRACT(YEAR FROM n_impianto)::INTEGER, 'partite_aperte', '', 1 FROM cambiate
+            UNION ALL
+            SELECT v_comune, EXTRACT(YEAR FROM v_chiusura)::INTEGER, 'partite_chiuse', '', -1 FROM cambiate WHERE v_chiusura IS NOT NULL
+            UNION ALL
+            SELECT n_comune, EXTRACT(YEAR FROM n_chiusura)::INTEGER, 'partite_chiuse', '', 1 FROM cambiate WHERE n_chiusura IS NOT NULL
+            UNION ALL
+            SELECT c.v_comune, EXTRACT(YEAR FROM c.v_impianto)::INTEGER, 'immobili', COALESCE(i.classificazione, 'Non Classificati'), -1
+            FROM cambiate c JOIN immobile i ON i.partita_id = c.id
+            UNION ALL
+            SELECT c.n_comune, EXTRACT(YEAR FROM c.n_impianto)::INTEGER, 'immobili', COALESCE(i.classificazione, 'Non Classificati'), 1
+            FROM cambiate c JOIN immobile i ON i.partita_id = c.id
+            UNION ALL
+            SELECT c.v_comune, EXTRACT(YEAR FROM va.data_variazione)::INTEGER, 'variazioni', va.tipo, -1
+            FROM cambiate c JOIN variazione va ON va.partita_origine_id = c.id
+            UNION ALL
+            SELECT c.n_comune, EXTRACT(YEAR FROM va.data_variazione)::INTEGER, 'variazioni', va.tipo, 1
+            FROM cambiate c JOIN variazione va ON va.partita_origine_id = c.id
+        ) d;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ========================================================================
+-- Trigger su immobile: conteggio per classificazione, nell'anno di impianto della partita
+-- ========================================================================
+CREATE OR REPLACE FUNCTION trg_statistica_annuale_immobile()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM statistica_annuale_somma(array_agg(p.comune_id), array_agg(EXTRACT(YEAR FROM p.data_impianto)::INTEGER),
+                                         array_agg('immobili'::TEXT), array_agg(COALESCE(v.classificazione, 'Non Classificati')::TEXT),
+                                         array_agg(-1::BIGINT))
+        FROM vecchie v JOIN partita p ON p.id = v.partita_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM statistica_annuale_somma(array_agg(p.comune_id), array_agg(EXTRACT(YEAR FROM p.data_impianto)::INTEGER),
+                                         array_agg('immobili'::TEXT), array_agg(COALESCE(n.classificazione, 'Non Classificati')::TEXT),
+                                         array_agg(1::BIGINT))
+        FROM nuove n JOIN partita p ON p.id = n.partita_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ========================================================================
+-- Trigger su variazione: conteggio per tipo, nel comune della partita di origine
+-- ========================================================================
+CREATE OR REPLACE FUNCTION trg_statistica_annuale_variazione()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM statistica_annuale_somma(array_agg(p.comune_id), array_agg(EXTRACT(YEAR FROM v.data_variazione)::INTEGER),
+                                         array_agg('variazioni'::TEXT), array_agg(v.tipo::TEXT), array_agg(-1::BIGINT))
+        FROM vecchie v JOIN partita p ON p.id = v.partita_origine_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM statistica_annuale_somma(array_agg(p.comune_id), array_agg(EXTRACT(YEAR FROM n.data_variazione)::INTEGER),
+                                         array_agg('variazioni'::TEXT), array_agg(n.tipo::TEXT), array_agg(1::BIGINT))
+        FROM nuove n JOIN partita p ON p.id = n.partita_origine_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Le tabelle di transizione richiedono un trigger per evento
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['partita', 'immobile', 'variazione'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_statistica_annuale_%1$s_ins ON %1$I', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_statistica_annuale_%1$s_upd ON %1$I', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_statistica_annuale_%1$s_del ON %1$I', t);
+        EXECUTE format('CREATE TRIGGER trg_statistica_annuale_%1$s_ins AFTER INSERT ON %1$I '
+                       'REFERENCING NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION trg_statistica_annuale_%1$s()', t);
+        EXECUTE format('CREATE TRIGGER trg_statistica_annuale_%1$s_upd AFTER UPDATE ON %1$I '
+                       'REFERENCING OLD TABLE AS vecchie NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION trg_statistica_annuale_%1$s()', t);
+        EXECUTE format('CREATE TRIGGER trg_statistica_annuale_%1$s_del AFTER DELETE ON %1$I '
+                       'REFERENCING OLD TABLE AS vecchie FOR EACH STATEMENT EXECUTE FUNCTION trg_statistica_annuale_%1$s()', t);
+    END LOOP;
+END $$;
+
+-- ========================================================================
+-- Ricostruzione completa
+-- ========================================================================
+CREATE OR REPLACE FUNCTION ricalcola_statistica_annuale()
+RETURNS INTEGER AS $$
+DECLARE
+    v_righe INTEGER;
+BEGIN
+    -- Le transazioni con variazioni non confermate terminano prima; le successive
+    -- aspettano e applicano le loro variazioni sopra il ricalcolo
+    LOCK TABLE statistica_annuale IN EXCLUSIVE MODE;
+    DELETE FROM statistica_annuale;
+    INSERT INTO statistica_annuale (comune_id, anno, misura, categoria, valore)
+    SELECT comune_id, anno, misura, categoria, COUNT(*)
+    FROM (
+        SELECT comune_id, EXTRACT(YEAR FROM data_impianto)::INTEGER AS anno, 'partite_aperte' AS misura, '' AS categoria FROM partita
+        UNION ALL
+        SELECT comune_id, EXTRACT(YEAR FROM data_chiusura)::INTEGER, 'partite_chiuse', '' FROM partita WHERE data_chiusura IS NOT NULL
+        UNION ALL
+        SELECT p.comune_id, EXTRACT(YEAR FROM p.data_impianto)::INTEGER, 'immobili', COALESCE(i.classificazione, 'Non Classificati')
+        FROM immobile i JOIN partita p ON p.id = i.partita_id
+        UNION ALL
+        SELECT p.comune_id, EXTRACT(YEAR FROM v.data_variazione)::INTEGER, 'variazioni', v.tipo
+        FROM variazione v JOIN partita p ON p.id = v.partita_origine_id
+    ) f
+    GROUP BY comune_id, anno, misura, categoria;
+    GET DIAGNOSTICS v_righe = ROW_COUNT;
+    RETURN v_righe;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ricalcola_statistica_annuale();
+
+-- ========================================================================
+-- statistiche_catastali_periodo (script 11) servita dalla tabella dei fatti
+-- ========================================================================
+CREATE OR REPLACE FUNCTION statistiche_catastali_periodo(
+    p_comune VARCHAR DEFAULT NULL,
+    p_anno_inizio INTEGER DEFAULT 1900,
+    p_anno_fine INTEGER DEFAULT EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER
+)
+RETURNS TABLE (
+    anno INTEGER,
+    comune_nome VARCHAR,
+    nuove_partite BIGINT,
+    partite_chiuse BIGINT,
+    totale_partite_attive BIGINT,
+    variazioni BIGINT,
+    immobili_registrati BIGINT
+) AS $$
+    WITH comuni AS (
+        SELECT c.id, c.nome FROM comune c WHERE p_comune IS NULL OR c.nome = p_comune
+    ),
+    per_anno AS (
+        SELECT s.comune_id, s.anno,
+               COALESCE(SUM(s.valore) FILTER (WHERE s.misura = 'partite_aperte'), 0) AS aperte,
+               COALESCE(SUM(s.valore) FILTER (WHERE s.misura = 'partite_chiuse'), 0) AS chiuse,
+               COALESCE(SUM(s.valore) FILTER (WHERE s.misura = 'variazioni'), 0) AS variazioni,
+               COALESCE(SUM(s.valore) FILTER (WHERE s.misura = 'immobili'), 0) AS immobili
+        FROM statistica_annuale s JOIN comuni c ON c.id = s.comune_id
+        WHERE s.anno <= p_anno_fine
+        GROUP BY s.comune_id, s.anno
+    ),
+    saldo_iniziale AS (
+        SELECT comune_id, SUM(aperte - chiuse) AS saldo FROM per_anno WHERE anno < p_anno_inizio GROUP BY comune_id
+    )
+    SELECT g.anno, g.nome::VARCHAR,
+           COALESCE(pa.aperte, 0)::BIGINT,
+           COALESCE(pa.chiuse, 0)::BIGINT,
+           (COALESCE(si.saldo, 0)
+            + SUM(COALESCE(pa.aperte, 0) - COALESCE(pa.chiuse, 0)) OVER (PARTITION BY g.id ORDER BY g.anno))::BIGINT,
+           COALESCE(pa.variazioni, 0)::BIGINT,
+           COALESCE(pa.immobili, 0)::BIGINT
+    FROM (SELECT c.id, c.nome, a.anno FROM comuni c CROSS JOIN generate_series(p_anno_inizio, p_anno_fine) AS a(anno)) g
+    LEFT JOIN per_anno pa ON pa.comune_id = g.id AND pa.anno = g.anno
+    LEFT JOIN saldo_iniziale si ON si.comune_id = g.id
+    ORDER BY g.anno, g.nome;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,128 @@
+-- File: 28_contatori_entita.sql (v1.1 - Idempotente)
+-- Scopo: Contatori esatti delle righe delle tabelle principali, per la dashboard
+--        (CatastoDBManager.get_dashboard_stats) senza COUNT(*) su tabelle grandi.
+--        Trigger a livello di istruzione aggiungono una riga di variazione in
+--        contatore_entita_delta per ogni INSERT/DELETE (una per istruzione, non per
+--        riga): le transazioni concorrenti non si bloccano su un'unica riga contatore.
+--        Il valore corrente è contatore_entita + somma delle variazioni (vista
+--        v_contatore_entita). La compattazione (compatta_contatori_entita) avviene dal
+--        lato di chi scrive: quando le variazioni superano la soglia, il trigger la
+--        esegue se nessun'altra transazione la sta già facendo (lock consultivo non
+--        bloccante). I client che leggono la dashboard non scrivono nulla.
+-- Note: ricalcola_contatori_entita() riallinea i contatori con COUNT(*) (eseguita alla
+--       fine dello script; utile dopo caricamenti con i trigger disabilitati).
+
+SET search_path TO catasto, public;
+
+CREATE TABLE IF NOT EXISTS contatore_entita (
+    tabella VARCHAR(63) PRIMARY KEY,
+    righe BIGINT NOT NULL DEFAULT 0,
+    data_aggiornamento TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Solo inserimenti e la cancellazione della compattazione: nessun indice da mantenere
+CREATE TABLE IF NOT EXISTS contatore_entita_delta (
+    tabella VARCHAR(63) NOT NULL,
+    delta BIGINT NOT NULL
+);
+
+COMMENT ON TABLE contatore_entita IS 'Numero di righe delle tabelle principali alla data dell''ultima compattazione.';
+COMMENT ON TABLE contatore_entita_delta IS 'Variazioni dei contatori non ancora compattate (una riga per istruzione INSERT/DELETE).';
+
+CREATE OR REPLACE VIEW v_contatore_entita AS
+SELECT c.tabella, c.righe + COALESCE(d.delta, 0) AS righe
+FROM contatore_entita c
+LEFT JOIN (SELECT tabella, SUM(delta) AS delta FROM contatore_entita_delta GROUP BY tabella) d
+    ON d.tabella = c.tabella;
+
+-- Lock consultivo che serializza le compattazioni
+CREATE OR REPLACE FUNCTION contatore_entita_lock_id()
+RETURNS BIGINT AS $$
+    SELECT hashtext('catasto.contatore_entita')::BIGINT;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION trg_contatore_entita()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_soglia CONSTANT INTEGER := 1000;  -- Variazioni accumulate oltre le quali si compatta
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO contatore_entita_delta (tabella, delta)
+        SELECT TG_TABLE_NAME, COUNT(*) FROM nuove HAVING COUNT(*) > 0;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO contatore_entita_delta (tabella, delta)
+        SELECT TG_TABLE_NAME, -COUNT(*) FROM vecchie HAVING COUNT(*) > 0;
+    ELSIF TG_OP = 'TRUNCATE' THEN
+        DELETE FROM contatore_entita_delta WHERE tabella = TG_TABLE_NAME;
+        UPDATE contatore_entita SET righe = 0, data_aggiornamento = CURRENT_TIMESTAMP WHERE tabella = TG_TABLE_NAME;
+        RETURN NULL;
+    END IF;
+
+    -- Conteggio limitato alla soglia: la tabella delle variazioni resta piccola.
+    -- Solo in READ COMMITTED: con un'istantanea più vecchia la cancellazione delle
+    -- variazioni già compattate da altri farebbe fallire la scrittura dell'utente.
+    IF current_setting('transaction_isolation') = 'read committed'
+       AND (SELECT COUNT(*) FROM (SELECT 1 FROM contatore_entita_delta LIMIT v_soglia) d) >= v_soglia
+       AND pg_try_advisory_xact_lock(contatore_entita_lock_id()) THEN
+        PERFORM compatta_contatori_entita();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['comune', 'partita', 'possessore', 'immobile'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_contatore_entita_%1$s_ins ON %1$I', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_contatore_entita_%1$s_del ON %1$I', t);
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_contatore_entita_%1$s_trunc ON %1$I', t);
+        EXECUTE format('CREATE TRIGGER trg_contatore_entita_%1$s_ins AFTER INSERT ON %1$I '
+                       'REFERENCING NEW TABLE AS nuove FOR EACH STATEMENT EXECUTE FUNCTION trg_contatore_entita()', t);
+        EXECUTE format('CREATE TRIGGER trg_contatore_entita_%1$s_del AFTER DELETE ON %1$I '
+                       'REFERENCING OLD TABLE AS vecchie FOR EACH STATEMENT EXECUTE FUNCTION trg_contatore_entita()', t);
+        EXECUTE format('CREATE TRIGGER trg_contatore_entita_%1$s_trunc AFTER TRUNCATE ON %1$I '
+                       'FOR EACH STATEMENT EXECUTE FUNCTION trg_contatore_entita()', t);
+    END LOOP;
+END $$;
+
+-- Riporta le variazioni nel contatore. Le righe inserite da transazioni concorrenti
+-- dopo l'inizio della compattazione restano per la successiva.
+CREATE OR REPLACE FUNCTION compatta_contatori_entita()
+RETURNS INTEGER AS $$
+DECLARE
+    v_righe INTEGER;
+BEGIN
+    PERFORM pg_advisory_xact_lock(contatore_entita_lock_id());
+    WITH compattate AS (
+        DELETE FROM contatore_entita_delta RETURNING tabella, delta
+    ), somme AS (
+        SELECT tabella, SUM(delta) AS delta, COUNT(*) AS n FROM compattate GROUP BY tabella
+    ), aggiornate AS (
+        UPDATE contatore_entita c SET righe = c.righe + s.delta, data_aggiornamento = CURRENT_TIMESTAMP
+        FROM somme s WHERE c.tabella = s.tabella
+        RETURNING s.n
+    )
+    SELECT COALESCE(SUM(n), 0) INTO v_righe FROM aggiornate;
+    RETURN v_righe;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ricalcola_contatori_entita()
+RETURNS VOID AS $$
+BEGIN
+    -- Le transazioni che hanno già registrato variazioni terminano prima del conteggio;
+    -- le successive attendono e le aggiungono sopra il nuovo valore
+    LOCK TABLE contatore_entita_delta IN EXCLUSIVE MODE;
+    DELETE FROM contatore_entita_delta;
+    INSERT INTO contatore_entita (tabella, righe)
+    VALUES ('comune', (SELECT COUNT(*) FROM comune)),
+           ('partita', (SELECT COUNT(*) FROM partita)),
+           ('possessore', (SELECT COUNT(*) FROM possessore)),
+           ('immobile', (SELECT COUNT(*) FROM immobile))
+    ON CONFLICT (tabella) DO UPDATE SET righe = EXCLUDED.righe, data_aggiornamento = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ricalcola_contatori_entita();
@@ -0,0 +1,34 @@
+-- File: 29_notifiche_dashboard.sql (v1.1 - Idempotente)
+-- Scopo: Notifiche per l'aggiornamento in tempo reale della dashboard e della barra
+--        "dati non aggiornati", sul canale del bus di invalidazione (script 24):
+--        - 'app_metadata:*' a ogni modifica di app_metadata (es. last_mv_refresh);
+--        - 'sessione:*' a ogni modifica di sessioni_accesso.
+--        I conteggi di comune, partita, possessore e immobile sono già notificati
+--        dai trigger dello script 24.
+-- Note: richiede trg_notifica_invalidazione_tabella() dello script 24. Anche
+--       l'UPDATE di sessioni_accesso va notificato: logout_utente_sessione cambia
+--       azione ed esito di righe già mostrate.
+
+SET search_path TO catasto, public;
+
+DO $$
+BEGIN
+    IF to_regclass('app_metadata') IS NULL THEN
+        RAISE NOTICE 'Tabella app_metadata non trovata: trigger di notifica non creato.';
+    ELSE
+        DROP TRIGGER IF EXISTS trg_invalidazione_app_metadata ON app_metadata;
+        CREATE TRIGGER trg_invalidazione_app_metadata
+            AFTER INSERT OR UPDATE OR DELETE ON app_metadata
+            FOR EACH STATEMENT EXECUTE FUNCTION trg_notifica_invalidazione_tabella('app_metadata');
+    END IF;
+
+    IF to_regclass('sessioni_accesso') IS NULL THEN
+        RAISE NOTICE 'Tabella sessioni_accesso non trovata: trigger di notifica non creato.';
+    ELSE
+        DROP TRIGGER IF EXISTS trg_invalidazione_sessioni_accesso ON sessioni_accesso;
+        CREATE TRIGGER trg_invalidazione_sessioni_accesso
+            AFTER INSERT OR UPDATE OR DELETE ON sessioni_accesso
+            FOR EACH STATEMENT EXECUTE FUNCTION trg_notifica_invalidazione_tabella('sessione');
+    END IF;
+END;
+$$;
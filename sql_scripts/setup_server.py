@@ -27,7 +27,16 @@ BASE_SQL_SCRIPTS = [
     "sql_scripts/15_integration_audit_users.sql",
     "sql_scripts/16_advanced_search.sql",
     "sql_scripts/17_funzione_ricerca_immobili.sql",
-    "sql_scripts/20_feature_tipi_localita.sql"
+    "sql_scripts/20_feature_tipi_localita.sql",
+    "sql_scripts/21_genealogia_ricorsiva.sql",
+    "sql_scripts/22_report_strutturati.sql",
+    "sql_scripts/23_notifiche_permessi.sql",
+    "sql_scripts/24_notifiche_invalidazione.sql",
+    "sql_scripts/25_archivio_documenti.sql",
+    "sql_scripts/26_ingestione_documenti.sql",
+    "sql_scripts/27_statistiche_annuali.sql",
+    "sql_scripts/28_contatori_entita.sql",
+    "sql_scripts/29_notifiche_dashboard.sql"
 ]
 
 # Definizione degli script opzionali
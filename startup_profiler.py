@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Profilazione dell'avvio di Meridiana (opzione --profile-startup)
+================================================================
+Misura, dall'avvio del processo fino alla finestra principale pronta:
+- il tempo di import di ogni modulo caricato per la prima volta (cumulativo,
+  cioè comprensivo dei moduli che importa, e "proprio", al netto di questi);
+- la durata delle fasi di inizializzazione (QApplication, login, costruzione
+  dei singoli tab...) registrate con phase();
+- i traguardi (es. "login visibile") registrati con mark().
+
+Uso:
+    python gui_main.py --profile-startup             # report nel log
+    python gui_main.py --profile-startup=avvio.json  # report nel log + JSON
+
+Il JSON serve a confrontare due versioni e accorgersi delle regressioni.
+Senza l'opzione, phase() e mark() non fanno nulla e gli import non vengono toccati.
+"""
+
+import builtins
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("CatastoGUI.startup")
+
+ARG_NAME = "--profile-startup"
+TOP_MODULES = 25
+
+_T0 = time.perf_counter()
+
+
+class StartupProfiler:
+    """Raccoglie tempi di import, fasi e traguardi. Un'istanza per processo (vedi enable_from_argv())."""
+
+    def __init__(self, output_path: Optional[str] = None):
+        self.output_path = output_path
+        self.enabled = False
+        self.imports: Dict[str, Tuple[float, float]] = {}   # modulo -> (cumulativo, proprio) in secondi
+        self.phases: List[Tuple[str, float, float]] = []      # (nome, inizio relativo, durata)
+        self.marks: List[Tuple[str, float]] = []              # (nome, secondi dall'avvio)
+        self._stack: List[float] = []                         # tempo dei figli per ogni import aperto
+        self._original_import = None
+        self._reported = False
+
+    # --- Import ---------------------------------------------------------
+
+    def install(self):
+        if self.enabled:
+            return
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+        self.enabled = True
+
+    def uninstall(self):
+        # I metodi legati si confrontano con ==: ogni accesso crea un oggetto nuovo
+        if self._original_import is not None and builtins.__import__ == self._timed_import:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+        self.enabled = False
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        # Si misurano solo i moduli non ancora caricati: gli altri costano un accesso a dizionario
+        if level or name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            if name not in self.imports:
+                self.imports[name] = (elapsed, elapsed - children)
+
+    # --- Fasi e traguardi -------------------------------------------------
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start - _T0, time.perf_counter() - start))
+
+    def mark(self, name: str):
+        self.marks.append((name, time.perf_counter() - _T0))
+
+    # --- Report -----------------------------------------------------------
+
+    def as_dict(self) -> dict:
+        return {
+            "totale_s": round(time.perf_counter() - _T0, 4),
+            "traguardi": [{"nome": n, "s": round(t, 4)} for n, t in self.marks],
+            "fasi": [{"nome": n, "inizio_s": round(s, 4), "durata_s": round(d, 4)} for n, s, d in self.phases],
+            "import": [{"modulo": m, "cumulativo_s": round(c, 4), "proprio_s": round(p, 4)}
+                       for m, (c, p) in sorted(self.imports.items(), key=lambda kv: kv[1][0], reverse=True)],
+        }
+
+    def format_report(self, top: int = TOP_MODULES) -> str:
+        lines = [f"Profilo di avvio: {time.perf_counter() - _T0:.3f} s dall'avvio del processo"]
+        if self.marks:
+            lines.append("Traguardi:")
+            lines.extend(f"  {t:8.3f} s  {n}" for n, t in self.marks)
+        if self.phases:
+            lines.append("Fasi:")
+            lines.extend(f"  {d * 1000:9.1f} ms  {n}" for n, _, d in self.phases)
+        if self.imports:
+            ordered = sorted(self.imports.items(), key=lambda kv: kv[1][0], reverse=True)
+            lines.append(f"Import più lenti (primi {min(top, len(ordered))} di {len(ordered)}, cumulativo / proprio):")
+            lines.extend(f"  {c * 1000:9.1f} ms {p * 1000:9.1f} ms  {m}" for m, (c, p) in ordered[:top])
+        return "\n".join(lines)
+
+    def report(self):
+        """Scrive il report nel log (e nel file JSON, se richiesto) e smette di misurare gli import."""
+        if self._reported:
+            return
+        self._reported = True
+        self.uninstall()
+        logger.info(self.format_report())
+        if self.output_path:
+            try:
+                with open(self.output_path, "w", encoding="utf-8") as f:
+                    json.dump(self.as_dict(), f, indent=2, ensure_ascii=False)
+                logger.info(f"Profilo di avvio salvato in: {self.output_path}")
+            except OSError as e:
+                logger.error(f"Impossibile salvare il profilo di avvio in '{self.output_path}': {e}")
+
+
+_profiler: Optional[StartupProfiler] = None
+
+
+def enable_from_argv(argv: List[str]) -> Optional[StartupProfiler]:
+    """
+    Attiva la profilazione se tra gli argomenti c'è --profile-startup[=file.json].
+    Va chiamata il prima possibile, prima degli import pesanti.
+    """
+    global _profiler
+    for arg in argv[1:]:
+        if arg == ARG_NAME or arg.startswith(ARG_NAME + "="):
+            _profiler = StartupProfiler(arg.partition("=")[2] or None)
+            _profiler.install()
+            break
+    return _profiler
+
+
+def is_enabled() -> bool:
+    return _profiler is not None
+
+
+@contextmanager
+def phase(name: str):
+    """Misura un blocco di inizializzazione; senza profilazione attiva non fa nulla."""
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.phase(name):
+            yield
+
+
+def mark(name: str):
+    if _profiler is not None:
+        _profiler.mark(name)
+
+
+def report():
+    if _profiler is not None:
+        _profiler.report()
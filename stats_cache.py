@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Aggregati statistici in memoria
+===============================
+Le statistiche per comune e per tipologia di immobile vengono dalle viste
+materializzate mv_statistiche_comune e mv_immobili_per_tipologia, che cambiano
+solo quando le viste vengono aggiornate. Invece di rileggerle a ogni filtro o
+aggiornamento, AggregateCache le carica una volta in tabelle colonnari NumPy:
+
+- le colonne di testo (comune, classificazione, ...) sono categorie: un array di
+  codici int32 più il dizionario dei valori, ordinato senza distinzione tra
+  maiuscole e minuscole, così ordinare per codice equivale a ordinare per testo;
+- le colonne numeriche sono array int64.
+
+Filtri (valore esatto o testo contenuto), raggruppamenti con somma e ordinamenti
+lavorano sugli array, senza query. La validità della copia in memoria si controlla
+con il timestamp dell'ultimo aggiornamento delle viste (app_metadata,
+'last_mv_refresh'): una sola lettura di una riga. Se il timestamp non è
+disponibile la copia resta valida fino a un caricamento forzato.
+
+Il modulo non importa Qt; NumPy va importato solo da chi usa le statistiche
+(l'import è differito nella GUI per non rallentare l'avvio).
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("CatastoGUI.stats_cache")
+
+# Nome -> (colonne di testo, colonne numeriche), come restituite da CatastoDBManager.get_statistiche_aggregate
+STATISTICS_TABLES: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "comuni": (("comune", "provincia"),
+               ("totale_partite", "partite_attive", "partite_inattive", "totale_possessori", "totale_immobili")),
+    "immobili": (("comune_nome", "classificazione"),
+                 ("numero_immobili", "totale_piani", "totale_vani")),
+}
+
+
+class ColumnarTable:
+    """Tabella in sola lettura: categorie (codici + dizionario) e colonne numeriche."""
+
+    def __init__(self, categories: Dict[str, Tuple[List[str], np.ndarray]], numbers: Dict[str, np.ndarray]):
+        self.categories = categories
+        self.numbers = numbers
+        lengths = {len(codes) for _, codes in categories.values()} | {len(values) for values in numbers.values()}
+        if len(lengths) > 1:
+            raise ValueError("Colonne di lunghezza diversa.")
+        self._length = lengths.pop() if lengths else 0
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict[str, Any]], category_columns: Sequence[str],
+                  numeric_columns: Sequence[str]) -> "ColumnarTable":
+        categories = {}
+        for column in category_columns:
+            values = ["" if row.get(column) is None else str(row.get(column)) for row in rows]
+            dictionary = sorted(set(values), key=lambda value: (value.casefold(), value))
+            index = {value: code for code, value in enumerate(dictionary)}
+            categories[column] = (dictionary, np.fromiter((index[v] for v in values), dtype=np.int32, count=len(values)))
+        numbers = {column: np.fromiter((int(row.get(column) or 0) for row in rows), dtype=np.int64, count=len(rows))
+                   for column in numeric_columns}
+        return cls(categories, numbers)
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.categories) + list(self.numbers)
+
+    def category_values(self, column: str) -> List[str]:
+        return list(self.categories[column][0])
+
+    def mask(self, equals: Optional[Dict[str, str]] = None, contains: Optional[str] = None,
+             contains_columns: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Righe che soddisfano tutti i filtri `equals` ({colonna: valore}) e, se `contains`
+        non è vuoto, in cui almeno una delle `contains_columns` contiene il testo.
+        """
+        result = np.ones(self._length, dtype=bool)
+        for column, value in (equals or {}).items():
+            dictionary, codes = self.categories[column]
+            try:
+                result &= codes == dictionary.index(value)
+            except ValueError:
+                result[:] = False
+        needle = (contains or "").strip().casefold()
+        if needle:
+            any_match = np.zeros(self._length, dtype=bool)
+            for column in contains_columns or list(self.categories):
+                dictionary, codes = self.categories[column]
+                matching = [code for code, value in enumerate(dictionary) if needle in value.casefold()]
+                any_match |= np.isin(codes, matching)
+            result &= any_match
+        return result
+
+    def group_sum(self, by: Sequence[str], mask: Optional[np.ndarray] = None) -> "ColumnarTable":
+        """Una riga per combinazione di valori di `by`, con la somma delle colonne numeriche."""
+        selected = np.flatnonzero(mask) if mask is not None else np.arange(self._length)
+        if not by:  # totale generale: una sola riga
+            return ColumnarTable({}, {column: np.array([values[selected].sum()], dtype=np.int64)
+                                      for column, values in self.numbers.items()})
+        if not len(selected):
+            return ColumnarTable({column: (self.categories[column][0], np.empty(0, dtype=np.int32)) for column in by},
+                                 {column: np.empty(0, dtype=np.int64) for column in self.numbers})
+        keys = np.stack([self.categories[column][1][selected] for column in by], axis=1)
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        numbers = {column: np.bincount(inverse, weights=values[selected], minlength=len(unique_keys)).astype(np.int64)
+                   for column, values in self.numbers.items()}
+        categories = {column: (self.categories[column][0], unique_keys[:, position].astype(np.int32))
+                      for position, column in enumerate(by)}
+        return ColumnarTable(categories, numbers)
+
+    def order(self, column: Optional[str] = None, descending: bool = False,
+              mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Indici delle righe selezionate da `mask`, ordinati per `column` (ordinamento stabile)."""
+        selected = np.flatnonzero(mask) if mask is not None else np.arange(self._length)
+        if column is None:
+            return selected
+        keys = self.categories[column][1] if column in self.categories else self.numbers[column]
+        keys = keys[selected].astype(np.int64)
+        return selected[np.argsort(-keys if descending else keys, kind="stable")]
+
+    def rows(self, indices: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Righe come dizionari di tipi Python (per la visualizzazione)."""
+        indices = np.arange(self._length) if indices is None else indices
+        columns = {column: [dictionary[code] for code in codes[indices].tolist()]
+                   for column, (dictionary, codes) in self.categories.items()}
+        columns.update({column: values[indices].tolist() for column, values in self.numbers.items()})
+        return [{column: columns[column][i] for column in columns} for i in range(len(indices))]
+
+
+class StatisticsSnapshot(NamedTuple):
+    version: Any                      # timestamp dell'ultimo aggiornamento delle viste (o None)
+    tables: Dict[str, ColumnarTable]
+    loaded_at: float                  # time.time() del caricamento
+
+
+class AggregateCache:
+    """
+    Copia in memoria degli aggregati, ricaricata solo quando cambia la versione.
+    `loader()` restituisce (versione, {nome: righe}) letti nella stessa transazione;
+    `version_getter()` legge solo la versione corrente. Thread-safe.
+    """
+
+    def __init__(self, loader: Callable[[], Tuple[Any, Dict[str, List[Dict[str, Any]]]]],
+                 version_getter: Callable[[], Any],
+                 table_columns: Dict[str, Tuple[Sequence[str], Sequence[str]]] = STATISTICS_TABLES):
+        self._loader = loader
+        self._version_getter = version_getter
+        self._table_columns = table_columns
+        self._snapshot: Optional[StatisticsSnapshot] = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    @property
+    def snapshot(self) -> Optional[StatisticsSnapshot]:
+        return self._snapshot
+
+    def get(self, force: bool = False) -> StatisticsSnapshot:
+        with self._lock:
+            if self._snapshot is not None and not force:
+                current_version = self._version_getter()
+                if current_version is None or current_version == self._snapshot.version:
+                    return self._snapshot
+                logger.info(f"Viste materializzate aggiornate ({current_version}): ricarico gli aggregati.")
+            started = time.perf_counter()
+            version, raw_tables = self._loader()
+            tables = {name: ColumnarTable.from_rows(raw_tables.get(name) or [], *columns)
+                      for name, columns in self._table_columns.items()}
+            self._snapshot = StatisticsSnapshot(version, tables, time.time())
+            self.loads += 1
+            logger.info(f"Aggregati statistici caricati in {time.perf_counter() - started:.3f}s: "
+                        + ", ".join(f"{name} {len(table)} righe" for name, table in tables.items()) + ".")
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
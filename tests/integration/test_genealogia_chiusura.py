@@ -0,0 +1,90 @@
+"""
+Test di integrazione per la tabella di chiusura della genealogia (sql_scripts/21_genealogia_ricorsiva.sql).
+
+Richiedono un'istanza PostgreSQL con lo schema catasto, indicata da:
+    CATASTO_TEST_PRIMARY   es. "host=localhost port=5432 dbname=catasto_storico user=postgres password=..."
+Senza questa variabile i test vengono saltati. Ogni test lavora in una transazione annullata alla fine.
+"""
+import os
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+PRIMARY_DSN = os.environ.get("CATASTO_TEST_PRIMARY")
+
+pytestmark = [
+    pytest.mark.integration,
+    pytest.mark.skipif(not PRIMARY_DSN, reason="CATASTO_TEST_PRIMARY non impostata"),
+]
+
+
+@pytest.fixture
+def cur():
+    conn = psycopg2.connect(PRIMARY_DSN)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET search_path TO catasto, public;")
+            yield cursor
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def _crea_partite(cur, n):
+    cur.execute("INSERT INTO comune (nome, provincia, regione) VALUES ('Test genealogia', 'SV', 'Liguria') RETURNING id;")
+    comune_id = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO partita (comune_id, numero_partita, data_impianto, stato, tipo)
+        SELECT %s, g, DATE '1900-01-01', 'attiva', 'principale' FROM generate_series(1, %s) g
+        ORDER BY g RETURNING id;
+    """, (comune_id, n))
+    return [row[0] for row in cur.fetchall()]
+
+
+def _collega(cur, origine_id, destinazione_id):
+    cur.execute("""
+        INSERT INTO variazione (partita_origine_id, partita_destinazione_id, tipo, data_variazione)
+        VALUES (%s, %s, 'Vendita', DATE '1950-01-01') RETURNING id;
+    """, (origine_id, destinazione_id))
+    return cur.fetchone()[0]
+
+
+def _chiusura(cur, ids):
+    cur.execute("""
+        SELECT antenato_id, discendente_id, profondita FROM partita_genealogia_chiusura
+        WHERE discendente_id = ANY(%s) ORDER BY 1, 2;
+    """, (ids,))
+    return cur.fetchall()
+
+
+def test_inserimento_incrementale_coincide_con_il_ricalcolo(cur):
+    ids = _crea_partite(cur, 60)
+    # Catena collegata dal fondo: ogni arco unisce due catene già presenti nella chiusura
+    for origine, destinazione in reversed(list(zip(ids, ids[1:]))):
+        _collega(cur, origine, destinazione)
+    incrementale = _chiusura(cur, ids)
+
+    cur.execute("SELECT genealogia_profondita_massima();")
+    profondita_massima = cur.fetchone()[0]
+    assert max(row[2] for row in incrementale) == profondita_massima
+
+    cur.execute("SELECT ricalcola_antenati_partite(%s);", (ids,))
+    assert _chiusura(cur, ids) == incrementale
+
+
+def test_cancellazione_e_modifica_di_un_arco(cur):
+    a, b, c, d = _crea_partite(cur, 4)
+    _collega(cur, a, b)
+    arco_bc = _collega(cur, b, c)
+    _collega(cur, c, d)
+    assert (a, d, 3) in _chiusura(cur, [d])
+
+    cur.execute("DELETE FROM variazione WHERE id = %s;", (arco_bc,))
+    assert _chiusura(cur, [c, d]) == [(c, d, 1)]
+
+    # Un nuovo arco diretto a -> d accorcia la distanza senza duplicare righe
+    _collega(cur, b, c)
+    _collega(cur, a, d)
+    assert (a, d, 1) in _chiusura(cur, [d])
+    assert (b, d, 2) in _chiusura(cur, [d])
@@ -0,0 +1,57 @@
+"""
+Test di integrazione per la riapplicazione dei set incrementali (incremental_export.py).
+
+Richiedono un'istanza PostgreSQL indicata da CATASTO_TEST_PRIMARY (vedi test_genealogia_chiusura.py).
+La riapplicazione fa commit: i test lavorano su uno schema di prova rimosso alla fine.
+"""
+import os
+from datetime import datetime
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+from incremental_export import replay_changes, write_change_set
+
+PRIMARY_DSN = os.environ.get("CATASTO_TEST_PRIMARY")
+SCHEMA = "test_incrementale"
+
+pytestmark = [
+    pytest.mark.integration,
+    pytest.mark.skipif(not PRIMARY_DSN, reason="CATASTO_TEST_PRIMARY non impostata"),
+]
+
+
+@pytest.fixture
+def conn():
+    connection = psycopg2.connect(PRIMARY_DSN)
+    try:
+        with connection.cursor() as cur:
+            cur.execute(f"""
+                DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+                CREATE SCHEMA {SCHEMA};
+                CREATE TABLE {SCHEMA}.comune (id SERIAL PRIMARY KEY, nome VARCHAR(100) NOT NULL UNIQUE);
+                CREATE TABLE {SCHEMA}.app_metadata (key TEXT PRIMARY KEY, value_text TEXT,
+                                                    value_timestamp TIMESTAMPTZ);
+                INSERT INTO {SCHEMA}.comune (id, nome) VALUES (1, 'Carcare');
+            """)
+        connection.commit()
+        yield connection
+    finally:
+        connection.rollback()
+        with connection.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+        connection.commit()
+        connection.close()
+
+
+def test_eliminazione_e_reinserimento_stessa_chiave(conn, tmp_path):
+    name = write_change_set(str(tmp_path), 1, None, datetime(2026, 10, 19, 14, 0),
+                            {"comune": [{"id": 2, "nome": "Carcare"}]}, [{"tabella": "comune", "id": 1}])
+
+    assert replay_changes(conn, str(tmp_path), schema=SCHEMA) == [name]
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT id, nome FROM {SCHEMA}.comune ORDER BY id;")
+        assert cur.fetchall() == [(2, "Carcare")]
+        cur.execute(f"SELECT nextval(pg_get_serial_sequence('{SCHEMA}.comune', 'id'));")
+        assert cur.fetchone()[0] == 3
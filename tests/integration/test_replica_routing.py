@@ -0,0 +1,63 @@
+"""
+Test di integrazione per l'instradamento delle letture sulle repliche.
+
+Richiedono due istanze PostgreSQL locali con lo schema catasto, indicate da:
+    CATASTO_TEST_PRIMARY   es. "host=localhost port=5432 dbname=catasto_storico user=postgres password=..."
+    CATASTO_TEST_REPLICA   es. "host=localhost port=5433"
+Senza queste variabili i test vengono saltati.
+"""
+import os
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("PyQt5")
+
+PRIMARY_DSN = os.environ.get("CATASTO_TEST_PRIMARY")
+REPLICA_DSN = os.environ.get("CATASTO_TEST_REPLICA")
+
+pytestmark = [
+    pytest.mark.integration,
+    pytest.mark.skipif(not (PRIMARY_DSN and REPLICA_DSN), reason="CATASTO_TEST_PRIMARY/CATASTO_TEST_REPLICA non impostate"),
+]
+
+
+def _make_manager(replica_dsns):
+    from catasto_db_manager import CatastoDBManager
+    params = psycopg2.extensions.parse_dsn(PRIMARY_DSN)
+    return CatastoDBManager(dbname=params.get("dbname", "catasto_storico"), user=params.get("user", "postgres"),
+                            password=params.get("password", ""), host=params.get("host", "localhost"),
+                            port=params.get("port", 5432), replica_dsns=replica_dsns)
+
+
+def _server_port(db_manager):
+    with db_manager._get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT inet_server_port();")
+            return cur.fetchone()[0]
+
+
+def test_letture_dichiarate_vanno_sulla_replica():
+    from catasto_db_manager import read_only_replica
+    db = _make_manager([REPLICA_DSN])
+    assert db.initialize_main_pool()
+    try:
+        replica_port = int(psycopg2.extensions.parse_dsn(REPLICA_DSN).get("port", 5432))
+        routed = read_only_replica(_server_port)
+        assert routed(db) == replica_port
+        assert _server_port(db) != replica_port  # I metodi non marcati restano sul primario
+        with db.force_primary():
+            assert routed(db) != replica_port
+    finally:
+        db.close_pool()
+
+
+def test_fallback_sul_primario_se_replica_giu():
+    from catasto_db_manager import read_only_replica
+    db = _make_manager(["host=127.0.0.1 port=1 connect_timeout=1"])
+    assert db.initialize_main_pool()
+    try:
+        assert read_only_replica(_server_port)(db) == _server_port(db)
+        assert db.get_replica_status()[0]["available"] is False
+    finally:
+        db.close_pool()
@@ -0,0 +1,83 @@
+"""Test unitari per il supporto a backup e ripristino (backup_tools.py)"""
+import pytest
+
+from backup_tools import (BackupProgressTracker, compare_row_counts, compression_args,
+                          count_toc_table_data, manifest_path_for, parse_tool_major_version,
+                          verify_checksum_manifest, write_checksum_manifest)
+
+TOC_LISTING = """;
+; Archive created at 2026-10-19 10:00:00 CEST
+;
+215; 1259 16403 TABLE catasto comune postgres
+3368; 0 16403 TABLE DATA catasto comune postgres
+3369; 0 16420 TABLE DATA catasto partita postgres
+3370; 0 16431 TABLE DATA catasto possessore postgres
+3101; 2606 16410 CONSTRAINT catasto comune comune_pkey postgres
+"""
+
+
+@pytest.mark.unit
+class TestBackupTools:
+
+    def test_versione_strumento(self):
+        assert parse_tool_major_version("pg_dump (PostgreSQL) 16.2") == 16
+        assert parse_tool_major_version("pg_restore (PostgreSQL) 12.18 (Ubuntu 12.18-1)") == 12
+        assert parse_tool_major_version("comando non trovato") is None
+
+    def test_compressione_per_versione(self):
+        assert compression_args(None, None, 16) == []
+        assert compression_args("zstd", 5, 16) == ["--compress=zstd:5"]
+        assert compression_args("zstd", 99, 17) == ["--compress=zstd:22"]
+        assert compression_args("lz4", None, 16) == ["--compress=lz4:1"]
+        # pg_dump < 16: solo gzip con livello
+        assert compression_args("zstd", 5, 15) == ["-Z", "6"]
+        assert compression_args("gzip", 9, None) == ["-Z", "9"]
+        assert compression_args("none", None, 16) == ["-Z", "0"]
+        with pytest.raises(ValueError):
+            compression_args("bzip2", 1, 16)
+
+    def test_conteggio_voci_toc(self):
+        assert count_toc_table_data(TOC_LISTING) == 3
+        assert count_toc_table_data("") == 0
+
+    def test_avanzamento_da_output_verbose(self):
+        tracker = BackupProgressTracker(total_tables=4)
+        assert tracker.percent() == 0
+        assert tracker.feed_line('pg_dump: dumping contents of table "catasto.comune"') == "catasto.comune"
+        assert tracker.feed_line('pg_dump: dumping contents of table "catasto.comune"') is None
+        assert tracker.feed_line("pg_dump: reading extensions") is None
+        assert tracker.feed_line('pg_restore: processing data for table "catasto.partita"') == "catasto.partita"
+        assert tracker.done == 2
+        assert tracker.percent() == 50
+        assert BackupProgressTracker().percent() is None
+
+    def test_manifest_backup_directory(self, tmp_path):
+        backup = tmp_path / "catasto_backup"
+        backup.mkdir()
+        (backup / "toc.dat").write_bytes(b"toc")
+        (backup / "3368.dat.gz").write_bytes(b"dati")
+
+        manifest = write_checksum_manifest(str(backup))
+        assert manifest == manifest_path_for(str(backup)) == str(backup) + ".sha256"
+        assert verify_checksum_manifest(str(backup)) == []
+
+        (backup / "3368.dat.gz").write_bytes(b"dati alterati")
+        (backup / "toc.dat").unlink()
+        (backup / "extra.dat").write_bytes(b"x")
+        assert sorted(verify_checksum_manifest(str(backup))) == [
+            "Checksum diverso: 3368.dat.gz", "File mancante: toc.dat", "File non presente nel manifest: extra.dat"]
+
+    def test_manifest_backup_file_singolo(self, tmp_path):
+        backup = tmp_path / "catasto.dump"
+        backup.write_bytes(b"PGDMP")
+        write_checksum_manifest(str(backup))
+        assert verify_checksum_manifest(str(backup)) == []
+        backup.write_bytes(b"PGDMP troncato")
+        assert verify_checksum_manifest(str(backup)) == ["Checksum diverso: catasto.dump"]
+
+    def test_confronto_conteggi(self):
+        live = {"catasto.comune": 10, "catasto.partita": 250, "catasto.possessore": 80}
+        assert compare_row_counts(live, dict(live)) == []
+        assert compare_row_counts(live, {"catasto.comune": 10, "catasto.partita": 249}) == [
+            "Tabella assente nel ripristino: catasto.possessore",
+            "catasto.partita: 250 righe nel database, 249 nel ripristino"]
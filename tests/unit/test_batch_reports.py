@@ -0,0 +1,136 @@
+"""Test unitari per i report di proprietà in blocco (batch_reports.py)"""
+import json
+import os
+
+import pytest
+
+from batch_reports import (BatchReportError, BatchReportJob, MANIFEST_NAME, MODE_PER_PARTITA, MODE_UNICO,
+                           _output_name)
+
+
+def _report(partita_id, numero):
+    return {"partita_id": partita_id, "comune_nome": "Carcare", "numero_partita": numero, "suffisso_partita": None,
+            "tipo": "principale", "stato": "attiva", "intestatari": [], "immobili": [], "variazioni": []}
+
+
+class FakeDBManager:
+    """Restituisce dati di report finti e registra le partite richieste."""
+
+    def __init__(self, ids, fail_after=None):
+        self.ids = ids
+        self.requested = []
+        self.fail_after = fail_after
+
+    def get_partita_ids_for_comune(self, comune_id):
+        return list(self.ids)
+
+    def iter_report_proprieta_batch(self, partita_ids, chunk_size=500):
+        self.requested.append(list(partita_ids))
+        for n, pid in enumerate(partita_ids):
+            if self.fail_after is not None and n >= self.fail_after:
+                raise RuntimeError("connessione persa")
+            yield [(pid, _report(pid, pid * 10))]
+
+
+@pytest.mark.unit
+class TestBatchReports:
+
+    def test_parametri_non_validi(self, tmp_path):
+        with pytest.raises(BatchReportError):
+            BatchReportJob(FakeDBManager([]), str(tmp_path))
+        with pytest.raises(BatchReportError):
+            BatchReportJob(FakeDBManager([]), str(tmp_path), comune_id=1, mode="zip")
+
+    def test_nome_file(self):
+        assert _output_name(7, {"numero_partita": 12, "suffisso_partita": "bis/1"}, "pdf") == "partita_00012bis1_id7.pdf"
+
+    def test_ripresa_dopo_interruzione(self, tmp_path):
+        pytest.importorskip("fpdf")
+        db = FakeDBManager([1, 2, 3], fail_after=2)
+        job = BatchReportJob(db, str(tmp_path), comune_id=5, mode=MODE_PER_PARTITA, workers=1)
+        with pytest.raises(RuntimeError):
+            job.run()
+        with open(tmp_path / MANIFEST_NAME, encoding="utf-8") as f:
+            assert json.load(f)["stato"] == "errore"
+
+        db.fail_after = None
+        manifest = BatchReportJob(db, str(tmp_path), comune_id=5, mode=MODE_PER_PARTITA, workers=1).run()
+        assert db.requested[-1] == [3]  # Solo la partita mancante
+        assert manifest["stato"] == "completato" and manifest["totali"]["ok"] == 3
+        assert all(os.path.exists(tmp_path / v["file"]) for v in manifest["voci"].values())
+
+    def test_pdf_unico(self, tmp_path):
+        pytest.importorskip("fpdf")
+        manifest = BatchReportJob(FakeDBManager([4, 5]), str(tmp_path), comune_id=5, mode=MODE_UNICO,
+                                  workers=1, comune_nome="Carcare").run()
+        assert manifest["file_unico"]["partite"] == 2
+        assert os.path.exists(tmp_path / manifest["file_unico"]["file"])
+
+
+class _FakeReportCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if "set_config" in query:  # Profilo di esecuzione "report"
+            return
+        ids = params[0]
+        self.conn.chunks.append(list(ids))
+        # Solo la query delle partite restituisce righe; la partita 3 non esiste
+        self.rows = [{"partita_id": pid, "numero_partita": pid * 10} for pid in ids
+                     if pid != 3] if "p.numero_provenienza" in query else []
+
+    def fetchall(self):
+        return self.rows
+
+
+class _FakeReportPool:
+    def __init__(self):
+        self.chunks = []
+        self.checkouts = 0
+        self.in_use = 0
+
+    def cursor(self, *args, **kwargs):
+        return _FakeReportCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def getconn(self, priority=None, timeout=None):
+        self.checkouts += 1
+        self.in_use += 1
+        return self
+
+    def putconn(self, conn):
+        self.in_use -= 1
+
+
+@pytest.mark.unit
+class TestIterReportProprietaBatch:
+
+    def test_blocchi_per_id_in_transazioni_brevi(self):
+        pytest.importorskip("psycopg2")
+        pytest.importorskip("PyQt5")
+        from catasto_db_manager import CatastoDBManager
+
+        db = CatastoDBManager(dbname="catasto_test", user="test", password="", host="localhost", port=5432)
+        db.pool = pool = _FakeReportPool()
+
+        yielded = []
+        for batch in db.iter_report_proprieta_batch([5, 1, 4, 3, 2, 1], chunk_size=2):
+            assert pool.in_use == 0  # Nessuna connessione (né transazione) aperta durante il consumo
+            yielded.append([pid for pid, _ in batch])
+
+        assert yielded == [[1, 2], [4], [5]]
+        assert pool.checkouts == 3
+        assert pool.chunks[::4] == [[1, 2], [3, 4], [5]]
@@ -0,0 +1,127 @@
+"""Test unitari per l'esportazione CSV con COPY (copy_export_to_file, StreamingExportThread)"""
+import logging
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("PyQt5")
+
+from catasto_db_manager import CatastoDBManager, DBOperationCancelled  # noqa: E402
+
+# Due record, il secondo con un campo su più righe: i fine riga non coincidono con i record
+CSV_DATA = b'id;note\n1;semplice\n2;"prima riga\nseconda riga"\n'
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        pass
+
+    def mogrify(self, query, params=None):
+        return query.encode("utf-8")
+
+    def copy_expert(self, query, file_obj):
+        self.conn.copy_queries.append(query)
+        for start in range(0, len(CSV_DATA), 16):
+            file_obj.write(CSV_DATA[start:start + 16])
+        self.rowcount = 2
+
+
+class FakeConnection:
+    encoding = "UTF8"
+
+    def __init__(self):
+        self.copy_queries = []
+        self.rollbacks = 0
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeConnection()
+
+    def getconn(self, priority=None, timeout=None):
+        return self.conn
+
+    def putconn(self, conn):
+        pass
+
+
+def make_manager():
+    db = CatastoDBManager(dbname="catasto_test", user="test", password="", host="localhost", port=5432)
+    db.pool = FakePool()
+    return db
+
+
+class CancellingWriter:
+    def write(self, data):
+        raise DBOperationCancelled()
+
+
+class ChunkCollector:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+@pytest.mark.unit
+class TestCopyExport:
+
+    def test_righe_copiate_dal_driver(self):
+        db = make_manager()
+        target = ChunkCollector()
+        assert db.copy_export_to_file("immobili", None, target) == 2
+        assert target.data == CSV_DATA
+        assert db.pool.conn.copy_queries[0].startswith("COPY (SELECT * FROM (")
+
+    def test_annullamento_registrato_come_informazione(self, caplog):
+        db = make_manager()
+        with caplog.at_level(logging.INFO):
+            with pytest.raises(DBOperationCancelled):
+                db.copy_export_to_file("immobili", None, CancellingWriter())
+        assert db.pool.conn.rollbacks == 1
+        assert not [r for r in caplog.records if r.levelno >= logging.ERROR]
+        assert any("annullata" in r.getMessage() for r in caplog.records)
+
+    def test_thread_usa_il_conteggio_dei_record(self, tmp_path):
+        from gui_widgets import StreamingExportThread
+
+        filename = tmp_path / "immobili.csv"
+        thread = StreamingExportThread(make_manager(), "immobili", None, "csv", str(filename), {}, use_copy=True)
+        assert thread._write_csv_copy(total=2) == 2
+        assert filename.read_bytes() == CSV_DATA
+
+    def test_thread_annullato_durante_la_copy(self, tmp_path):
+        from gui_widgets import StreamingExportThread
+
+        filename = tmp_path / "immobili.csv"
+        db = make_manager()
+        db.count_export_rows = lambda export_key, comune_id: 2
+        thread = StreamingExportThread(db, "immobili", None, "csv", str(filename), {}, use_copy=True)
+        events = []
+        thread.export_cancelled.connect(lambda: events.append("annullata"))
+        thread.error_occurred.connect(events.append)
+        thread.cancel()
+        thread.run()  # Eseguito nel thread del test: i segnali arrivano subito
+        assert events == ["annullata"]
+        assert not filename.exists()
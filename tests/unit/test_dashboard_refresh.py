@@ -0,0 +1,128 @@
+"""Test unitari per l'aggiornamento della dashboard dalle notifiche (DashboardWidget, barra dei dati non aggiornati)"""
+import os
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+
+import pytest
+
+pytest.importorskip("psycopg2")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # Nessun display nei test
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication(["test"])
+
+
+@pytest.fixture
+def dashboard(qapp, monkeypatch):
+    import gui_widgets
+    refreshes = []
+    # I conteggi partono in un QThread: qui interessa solo quando vengono richiesti
+    monkeypatch.setattr(gui_widgets.DashboardWidget, "refresh_stats", lambda self: refreshes.append(1))
+    db_manager = Mock()
+    db_manager.get_recent_session_logs.return_value = [
+        {"data_login": datetime(2026, 10, 19, 9, 0), "azione": "login", "esito": True,
+         "indirizzo_ip": "10.0.0.1", "username": "mario", "nome_completo": "Mario Rossi"}]
+    widget = gui_widgets.DashboardWidget(db_manager, {"nome_completo": "Test", "ruolo": "admin"})
+    widget.refreshes = refreshes
+    refreshes.clear()
+    db_manager.get_recent_session_logs.reset_mock()
+    yield widget
+    widget.deleteLater()
+
+
+@pytest.mark.unit
+class TestDashboardRefresh:
+
+    def test_aggiornamento_mirato_quando_visibile(self, dashboard):
+        dashboard.show()
+        logs = dashboard.db_manager.get_recent_session_logs
+
+        dashboard.handle_entities_changed({"partita"})
+        assert (len(dashboard.refreshes), logs.call_count) == (1, 0)
+
+        dashboard.handle_entities_changed({"sessione"})
+        assert (len(dashboard.refreshes), logs.call_count) == (1, 1)
+        logs.assert_called_with(limit=dashboard.SESSION_LOG_LIMIT)  # Finestra intera, non incrementale
+
+        dashboard.handle_entities_changed({"*"})
+        assert (len(dashboard.refreshes), logs.call_count) == (2, 2)
+
+        dashboard.handle_entities_changed({"variazione"})
+        assert (len(dashboard.refreshes), logs.call_count) == (2, 2)
+
+    def test_modifiche_da_nascosta_applicate_alla_comparsa(self, dashboard):
+        dashboard.hide()
+        logs = dashboard.db_manager.get_recent_session_logs
+
+        dashboard.handle_entities_changed({"comune"})
+        dashboard.handle_entities_changed({"sessione"})
+        assert (len(dashboard.refreshes), logs.call_count) == (0, 0)
+
+        dashboard.show()  # showEvent applica le modifiche accumulate, una volta sola
+        assert (len(dashboard.refreshes), logs.call_count) == (1, 1)
+        dashboard.hide()
+        dashboard.show()
+        assert (len(dashboard.refreshes), logs.call_count) == (1, 1)
+
+    def test_logout_aggiorna_righe_gia_mostrate(self, dashboard):
+        dashboard.show()
+        login = dashboard.db_manager.get_recent_session_logs.return_value[0]
+        dashboard.db_manager.get_recent_session_logs.return_value = [dict(login, azione="logout")]
+        dashboard.handle_entities_changed({"sessione"})
+        assert dashboard.audit_table.rowCount() == 1
+        assert dashboard.audit_table.item(0, 2).text() == "Logout"
+
+
+class FakeSettings:
+    """QSettings senza file: restituisce sempre il valore predefinito."""
+
+    def value(self, key, default=None, type=None):
+        return default
+
+
+@pytest.fixture
+def main_window(qapp, monkeypatch):
+    import gui_main
+    monkeypatch.setattr(gui_main, "QSettings", FakeSettings)
+    window = gui_main.CatastoMainWindow("127.0.0.1")
+    window.db_manager = Mock()
+    yield window
+    window._stale_data_timer.stop()
+    window.deleteLater()
+
+
+@pytest.mark.unit
+class TestStaleDataTimer:
+
+    def _last_refresh(self, window, hours_ago):
+        window.db_manager.get_last_mv_refresh_timestamp.return_value = datetime.now(timezone.utc) - timedelta(hours=hours_ago)
+
+    def test_ricontrollo_alla_scadenza_della_soglia(self, main_window):
+        self._last_refresh(main_window, 23)
+        main_window.check_mv_refresh_status()
+        assert main_window.stale_data_bar.isHidden()
+        assert main_window._stale_data_timer.isActive()
+        # Soglia predefinita di 24 ore: il ricontrollo è previsto tra circa un'ora
+        assert abs(main_window._stale_data_timer.remainingTime() - 3601000) < 5000
+
+        self._last_refresh(main_window, 25)
+        main_window._stale_data_timer.timeout.emit()  # Come allo scadere del timer
+        assert not main_window.stale_data_bar.isHidden()
+        assert not main_window._stale_data_timer.isActive()
+
+    def test_notifica_app_metadata_ricontrolla_subito(self, main_window):
+        self._last_refresh(main_window, 30)
+        main_window.logged_in_user_id = 1
+        main_window._pending_entity_changes = {"app_metadata"}
+        main_window._dispatch_entity_changes()
+        assert not main_window.stale_data_bar.isHidden()
+
+        self._last_refresh(main_window, 1)  # Viste aggiornate da un altro client
+        main_window._pending_entity_changes = {"app_metadata"}
+        main_window._dispatch_entity_changes()
+        assert main_window.stale_data_bar.isHidden()
+        assert main_window._stale_data_timer.isActive()
+        main_window.logged_in_user_id = None
@@ -0,0 +1,113 @@
+"""Test unitari per i conteggi della dashboard (get_dashboard_stats: stime, contatori, COUNT(*))"""
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("PyQt5")
+
+import psycopg2.errors  # noqa: E402
+
+from catasto_db_manager import CatastoDBManager  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.db.queries.append(query)
+        if "pg_stat_user_tables" in query:
+            self.result = [(table, rows) for table, rows in self.db.estimates.items() if table in params[1]]
+        elif "v_contatore_entita" in query:
+            if self.db.counters is None:
+                raise psycopg2.errors.UndefinedTable('relation "catasto.v_contatore_entita" does not exist')
+            self.result = [(table, rows) for table, rows in self.db.counters.items() if table in params[0]]
+        elif "COUNT(*)" in query:
+            self.result = [(self.db.exact[query.split(".")[-1].rstrip(";")],)]
+        else:
+            self.result = []
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0]
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeDatabase:
+    """Stime del pianificatore, contatori dello script 28 (None = vista assente) e conteggi esatti."""
+
+    def __init__(self, estimates=None, counters=None):
+        self.estimates = estimates or {}
+        self.counters = counters
+        self.exact = {"comune": 3, "partita": 30, "possessore": 20, "immobile": 40}
+        self.queries = []
+
+    def getconn(self, priority=None, timeout=None):
+        return FakeConnection(self)
+
+    def putconn(self, conn):
+        pass
+
+
+def get_stats(fake_db, approximate):
+    db = CatastoDBManager(dbname="catasto_test", user="test", password="", host="localhost", port=5432)
+    db.pool = fake_db
+    return db.get_dashboard_stats(approximate=approximate)
+
+
+COUNTERS = {"comune": 4, "partita": 31, "possessore": 21, "immobile": 41}
+
+
+@pytest.mark.unit
+class TestDashboardStats:
+
+    def test_contatori_esatti(self):
+        fake_db = FakeDatabase(estimates={"comune": 100}, counters=COUNTERS)
+        stats = get_stats(fake_db, approximate=False)
+        assert stats["fonte"] == "contatori"
+        assert (stats["total_comuni"], stats["total_immobili"]) == (4, 41)
+        assert not any("pg_stat_user_tables" in q for q in fake_db.queries)
+
+    def test_stime_per_tutte_le_tabelle_analizzate(self):
+        estimates = {"comune": 5, "partita": 500, "possessore": 300, "immobile": 800}
+        fake_db = FakeDatabase(estimates=estimates, counters=COUNTERS)
+        stats = get_stats(fake_db, approximate=True)
+        assert stats["fonte"] == "stime"
+        assert stats["total_partite"] == 500
+        assert not any("v_contatore_entita" in q for q in fake_db.queries)
+
+    def test_tabelle_mai_analizzate_usano_i_contatori(self):
+        fake_db = FakeDatabase(estimates={"partita": 500, "immobile": 800}, counters=COUNTERS)
+        stats = get_stats(fake_db, approximate=True)
+        assert stats["fonte"] == "stime e contatori"
+        assert (stats["total_comuni"], stats["total_partite"], stats["total_possessori"]) == (4, 500, 21)
+        estimate_query = next(q for q in fake_db.queries if "pg_stat_user_tables" in q)
+        assert "last_autoanalyze" in estimate_query and "reltuples >=" not in estimate_query
+
+    def test_senza_script_28_ripiega_sul_conteggio(self):
+        fake_db = FakeDatabase(estimates={"partita": 500}, counters=None)
+        stats = get_stats(fake_db, approximate=True)
+        assert stats["fonte"] == "conteggio"
+        assert (stats["total_comuni"], stats["total_partite"], stats["total_immobili"]) == (3, 500, 40)
+        assert "ROLLBACK TO SAVEPOINT contatori;" in fake_db.queries
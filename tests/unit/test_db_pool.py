@@ -0,0 +1,83 @@
+"""Test unitari per il pool di connessioni bloccante (db_pool.py)"""
+import threading
+import time
+
+import pytest
+
+from db_pool import (BlockingPriorityPool, PoolTimeoutError, PoolError,
+                     PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND)
+
+
+class FakeConnection:
+    """Connessione finta: basta l'attributo closed e il metodo close()."""
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(minconn=0, maxconn=2, timeout=1.0):
+    return BlockingPriorityPool(minconn, maxconn, checkout_timeout=timeout,
+                                connection_factory=lambda *a, **k: FakeConnection(),
+                                dbname="test_db")
+
+
+@pytest.mark.unit
+class TestBlockingPriorityPool:
+
+    def test_riuso_connessione_inattiva(self):
+        pool = make_pool(minconn=1)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        assert pool.getconn() is conn
+        assert pool._kwargs["dbname"] == "test_db"
+
+    def test_timeout_quando_esaurito(self):
+        pool = make_pool(maxconn=1)
+        pool.getconn()
+        start = time.monotonic()
+        with pytest.raises(PoolTimeoutError):
+            pool.getconn(timeout=0.1)
+        assert time.monotonic() - start >= 0.1
+        assert pool.stats()["total_timeouts"] == 1
+
+    def test_attesa_sbloccata_da_putconn(self):
+        pool = make_pool(maxconn=1)
+        conn = pool.getconn()
+        threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+        assert pool.getconn(timeout=2.0) is conn
+
+    def test_corsia_interattiva_servita_prima(self):
+        pool = make_pool(maxconn=1, timeout=2.0)
+        conn = pool.getconn()
+        order = []
+
+        def worker(name, priority):
+            c = pool.getconn(priority=priority)
+            order.append(name)
+            pool.putconn(c)
+
+        t_bg = threading.Thread(target=worker, args=("background", PRIORITY_BACKGROUND))
+        t_bg.start()
+        time.sleep(0.05)
+        t_int = threading.Thread(target=worker, args=("interattiva", PRIORITY_INTERACTIVE))
+        t_int.start()
+        time.sleep(0.05)
+        assert pool.stats()["waiting"] == 2
+
+        pool.putconn(conn)
+        t_bg.join(); t_int.join()
+        assert order == ["interattiva", "background"]
+
+    def test_stats_e_closeall(self):
+        pool = make_pool(maxconn=3)
+        c1 = pool.getconn()
+        pool.getconn()
+        pool.putconn(c1)
+        stats = pool.stats()
+        assert stats["in_use"] == 1 and stats["idle"] == 1 and stats["waiting"] == 0
+        pool.closeall()
+        assert c1.closed
+        with pytest.raises(PoolError):
+            pool.getconn()
@@ -0,0 +1,85 @@
+"""Test unitari per i tab a costruzione differita (DeferredTabWidget, CatastoMainWindow._deferred_tab)"""
+import os
+
+import pytest
+
+pytest.importorskip("psycopg2")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+
+@pytest.fixture(scope="module")
+def main_window():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # Nessun display nei test
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(["test"])
+    from gui_main import CatastoMainWindow
+    window = CatastoMainWindow("127.0.0.1")
+    yield window
+    window.deleteLater()
+    app.processEvents()
+
+
+class CountingWidget(QtWidgets.QWidget):
+    def __init__(self):
+        super().__init__()
+        self.loads = 0
+
+    def load_initial_data(self):
+        self.loads += 1
+
+
+class CountingFactory:
+    def __init__(self):
+        self.calls = 0
+        self.widget = None
+
+    def __call__(self):
+        self.calls += 1
+        self.widget = CountingWidget()
+        return self.widget
+
+
+@pytest.mark.unit
+class TestDeferredTabs:
+
+    def test_costruzione_alla_prima_attivazione(self, main_window):
+        factory = CountingFactory()
+        built = []
+        placeholder = main_window._deferred_tab("Prova", factory, ref_attr="_test_widget_ref", on_built=built.append)
+        tabs = QtWidgets.QTabWidget()
+        tabs.addTab(QtWidgets.QWidget(), "Primo")
+        tabs.addTab(placeholder, "Prova")
+        tabs.currentChanged.connect(main_window.handle_sub_tab_changed)
+        assert factory.calls == 0 and not placeholder.is_built
+
+        for index in (1, 0, 1):
+            tabs.setCurrentIndex(index)
+
+        assert factory.calls == 1
+        assert placeholder.real_widget is factory.widget is main_window._test_widget_ref
+        assert built == [factory.widget]
+        assert factory.widget.loads == 2  # Dati richiesti a ogni attivazione, widget costruito una volta
+        tabs.deleteLater()
+
+    def test_pre_costruzione_in_background(self, main_window):
+        main_window._deferred_tabs = []
+        factories = [CountingFactory(), CountingFactory()]
+        placeholders = [main_window._deferred_tab(f"Tab {n}", f) for n, f in enumerate(factories)]
+        main_window.logged_in_user_id = 1
+        try:
+            generation = main_window._tab_generation
+            main_window._prebuild_next_tab(generation)
+            assert [f.calls for f in factories] == [1, 0]
+
+            placeholders[0].load_initial_data()  # Attivazione dopo la pre-costruzione: nessuna ricostruzione
+            main_window._prebuild_next_tab(generation)
+            main_window._prebuild_next_tab(generation)  # Tutti costruiti: non fa nulla
+            assert [f.calls for f in factories] == [1, 1]
+            assert factories[0].widget.loads == 1 and factories[1].widget.loads == 0
+
+            stale = CountingFactory()
+            main_window._deferred_tab("Dopo il logout", stale)
+            main_window._prebuild_next_tab(generation - 1)  # Generazione superata (nuovo setup_tabs)
+            assert stale.calls == 0
+        finally:
+            main_window.logged_in_user_id = None
+            main_window._deferred_tabs = []
@@ -0,0 +1,102 @@
+"""Test unitari per l'importazione massiva di documenti (document_ingestion.py)"""
+import json
+from contextlib import contextmanager
+
+import pytest
+
+import document_ingestion
+from document_ingestion import ManifestError, PartitaRef, load_report, manifest_identity, parse_manifest
+from document_store import DocumentStore
+
+
+def make_scans(directory, names):
+    for name in names:
+        path = directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(f"scansione {name}".encode())
+
+
+@pytest.mark.unit
+class TestDocumentIngestion:
+
+    def test_manifest_csv(self, tmp_path):
+        make_scans(tmp_path, ["1850/p001.jpg", "1850/p002.jpg"])
+        manifest = tmp_path / "manifest.csv"
+        manifest.write_text(
+            "file;partita_id;comune;numero_partita;titolo;anno;rilevanza\n"
+            "1850/p001.jpg;12|15;;;Registro 1850 p.1;1850;\n"
+            "1850/p002.jpg;;Carcare;34;;;secondaria\n"
+            "1850/p003.jpg;12;;;;;\n"
+            "1850/p001.jpg;16;;;;;\n", encoding="utf-8")
+
+        items, failures = parse_manifest(str(manifest))
+
+        manifest_id = manifest_identity(str(manifest))
+        assert [item.key for item in items] == [f"{manifest_id}:1850/p001.jpg", f"{manifest_id}:1850/p002.jpg"]
+        assert items[0].partita_ids == (12, 15) and items[0].anno == 1850 and items[0].rilevanza == "primaria"
+        assert items[1].partita_ref == PartitaRef(None, "carcare", 34, "")
+        assert items[1].titolo == "p002" and items[1].rilevanza == "secondaria"
+        assert [(f.line, f.message) for f in failures][0] == (4, "file non trovato")
+        assert failures[1].key is None and "riga 2" in failures[1].message
+
+    def test_consegne_diverse_con_lo_stesso_nome_di_manifest(self, tmp_path):
+        keys = []
+        for consegna in ("fornitore_a", "fornitore_b"):
+            make_scans(tmp_path / consegna, ["p001.jpg"])
+            manifest = tmp_path / consegna / "manifest.csv"
+            manifest.write_text("file;partita_id\np001.jpg;7\n", encoding="utf-8")
+            items, _ = parse_manifest(str(manifest))
+            keys.append(items[0].key)
+            assert manifest_identity(str(manifest)).endswith(f"{consegna}/manifest.csv")
+        assert keys[0] != keys[1]
+
+    def test_manifest_json_e_errori(self, tmp_path):
+        make_scans(tmp_path, ["a.pdf"])
+        manifest = tmp_path / "manifest.json"
+        manifest.write_text(json.dumps({"documenti": [{"file": "a.pdf", "partita_id": [3, 4], "anno": "xx"}]}))
+        items, failures = parse_manifest(str(manifest))
+        assert items == [] and "anno" in failures[0].message
+
+        senza_file = tmp_path / "vuoto.csv"
+        senza_file.write_text("nome;partita_id\na.pdf;1\n", encoding="utf-8")
+        with pytest.raises(ManifestError):
+            parse_manifest(str(senza_file))
+
+    def test_ripresa_dopo_errore_del_database(self, tmp_path, monkeypatch):
+        names = [f"p{i:03d}.jpg" for i in range(5)]
+        make_scans(tmp_path, names)
+        manifest = tmp_path / "manifest.csv"
+        manifest.write_text("file;partita_id\n" + "".join(f"{name};7\n" for name in names), encoding="utf-8")
+        inserted = {}
+        fail_after = {"blocchi": 1}
+
+        def fake_insert(conn, schema, store, manifest_name, batch):
+            if fail_after["blocchi"] == 0:
+                raise RuntimeError("connessione persa")
+            fail_after["blocchi"] -= 1
+            ids = {item.key: len(inserted) + n for n, (item, _, _) in enumerate(batch, start=1)}
+            inserted.update(ids)
+            return ids
+
+        monkeypatch.setattr(document_ingestion, "fetch_ingested_keys", lambda conn, schema, name: set(inserted))
+        monkeypatch.setattr(document_ingestion, "resolve_partite",
+                            lambda conn, schema, items: ({item.key: item.partita_ids for item in items}, []))
+        monkeypatch.setattr(document_ingestion, "insert_batch", fake_insert)
+
+        @contextmanager
+        def connection():
+            yield None
+
+        store = DocumentStore(str(tmp_path / "archivio"))
+        with pytest.raises(RuntimeError):
+            document_ingestion.ingest_manifest(str(manifest), store, connection, workers=2, batch_size=2)
+        assert len(inserted) == 2
+
+        fail_after["blocchi"] = 10
+        summary = document_ingestion.ingest_manifest(str(manifest), store, connection, workers=2, batch_size=2)
+
+        assert summary["gia_importati"] == 2 and summary["importati"] == 3 and summary["errori"] == 0
+        assert len(inserted) == 5
+        report = load_report(summary["report"])
+        assert {entry["esito"] for entry in report.values()} == {"importato"}
+        assert len(report) == 5
@@ -0,0 +1,59 @@
+"""Test unitari per l'archivio allegati indirizzato per contenuto (document_store.py)"""
+import hashlib
+import os
+import time
+
+import pytest
+
+from document_store import DocumentStore, normalized_extension
+
+
+def make_file(directory, name, content):
+    path = directory / name
+    path.write_bytes(content)
+    return str(path)
+
+
+@pytest.mark.unit
+class TestDocumentStore:
+
+    def test_contenuto_salvato_una_volta(self, tmp_path):
+        store = DocumentStore(str(tmp_path / "archivio"))
+        first = store.put(make_file(tmp_path, "registro.pdf", b"pagina 1"))
+        second = store.put(make_file(tmp_path, "copia registro.PDF", b"pagina 1"))
+
+        assert first.sha256 == hashlib.sha256(b"pagina 1").hexdigest()
+        assert first.is_new and not second.is_new
+        assert first.path == second.path == store.path_for(first.sha256, ".pdf")
+        assert first.path.startswith(os.path.join(store.objects_dir, first.sha256[:2], first.sha256[2:4]))
+        assert len(list(store.iter_objects())) == 1
+
+    def test_nomi_uguali_contenuti_diversi(self, tmp_path):
+        store = DocumentStore(str(tmp_path / "archivio"))
+        (tmp_path / "a").mkdir()
+        (tmp_path / "b").mkdir()
+        first = store.put(make_file(tmp_path / "a", "scansione.jpg", b"uno"))
+        second = store.put(make_file(tmp_path / "b", "scansione.jpg", b"due"))
+        assert first.path != second.path
+        with open(first.path, "rb") as f:
+            assert f.read() == b"uno"
+
+    def test_pulizia_rispetta_riferimenti_e_periodo_di_grazia(self, tmp_path):
+        store = DocumentStore(str(tmp_path / "archivio"))
+        kept = store.put(make_file(tmp_path, "a.pdf", b"referenziato"))
+        orphan = store.put(make_file(tmp_path, "b.pdf", b"orfano"))
+        recent = store.put(make_file(tmp_path, "c.pdf", b"appena allegato"))
+        old = time.time() - 7200
+        for stored in (kept, orphan):
+            os.utime(stored.path, (old, old))
+
+        removed = store.collect_garbage([kept.sha256], grace_seconds=3600)
+
+        assert removed == {"file": 1, "byte": len(b"orfano")}
+        assert os.path.exists(kept.path) and os.path.exists(recent.path)
+        assert not os.path.exists(orphan.path)
+
+    def test_estensione_normalizzata(self):
+        assert normalized_extension("Registro.JPEG") == ".jpeg"
+        assert normalized_extension("senza_estensione") == ""
+        assert normalized_extension("strano.estensione con spazi") == ""
@@ -0,0 +1,116 @@
+"""Test unitari per i profili di esecuzione di CatastoDBManager (@execution_profile)"""
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("PyQt5")
+
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT  # noqa: E402
+
+from catasto_db_manager import CatastoDBManager, execution_profile  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.log.append(("execute", query, params))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.log = []
+        self.autocommit = False
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def set_isolation_level(self, level):
+        self.log.append(("isolation", level))
+        self.autocommit = level == ISOLATION_LEVEL_AUTOCOMMIT
+
+    def commit(self):
+        self.log.append(("commit",))
+
+    def rollback(self):
+        self.log.append(("rollback",))
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeConnection()
+
+    def getconn(self, priority=None, timeout=None):
+        return self.conn
+
+    def putconn(self, conn):
+        pass
+
+
+def make_manager():
+    db = CatastoDBManager(dbname="catasto_test", user="test", password="", host="localhost", port=5432)
+    db.pool = FakePool()
+    return db
+
+
+def set_config_calls(conn):
+    return [entry for entry in conn.log if entry[0] == "execute" and "set_config" in entry[1]]
+
+
+def run_query(db):
+    with db._get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+
+
+@pytest.mark.unit
+class TestExecutionProfiles:
+
+    def test_metodi_senza_profilo_usano_i_default_del_server(self):
+        db = make_manager()
+        run_query(db)
+        assert set_config_calls(db.pool.conn) == []
+
+    def test_profilo_del_decoratore_e_ripristino(self):
+        db = make_manager()
+        profiled = execution_profile("report")(run_query)
+        profiled(db)
+        (call,) = set_config_calls(db.pool.conn)
+        assert call[1].count("set_config(%s, %s, true)") == len(db.execution_profiles["report"])
+        assert call[2][:2] == ["statement_timeout", db.execution_profiles["report"]["statement_timeout"]]
+
+        db.pool.conn.log.clear()
+        run_query(db)  # Fuori dal metodo decorato non resta alcun profilo
+        assert set_config_calls(db.pool.conn) == []
+
+    def test_profilo_esplicito_e_sovrascritture(self):
+        db = CatastoDBManager(dbname="catasto_test", user="test", password="", host="localhost", port=5432,
+                              execution_profiles={"export": {"statement_timeout": "42s"}})
+        db.pool = FakePool()
+        with db._get_connection(profile="export"):
+            pass
+        (call,) = set_config_calls(db.pool.conn)
+        assert "42s" in call[2] and "work_mem" in call[2]
+
+    def test_script_sql_con_profilo_di_sessione_in_autocommit(self, tmp_path):
+        script = tmp_path / "script.sql"
+        script.write_text("SELECT 1;", encoding="utf-8")
+        db = make_manager()
+
+        ok, _ = db.execute_sql_from_file(str(script))
+
+        assert ok
+        log = db.pool.conn.log
+        autocommit_at = log.index(("isolation", ISOLATION_LEVEL_AUTOCOMMIT))
+        profile_at = next(i for i, entry in enumerate(log) if entry[0] == "execute" and "set_config(%s" in entry[1])
+        script_at = next(i for i, entry in enumerate(log) if entry[0] == "execute" and entry[1] == "SELECT 1;")
+        reset_at = next(i for i, entry in enumerate(log) if entry[0] == "execute" and "reset_val" in entry[1])
+        assert autocommit_at < profile_at < script_at < reset_at
+        assert "false)" in log[profile_at][1] and "true)" not in log[profile_at][1]
+        assert db.pool.conn.autocommit is False
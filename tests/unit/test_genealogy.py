@@ -0,0 +1,105 @@
+"""Test unitari per la genealogia delle partite (get_property_genealogy / get_property_genealogy_graph)"""
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("PyQt5")
+
+from catasto_db_manager import CatastoDBManager, GENEALOGY_MAX_DEPTH  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if "set_config" in query:  # Profilo di esecuzione "report"
+            return
+        self.conn.queries.append((query, params))
+        self.result = self.conn.results.pop(0)
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+
+class FakeConnection:
+    def __init__(self, results):
+        self.results = list(results)
+        self.queries = []
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, results):
+        self.conn = FakeConnection(results)
+
+    def getconn(self, priority=None, timeout=None):
+        return self.conn
+
+    def putconn(self, conn):
+        pass
+
+
+def make_manager(results):
+    db = CatastoDBManager(dbname="catasto_test", user="test", password="", host="localhost", port=5432)
+    db.pool = FakePool(results)
+    return db
+
+
+def node(partita_id, numero):
+    return {"partita_id": partita_id, "comune_nome": "Carcare", "numero_partita": numero, "suffisso_partita": None,
+            "tipo": "principale", "stato": "attiva", "data_impianto": None, "data_chiusura": None, "possessori": None}
+
+
+@pytest.mark.unit
+class TestGenealogiaPartite:
+
+    def test_firma_storica_restituisce_lista(self):
+        righe = [{"livello": 0, "tipo_relazione": "corrente", "partita_id": 7}]
+        db = make_manager([righe])
+        assert db.get_property_genealogy(7) == righe
+        assert "albero_genealogico_proprieta" in db.pool.conn.queries[0][0]
+
+    def test_grafo_dalla_tabella_di_chiusura(self):
+        livelli = [{"partita_id": 2, "livello": 0}, {"partita_id": 1, "livello": -1},
+                   {"partita_id": 3, "livello": 1}, {"partita_id": 4, "livello": 2}]
+        archi = [{"variazione_id": 10, "partita_origine_id": 1, "partita_destinazione_id": 2}]
+        db = make_manager([[(True,)], livelli, [node(4, 40), node(2, 20), node(3, 30), node(1, 10)], archi])
+
+        grafo = db.get_property_genealogy_graph(2, max_depth=999)
+
+        assert grafo["source"] == "chiusura"
+        assert [n["partita_id"] for n in grafo["nodes"]] == [1, 2, 3, 4]
+        assert [n["tipo_relazione"] for n in grafo["nodes"]] == ["predecessore", "corrente", "successore", "successore"]
+        assert grafo["edges"] == archi
+        closure_query, params = db.pool.conn.queries[1]
+        assert "partita_genealogia_chiusura" in closure_query
+        assert params["depth"] == GENEALOGY_MAX_DEPTH  # Profondità richiesta limitata al massimo
+
+    def test_senza_chiusura_usa_la_cte_ricorsiva_e_gestisce_i_cicli(self):
+        # Con un ciclo 5 -> 6 -> 5 la partita 6 è sia antenata sia discendente: vince il livello più vicino
+        livelli = [{"partita_id": 5, "livello": 0}, {"partita_id": 6, "livello": -2}, {"partita_id": 6, "livello": 1}]
+        db = make_manager([[(False,)], livelli, [node(5, 50), node(6, 60)], []])
+
+        grafo = db.get_property_genealogy_graph(5)
+
+        assert grafo["source"] == "ricorsiva"
+        assert "WITH RECURSIVE" in db.pool.conn.queries[1][0]
+        assert {n["partita_id"]: n["livello"] for n in grafo["nodes"]} == {5: 0, 6: 1}
@@ -0,0 +1,148 @@
+"""Test unitari per le esportazioni incrementali (incremental_export.py), senza database"""
+import json
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from incremental_export import (export_changes, export_window_start, list_change_sets,
+                                load_change_set, pending_change_sets, read_checkpoint,
+                                replay_changes, write_change_set)
+
+UNTIL_1 = datetime(2026, 10, 19, 14, 0, 0, 250000)
+UNTIL_2 = datetime(2026, 10, 19, 15, 0, 0)
+
+
+class FakeCursor:
+    """Tabella comune in memoria con vincolo di unicità sul nome."""
+
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self.itersize = None
+        self._result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter(self._result)
+
+    def execute(self, query, params=None):
+        text = repr(query)
+        self._result = []
+        if "LOCALTIMESTAMP" in text:
+            self._result = [(self.conn.now,)]
+        elif "information_schema.columns" in text:
+            if params[1] == "comune":
+                self._result = [("id",), ("nome",), ("data_modifica",)]
+        elif "value_text FROM" in text:
+            self._result = []
+        elif "DELETE FROM" in text:
+            self.conn.statements.append("DELETE")
+            for record_id in params[0]:
+                self.conn.comuni.pop(record_id, None)
+        elif "jsonb_populate_recordset" in text:
+            self.conn.statements.append("UPSERT")
+            for row in json.loads(params[0]):
+                if any(nome == row["nome"] and record_id != row["id"] for record_id, nome in self.conn.comuni.items()):
+                    raise ValueError(f"nome duplicato: {row['nome']}")
+                self.conn.comuni[row["id"]] = row["nome"]
+        elif "to_jsonb" in text:
+            self.conn.statements.append(f"SELECT:{self.name}")
+            self._result = [(json.dumps({"id": record_id, "nome": nome}),)
+                            for record_id, nome in sorted(self.conn.comuni.items())
+                            if params["da"] is None or record_id in self.conn.modified]
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return self._result
+
+
+class FakeConnection:
+    def __init__(self, comuni, now=UNTIL_1):
+        self.comuni = dict(comuni)
+        self.modified = set()
+        self.now = now
+        self.statements = []
+        self.committed = 0
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+    def commit(self):
+        self.committed += 1
+
+    def rollback(self):
+        pass
+
+
+@pytest.mark.unit
+class TestIncrementalExport:
+
+    def test_cartella_nuova_esportazione_completa(self, tmp_path):
+        assert read_checkpoint(str(tmp_path)) is None
+        assert export_window_start(None) is None
+        assert list_change_sets(str(tmp_path / "inesistente")) == []
+
+    def test_scrittura_e_lettura_set(self, tmp_path):
+        rows = {"comune": ['{"id": 1, "nome": "Carcare"}'], "partita": [{"id": 7, "comune_id": 1}], "immobile": []}
+        name = write_change_set(str(tmp_path), 1, None, UNTIL_1, rows, [{"tabella": "possessore", "id": 3}])
+
+        assert name == "000001_20261019_140000"
+        checkpoint = read_checkpoint(str(tmp_path))
+        assert checkpoint["sequence"] == 1 and checkpoint["until"] == UNTIL_1
+
+        change_set = load_change_set(str(tmp_path), name)
+        assert change_set["rows"] == {"comune": [{"id": 1, "nome": "Carcare"}], "partita": [{"id": 7, "comune_id": 1}]}
+        assert change_set["deletes"] == [{"tabella": "possessore", "id": 3}]
+        assert change_set["manifest"]["righe"] == {"comune": 1, "partita": 1}
+
+    def test_sovrapposizione_con_il_set_precedente(self, tmp_path):
+        write_change_set(str(tmp_path), 1, None, UNTIL_1, {"comune": ['{"id": 1}']}, [])
+        start = export_window_start(read_checkpoint(str(tmp_path)), overlap_seconds=600)
+        assert start == datetime(2026, 10, 19, 13, 50, 0, 250000)
+
+    def test_set_da_applicare(self, tmp_path):
+        first = write_change_set(str(tmp_path), 1, None, UNTIL_1, {"comune": ['{"id": 1}']}, [])
+        second = write_change_set(str(tmp_path), 2, UNTIL_1, UNTIL_2, {}, [{"tabella": "partita", "id": 7}])
+        (tmp_path / ".000003_20261019_160000.tmp").mkdir()  # set interrotto: ignorato
+
+        assert list_change_sets(str(tmp_path)) == [first, second]
+        assert pending_change_sets(str(tmp_path), None) == [first, second]
+        assert pending_change_sets(str(tmp_path), first) == [second]
+        assert pending_change_sets(str(tmp_path), second) == []
+
+    def test_riapplicazione_eliminazione_e_reinserimento_stessa_chiave(self, tmp_path):
+        # Comune eliminato e ricreato con un nuovo id e lo stesso nome nella stessa finestra
+        name = write_change_set(str(tmp_path), 1, None, UNTIL_1, {"comune": [{"id": 2, "nome": "Carcare"}]},
+                                [{"tabella": "comune", "id": 1}])
+        conn = FakeConnection({1: "Carcare"})
+
+        assert replay_changes(conn, str(tmp_path), schema="catasto") == [name]
+        assert conn.statements == ["DELETE", "UPSERT"]
+        assert conn.comuni == {2: "Carcare"}
+        assert conn.committed == 1
+
+    def test_esportazione_da_cursore_lato_server(self, tmp_path):
+        conn = FakeConnection({1: "Carcare", 2: "Cairo Montenotte"})
+        first = export_changes(conn, str(tmp_path))
+        assert first["set"] == "000001_20261019_140000" and first["righe"] == 2
+        assert conn.statements == ["SELECT:incrementale_comune"]
+        assert load_change_set(str(tmp_path), first["set"])["rows"]["comune"][1] == {"id": 2, "nome": "Cairo Montenotte"}
+
+        # Nessuna modifica: nessun set e nessuna cartella temporanea rimasta
+        conn.now = UNTIL_2
+        assert export_changes(conn, str(tmp_path))["set"] is None
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["000001_20261019_140000", "checkpoint.json"]
+
+        conn.modified = {2}
+        second = export_changes(conn, str(tmp_path))
+        assert second["righe"] == 1
+        assert load_change_set(str(tmp_path), second["set"])["manifest"]["righe"] == {"comune": 1}
@@ -0,0 +1,53 @@
+"""Test unitari per il bus di invalidazione delle cache (invalidation_bus.py)"""
+from unittest.mock import Mock
+
+import pytest
+
+from invalidation_bus import InvalidationBus, parse_payload, ALL
+
+
+@pytest.mark.unit
+class TestInvalidationBus:
+
+    def test_parse_payload(self):
+        assert parse_payload("comune:12") == ("comune", 12)
+        assert parse_payload("partita:*") == ("partita", None)
+        assert parse_payload(" tipo_localita ") == ("tipo_localita", None)
+        assert parse_payload("") == (ALL, None)
+
+    def test_consegna_solo_agli_interessati(self):
+        bus = InvalidationBus()
+        comuni, partite, tutto = Mock(), Mock(), Mock()
+        bus.subscribe("comune", comuni)
+        bus.subscribe("partita", partite)
+        bus.subscribe_all(tutto)
+
+        bus.handle_notification("comune:12")
+
+        comuni.assert_called_once_with("comune", 12)
+        partite.assert_not_called()
+        tutto.assert_called_once_with("comune", 12)
+
+    def test_invalidazione_completa(self):
+        bus = InvalidationBus()
+        comuni, partite = Mock(), Mock()
+        bus.subscribe("comune", comuni)
+        bus.subscribe("partita", partite)
+
+        bus.invalidate_all()
+
+        comuni.assert_called_once_with("comune", None)
+        partite.assert_called_once_with("partita", None)
+
+    def test_errore_in_un_callback_non_blocca_gli_altri(self):
+        bus = InvalidationBus()
+        guasto, sano = Mock(side_effect=RuntimeError("boom")), Mock()
+        bus.subscribe("possessore", guasto)
+        bus.subscribe("possessore", sano)
+
+        bus.publish("possessore", 3)
+        sano.assert_called_once_with("possessore", 3)
+
+        bus.unsubscribe(sano)
+        bus.publish("possessore", 4)
+        assert sano.call_count == 1
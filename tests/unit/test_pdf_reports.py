@@ -0,0 +1,43 @@
+"""Test unitari per le classi PDF dei report testuali (pdf_reports.py)"""
+import logging
+
+import pytest
+
+pytest.importorskip("fpdf")
+
+from fpdf.errors import FPDFException  # noqa: E402
+
+from pdf_reports import PDFPossessore  # noqa: E402
+
+
+@pytest.mark.unit
+class TestPdfReports:
+
+    def test_campo_troppo_lungo_sostituito(self, monkeypatch, caplog):
+        written = []
+        original = PDFPossessore.multi_cell
+
+        def multi_cell(self, w, h, text="", *args, **kwargs):
+            if "xxxx" in text:
+                raise FPDFException("Not enough horizontal space to render a single character")
+            written.append(text)
+            return original(self, w, h, text, *args, **kwargs)
+
+        monkeypatch.setattr(PDFPossessore, "multi_cell", multi_cell)
+        pdf = PDFPossessore()
+        pdf.add_page()
+        with caplog.at_level(logging.WARNING, logger="CatastoGUI"):
+            pdf.chapter_body({"nome_completo": "Rossi Mario", "note": "x" * 500})
+
+        assert written == ["Nome Completo: Rossi Mario", "Note: [DATI TROPPO LUNGHI]"]
+        assert any("chapter_body possessore" in r.getMessage() for r in caplog.records)
+
+    def test_altri_errori_propagati(self, monkeypatch):
+        def multi_cell(self, *args, **kwargs):
+            raise FPDFException("Undefined font")
+
+        monkeypatch.setattr(PDFPossessore, "multi_cell", multi_cell)
+        pdf = PDFPossessore()
+        pdf.add_page()
+        with pytest.raises(FPDFException, match="Undefined font"):
+            pdf.chapter_body({"note": "testo"})
@@ -0,0 +1,46 @@
+"""Test unitari per l'impaginazione veloce delle tabelle PDF (pdf_table.py)"""
+import pytest
+
+pytest.importorskip("fpdf")
+
+from pdf_table import BulkReportPDF, TABLE_FONT, render_table_pdf
+
+HEADERS = ["ID", "Comune", "Possessore", "Note"]
+
+
+def _rows(n):
+    for i in range(n):
+        yield {"ID": i, "Comune": "Cairo Montenotte", "Possessore": f"Rossi Mario fu Giovanni {i}",
+               "Note": "annotazione molto lunga " * (i % 7), "Extra": "ignorato"}
+
+
+@pytest.mark.unit
+class TestPdfTable:
+
+    def test_larghezze_dal_campione(self):
+        pdf = BulkReportPDF(report_title="Prova")
+        sample = [[str(i), "Carcare", "x" * (i % 40), ""] for i in range(100)]
+        layout = pdf.prepare_table(HEADERS, sample)
+        available = pdf.w - pdf.l_margin - pdf.r_margin
+        assert sum(layout.col_widths) == pytest.approx(available)
+        assert layout.col_widths[0] < layout.col_widths[2]
+
+    def test_a_capo_entro_la_colonna(self):
+        pdf = BulkReportPDF(report_title="Prova")
+        layout = pdf.prepare_table(HEADERS, [], col_widths=[20, 20, 20, 20])
+        pdf.set_font(*TABLE_FONT)
+        lines = layout.wrap(3, "Possessore Rossi Mario fu Giovanni e fratelli " + "A" * 60)
+        assert len(lines) > 2
+        assert all(pdf.get_string_width(line) <= 20 for line in lines)
+        assert layout.wrap(3, "breve") == ["breve"]
+
+    def test_stream_su_piu_pagine(self, tmp_path):
+        pdf = BulkReportPDF(report_title="Prova")
+        pdf.alias_nb_pages()
+        assert pdf.print_table(HEADERS, _rows(1500)) == 1500
+        assert pdf.page > 1
+
+        target = tmp_path / "tabella.pdf"
+        assert render_table_pdf(str(target), HEADERS, list(_rows(50))) == 50
+        assert target.read_bytes().startswith(b"%PDF")
+        assert BulkReportPDF().print_table(HEADERS, []) == 0
@@ -0,0 +1,88 @@
+"""Test unitari per la cache dei permessi (permissions.py)"""
+from unittest.mock import Mock
+
+import pytest
+
+from permissions import PermissionCache, ALL_USERS_PAYLOAD
+
+
+def make_cache(**utenti):
+    """utenti: {'u<id>': {'ruolo', 'attivo', 'permessi'}}; il loader è un Mock per contare le query."""
+    loader = Mock(side_effect=lambda utente_id: utenti.get(f"u{utente_id}"))
+    return PermissionCache(loader), loader
+
+
+@pytest.mark.unit
+class TestPermissionCache:
+
+    def test_stessa_logica_di_ha_permesso(self):
+        cache, _ = make_cache(
+            u1={"ruolo": "admin", "attivo": True, "permessi": []},
+            u2={"ruolo": "archivista", "attivo": True, "permessi": ["modifica_partite"]},
+            u3={"ruolo": "admin", "attivo": False, "permessi": []})
+
+        assert cache.has_permission(1, "qualsiasi")
+        assert cache.has_permission(2, "modifica_partite")
+        assert not cache.has_permission(2, "gestione_utenti")
+        assert not cache.has_permission(3, "qualsiasi")
+        assert not cache.has_permission(99, "qualsiasi")
+        assert cache.role(3) is None
+
+    def test_una_sola_query_per_utente(self):
+        cache, loader = make_cache(u2={"ruolo": "archivista", "attivo": True, "permessi": ["a", "b"]})
+
+        for _ in range(50):
+            cache.has_permission(2, "a")
+            cache.role(2)
+
+        assert loader.call_count == 1
+        assert cache.permissions(2) == frozenset({"a", "b"})
+
+    def test_notifica_invalida_utente_o_tutti(self):
+        cache, loader = make_cache(u1={"ruolo": "consultatore", "attivo": True, "permessi": []},
+                                   u2={"ruolo": "archivista", "attivo": True, "permessi": []})
+        cache.load(1)
+        cache.load(2)
+
+        cache.handle_notification("1")
+        cache.role(1)
+        cache.role(2)
+        assert loader.call_count == 3
+
+        cache.handle_notification(ALL_USERS_PAYLOAD)
+        cache.role(1)
+        cache.role(2)
+        assert loader.call_count == 5
+
+    def test_errore_di_caricamento_nega_il_permesso(self):
+        cache = PermissionCache(Mock(side_effect=RuntimeError("pool esaurito")))
+        assert not cache.has_permission(1, "qualsiasi")
+
+    def test_invalidazione_durante_il_caricamento_scarta_il_risultato(self):
+        utente = {"ruolo": "admin", "attivo": True, "permessi": []}
+        cache = None
+
+        def loader(utente_id):
+            letto = dict(utente)
+            if utente["ruolo"] == "admin":
+                # La revoca arriva (e viene notificata) mentre la prima lettura è in corso
+                utente["ruolo"] = "consultatore"
+                cache.handle_notification(str(utente_id))
+            return letto
+
+        cache = PermissionCache(Mock(side_effect=loader))
+        assert cache.load(1)["ruolo"] == "admin"
+        assert cache.role(1) == "consultatore"
+        assert cache.role(1) == "consultatore" and cache._loader.call_count == 2
+
+    def test_scadenza_senza_notifiche(self):
+        now = [0.0]
+        loader = Mock(return_value={"ruolo": "archivista", "attivo": True, "permessi": []})
+        cache = PermissionCache(loader, ttl=60, clock=lambda: now[0])
+        cache.role(1)
+        now[0] = 59
+        cache.role(1)
+        assert loader.call_count == 1
+        now[0] = 61
+        cache.role(1)
+        assert loader.call_count == 2
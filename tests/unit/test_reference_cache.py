@@ -0,0 +1,77 @@
+"""Test unitari per la cache dei dati di riferimento (reference_cache.py)"""
+from unittest.mock import Mock
+
+import pytest
+
+from reference_cache import ReferenceDataCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(ttl=60.0):
+    clock = FakeClock()
+    cache = ReferenceDataCache(clock=clock)
+    loader = Mock(return_value=[{"id": 1, "nome": "Carcare"}, {"id": 2, "nome": "Altare"}])
+    cache.register("comuni", loader, "comune", ttl)
+    return cache, loader, clock
+
+
+@pytest.mark.unit
+class TestReferenceDataCache:
+
+    def test_una_query_finche_valida(self):
+        cache, loader, _ = make_cache()
+        for _ in range(10):
+            assert len(cache.get("comuni")) == 2
+        assert loader.call_count == 1
+        assert cache.stats()["hits"] == 9
+
+    def test_scadenza_ttl(self):
+        cache, loader, clock = make_cache(ttl=60.0)
+        cache.get("comuni")
+        clock.now += 61
+        cache.get("comuni")
+        assert loader.call_count == 2
+
+    def test_invalidazione_per_entita(self):
+        cache, loader, _ = make_cache()
+        cache.get("comuni")
+        cache.invalidate("tipo_localita")
+        cache.get("comuni")
+        assert loader.call_count == 1
+
+        cache.invalidate("comune", 5)
+        cache.get("comuni")
+        assert loader.call_count == 2
+
+    def test_invalidazione_durante_il_caricamento(self):
+        cache, loader, _ = make_cache()
+
+        def carica_e_invalida():
+            cache.invalidate("comune")
+            return [{"id": 1, "nome": "Carcare"}]
+        loader.side_effect = carica_e_invalida
+
+        cache.get("comuni")
+        loader.side_effect = None
+        cache.get("comuni")
+        assert loader.call_count == 2
+
+    def test_restituisce_copie(self):
+        cache, _, _ = make_cache()
+        cache.get("comuni")[0]["nome"] = "modificato"
+        assert cache.get("comuni")[0]["nome"] == "Carcare"
+
+    def test_warm_ignora_gli_errori(self):
+        cache, loader, _ = make_cache()
+        cache.register("periodi", Mock(side_effect=RuntimeError("db giù")), "periodo_storico")
+        cache.warm()
+        assert loader.call_count == 1
+        with pytest.raises(RuntimeError):
+            cache.get("periodi")
@@ -0,0 +1,44 @@
+"""Test unitari per la cache delle anteprime dei documenti (render_cache.py)"""
+import hashlib
+
+import pytest
+
+from render_cache import RenderCache, best_level
+
+LEVELS = [(1024, "livello_1024.jpg"), (2048, "livello_2048.jpg"), (4096, "livello_4096.jpg")]
+
+
+@pytest.mark.unit
+class TestRenderCache:
+
+    def test_scelta_del_livello(self):
+        assert best_level(LEVELS, 800) == (1024, "livello_1024.jpg")
+        assert best_level(LEVELS, 1024) == (1024, "livello_1024.jpg")
+        assert best_level(LEVELS, 3000) == (4096, "livello_4096.jpg")
+        assert best_level(LEVELS, 5000) is None
+
+    def test_chiave_dal_nome_o_dal_contenuto(self, tmp_path):
+        cache = RenderCache(str(tmp_path / "anteprime"))
+        digest = hashlib.sha256(b"scansione").hexdigest()
+        archived = tmp_path / f"{digest}.jpg"
+        archived.write_bytes(b"non letto")
+        assert cache.content_key(str(archived)) == digest
+
+        loose = tmp_path / "registro.jpg"
+        loose.write_bytes(b"scansione")
+        assert cache.content_key(str(loose)) == digest
+        assert cache.get(str(loose)) is None
+
+    def test_piramide_e_miniatura(self, tmp_path):
+        Image = pytest.importorskip("PIL.Image")
+        source = tmp_path / "registro.png"
+        Image.new("RGB", (3000, 1500), "white").save(source)
+        cache = RenderCache(str(tmp_path / "anteprime"))
+
+        render_set = cache.ensure(str(source))
+
+        assert render_set.original_size == (3000, 1500)
+        assert [size for size, _ in render_set.levels] == [1024, 2048]
+        with Image.open(render_set.thumbnail) as thumbnail:
+            assert max(thumbnail.size) == 256
+        assert cache.ensure(str(source)) == render_set
@@ -0,0 +1,121 @@
+"""Test unitari per l'instradamento sulle repliche e il ripiego sul primario (CatastoDBManager)"""
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("PyQt5")
+
+import catasto_db_manager  # noqa: E402
+from catasto_db_manager import CatastoDBManager, read_only_replica  # noqa: E402
+from db_pool import PoolTimeoutError  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if self.conn.error is not None:
+            raise self.conn.error
+
+    def fetchone(self):
+        return (self.conn.name,)
+
+
+class FakeConnection:
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    """Sostituisce BlockingPriorityPool: registra i parametri di creazione."""
+    created = []
+
+    def __init__(self, minconn, maxconn, *args, checkout_timeout=None, **kwargs):
+        self.kwargs = kwargs
+        self.conn = FakeConnection(kwargs.get("dsn", "primario"))
+        self.timeout = False
+        FakePool.created.append(self)
+
+    def getconn(self, priority=None, timeout=None):
+        if self.timeout:
+            raise PoolTimeoutError("pool esaurito")
+        return self.conn
+
+    def putconn(self, conn):
+        pass
+
+    def closeall(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    FakePool.created = []
+    monkeypatch.setattr(catasto_db_manager, "BlockingPriorityPool", FakePool)
+    manager = CatastoDBManager(dbname="catasto_test", user="test", password="", host="localhost", port=5432,
+                               replica_dsns=["host=replica1 port=5433"])
+    manager.pool = FakePool(1, 2)
+    manager._initialize_replica_pools()
+    return manager
+
+
+@read_only_replica
+def read_server(db):
+    try:
+        with db._get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+                return cur.fetchone()[0]
+    except Exception:
+        return None  # come molti metodi del manager, che gestiscono l'errore al loro interno
+
+
+@pytest.mark.unit
+class TestReplicaFallback:
+
+    def test_application_name_come_parametro_di_connessione(self, db):
+        replica_pool = db.replica_pools[0]["pool"]
+        assert replica_pool.kwargs["application_name"] == "CatastoApp_Pool_replica"
+        assert "application_name" not in replica_pool.kwargs["options"]
+        assert "default_transaction_read_only=on" in replica_pool.kwargs["options"]
+
+        db.replica_pools[0]["pool"] = None  # ricreazione dopo una caduta
+        db._checkout_replica_connection(priority=None)
+        assert db.replica_pools[0]["pool"].kwargs["application_name"] == "CatastoApp_Pool_replica"
+
+    def test_replica_occupata_non_viene_esclusa(self, db):
+        db.replica_pools[0]["pool"].timeout = True
+        assert db._checkout_replica_connection(priority=None) == (None, None)
+        assert db.get_replica_status()[0]["available"] is True
+
+    @pytest.mark.parametrize("error", [
+        psycopg2.errors.ReadOnlySqlTransaction("cannot execute UPDATE in a read-only transaction"),
+        psycopg2.errors.SerializationFailure("canceling statement due to conflict with recovery"),
+    ])
+    def test_errore_dello_standby_ripetuto_sul_primario(self, db, error):
+        assert read_server(db).startswith("host=replica1")
+        db.replica_pools[0]["pool"].conn.error = error
+        assert read_server(db) == "primario"
+
+    def test_altri_errori_non_ripetuti(self, db):
+        db.replica_pools[0]["pool"].conn.error = psycopg2.errors.UndefinedTable("relation does not exist")
+        assert read_server(db) is None
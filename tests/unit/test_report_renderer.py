@@ -0,0 +1,57 @@
+"""Test unitari per l'impaginazione client dei report strutturati (report_renderer.py)"""
+from datetime import date
+
+import pytest
+
+from report_renderer import build_report_blocks, format_value, render_html, render_report, render_text
+
+POSSESSORE = {
+    "possessore_id": 7,
+    "nome_completo": "Rossi Mario fu Giovanni",
+    "paternita": None,
+    "comune_nome": "Carcare",
+    "attivo": True,
+    "partite": [
+        {"numero_partita": 12, "comune_nome": "Carcare", "tipo": "principale", "stato": "attiva",
+         "data_impianto": "1950-03-01", "data_chiusura": None, "titolo": "proprietà esclusiva",
+         "quota": None, "num_immobili": 2,
+         "immobili": [{"natura": "Casa", "localita_nome": "Vispa"}, {"natura": "Prato", "localita_nome": None}]},
+    ],
+    "variazioni": [],
+}
+
+
+@pytest.mark.unit
+class TestReportRenderer:
+
+    def test_format_value(self):
+        assert format_value(None) is None
+        assert format_value(True) == "Sì"
+        assert format_value("1950-03-01") == "01/03/1950"
+        assert format_value(date(1951, 12, 31)) == "31/12/1951"
+        assert format_value(42) == "42"
+
+    def test_blocchi_omettono_campi_nulli(self):
+        blocks = build_report_blocks("possessore", POSSESSORE)
+        labels = [b[1] for b in blocks if b[0] == "campo"]
+        assert "Paternità" not in labels and "Attivo" in labels
+        voce = next(b for b in blocks if b[0] == "voce")
+        assert voce[1] == "Partita n. 12 (Carcare)"
+        assert ("Chiusura", "01/03/1950") not in voce[2]
+        assert voce[3] == ["Casa in Vispa", "Prato in N/D"]
+        assert ("nota", "Nessuna variazione correlata.") in blocks
+
+    def test_render_text_e_html(self):
+        text = render_text("possessore", POSSESSORE, generated_on=date(2024, 1, 2))
+        assert "POSSESSORE: Rossi Mario fu Giovanni" in text
+        assert "Report generato il: 02/01/2024" in text
+        page = render_html("consultazioni", {"consultazioni": [{"id": 1, "data": "2024-01-02",
+                                                                "richiedente": "<script>"}]})
+        assert "&lt;script&gt;" in page and "<script>" not in page
+        assert "Totale consultazioni: 1" in page
+
+    def test_tipo_o_formato_sconosciuto(self):
+        with pytest.raises(ValueError):
+            build_report_blocks("inesistente", {})
+        with pytest.raises(ValueError):
+            render_report("proprieta", {}, fmt="docx")
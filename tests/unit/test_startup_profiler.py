@@ -0,0 +1,47 @@
+"""Test unitari per la profilazione dell'avvio (startup_profiler.py)"""
+import builtins
+import json
+import sys
+
+import pytest
+
+import startup_profiler
+from startup_profiler import StartupProfiler
+
+
+@pytest.mark.unit
+class TestStartupProfiler:
+
+    def test_misura_import_fasi_e_traguardi(self, tmp_path, monkeypatch):
+        (tmp_path / "modulo_lento_figlio.py").write_text("import time\ntime.sleep(0.02)\n")
+        (tmp_path / "modulo_lento.py").write_text("import modulo_lento_figlio\n")
+        monkeypatch.syspath_prepend(str(tmp_path))
+        output = tmp_path / "profilo.json"
+
+        profiler = StartupProfiler(str(output))
+        profiler.install()
+        try:
+            import modulo_lento  # noqa: F401
+            with profiler.phase("tab Prova"):
+                pass
+            profiler.mark("login")
+        finally:
+            profiler.report()
+            sys.modules.pop("modulo_lento", None)
+            sys.modules.pop("modulo_lento_figlio", None)
+
+        cumulativo, proprio = profiler.imports["modulo_lento"]
+        assert cumulativo >= 0.02 and proprio < cumulativo
+        assert profiler.imports["modulo_lento_figlio"][1] >= 0.02
+        data = json.loads(output.read_text(encoding="utf-8"))
+        assert [f["nome"] for f in data["fasi"]] == ["tab Prova"]
+        assert data["traguardi"][0]["nome"] == "login"
+        assert "modulo_lento" in profiler.format_report()
+        assert not profiler.enabled
+        assert builtins.__import__ != profiler._timed_import
+
+    def test_attivazione_da_riga_di_comando(self):
+        assert startup_profiler.enable_from_argv(["gui_main.py", "--altro"]) is None
+        assert not startup_profiler.is_enabled()
+        with startup_profiler.phase("ignorata"):
+            startup_profiler.mark("ignorato")
@@ -0,0 +1,61 @@
+"""Test unitari per gli aggregati statistici in memoria (stats_cache.py)"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from stats_cache import AggregateCache, ColumnarTable  # noqa: E402
+
+IMMOBILI = [
+    {"comune_nome": "Carcare", "classificazione": "Casa", "numero_immobili": 10, "totale_piani": 20, "totale_vani": 50},
+    {"comune_nome": "Carcare", "classificazione": "Fienile", "numero_immobili": 4, "totale_piani": 4, "totale_vani": 4},
+    {"comune_nome": "altare", "classificazione": "Casa", "numero_immobili": 6, "totale_piani": 12, "totale_vani": 30},
+    {"comune_nome": "Cairo", "classificazione": None, "numero_immobili": 1, "totale_piani": 0, "totale_vani": 0},
+]
+
+
+def immobili_table():
+    return ColumnarTable.from_rows(IMMOBILI, ("comune_nome", "classificazione"),
+                                   ("numero_immobili", "totale_piani", "totale_vani"))
+
+
+@pytest.mark.unit
+class TestStatsCache:
+
+    def test_filtri_e_ordinamento(self):
+        table = immobili_table()
+        assert table.category_values("comune_nome") == ["altare", "Cairo", "Carcare"]
+
+        mask = table.mask({"comune_nome": "Carcare"})
+        rows = table.rows(table.order("numero_immobili", descending=True, mask=mask))
+        assert [row["classificazione"] for row in rows] == ["Casa", "Fienile"]
+
+        assert mask.sum() == 2
+        assert table.mask(contains="CAS").sum() == 2
+        assert table.mask({"comune_nome": "Inesistente"}).sum() == 0
+
+    def test_raggruppamento_con_somma(self):
+        table = immobili_table()
+        grouped = table.group_sum(["classificazione"])
+        rows = {row["classificazione"]: row for row in grouped.rows()}
+        assert rows["Casa"]["numero_immobili"] == 16 and rows["Casa"]["totale_vani"] == 80
+        assert rows[""]["numero_immobili"] == 1
+
+        totals = table.group_sum([], table.mask(contains="car")).rows()
+        assert totals == [{"numero_immobili": 14, "totale_piani": 24, "totale_vani": 54}]
+        assert len(table.group_sum(["comune_nome"], table.mask(contains="nessuno"))) == 0
+
+    def test_ricarica_solo_se_cambia_la_versione(self):
+        state = {"version": "v1"}
+
+        def loader():
+            return state["version"], {"immobili": IMMOBILI}
+
+        cache = AggregateCache(loader, lambda: state["version"])
+        first = cache.get()
+        assert cache.get() is first and cache.loads == 1
+        assert len(first.tables["immobili"]) == 4 and len(first.tables["comuni"]) == 0
+
+        state["version"] = "v2"
+        assert cache.get().version == "v2" and cache.loads == 2
+        cache.get(force=True)
+        assert cache.loads == 3
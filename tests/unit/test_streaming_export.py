@@ -0,0 +1,155 @@
+"""Test unitari per l'esportazione in streaming (build_export_query, iter_export_rows, StreamingExportThread)"""
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("PyQt5")
+
+from catasto_db_manager import CatastoDBManager, DBDataError  # noqa: E402
+
+EXPORT_KEYS = ("possessori", "partite", "immobili", "localita", "variazioni")
+
+
+class FakeNamedCursor:
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+        self.itersize = None
+        self.closed = False
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+        return False
+
+    def execute(self, query, params=None):
+        if self.name is None:  # Cursore normale: solo i set_config del profilo "export"
+            return
+        self.conn.queries.append((query, params))
+        self.rows = list(self.conn.rows)
+
+    def fetchmany(self, size):
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.cursors = []
+
+    def cursor(self, name=None, **kwargs):
+        cursor = FakeNamedCursor(self, name)
+        if name is not None:
+            self.cursors.append(cursor)
+        return cursor
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, rows):
+        self.conn = FakeConnection(rows)
+        self.in_use = 0
+
+    def getconn(self, priority=None, timeout=None):
+        self.in_use += 1
+        return self.conn
+
+    def putconn(self, conn):
+        self.in_use -= 1
+
+
+def make_manager(rows=()):
+    db = CatastoDBManager(dbname="catasto_test", user="test", password="", host="localhost", port=5432)
+    db.pool = FakePool([{"id": n, "nome": f"riga {n}"} for n in rows])
+    return db
+
+
+class FakeExportDB:
+    """db_manager per StreamingExportThread: blocchi finti, registra la chiusura del generatore."""
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.generator_closed = False
+
+    def count_export_rows(self, export_key, comune_id):
+        return sum(len(batch) for batch in self.batches)
+
+    def iter_export_rows(self, export_key, comune_id, batch_size=2000):
+        try:
+            yield from self.batches
+        finally:
+            self.generator_closed = True
+
+
+@pytest.mark.unit
+class TestStreamingExport:
+
+    @pytest.mark.parametrize("export_key", EXPORT_KEYS)
+    def test_query_di_esportazione(self, export_key):
+        db = make_manager()
+        query, params = db.build_export_query(export_key, 3)
+        assert not query.rstrip().endswith(";")  # Deve poter essere racchiusa in COUNT(*) e COPY
+        assert params[0] == 3 and len(params) == query.count("%s")
+
+    def test_query_senza_comune_e_tipo_sconosciuto(self):
+        db = make_manager()
+        for export_key in ("immobili", "localita", "variazioni"):
+            query, params = db.build_export_query(export_key, None)
+            assert params == [] and "WHERE" not in query
+        with pytest.raises(DBDataError):
+            db.build_export_query("catasti", 1)
+
+    def test_lettura_a_blocchi_da_cursore_lato_server(self):
+        db = make_manager(range(5))
+        batches = list(db.iter_export_rows("localita", 3, batch_size=2))
+
+        assert [[row["id"] for row in batch] for batch in batches] == [[0, 1], [2, 3], [4]]
+        (cursor,) = db.pool.conn.cursors
+        assert cursor.name.startswith("export_localita_") and cursor.itersize == 2
+        assert cursor.closed and db.pool.in_use == 0
+
+    def test_chiusura_anticipata_libera_cursore_e_connessione(self):
+        db = make_manager(range(5))
+        rows = db.iter_export_rows("localita", 3, batch_size=2)
+        assert len(next(rows)) == 2
+        assert db.pool.in_use == 1
+        rows.close()  # Come StreamingExportThread all'annullamento
+        assert db.pool.conn.cursors[0].closed and db.pool.in_use == 0
+
+    def test_thread_annullato_tra_un_blocco_e_l_altro(self, tmp_path):
+        from gui_widgets import StreamingExportThread
+
+        filename = tmp_path / "localita.csv"
+        db = FakeExportDB([[{"id": 1}, {"id": 2}], [{"id": 3}], [{"id": 4}]])
+        thread = StreamingExportThread(db, "localita", 3, "csv", str(filename), {"id": "ID"})
+        events = []
+        thread.progress_updated.connect(lambda written, total: written and thread.cancel())
+        thread.export_cancelled.connect(lambda: events.append("annullata"))
+        thread.export_completed.connect(lambda *args: events.append("completata"))
+        thread.run()  # Eseguito nel thread del test: i segnali arrivano subito
+
+        assert events == ["annullata"]
+        assert db.generator_closed
+        assert not filename.exists()
+
+    def test_thread_scrive_tutti_i_blocchi(self, tmp_path):
+        from gui_widgets import StreamingExportThread
+
+        filename = tmp_path / "localita.csv"
+        db = FakeExportDB([[{"id": 1, "nome": "A"}, {"id": 2, "nome": "B"}], [{"id": 3, "nome": "C"}]])
+        thread = StreamingExportThread(db, "localita", 3, "csv", str(filename), {"id": "ID", "nome": "Nome"})
+        completed = []
+        thread.export_completed.connect(lambda path, written: completed.append(written))
+        thread.run()
+
+        assert completed == [3]
+        assert filename.read_text(encoding="utf-8").splitlines() == ["ID;Nome", "1;A", "2;B", "3;C"]
@@ -0,0 +1,40 @@
+"""Test unitari per le serie storiche annuali (time_series.py)"""
+import pytest
+
+from time_series import build_time_series, series_key
+
+ROWS = [
+    (1848, "partite_aperte", "", 5),
+    (1850, "partite_aperte", "", 3),
+    (1850, "immobili", "Casa", 4),
+    (1850, "immobili", "Fienile", 1),
+    (1851, "partite_chiuse", "", 2),
+    (1851, "variazioni", "Vendita", 2),
+    (1852, "variazioni", "Successione", 1),
+    (1852, "variazioni", "Vendita", 1),
+]
+
+
+@pytest.mark.unit
+class TestTimeSeries:
+
+    def test_serie_dense_con_categorie(self):
+        serie = build_time_series(ROWS, 1850, 1853)
+
+        assert serie.years == [1850, 1851, 1852, 1853]
+        assert serie.series["partite_aperte"] == [3, 0, 0, 0]
+        assert serie.series["immobili"] == [5, 0, 0, 0]
+        assert serie.series[series_key("variazioni", "Vendita")] == [0, 2, 1, 0]
+        assert serie.categories("variazioni") == ["Successione", "Vendita"]
+
+    def test_partite_attive_includono_gli_anni_precedenti(self):
+        serie = build_time_series(ROWS, 1850, 1852)
+        assert serie.series["partite_attive"] == [8, 6, 6]
+
+        dal_primo_anno = build_time_series(ROWS, None, 1849)
+        assert dal_primo_anno.years == [1848, 1849]
+        assert dal_primo_anno.series["partite_attive"] == [5, 5]
+
+    def test_intervallo_non_valido(self):
+        with pytest.raises(ValueError):
+            build_time_series(ROWS, 1900, 1850)
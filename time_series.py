@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Serie storiche dalla tabella dei fatti annuali
+==============================================
+statistica_annuale (sql_scripts/27_statistiche_annuali.sql) contiene, per comune e
+anno, pochi conteggi mantenuti da trigger: partite aperte e chiuse, variazioni per
+tipo, immobili per classificazione. CatastoDBManager.get_serie_storiche ne legge
+le righe già sommate sui comuni richiesti (anno, misura, categoria, valore) e
+build_time_series le trasforma in serie annuali dense:
+
+- una serie per misura (somma delle categorie) e una per ogni "misura:categoria";
+- gli anni senza righe valgono 0;
+- partite_attive (partite attive a fine anno) è la somma cumulativa di aperte -
+  chiuse, a partire anche dagli anni precedenti l'intervallo richiesto: per questo
+  le righe vanno lette dal primo anno disponibile fino alla fine dell'intervallo.
+
+Il modulo non importa Qt né psycopg2.
+"""
+
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+MEASURE_LABELS = {
+    "partite_attive": "Partite attive (fine anno)",
+    "partite_aperte": "Partite aperte",
+    "partite_chiuse": "Partite chiuse",
+    "variazioni": "Variazioni",
+    "immobili": "Immobili (per anno di impianto)",
+}
+ACTIVE_PARTITE = "partite_attive"
+CATEGORY_SEPARATOR = ":"
+
+
+class TimeSeries(NamedTuple):
+    years: List[int]
+    series: Dict[str, List[int]]   # misura, oppure "misura:categoria" -> un valore per anno
+
+    def categories(self, measure: str) -> List[str]:
+        """Categorie disponibili per la misura (tipi di variazione, classificazioni), in ordine alfabetico."""
+        prefix = measure + CATEGORY_SEPARATOR
+        return sorted((key[len(prefix):] for key in self.series if key.startswith(prefix)), key=str.casefold)
+
+
+def series_key(measure: str, category: str = "") -> str:
+    return f"{measure}{CATEGORY_SEPARATOR}{category}" if category else measure
+
+
+def build_time_series(rows: Iterable[Tuple[int, str, str, int]], year_start: Optional[int] = None,
+                      year_end: Optional[int] = None) -> TimeSeries:
+    """
+    Serie dense per gli anni da `year_start` a `year_end` compresi, da righe
+    (anno, misura, categoria, valore). Senza `year_start` si parte dal primo anno
+    presente nelle righe; senza `year_end` dall'anno corrente.
+    """
+    rows = list(rows)
+    year_end = year_end if year_end is not None else date.today().year
+    if year_start is None:
+        year_start = min((row[0] for row in rows), default=year_end)
+    if year_start > year_end:
+        raise ValueError(f"Intervallo di anni non valido: {year_start}-{year_end}.")
+    years = list(range(year_start, year_end + 1))
+    series: Dict[str, List[int]] = {measure: [0] * len(years) for measure in MEASURE_LABELS}
+    active_before = 0
+    for year, measure, category, value in rows:
+        if year < year_start:
+            if measure == "partite_aperte":
+                active_before += value
+            elif measure == "partite_chiuse":
+                active_before -= value
+            continue
+        if year > year_end:
+            continue
+        position = year - year_start
+        series.setdefault(measure, [0] * len(years))[position] += value
+        if category:
+            series.setdefault(series_key(measure, category), [0] * len(years))[position] += value
+
+    running = active_before
+    for position in range(len(years)):
+        running += series["partite_aperte"][position] - series["partite_chiuse"][position]
+        series[ACTIVE_PARTITE][position] = running
+    return TimeSeries(years, series)